@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Análise da Cafeicultura no Polo de Varginha/MG
+
+Pacote com as etapas do artigo (ingestão, carregamento, estatística
+descritiva, correlação, regressão, ANOVA, cluster, previsão e gráficos). As
+bibliotecas pesadas (matplotlib, seaborn, scikit-learn, scipy) só são
+importadas pelas etapas que precisam delas, de modo que ``import cafe`` não
+tem custo perceptível.
+"""
+
+import importlib
+
+__version__ = '0.1.0'
+
+# Função pública -> módulo que a implementa (importado sob demanda)
+_API = {
+    'ingerir': 'cafe.ingestao',
+    'load': 'cafe.dados',
+    'describe': 'cafe.estatistica',
+    'correlate': 'cafe.estatistica',
+    'regress': 'cafe.estatistica',
+    'anova': 'cafe.estatistica',
+    'cluster': 'cafe.cluster',
+    'prever': 'cafe.previsao',
+    'render': 'cafe.graficos',
+}
+
+__all__ = sorted(_API)
+
+
+def __getattr__(nome):
+    if nome in _API:
+        return getattr(importlib.import_module(_API[nome]), nome)
+    raise AttributeError(f"module 'cafe' has no attribute {nome!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""Permite executar ``python -m cafe``."""
+
+import sys
+
+from cafe.cli import main
+
+sys.exit(main())
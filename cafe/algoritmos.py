@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Comparação de algoritmos de agrupamento dos estágios de tecnificação.
+
+Além do K-means (``cafe.cluster``), os mesmos dados padronizados são
+agrupados por:
+
+* ``ward``: hierárquico de Ward, cortado em K grupos. Até
+  ``LIMITE_MATRIZ`` linhas usa a árvore da matriz condensada (também em
+  cache, para qualquer K); acima disso, o Ward do scikit-learn restrito ao
+  grafo dos ``VIZINHOS_WARD`` vizinhos mais próximos;
+* ``gmm``: mistura gaussiana de K componentes (covariâncias completas);
+* ``dbscan``: grupos por densidade, com ruído. ``min_amostras`` padrão é
+  2 x o número de variáveis, e ``eps`` é o joelho da curva ordenada das
+  distâncias ao ``min_amostras``-ésimo vizinho.
+
+Todas as distâncias vêm de um único ``cafe.distancias.Distancias``: a
+matriz condensada e os grafos de vizinhos são calculados uma vez, guardados
+em disco e reaproveitados pelo Ward, pelo DBSCAN e pela silhueta de todos
+os algoritmos. Os grupos de cada algoritmo são ordenados pelo índice
+tecnológico médio, como os níveis do K-means.
+"""
+
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from cafe.cluster import cluster, nomes_niveis
+from cafe.distancias import LIMITE_MATRIZ, distancias
+from cafe.instrumentacao import medida
+
+ALGORITMOS = ('kmeans', 'ward', 'gmm', 'dbscan')
+
+NOMES_ALGORITMOS = {
+    'kmeans': 'K-means',
+    'ward': 'Hierárquico (Ward)',
+    'gmm': 'Mistura gaussiana',
+    'dbscan': 'DBSCAN'
+}
+
+# Vizinhos do grafo de conectividade do Ward acima de LIMITE_MATRIZ linhas
+VIZINHOS_WARD = 10
+
+# Rótulo dos pontos de ruído do DBSCAN
+RUIDO = 'Ruído'
+
+
+@dataclass
+class Agrupamento:
+    """Rótulos de um algoritmo (0..K-1 em ordem de índice tecnológico; -1 = ruído)."""
+    algoritmo: str
+    rotulos: np.ndarray
+    tempo: float
+    parametros: dict = field(default_factory=dict)
+    silhueta: object = None
+    calinski_harabasz: float = np.nan
+    davies_bouldin: float = np.nan
+    concordancia: float = np.nan    # índice de Rand ajustado com o K-means
+
+    @property
+    def k(self):
+        return int(len(np.unique(self.rotulos[self.rotulos >= 0])))
+
+    @property
+    def ruido(self):
+        """Fração das observações marcadas como ruído."""
+        return float(np.mean(self.rotulos < 0))
+
+    @property
+    def niveis(self):
+        """Nome do nível de cada linha (``RUIDO`` para -1)."""
+        nomes = np.array([*nomes_niveis(self.k), RUIDO], dtype=object)
+        return nomes[np.where(self.rotulos >= 0, self.rotulos, self.k)]
+
+
+@dataclass
+class Comparacao:
+    """Agrupamentos de cada algoritmo sobre os mesmos dados padronizados."""
+    df: pd.DataFrame
+    agrupamentos: dict     # algoritmo -> Agrupamento
+    distancias: object     # cafe.distancias.Distancias usada por todos
+    variaveis: list
+    tempo: float
+
+
+def ordenar_por_tecnologia(rotulos, indice_tecnologico):
+    """Renumera os grupos como 0..K-1 em ordem crescente de índice tecnológico médio."""
+    rotulos = np.asarray(rotulos)
+    dentro = rotulos >= 0
+    grupos, codigos = np.unique(rotulos[dentro], return_inverse=True)
+    medias = np.bincount(codigos, weights=indice_tecnologico[dentro]) / np.bincount(codigos)
+    posicao = np.empty(len(grupos), dtype=np.intp)
+    posicao[np.argsort(medias, kind='stable')] = np.arange(len(grupos))
+    saida = np.full(len(rotulos), -1, dtype=np.intp)
+    saida[dentro] = posicao[codigos]
+    return saida
+
+
+# ====================
+# ALGORITMOS
+# ====================
+
+def ward(dist, k):
+    """Hierárquico de Ward cortado em ``k`` grupos."""
+    if dist.matriz:
+        from scipy.cluster.hierarchy import fcluster
+
+        return fcluster(dist.ligacao('ward'), k, criterion='maxclust') - 1, {'ligacao': 'ward'}
+    from sklearn.cluster import AgglomerativeClustering
+
+    modelo = AgglomerativeClustering(n_clusters=k, linkage='ward',
+                                     connectivity=dist.conectividade(VIZINHOS_WARD))
+    return modelo.fit_predict(dist.X), {'ligacao': 'ward', 'vizinhos': VIZINHOS_WARD}
+
+
+def gmm(X, k, semente=42):
+    """Mistura gaussiana de ``k`` componentes."""
+    from sklearn.mixture import GaussianMixture
+
+    modelo = GaussianMixture(n_components=k, covariance_type='full', n_init=3,
+                             random_state=semente)
+    return modelo.fit_predict(X), {'covariancia': 'full'}
+
+
+def joelho(valores):
+    """Ponto da curva ordenada mais distante da reta entre os extremos."""
+    y = np.sort(np.asarray(valores, dtype=float))
+    if len(y) < 3 or y[-1] == y[0]:
+        return float(y[-1])
+    x = np.linspace(0, 1, len(y))
+    normalizado = (y - y[0]) / (y[-1] - y[0])
+    return float(y[np.argmax(x - normalizado)])
+
+
+def dbscan(dist, eps=None, min_amostras=None):
+    """DBSCAN sobre o grafo de raio ``eps`` das distâncias compartilhadas."""
+    from sklearn.cluster import DBSCAN
+
+    min_amostras = min_amostras or 2 * dist.X.shape[1]
+    if eps is None:
+        # Distância ao min_amostras-ésimo ponto (contando o próprio)
+        eps = joelho(dist.vizinhos(min_amostras - 1)[0][:, -1])
+    modelo = DBSCAN(eps=eps, min_samples=min_amostras, metric='precomputed')
+    return modelo.fit_predict(dist.raio(eps)), {'eps': round(eps, 6), 'min_amostras': min_amostras}
+
+
+# ====================
+# COMPARAÇÃO
+# ====================
+
+def _metricas(agrupamentos, dist):
+    """Silhueta (numa leitura das distâncias), Calinski-Harabasz, Davies-Bouldin e ARI."""
+    from sklearn.metrics import (adjusted_rand_score, calinski_harabasz_score,
+                                 davies_bouldin_score)
+
+    lista = list(agrupamentos.values())
+    for agrupamento, s in zip(lista, dist.silhuetas([a.rotulos for a in lista])):
+        agrupamento.silhueta = s
+        dentro = agrupamento.rotulos >= 0
+        if agrupamento.k >= 2:
+            agrupamento.calinski_harabasz = calinski_harabasz_score(
+                dist.X[dentro], agrupamento.rotulos[dentro])
+            agrupamento.davies_bouldin = davies_bouldin_score(
+                dist.X[dentro], agrupamento.rotulos[dentro])
+    if 'kmeans' in agrupamentos:
+        referencia = agrupamentos['kmeans'].rotulos
+        for agrupamento in lista:
+            agrupamento.concordancia = adjusted_rand_score(referencia, agrupamento.rotulos)
+
+
+@medida('comparacao_algoritmos')
+def comparar(df, k='auto', algoritmos=ALGORITMOS, variaveis=None, eps=None, min_amostras=None,
+             n_jobs=None, semente=42, cache_disco=True):
+    """
+    Agrupa ``df`` com cada um dos ``algoritmos``. K é o do K-means
+    (``cafe.cluster.cluster``, escolhido automaticamente com ``k='auto'``);
+    o DBSCAN encontra o seu próprio número de grupos.
+    """
+    inicio = time.perf_counter()
+    referencia = cluster(df, k=k, variaveis=variaveis, n_jobs=n_jobs)
+    k = len(referencia.mapeamento)
+    dist = distancias(referencia.X_scaled, cache_disco=cache_disco)
+    tecnologia = referencia.df['indice_tecnologico'].to_numpy(dtype=float)
+
+    agrupamentos = {}
+    for algoritmo in algoritmos:
+        inicio_algoritmo = time.perf_counter()
+        if algoritmo == 'kmeans':
+            rotulos, parametros = referencia.df['cluster'].to_numpy(), {'k': k}
+        elif algoritmo == 'ward':
+            rotulos, parametros = ward(dist, k)
+        elif algoritmo == 'gmm':
+            rotulos, parametros = gmm(dist.X, k, semente)
+        elif algoritmo == 'dbscan':
+            rotulos, parametros = dbscan(dist, eps, min_amostras)
+        else:
+            raise ValueError(f'algoritmo desconhecido: {algoritmo!r}')
+        agrupamentos[algoritmo] = Agrupamento(
+            algoritmo, ordenar_por_tecnologia(rotulos, tecnologia),
+            time.perf_counter() - inicio_algoritmo, parametros)
+    _metricas(agrupamentos, dist)
+
+    saida = referencia.df.drop(columns=['cluster', 'nivel_tecnificacao'])
+    for algoritmo, agrupamento in agrupamentos.items():
+        saida[f'nivel_{algoritmo}'] = agrupamento.niveis
+    return Comparacao(df=saida, agrupamentos=agrupamentos, distancias=dist,
+                      variaveis=referencia.variaveis, tempo=time.perf_counter() - inicio)
+
+
+def tabela(comparacao):
+    """Uma linha por algoritmo com K, ruído, métricas e tempo."""
+    return pd.DataFrame([{
+        'algoritmo': algoritmo,
+        'k': a.k,
+        'ruido': a.ruido,
+        'silhueta': float(a.silhueta),
+        'calinski_harabasz': a.calinski_harabasz,
+        'davies_bouldin': a.davies_bouldin,
+        'ari_kmeans': a.concordancia,
+        'tempo_s': a.tempo,
+        'parametros': ', '.join(f'{chave}={valor}' for chave, valor in a.parametros.items())
+    } for algoritmo, a in comparacao.agrupamentos.items()])
+
+
+# ====================
+# RELATÓRIO
+# ====================
+
+def relatorio(comparacao, saida=None):
+    """Imprime a comparação e grava as métricas e os rótulos em ``saida``."""
+    dist = comparacao.distancias
+    print("=" * 80)
+    print("COMPARAÇÃO DE ALGORITMOS DE AGRUPAMENTO")
+    print("=" * 80)
+    print(f"Observações: {dist.n}; variáveis: {', '.join(comparacao.variaveis)}")
+
+    origem = ('matriz condensada' if dist.matriz
+              else f'árvore k-d (acima de {LIMITE_MATRIZ} linhas; silhueta amostrada)')
+    print(f"\nDistâncias ({origem}), compartilhadas por todos os algoritmos:")
+    for artefato, de_onde, segundos in dist.registro:
+        print(f"  {artefato}: {de_onde} em {segundos:.2f} s")
+
+    metricas = tabela(comparacao)
+    print("\nMétricas (silhueta e Calinski-Harabasz: maior é melhor; Davies-Bouldin: menor; "
+          "ARI: concordância com o K-means):")
+    exibicao = metricas.drop(columns='parametros').assign(
+        algoritmo=metricas['algoritmo'].map(NOMES_ALGORITMOS))
+    print(exibicao.round(4).to_string(index=False))
+    for _, linha in metricas.iterrows():
+        if linha['parametros']:
+            print(f"  {NOMES_ALGORITMOS[linha['algoritmo']]}: {linha['parametros']}")
+
+    print("\nÍndice tecnológico e produtividade médios por nível:")
+    for algoritmo in comparacao.agrupamentos:
+        medias = comparacao.df.groupby(f'nivel_{algoritmo}', sort=False)[
+            ['indice_tecnologico', 'produtividade_kg_ha']].agg(['mean', 'size'])
+        medias = medias.sort_values(('indice_tecnologico', 'mean'))
+        print(f"\n{NOMES_ALGORITMOS[algoritmo]}:")
+        for nivel, linha in medias.iterrows():
+            print(f"  {nivel}: n = {int(linha[('indice_tecnologico', 'size')])}, "
+                  f"índice = {linha[('indice_tecnologico', 'mean')]:.2f}, "
+                  f"produtividade = {linha[('produtividade_kg_ha', 'mean')]:.0f} kg/ha")
+
+    print(f"\nTempo total: {comparacao.tempo:.2f} s")
+
+    if saida is not None:
+        from pathlib import Path
+        saida = Path(saida)
+        saida.mkdir(parents=True, exist_ok=True)
+        metricas.to_csv(saida / 'comparacao_algoritmos.csv', index=False)
+        chaves = [c for c in ('municipio_id', 'municipio', 'ano') if c in comparacao.df.columns]
+        niveis = [f'nivel_{algoritmo}' for algoritmo in comparacao.agrupamentos]
+        comparacao.df[[*chaves, *niveis]].to_csv(saida / 'rotulos_algoritmos.csv', index=False)
+        print(f"\n✓ Tabelas salvas em: {saida / 'comparacao_algoritmos.csv'} e "
+              f"{saida / 'rotulos_algoritmos.csv'}")
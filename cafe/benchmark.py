@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+Suíte de desempenho: tempo e pico de memória de cada etapa da análise em
+datasets sintéticos de tamanho crescente (``cafe.sintetico``).
+
+Cada par (tamanho, etapa) roda num processo novo: o pico de memória
+(``ru_maxrss``) é o da etapa, sem resíduos das anteriores, e uma etapa que
+passa do ``limite`` de tempo ou falha (por exemplo, ``MemoryError``) é
+interrompida sem derrubar a suíte e não é repetida nos tamanhos maiores.
+O dataset de cada tamanho é gravado uma vez em ``<saida>/dados`` e lido do
+cache binário por cada processo, fora da medição (exceto na etapa
+``carga``, que mede a leitura do CSV).
+
+Os resultados ficam em ``benchmark.json``; ``comparar`` aponta as etapas
+que ficaram mais lentas que numa execução anterior.
+"""
+
+import contextlib
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import time
+import traceback
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+TAMANHOS_PADRAO = (15, 10_000, 100_000, 1_000_000, 10_000_000)
+
+ETAPAS = ('carga', 'cache', 'describe', 'correlacao', 'regressao', 'anova', 'kmeans',
+          'silhueta', 'graficos')
+
+# Tempo máximo (s) do processo de uma etapa, preparo incluído; acima dele a
+# etapa é interrompida
+LIMITE_PADRAO = 900
+
+# Aumento de tempo tolerado em relação à execução anterior
+TOLERANCIA = 0.25
+
+# Abaixo deste tempo (s) as diferenças entre execuções são ruído
+TEMPO_MINIMO = 0.05
+
+ARQUIVO_RESULTADOS = 'benchmark.json'
+
+
+@dataclass
+class Medicao:
+    """Tempo e memória de uma etapa em um tamanho de dataset."""
+    tamanho: int
+    linhas: int
+    etapa: str
+    status: str                       # 'ok', 'nao_aplicavel', 'tempo_esgotado', 'erro' ou 'pulada'
+    tempo: float = float('nan')
+    pico_mb: float = float('nan')     # pico de memória do processo da etapa
+    incremento_mb: float = float('nan')  # acréscimo ao pico causado pela etapa
+    pico_processos_mb: float = float('nan')  # maior pico entre os processos do pool
+    erro: str = ''
+
+
+@dataclass
+class ResultadoBenchmark:
+    medicoes: list                    # [Medicao], por tamanho e etapa
+    ambiente: dict = field(default_factory=dict)
+
+    def tabela(self, coluna='tempo'):
+        """DataFrame etapa x linhas com ``coluna`` (NaN onde a etapa não rodou)."""
+        import pandas as pd
+        dados = pd.DataFrame([asdict(m) for m in self.medicoes])
+        dados.loc[dados['status'] != 'ok', coluna] = float('nan')
+        return dados.pivot(index='etapa', columns='linhas', values=coluna).reindex(
+            [e for e in ETAPAS if e in set(dados['etapa'])])
+
+    def salvar(self, caminho):
+        caminho = Path(caminho)
+        conteudo = {'ambiente': self.ambiente,
+                    'medicoes': [{k: _json(v) for k, v in asdict(m).items()}
+                                 for m in self.medicoes]}
+        caminho.write_text(json.dumps(conteudo, indent=2, ensure_ascii=False))
+        return caminho
+
+    @classmethod
+    def carregar(cls, caminho):
+        conteudo = json.loads(Path(caminho).read_text())
+        medicoes = [Medicao(**{k: (float('nan') if v is None else v) for k, v in m.items()})
+                    for m in conteudo['medicoes']]
+        return cls(medicoes, conteudo.get('ambiente', {}))
+
+
+def _json(valor):
+    """Floats arredondados; NaN vira null."""
+    if isinstance(valor, float):
+        return None if valor != valor else round(valor, 4)
+    return valor
+
+
+# ====================
+# ETAPAS
+# ====================
+
+def _carga(caminho, df, n_jobs, saida):
+    from cafe.dados import ler_csv
+    ler_csv(caminho)
+
+
+def _cache(caminho, df, n_jobs, saida):
+    from cafe.dados import load
+    load(caminho)
+
+
+def _describe(caminho, df, n_jobs, saida):
+    from cafe.dados import eh_painel
+    from cafe.estatistica import describe, describe_grupos
+    describe(df)
+    if eh_painel(df):
+        describe_grupos(df, 'municipio_id')
+
+
+def _correlacao(caminho, df, n_jobs, saida):
+    from cafe.estatistica import correlate, variaveis_numericas
+    correlate(df, variaveis_numericas(df))
+
+
+def _regressao(caminho, df, n_jobs, saida):
+    from cafe.dados import eh_painel
+    from cafe.estatistica import ols_grupos, regress
+    regress(df)
+    if eh_painel(df):
+        ols_grupos(df, 'municipio_id')
+
+
+def _anova(caminho, df, n_jobs, saida):
+    from cafe.estatistica import anova, coluna_grupo
+    if coluna_grupo(df) is None:
+        return 'nao_aplicavel'
+    anova(df, n_jobs=n_jobs)
+
+
+def _kmeans(caminho, df, n_jobs, saida):
+    from cafe.cluster import cluster
+    cluster(df, n_jobs=n_jobs)
+
+
+def _silhueta(caminho, df, n_jobs, saida):
+    import numpy as np
+
+    from cafe.cluster import padronizar
+    from cafe.selecao_k import rotular
+    from cafe.silhueta import silhueta
+
+    # Rótulos de 3 centróides sorteados: o custo da silhueta não depende da
+    # qualidade do agrupamento
+    X, _ = padronizar(df)
+    centroides = X[np.random.default_rng(0).choice(len(X), 3, replace=False)]
+    rotulos, _ = rotular(X, centroides)
+    inicio = time.perf_counter()
+    silhueta(X, rotulos, n_jobs=n_jobs)
+    return time.perf_counter() - inicio
+
+
+def _graficos(caminho, df, n_jobs, saida):
+    from cafe.cluster import cluster
+    from cafe.graficos import render
+
+    resultado = cluster(df, k=3, n_jobs=n_jobs)
+    inicio = time.perf_counter()
+    render(df, saida, resultado_cluster=resultado, n_jobs=n_jobs, cache=False)
+    return time.perf_counter() - inicio
+
+
+FUNCOES = {'carga': _carga, 'cache': _cache, 'describe': _describe, 'correlacao': _correlacao,
+           'regressao': _regressao, 'anova': _anova, 'kmeans': _kmeans, 'silhueta': _silhueta,
+           'graficos': _graficos}
+
+# Etapas que medem a leitura e não recebem o DataFrame já carregado
+SEM_DADOS = {'carga', 'cache'}
+
+# Bibliotecas importadas antes da medição: o tempo medido é o do cálculo,
+# não o da importação (constante, ver "Tempo de inicialização" no README)
+IMPORTACOES = {
+    'carga': ('cafe.dados',),
+    'cache': ('cafe.dados',),
+    'regressao': ('scipy.stats',),
+    'anova': ('scipy.stats',),
+    'kmeans': ('scipy.stats', 'sklearn.cluster', 'sklearn.preprocessing'),
+    'silhueta': ('sklearn.preprocessing',),
+    'graficos': ('scipy.stats', 'sklearn.cluster', 'matplotlib.pyplot', 'seaborn'),
+}
+
+
+# ====================
+# EXECUÇÃO
+# ====================
+
+def _picos():
+    """Pico de memória (MB) do processo e do maior processo filho encerrado."""
+    try:
+        import resource
+    except ImportError:
+        return float('nan'), float('nan')
+    # ru_maxrss em KB no Linux e em bytes no macOS
+    escala = 2**20 if platform.system() == 'Darwin' else 2**10
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / escala,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / escala)
+
+
+def _processo_etapa(conexao, etapa, caminho, n_jobs, saida, cache):
+    """Corpo do processo de uma etapa: prepara os dados, mede e devolve pela conexão."""
+    os.environ['CAFE_CACHE'] = str(cache)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for modulo in IMPORTACOES.get(etapa, ()):
+                importlib.import_module(modulo)
+            df = None
+            if etapa not in SEM_DADOS:
+                from cafe.dados import load
+                df = load(caminho)
+            antes, _ = _picos()
+            inicio = time.perf_counter()
+            retorno = FUNCOES[etapa](caminho, df, n_jobs, saida)
+            tempo = time.perf_counter() - inicio
+        pico, pico_processos = _picos()
+        if retorno == 'nao_aplicavel':
+            conexao.send({'status': 'nao_aplicavel'})
+            return
+        # Etapas com preparo próprio devolvem o tempo da parte medida
+        if isinstance(retorno, float):
+            tempo = retorno
+        conexao.send({'status': 'ok', 'tempo': tempo, 'pico_mb': pico,
+                      'incremento_mb': pico - antes, 'pico_processos_mb': pico_processos})
+    except BaseException as erro:
+        conexao.send({'status': 'erro', 'erro': f'{type(erro).__name__}: {erro}',
+                      'detalhe': traceback.format_exc()})
+    finally:
+        conexao.close()
+
+
+def medir(etapa, caminho, n_jobs=None, saida='.', cache=None, limite=LIMITE_PADRAO):
+    """
+    Mede uma etapa sobre o CSV ``caminho`` num processo novo. Retorna um
+    dicionário com ``status`` e, se 'ok', tempo e memória.
+    """
+    from cafe.dados import diretorio_cache
+
+    contexto = multiprocessing.get_context('spawn')
+    receptor, emissor = contexto.Pipe(duplex=False)
+    processo = contexto.Process(target=_processo_etapa,
+                                args=(emissor, etapa, str(caminho), n_jobs, str(saida),
+                                      str(cache or diretorio_cache())))
+    processo.start()
+    emissor.close()
+    if not receptor.poll(limite):
+        processo.terminate()
+        processo.join()
+        return {'status': 'tempo_esgotado', 'erro': f'mais de {limite} s'}
+    try:
+        resposta = receptor.recv()
+    except EOFError:
+        # Processo encerrado sem resposta (por exemplo, morto por falta de memória)
+        resposta = {'status': 'erro', 'erro': 'processo encerrado'}
+    processo.join()
+    if processo.exitcode and resposta['status'] == 'ok':
+        resposta = {'status': 'erro', 'erro': f'código de saída {processo.exitcode}'}
+    resposta.pop('detalhe', None)
+    return resposta
+
+
+def dataset(tamanho, diretorio, semente=42):
+    """Caminho do CSV sintético de ~``tamanho`` linhas, gravado se ainda não existir."""
+    from cafe.sintetico import gravar
+
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    caminho = diretorio / f'sintetico_{tamanho}_{semente}.csv'
+    if not caminho.exists():
+        temporario = caminho.with_suffix('.tmp')
+        gravar(temporario, tamanho, semente=semente)
+        os.replace(temporario, caminho)
+    return caminho
+
+
+def executar(tamanhos=TAMANHOS_PADRAO, etapas=None, saida='benchmark', n_jobs=None,
+             limite=LIMITE_PADRAO, semente=42, ao_medir=None):
+    """
+    Roda as ``etapas`` (padrão: todas) em cada tamanho, do menor para o
+    maior. Uma etapa que falha ou esgota o ``limite`` é marcada 'pulada'
+    nos tamanhos seguintes. ``ao_medir(medicao)`` é chamado a cada medição.
+
+    Retorna ``ResultadoBenchmark``, também gravado em ``<saida>/benchmark.json``.
+    """
+    from cafe.sintetico import ANOS, unidades
+
+    etapas = list(etapas or ETAPAS)
+    desconhecidas = set(etapas) - set(ETAPAS)
+    if desconhecidas:
+        raise ValueError(f'etapas desconhecidas: {", ".join(sorted(desconhecidas))} '
+                         f'(opções: {", ".join(ETAPAS)})')
+    saida = Path(saida)
+    cache = saida / 'cache'
+    ambiente = {'python': platform.python_version(), 'plataforma': platform.platform(),
+                'nucleos': os.cpu_count(), 'n_jobs': n_jobs, 'semente': semente,
+                'limite': limite, 'data': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    medicoes = []
+    interrompidas = set()
+    for tamanho in sorted(tamanhos):
+        caminho = dataset(tamanho, saida / 'dados', semente)
+        linhas = unidades(tamanho) * ANOS
+        # Prepara o cache binário fora da medição
+        medir('cache', caminho, cache=cache, limite=limite)
+        for etapa in etapas:
+            if etapa in interrompidas:
+                medicao = Medicao(tamanho, linhas, etapa, 'pulada')
+            else:
+                resposta = medir(etapa, caminho, n_jobs, saida / 'graficos', cache, limite)
+                medicao = Medicao(tamanho, linhas, etapa, **resposta)
+                if medicao.status in ('erro', 'tempo_esgotado'):
+                    interrompidas.add(etapa)
+            medicoes.append(medicao)
+            if ao_medir is not None:
+                ao_medir(medicao)
+    resultado = ResultadoBenchmark(medicoes, ambiente)
+    resultado.salvar(saida / ARQUIVO_RESULTADOS)
+    return resultado
+
+
+def comparar(atual, anterior, tolerancia=TOLERANCIA, tempo_minimo=TEMPO_MINIMO):
+    """
+    Regressões de desempenho: etapas e tamanhos em que o tempo de ``atual``
+    passou o de ``anterior`` em mais de ``tolerancia`` (fração), ou que
+    rodavam e deixaram de rodar. Retorna DataFrame (etapa, linhas,
+    tempo_anterior, tempo_atual, razao, status).
+    """
+    import pandas as pd
+
+    antes = {(m.etapa, m.linhas): m for m in anterior.medicoes}
+    linhas = []
+    for m in atual.medicoes:
+        base = antes.get((m.etapa, m.linhas))
+        if base is None or base.status != 'ok':
+            continue
+        if m.status != 'ok':
+            if m.status != 'nao_aplicavel':
+                linhas.append((m.etapa, m.linhas, base.tempo, float('nan'), float('nan'),
+                               m.status))
+            continue
+        razao = m.tempo / max(base.tempo, 1e-9)
+        if m.tempo > tempo_minimo and razao > 1 + tolerancia:
+            linhas.append((m.etapa, m.linhas, base.tempo, m.tempo, razao, m.status))
+    return pd.DataFrame(linhas, columns=['etapa', 'linhas', 'tempo_anterior', 'tempo_atual',
+                                         'razao', 'status'])
+
+
+def _formatar(medicao):
+    if medicao.status != 'ok':
+        return {'nao_aplicavel': 'n/a', 'tempo_esgotado': 'limite', 'erro': 'erro',
+                'pulada': '-'}[medicao.status]
+    return f'{medicao.tempo:.2f}s {medicao.pico_mb:.0f}MB'
+
+
+def relatorio(tamanhos=TAMANHOS_PADRAO, etapas=None, saida='benchmark', n_jobs=None,
+              limite=LIMITE_PADRAO, semente=42, anterior=None, tolerancia=TOLERANCIA):
+    """Roda a suíte imprimindo cada medição e a tabela final. Retorna (resultado, regressões)."""
+    # Lido antes: a execução pode sobrescrever o mesmo arquivo
+    base = ResultadoBenchmark.carregar(anterior) if anterior is not None else None
+    print("=" * 80)
+    print("BENCHMARK: TEMPO E MEMÓRIA POR ETAPA")
+    print("=" * 80)
+
+    def ao_medir(m):
+        detalhe = f' ({m.erro})' if m.erro else ''
+        print(f"  {m.linhas:>11,} linhas  {m.etapa:<11} {_formatar(m)}{detalhe}", flush=True)
+
+    resultado = executar(tamanhos, etapas, saida, n_jobs, limite, semente, ao_medir)
+
+    print("\nTEMPO (s) POR ETAPA E NÚMERO DE LINHAS:")
+    print("-" * 80)
+    print(resultado.tabela('tempo').round(3).to_string(na_rep='-'))
+    print("\nPICO DE MEMÓRIA (MB) POR ETAPA E NÚMERO DE LINHAS:")
+    print("-" * 80)
+    print(resultado.tabela('pico_mb').round(0).to_string(na_rep='-'))
+    print(f"\n✓ Resultados salvos em: {Path(saida) / ARQUIVO_RESULTADOS}")
+
+    regressoes = None
+    if base is not None:
+        regressoes = comparar(resultado, base, tolerancia)
+        print(f"\nCOMPARAÇÃO COM {anterior} (tolerância {tolerancia:.0%}):")
+        print("-" * 80)
+        if regressoes.empty:
+            print("  Nenhuma regressão de desempenho.")
+        else:
+            print(regressoes.round(3).to_string(index=False))
+    return resultado, regressoes
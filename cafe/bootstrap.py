@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Intervalos de confiança bootstrap para correlações e coeficientes de
+regressão, vetorizados.
+
+As B reamostras de um bloco são sorteadas de uma vez como uma matriz de
+índices (b, m) e convertidas em contagens: quantas vezes cada unidade
+entrou em cada reamostra. Como médias e co-momentos são somas, os de todas
+as reamostras saem de um único produto de matrizes das contagens pelas
+somas de ``x`` e de ``x x'`` de cada unidade. Nenhuma reamostra é montada
+linha a linha. A partir dos co-momentos, as correlações são uma divisão e as
+regressões usam o MQO em lote (``cafe.regressao.ols_momentos``, com G = b).
+
+Unidades de reamostragem:
+
+* série anual: cada linha (bootstrap de pares);
+* painel: cada município inteiro, com todos os seus anos (bootstrap por
+  conglomerado, que preserva a dependência temporal dentro do município).
+
+Os blocos de reamostras são distribuídos pelo pool de processos
+(``cafe.paralelo``), com sementes derivadas de ``np.random.SeedSequence``:
+o resultado é o mesmo para qualquer ``n_jobs``.
+"""
+
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cafe.dados import eh_painel, flutuante, matriz
+from cafe.estatistica import ALVO, REGRESSORES, VARIAVEIS_NUMERICAS
+from cafe.grupos import IndiceGrupos
+from cafe.paralelo import executor
+from cafe.regressao import ols_momentos
+
+REAMOSTRAS_PADRAO = 10000
+
+# Reamostras por tarefa; limita a memória a ~bloco x unidades contagens
+BLOCO = 2000
+
+# Máximo de elementos da matriz de índices de um bloco (bloco x unidades)
+ELEMENTOS_BLOCO = 2**24
+
+# Somas por unidade de reamostragem em cada processo (ver _inicializar)
+_SOMAS = None
+
+
+@dataclass
+class ResultadoBootstrap:
+    """Estimativas pontuais e intervalos percentis bootstrap."""
+    correlacao: pd.DataFrame          # estimativa (variáveis x variáveis)
+    correlacao_inferior: pd.DataFrame
+    correlacao_superior: pd.DataFrame
+    coeficientes: pd.DataFrame        # intercepto/regressores/r2 x (estimativa, erro_padrao, inferior, superior); None só com correlações
+    reamostras: int
+    unidade: str                      # 'linha' ou nome da coluna do conglomerado
+    confianca: float
+    degeneradas: int                  # reamostras sem variância em alguma variável
+    tempo: float
+
+    def intervalo_correlacao(self, a, b):
+        """(r, inferior, superior) da correlação entre duas variáveis."""
+        return (float(self.correlacao.loc[a, b]), float(self.correlacao_inferior.loc[a, b]),
+                float(self.correlacao_superior.loc[a, b]))
+
+
+def _somas_unidades(X, indice):
+    """Tamanho, soma de x e soma de x x' (achatada) de cada unidade."""
+    produtos = (X[:, :, None] * X[:, None, :]).reshape(len(X), -1)
+    if indice is None:
+        return np.ones(len(X)), X, produtos
+    return indice.contagens.astype(float), indice.soma(X), indice.soma(produtos)
+
+
+def _inicializar(somas):
+    global _SOMAS
+    _SOMAS = somas
+
+
+def _momentos_bloco(semente, b):
+    """Contagens de b reamostras e os momentos (n, médias, co-momentos) de cada uma."""
+    tamanhos, soma_x, soma_xx = _SOMAS
+    m, p = soma_x.shape
+    rng = np.random.default_rng(semente)
+    indices = rng.integers(0, m, size=(b, m))
+    contagens = np.bincount((indices + m * np.arange(b)[:, None]).ravel(),
+                            minlength=b * m).reshape(b, m).astype(float)
+    n = contagens @ tamanhos
+    media = (contagens @ soma_x) / n[:, None]
+    C = (contagens @ soma_xx).reshape(b, p, p) - n[:, None, None] * media[:, :, None] * media[:, None, :]
+    return n, media, C
+
+
+def _tarefa(semente, b, posicoes_r, posicao_y, centro):
+    n, media, C = _momentos_bloco(semente, b)
+    desvio = np.sqrt(np.diagonal(C, axis1=1, axis2=2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = C / (desvio[:, :, None] * desvio[:, None, :])
+    if posicao_y is None:
+        return r, None
+    media = media + centro
+    modelos = ols_momentos(n, media[:, posicoes_r], media[:, posicao_y],
+                           C[:, posicoes_r][:, :, posicoes_r], C[:, posicoes_r, posicao_y],
+                           C[:, posicao_y, posicao_y])
+    return r, np.column_stack([modelos.coeficientes, modelos.r2])
+
+
+def bootstrap(df, variaveis=None, alvo=ALVO, regressores=None, reamostras=REAMOSTRAS_PADRAO,
+              confianca=0.95, semente=42, por=None, n_jobs=None, bloco=BLOCO, coeficientes=True):
+    """
+    Intervalos bootstrap percentis para a matriz de correlação de
+    ``variaveis`` e para a regressão de ``alvo`` sobre ``regressores``.
+    Com ``coeficientes=False`` só as correlações são reamostradas (sem o
+    MQO, que importa scipy) e ``coeficientes`` do resultado fica None.
+
+    ``por``: coluna das unidades de reamostragem (padrão: ``municipio_id``
+    no modo painel, linhas na série anual).
+    """
+    inicio = time.perf_counter()
+    regressores = list(regressores or REGRESSORES) if coeficientes else []
+    variaveis = list(variaveis or VARIAVEIS_NUMERICAS)
+    todas = variaveis + [v for v in [alvo, *regressores] if v not in variaveis] \
+        if coeficientes else variaveis
+    if por is None and eh_painel(df):
+        por = 'municipio_id'
+    indice = IndiceGrupos.de_coluna(df, por) if por else None
+
+    X = matriz(df, todas)
+    # Centrar na média amostral evita cancelamento em x x' com valores grandes;
+    # os desvios (e os co-momentos) ficam em float64
+    centro = X.mean(axis=0, dtype=np.float64)
+    somas = _somas_unidades(X - centro, indice)
+    posicoes_r = [todas.index(v) for v in regressores]
+    posicao_y = todas.index(alvo) if coeficientes else None
+
+    # Com muitas unidades (milhões de linhas) o bloco encolhe para caber na memória
+    bloco = max(1, min(bloco, ELEMENTOS_BLOCO // len(somas[0])))
+    tamanhos = [min(bloco, reamostras - i) for i in range(0, reamostras, bloco)]
+    sementes = np.random.SeedSequence(semente).spawn(len(tamanhos))
+    with executor(n_jobs, _inicializar, (somas,), n_tarefas=len(tamanhos)) as pool:
+        partes = list(pool.map(_tarefa, sementes, tamanhos, [posicoes_r] * len(tamanhos),
+                               [posicao_y] * len(tamanhos), [centro] * len(tamanhos)))
+    r = np.concatenate([parte[0] for parte in partes])
+
+    alfa = (1 - confianca) / 2
+    p = len(variaveis)
+    degeneradas = int((~np.isfinite(r[:, np.arange(p), np.arange(p)])).any(axis=1).sum())
+    with np.errstate(invalid='ignore'):
+        r_inf, r_sup = np.nanquantile(r[:, :p, :p], [alfa, 1 - alfa], axis=0)
+
+    estimativa = df[variaveis].corr()
+    if coeficientes:
+        from cafe.regressao import ols
+
+        coef = np.concatenate([parte[1] for parte in partes])
+        with np.errstate(invalid='ignore'):
+            c_inf, c_sup = np.nanquantile(coef, [alfa, 1 - alfa], axis=0)
+        modelo = ols(matriz(df, regressores), flutuante(df[alvo].to_numpy()))
+        coeficientes = pd.DataFrame({
+            'estimativa': np.append(modelo.coeficientes[0], modelo.r2[0]),
+            'erro_padrao': np.nanstd(coef, axis=0, ddof=1),
+            'inferior': c_inf,
+            'superior': c_sup
+        }, index=['intercepto', *regressores, 'r2'])
+    else:
+        coeficientes = None
+    return ResultadoBootstrap(
+        correlacao=estimativa,
+        correlacao_inferior=pd.DataFrame(r_inf, index=variaveis, columns=variaveis),
+        correlacao_superior=pd.DataFrame(r_sup, index=variaveis, columns=variaveis),
+        coeficientes=coeficientes, reamostras=reamostras, unidade=por or 'linha',
+        confianca=confianca, degeneradas=degeneradas, tempo=time.perf_counter() - inicio)
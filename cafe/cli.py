@@ -0,0 +1,515 @@
+# -*- coding: utf-8 -*-
+"""
+Linha de comando ``cafe``.
+
+Cada subcomando importa somente o que a sua etapa usa: ``cafe corr`` e
+``cafe describe`` carregam apenas pandas, enquanto ``cluster`` e ``render``
+trazem scikit-learn, scipy e matplotlib.
+
+Exemplos::
+
+    cafe corr
+    cafe corr --top-k 5 --metodo spearman --dados indicadores.csv
+    cafe regress --dados outro_dataset.csv
+    cafe cluster --saida analise/
+    cafe cluster --fluxo --dados propriedades.csv
+    cafe comparar --algoritmo ward --algoritmo dbscan --dados painel.csv
+    cafe consenso --reamostras 200 --saida analise/
+    cafe prever --horizonte 5 --dados painel.csv --saida previsoes/
+    cafe janelas --janela 5 --janela 7 --dados painel.csv --saida analise/
+    cafe espacial --vizinhanca municipios_mg.geojson --dados painel.csv --saida analise/
+    cafe cluster --vizinhanca municipios_mg.geojson --pesos knn --dados painel.csv
+    cafe acumular --estado estado.npz --novas safra_2025.csv
+    cafe render --conjunto visualizacoes --saida analise/
+    cafe render --por-municipio --dados painel.csv --saida municipios/
+    cafe render --perfil rascunho --saida previa/
+    cafe sintetico --linhas 1000000 --saida dados/
+    cafe ingerir --fontes brutos/ --saida dados/
+    cafe benchmark --tamanhos 15 100000 1000000 --comparar anterior.json
+    cafe servir --porta 8000 --dados painel.csv
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+
+def _cmd_describe(args):
+    from cafe import estatistica
+    df = _carregar(args)
+    estatistica.relatorio_visao_geral(df)
+    estatistica.relatorio_descritivo(df)
+
+
+def _cmd_corr(args):
+    from cafe import estatistica
+    df = _carregar(args)
+    estatistica.relatorio_correlacao(df, reamostras=args.reamostras, n_jobs=args.n_jobs)
+    if args.top_k:
+        caminho = Path(args.saida) / 'parceiros_correlacao.csv'
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        estatistica.relatorio_parceiros(df, args.top_k, args.metodo, caminho)
+
+
+def _cmd_regress(args):
+    from cafe import estatistica
+    estatistica.relatorio_regressao(_carregar(args), reamostras=args.reamostras,
+                                    n_jobs=args.n_jobs)
+
+
+def _cmd_anova(args):
+    from cafe import estatistica
+    estatistica.relatorio_anova(_carregar(args), n_jobs=args.n_jobs,
+                                permutacoes=args.permutacoes)
+
+
+def _cmd_estatistica(args):
+    from cafe import estatistica
+    estatistica.relatorio(_carregar(args), reamostras=args.reamostras, n_jobs=args.n_jobs)
+
+
+def _cmd_prever(args):
+    from cafe import previsao
+    df = _carregar(args)
+    modelos = args.modelo or previsao.MODELOS
+    resultado = previsao.prever(df, args.variavel, args.horizonte, modelos, args.confianca)
+    validacao = None
+    if args.validacao:
+        validacao = previsao.validar(df, args.variavel, args.validacao, modelos, args.confianca)
+    caminho = Path(args.saida) / f'previsoes_{args.variavel}.csv'
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    previsao.relatorio(resultado, validacao, caminho)
+
+
+def _cmd_janelas(args):
+    from cafe import graficos, janelas
+    df = _carregar(args)
+    try:
+        resultado = janelas.analisar(df, tuple(args.janela or janelas.JANELAS))
+    except ValueError as erro:
+        sys.exit(f'cafe janelas: {erro}')
+    janelas.relatorio(resultado, args.saida)
+    if not args.sem_grafico:
+        graficos.render(df, saida=args.saida, conjuntos=['janelas'], n_jobs=1)
+
+
+def _cmd_espacial(args):
+    from cafe import espacial, graficos
+    if not args.vizinhanca:
+        sys.exit('cafe espacial: informe --vizinhanca (limites GeoJSON ou centróides CSV)')
+    df = _carregar(args)
+    resultado = espacial.analisar(df, args.vizinhanca, args.pesos, args.vizinhos,
+                                  permutacoes=args.permutacoes)
+    espacial.relatorio(resultado, args.saida)
+    if not args.sem_grafico:
+        graficos.render(df, saida=args.saida, conjuntos=['espacial'], n_jobs=1,
+                        resultado_espacial=resultado)
+
+
+def _cmd_acumular(args):
+    from cafe.dados import caminho_dados, hash_arquivo
+    from cafe.incremental import EstadoEstatistico, relatorio
+
+    estado_arquivo = Path(args.estado)
+    if estado_arquivo.exists():
+        estado = EstadoEstatistico.carregar(estado_arquivo)
+        if args.quartis_exatos and not estado.quartis_exatos:
+            sys.exit(f'cafe acumular: {estado_arquivo} foi criado sem --quartis-exatos '
+                     '(os valores já incorporados não foram guardados); crie um novo estado')
+    else:
+        estado = EstadoEstatistico.de_dataframe(_carregar(args), quartis_exatos=args.quartis_exatos)
+        estado.arquivos.add(hash_arquivo(caminho_dados(args.dados)))
+    for caminho in args.novas or []:
+        estado.ingerir(caminho)
+        print(f"✓ Incorporado: {caminho}")
+    estado.salvar(estado_arquivo)
+    relatorio(estado)
+    print(f"\n✓ Estado salvo em: {estado_arquivo}")
+
+
+def _cmd_cluster(args):
+    caminho = Path(args.saida) / 'resultados_cluster.csv'
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    if args.fluxo and args.vizinhanca:
+        sys.exit('cafe cluster: --vizinhanca não está disponível no modo --fluxo')
+    if args.fluxo:
+        from cafe import fluxo
+        fluxo.relatorio(args.dados, caminho, k=args.k, criterio=args.criterio,
+                        tamanho_bloco=args.tamanho_bloco, n_jobs=args.n_jobs)
+    else:
+        from cafe import cluster
+        df, variaveis = _carregar(args), None
+        if args.vizinhanca:
+            from cafe import espacial
+            pesos = espacial.pesos(args.vizinhanca, args.pesos, args.vizinhos)
+            df, defasagens = espacial.com_defasagens(df, pesos)
+            variaveis = [*cluster.VARIAVEIS_CLUSTER, *defasagens]
+        resultado = cluster.relatorio(df, k=args.k, criterio=args.criterio, n_jobs=args.n_jobs,
+                                      silhueta=args.silhueta, variaveis=variaveis)
+        cluster.salvar_resultados(resultado, caminho)
+    print(f"\n✓ Resultados salvos em: {caminho}")
+
+
+def _cmd_comparar(args):
+    from cafe import algoritmos
+    comparacao = algoritmos.comparar(_carregar(args), k=args.k,
+                                     algoritmos=args.algoritmo or algoritmos.ALGORITMOS,
+                                     eps=args.eps, min_amostras=args.min_amostras,
+                                     n_jobs=args.n_jobs, cache_disco=not args.sem_cache)
+    algoritmos.relatorio(comparacao, args.saida)
+
+
+def _cmd_consenso(args):
+    from cafe import consenso, graficos
+    df = _carregar(args)
+    resultado = consenso.consenso(df, k=args.k, reamostras=args.reamostras, fracao=args.fracao,
+                                  modo=args.modo, n_jobs=args.n_jobs, semente=args.semente,
+                                  cache_disco=not args.sem_cache)
+    consenso.relatorio(resultado, args.saida)
+    if not args.sem_grafico:
+        graficos.render(df, saida=args.saida, conjuntos=['consenso'], n_jobs=1,
+                        resultado_consenso=resultado)
+
+
+def _cmd_render(args):
+    from cafe import graficos
+    df, resultado_espacial = _carregar(args), None
+    if 'espacial' in (args.conjunto or []):
+        if not args.vizinhanca:
+            sys.exit('cafe render: o conjunto espacial exige --vizinhanca')
+        from cafe import espacial
+        resultado_espacial = espacial.analisar(df, args.vizinhanca, args.pesos, args.vizinhos)
+    print("Gerando visualizações...")
+    gerados = graficos.render(df, saida=args.saida, conjuntos=args.conjunto,
+                              n_jobs=args.n_jobs, por_municipio=args.por_municipio,
+                              cache=not args.redesenhar, perfil=args.perfil, formato=args.formato,
+                              resultado_espacial=resultado_espacial)
+    print(f"\n{len(gerados)} gráficos gerados em {args.saida}")
+
+
+def _cmd_sintetico(args):
+    from cafe.sintetico import gravar
+    caminho = Path(args.saida) / f'sintetico_{args.linhas}.csv'
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    linhas = gravar(caminho, args.linhas, args.anos, semente=args.semente)
+    print(f"✓ {linhas} linhas salvas em: {caminho}")
+
+
+def _cmd_ingerir(args):
+    from cafe import ingestao
+    resultado = ingestao.ingerir(args.fontes, uf=args.uf or None, n_jobs=args.n_jobs)
+    caminho = Path(args.saida) / args.arquivo
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    ingestao.relatorio(resultado, caminho)
+
+
+def _cmd_benchmark(args):
+    from cafe import benchmark
+    _, regressoes = benchmark.relatorio(args.tamanhos, args.etapa, args.saida, args.n_jobs,
+                                        args.limite, args.semente, args.comparar,
+                                        args.tolerancia)
+    return 1 if regressoes is not None and not regressoes.empty else 0
+
+
+def _cmd_servir(args):
+    from cafe import servidor
+    servidor.servir(args.dados, args.host, args.porta, args.capacidade,
+                    cache=not args.sem_cache, compacto=not args.float64, n_jobs=args.n_jobs)
+
+
+def _carregar(args):
+    from cafe.dados import load
+    return load(args.dados, cache=not args.sem_cache, compacto=not args.float64)
+
+
+def _k(valor):
+    return valor if valor == 'auto' else int(valor)
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(
+        prog='cafe',
+        description='Análise da cafeicultura no Polo de Varginha/MG.')
+    comum = argparse.ArgumentParser(add_help=False)
+    comum.add_argument('--dados', help='caminho do dataset CSV '
+                       '(padrão: $CAFE_DADOS ou dataset_varginha_cafe.csv)')
+    comum.add_argument('--saida', default='.', help='diretório dos arquivos gerados')
+    comum.add_argument('--sem-cache', action='store_true',
+                       help='não usa o cache binário ($CAFE_CACHE) do CSV nem o das '
+                            'distâncias')
+    comum.add_argument('--float64', action='store_true',
+                       help='mantém as medidas em float64 (padrão: float32 nos arquivos '
+                            'a partir de 64 MB e chaves como categorias)')
+    comum.add_argument('--relatorio-execucao', metavar='JSON',
+                       help='grava tempo, CPU, pico de memória e linhas de cada etapa '
+                            '(padrão em cluster e render: relatorio_execucao_<comando>.json '
+                            'em --saida)')
+    comum.add_argument('--perfilar', action='append', metavar='ETAPA',
+                       help="grava o cProfile da etapa (ex.: correlacao, varredura_k, "
+                            "graficos; 'todas'; repetível)")
+    comum.add_argument('--alocacoes', action='append', metavar='ETAPA',
+                       help='mede as alocações da etapa com tracemalloc (repetível)')
+
+    inferencia = argparse.ArgumentParser(add_help=False)
+    inferencia.add_argument('--reamostras', type=int, default=None,
+                            help='reamostras bootstrap dos intervalos de confiança '
+                                 '(padrão: 10000; 0 desativa)')
+    inferencia.add_argument('--n-jobs', type=int, default=None,
+                            help='processos do bootstrap e dos testes de permutação '
+                                 '(padrão: todos os núcleos)')
+
+    vizinhanca = argparse.ArgumentParser(add_help=False)
+    vizinhanca.add_argument('--vizinhanca', metavar='ARQUIVO',
+                            help='limites dos municípios (GeoJSON, ex.: malha do IBGE com '
+                                 'CD_MUN) ou centróides (CSV com código, latitude e longitude)')
+    vizinhanca.add_argument('--pesos', default='rainha', choices=['rainha', 'torre', 'knn'],
+                            help='vizinhança: contiguidade rainha ou torre (GeoJSON) ou os k '
+                                 'mais próximos (padrão: rainha)')
+    vizinhanca.add_argument('--vizinhos', type=int, default=6, metavar='K',
+                            help='vizinhos de --pesos knn (padrão: 6)')
+
+    sub = parser.add_subparsers(dest='comando', metavar='comando')
+    sub.required = True
+
+    sub.add_parser('describe', parents=[comum],
+                   help='visão geral e estatística descritiva').set_defaults(func=_cmd_describe)
+    p = sub.add_parser('corr', parents=[comum, inferencia],
+                       help='correlações com a produtividade')
+    p.add_argument('--top-k', type=int, default=0, metavar='K',
+                   help='lista os K parceiros mais correlacionados de cada variável '
+                        '(grava parceiros_correlacao.csv)')
+    p.add_argument('--metodo', default='pearson', choices=['pearson', 'spearman', 'kendall'],
+                   help='correlação usada em --top-k')
+    p.set_defaults(func=_cmd_corr)
+    sub.add_parser('regress', parents=[comum, inferencia],
+                   help='regressão linear múltipla').set_defaults(func=_cmd_regress)
+    p = sub.add_parser('anova', parents=[comum, inferencia],
+                       help='ANOVA da produtividade entre regiões')
+    p.add_argument('--permutacoes', type=int, default=None,
+                   help='permutações do p-valor (padrão: 9999; 0 usa a distribuição F)')
+    p.set_defaults(func=_cmd_anova)
+    sub.add_parser('estatistica', parents=[comum, inferencia],
+                   help='relatório estatístico completo (seções 1-5)').set_defaults(func=_cmd_estatistica)
+
+    p = sub.add_parser('prever', parents=[comum],
+                       help='previsão da produtividade (ou produção) de cada município')
+    p.add_argument('--variavel', default='produtividade_kg_ha',
+                   help='variável prevista (padrão: produtividade_kg_ha)')
+    p.add_argument('--horizonte', type=int, default=5, help='anos previstos (padrão: 5)')
+    p.add_argument('--modelo', action='append', choices=['tendencia', 'suavizacao', 'regressao'],
+                   help='modelo ajustado (repetível; padrão: todos)')
+    p.add_argument('--confianca', type=float, default=0.95,
+                   help='nível dos intervalos de previsão (padrão: 0.95)')
+    p.add_argument('--validacao', type=int, default=3, metavar='ANOS',
+                   help='anos finais deixados fora do ajuste na validação (padrão: 3; 0 desativa)')
+    p.set_defaults(func=_cmd_prever)
+
+    p = sub.add_parser('janelas', parents=[comum],
+                       help='correlação, média e volatilidade em janelas móveis de anos')
+    p.add_argument('--janela', type=int, action='append',
+                   help='anos de cada janela (repetível; padrão: 5 e 7)')
+    p.add_argument('--sem-grafico', action='store_true',
+                   help='não gera o gráfico 7 (correlação móvel)')
+    p.set_defaults(func=_cmd_janelas)
+
+    p = sub.add_parser('espacial', parents=[comum, vizinhanca],
+                       help='I de Moran global e local (LISA) entre os municípios do painel')
+    p.add_argument('--permutacoes', type=int, default=999,
+                   help='permutações dos testes (padrão: 999; 0 desativa)')
+    p.add_argument('--sem-grafico', action='store_true',
+                   help='não gera os gráficos 8-9 (diagrama de Moran e mapa LISA)')
+    p.set_defaults(func=_cmd_espacial)
+
+    p = sub.add_parser('acumular', parents=[comum],
+                       help='estatísticas incrementais: incorpora novas safras a um estado salvo')
+    p.add_argument('--estado', default='estado_estatistico.npz',
+                   help='arquivo do estado (criado a partir de --dados se não existir)')
+    p.add_argument('--novas', action='append', metavar='CSV',
+                   help='arquivo com as linhas da nova safra (repetível)')
+    p.add_argument('--quartis-exatos', action='store_true',
+                   help='guarda os valores ordenados para quartis exatos (o estado cresce '
+                        'com a base; padrão: histograma de tamanho fixo). Vale na criação '
+                        'do estado')
+    p.set_defaults(func=_cmd_acumular)
+
+    p = sub.add_parser('cluster', parents=[comum, vizinhanca],
+                       help='análise de cluster K-means e resultados_cluster.csv')
+    p.add_argument('-k', type=_k, default='auto',
+                   help="número de clusters ou 'auto' (padrão: escolha automática)")
+    p.add_argument('--criterio', default='consenso',
+                   choices=['consenso', 'silhueta', 'cotovelo', 'gap'],
+                   help='critério da escolha automática de K (padrão: consenso)')
+    p.add_argument('--n-jobs', type=int, default=None,
+                   help='processos da varredura de K (padrão: todos os núcleos)')
+    p.add_argument('--silhueta', default='auto', choices=['auto', 'exata', 'amostrada'],
+                   help='cálculo da silhueta: exata em blocos ou estimada por amostra '
+                        'estratificada (padrão: exata até 20000 linhas)')
+    p.add_argument('--fluxo', action='store_true',
+                   help='lê o CSV em blocos e usa K-means em mini-lotes (memória constante)')
+    p.add_argument('--tamanho-bloco', type=int, default=100000,
+                   help='linhas por bloco no modo --fluxo (padrão: 100000)')
+    p.set_defaults(func=_cmd_cluster)
+
+    p = sub.add_parser('comparar', parents=[comum],
+                       help='compara K-means, Ward, mistura gaussiana e DBSCAN com as mesmas '
+                            'distâncias')
+    p.add_argument('-k', type=_k, default='auto',
+                   help="número de grupos de K-means, Ward e mistura gaussiana ou 'auto' "
+                        "(padrão: o K escolhido para o K-means)")
+    p.add_argument('--algoritmo', action='append', choices=['kmeans', 'ward', 'gmm', 'dbscan'],
+                   help='algoritmo comparado (repetível; padrão: todos)')
+    p.add_argument('--eps', type=float, default=None,
+                   help='raio do DBSCAN nos dados padronizados (padrão: joelho da curva '
+                        'das distâncias ao min-amostras-ésimo vizinho)')
+    p.add_argument('--min-amostras', type=int, default=None,
+                   help='pontos mínimos na vizinhança de um núcleo do DBSCAN '
+                        '(padrão: 2 x número de variáveis)')
+    p.add_argument('--n-jobs', type=int, default=None,
+                   help='processos da varredura de K (padrão: todos os núcleos)')
+    p.set_defaults(func=_cmd_comparar)
+
+    p = sub.add_parser('consenso', parents=[comum],
+                       help='estabilidade dos níveis do cluster em reamostras (consenso)')
+    p.add_argument('-k', type=_k, default='auto',
+                   help="número de clusters ou 'auto' (padrão: o K escolhido para o K-means)")
+    p.add_argument('--reamostras', type=int, default=100,
+                   help='subamostras reagrupadas (padrão: 100)')
+    p.add_argument('--fracao', type=float, default=0.8,
+                   help='fração das linhas sorteada em cada reamostra (padrão: 0.8)')
+    p.add_argument('--modo', choices=['auto', 'denso', 'esparso'], default='auto',
+                   help='co-atribuição de todos os pares (denso) ou só dos vizinhos mais '
+                        'próximos (esparso) (padrão: denso até 5000 linhas)')
+    p.add_argument('--semente', type=int, default=42)
+    p.add_argument('--n-jobs', type=int, default=None,
+                   help='processos das reamostras (padrão: todos os núcleos)')
+    p.add_argument('--sem-grafico', action='store_true',
+                   help='não gera o gráfico 10 (mapa de consenso)')
+    p.set_defaults(func=_cmd_consenso)
+
+    p = sub.add_parser('render', parents=[comum, vizinhanca], help='gera os gráficos do artigo')
+    p.add_argument('--conjunto', action='append',
+                   choices=['visualizacoes', 'estatistica', 'cluster', 'janelas', 'espacial',
+                            'consenso'],
+                   help='conjunto de gráficos (repetível; padrão: os três do artigo)')
+    p.add_argument('--n-jobs', type=int, default=None,
+                   help='processos de desenho (padrão: todos os núcleos)')
+    p.add_argument('--por-municipio', action='store_true',
+                   help='gera os conjuntos de cada município do painel em municipios/<id>/')
+    p.add_argument('--redesenhar', action='store_true',
+                   help='redesenha todas as figuras, sem usar o cache de gráficos')
+    p.add_argument('--perfil', choices=['rascunho', 'publicacao', 'vetorial'],
+                   help='rascunho (72 dpi, sem recorte justo), publicacao (PNG 300 dpi) '
+                        'ou vetorial (PDF) (padrão: $CAFE_PERFIL ou publicacao)')
+    p.add_argument('--formato', choices=['png', 'pdf', 'svg'],
+                   help='troca o formato do perfil (ex.: --perfil vetorial --formato svg)')
+    p.set_defaults(func=_cmd_render)
+
+    p = sub.add_parser('sintetico', help='gera um dataset sintético (metodologia_dataset.md)')
+    p.add_argument('--linhas', type=int, default=15,
+                   help='número aproximado de linhas (unidades x anos; padrão: 15, '
+                        'a série de Varginha)')
+    p.add_argument('--anos', type=int, default=15, help='anos por unidade, a partir de 2010')
+    p.add_argument('--semente', type=int, default=42)
+    p.add_argument('--saida', default='.', help='diretório do arquivo sintetico_<linhas>.csv')
+    p.set_defaults(func=_cmd_sintetico)
+
+    p = sub.add_parser('ingerir',
+                       help='monta o painel municipal a partir das tabelas da PAM, CONAB e '
+                            'fontes regionais')
+    p.add_argument('--fontes', required=True,
+                   help='diretório com os arquivos pam_*, conab_* e regional_* (CSV ou XLSX)')
+    p.add_argument('--uf', default='31',
+                   help="início do código IBGE dos municípios mantidos (padrão: 31, MG; '' = todos)")
+    p.add_argument('--n-jobs', type=int, default=None,
+                   help='processos de leitura dos arquivos (padrão: todos os núcleos)')
+    p.add_argument('--saida', default='.', help='diretório do painel gerado')
+    p.add_argument('--arquivo', default='dataset_mg_cafe.csv',
+                   help='nome do painel gerado (padrão: dataset_mg_cafe.csv)')
+    p.set_defaults(func=_cmd_ingerir)
+
+    p = sub.add_parser('benchmark', help='tempo e memória de cada etapa em datasets sintéticos')
+    p.add_argument('--tamanhos', type=int, nargs='+',
+                   default=[15, 10_000, 100_000, 1_000_000, 10_000_000],
+                   help='linhas de cada dataset (padrão: 15 a 10 milhões)')
+    p.add_argument('--etapa', action='append',
+                   choices=['carga', 'cache', 'describe', 'correlacao', 'regressao', 'anova',
+                            'kmeans', 'silhueta', 'graficos'],
+                   help='etapa medida (repetível; padrão: todas)')
+    p.add_argument('--saida', default='benchmark',
+                   help='diretório dos datasets, do cache e de benchmark.json')
+    p.add_argument('--n-jobs', type=int, default=None,
+                   help='processos das etapas paralelas (padrão: todos os núcleos)')
+    p.add_argument('--limite', type=float, default=900,
+                   help='tempo máximo de cada etapa em segundos (padrão: 900)')
+    p.add_argument('--semente', type=int, default=42)
+    p.add_argument('--comparar', metavar='JSON',
+                   help='benchmark.json anterior; o código de saída é 1 se alguma etapa '
+                        'ficou mais lenta que a tolerância')
+    p.add_argument('--tolerancia', type=float, default=0.25,
+                   help='aumento de tempo tolerado na comparação (padrão: 0.25)')
+    p.set_defaults(func=_cmd_benchmark)
+
+    p = sub.add_parser('servir', parents=[comum],
+                       help='serviço HTTP local com os resultados em memória (JSON e gráficos)')
+    p.add_argument('--host', default='127.0.0.1', help='endereço (padrão: 127.0.0.1)')
+    p.add_argument('--porta', type=int, default=8000, help='porta (padrão: 8000)')
+    p.add_argument('--capacidade', type=int, default=256,
+                   help='respostas e gráficos no cache LRU (padrão: 256)')
+    p.add_argument('--n-jobs', type=int, default=None,
+                   help='processos da varredura de K na carga (padrão: todos os núcleos)')
+    p.set_defaults(func=_cmd_servir)
+    return parser
+
+
+def opcoes_render(argv):
+    """
+    Das opções de um atalho (``analise_cluster.py``, ``analise_estatistica.py``),
+    só as que ``cafe render`` também aceita: dados, saída, cache, tipos e
+    processos. As demais (``-k``, ``--reamostras``...) são do primeiro comando.
+    """
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument('--dados')
+    parser.add_argument('--saida', default='.')
+    parser.add_argument('--sem-cache', action='store_true')
+    parser.add_argument('--float64', action='store_true')
+    parser.add_argument('--n-jobs')
+    args, _ = parser.parse_known_args(argv)
+    opcoes = ['--saida', args.saida]
+    if args.dados:
+        opcoes += ['--dados', args.dados]
+    if args.n_jobs is not None:
+        opcoes += ['--n-jobs', args.n_jobs]
+    opcoes += [opcao for opcao, ativa in (('--sem-cache', args.sem_cache),
+                                          ('--float64', args.float64)) if ativa]
+    return opcoes
+
+
+def _relatorio_execucao(args):
+    """Caminho do relatório de execução do comando, ou None se não for gravado."""
+    from cafe.instrumentacao import ARQUIVO_RELATORIO
+    caminho = getattr(args, 'relatorio_execucao', None)
+    if caminho:
+        return Path(caminho)
+    if args.comando in ('cluster', 'render') or getattr(args, 'perfilar', None) \
+            or getattr(args, 'alocacoes', None):
+        return Path(args.saida) / ARQUIVO_RELATORIO.format(comando=args.comando)
+    return None
+
+
+def main(argv=None):
+    from cafe import instrumentacao
+
+    args = criar_parser().parse_args(argv)
+    destino = _relatorio_execucao(args)
+    if destino is None:
+        return args.func(args) or 0
+    with instrumentacao.execucao(args.comando, args.perfilar, args.alocacoes,
+                                 destino.parent) as execucao:
+        codigo = args.func(args) or 0
+    execucao.salvar(destino)
+    print(f"✓ Relatório de execução salvo em: {destino}")
+    return codigo
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Análise de Cluster (K-means) - Técnica Avançada
+Agrupamento de Anos por Níveis de Tecnificação
+
+scikit-learn e scipy são importados apenas dentro das funções. No modo
+painel cada observação é um município-ano; os subconjuntos por nível são
+separados uma única vez (``separar_niveis``) e reutilizados pelo relatório.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from cafe.dados import eh_painel, matriz
+from cafe.grupos import IndiceGrupos
+from cafe.instrumentacao import medida
+
+# ====================
+# VARIÁVEIS
+# ====================
+
+VARIAVEIS_CLUSTER = [
+    'indice_tecnologico',
+    'investimento_tecnologia_milhoes',
+    'produtividade_kg_ha',
+    'producao_especiais_ton'
+]
+
+NIVEIS = ['Baixa Tecnificação', 'Média Tecnificação', 'Alta Tecnificação']
+
+# Nomes dos níveis para outros K (do menos ao mais tecnificado)
+NIVEIS_POR_K = {
+    2: ['Baixa Tecnificação', 'Alta Tecnificação'],
+    3: NIVEIS,
+    4: ['Baixa Tecnificação', 'Média-Baixa Tecnificação', 'Média-Alta Tecnificação',
+        'Alta Tecnificação'],
+    5: ['Baixa Tecnificação', 'Média-Baixa Tecnificação', 'Média Tecnificação',
+        'Média-Alta Tecnificação', 'Alta Tecnificação']
+}
+
+VARIAVEIS_ANOVA = [
+    ('Produtividade (kg/ha)', 'produtividade_kg_ha'),
+    ('Índice Tecnológico', 'indice_tecnologico'),
+    ('Investimento Tecnologia', 'investimento_tecnologia_milhoes'),
+    ('Produção Cafés Especiais', 'producao_especiais_ton')
+]
+
+K_RANGE = range(2, 8)
+
+# Colunas de resultados_cluster.csv (após as chaves de município, se houver)
+COLUNAS_RESULTADO = ['ano', 'cluster', 'nivel_tecnificacao', 'indice_tecnologico',
+                     'produtividade_kg_ha', 'producao_especiais_ton']
+
+
+@dataclass
+class ResultadoCluster:
+    """Resultado do K-means com os rótulos de tecnificação."""
+    df: object                # DataFrame com colunas 'cluster' e 'nivel_tecnificacao'
+    X_scaled: np.ndarray
+    scaler: object
+    centroides_padronizados: np.ndarray
+    mapeamento: dict          # id do cluster -> nível de tecnificação
+    variaveis: list
+    selecao: object = None    # SelecaoK da varredura de K, se houve
+    metodo_silhueta: str = 'auto'
+
+    @property
+    def niveis(self):
+        """Níveis em ordem crescente de índice tecnológico."""
+        return list(self.mapeamento.values())
+
+    @property
+    def centroides(self):
+        """Centróides na escala original das variáveis."""
+        return self.scaler.inverse_transform(self.centroides_padronizados)
+
+    @property
+    def silhueta(self):
+        """Silhueta dos clusters finais (``cafe.silhueta.Silhueta``), do cache se já calculada."""
+        from cafe.silhueta import silhueta
+
+        return silhueta(self.X_scaled, self.df['cluster'].to_numpy(), self.metodo_silhueta)
+
+    def digest(self):
+        """Impressão digital do que os gráficos usam: dados rotulados, centróides e níveis."""
+        import hashlib
+
+        import pandas as pd
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update(pd.util.hash_pandas_object(self.df, index=True).to_numpy().tobytes())
+        h.update(repr(list(self.df.columns)).encode())
+        h.update(np.ascontiguousarray(self.centroides).tobytes())
+        h.update(repr(self.mapeamento).encode())
+        return h.hexdigest()
+
+
+@dataclass
+class ClusterSobDemanda:
+    """
+    ``cluster(df, **opcoes)`` ainda não calculado, para os gráficos do
+    conjunto 'cluster': a chave de cache vem dos dados e das opções, e a
+    varredura de K só roda se algum gráfico faltar no cache (``resolver``,
+    chamado por ``cafe.renderizacao.executar``).
+    """
+    df: object
+    opcoes: dict = field(default_factory=dict)
+
+    def digest(self):
+        """Impressão digital dos dados, das opções e do código de ``cluster``."""
+        import hashlib
+
+        from cafe.renderizacao import digest_dados, digest_funcao
+
+        partes = [digest_dados(self.df), repr(sorted(self.opcoes.items())), digest_funcao(cluster)]
+        return hashlib.blake2b('|'.join(partes).encode(), digest_size=16).hexdigest()
+
+    def resolver(self):
+        """Roda a clusterização (``ResultadoCluster``)."""
+        return cluster(self.df, **self.opcoes)
+
+
+def padronizar(df, variaveis=None):
+    """Padroniza as variáveis de clustering. Retorna (X_scaled, scaler)."""
+    from sklearn.preprocessing import StandardScaler
+
+    X = matriz(df, variaveis or VARIAVEIS_CLUSTER)
+    scaler = StandardScaler()
+    return scaler.fit_transform(X), scaler
+
+
+def nomes_niveis(k):
+    """Nomes dos k níveis, do menos ao mais tecnificado."""
+    return NIVEIS_POR_K.get(k) or [f'Nível {i + 1} de Tecnificação' for i in range(k)]
+
+
+@medida('cluster')
+def cluster(df, k='auto', variaveis=None, ks=None, criterio='consenso', n_jobs=None,
+            silhueta='auto'):
+    """
+    Aplica K-means e rotula os clusters por nível de tecnificação
+    (ordenados pelo índice tecnológico médio).
+
+    Com ``k='auto'`` os K de ``ks`` (padrão: 2 a 7) são varridos em paralelo
+    por ``cafe.selecao_k.selecionar_k`` e o K é escolhido pelo ``criterio``.
+    Com ``k`` inteiro, apenas esse K é ajustado, a menos que ``ks`` também
+    seja informado (para o relatório da varredura). ``silhueta`` escolhe o
+    cálculo da silhueta ('auto', 'exata' ou 'amostrada', ver ``cafe.silhueta``).
+    """
+    from cafe.selecao_k import rotular, selecionar_k
+
+    variaveis = variaveis or VARIAVEIS_CLUSTER
+    X_scaled, scaler = padronizar(df, variaveis)
+
+    if k == 'auto':
+        candidatos = ks or K_RANGE
+    else:
+        candidatos = sorted(set(ks or []) | {int(k)})
+    selecao = selecionar_k(X_scaled, candidatos, criterio=criterio, n_jobs=n_jobs,
+                           n_referencias=5 if k == 'auto' or ks else 0,
+                           metodo_silhueta=silhueta)
+    if k != 'auto':
+        selecao.k = int(k)
+
+    # A melhor solução da varredura já convergiu: os rótulos são os mesmos
+    # usados na silhueta da varredura, que assim vem do cache no resumo
+    centroides = selecao.ajuste(selecao.k).centroides
+    clusters, _ = rotular(X_scaled, centroides)
+
+    df = df.copy()
+    df['cluster'] = clusters
+
+    # Mapear clusters para níveis de tecnificação
+    # Ordenar por índice tecnológico médio
+    cluster_means = df.groupby('cluster')['indice_tecnologico'].mean().sort_values()
+    mapeamento = dict(zip(cluster_means.index, nomes_niveis(selecao.k)))
+    df['nivel_tecnificacao'] = df['cluster'].map(mapeamento)
+
+    return ResultadoCluster(df=df, X_scaled=X_scaled, scaler=scaler,
+                            centroides_padronizados=centroides, mapeamento=mapeamento,
+                            variaveis=variaveis, selecao=selecao, metodo_silhueta=silhueta)
+
+
+def separar_niveis(resultado):
+    """Subconjunto do DataFrame de cada nível, em uma única passagem."""
+    grupos = dict(tuple(resultado.df.groupby('nivel_tecnificacao', sort=False, observed=True)))
+    return {nivel: grupos[nivel] for nivel in resultado.niveis if nivel in grupos}
+
+
+@medida('anova_clusters')
+def anova_clusters(resultado, variaveis_anova=None, permutacoes=None, n_jobs=None):
+    """
+    ANOVA de cada variável entre os níveis, todas numa única passagem do
+    teste de permutação (``cafe.permutacao``). Retorna [(nome, F, p)], com
+    o p-valor de permutação.
+    """
+    from cafe.permutacao import PERMUTACOES_PADRAO, anova_permutacao
+
+    df = resultado.df
+    variaveis_anova = variaveis_anova or VARIAVEIS_ANOVA
+    nomes = [nome for nome, _ in variaveis_anova]
+    tabela = anova_permutacao(IndiceGrupos(df['cluster'].to_numpy()),
+                              matriz(df, [var for _, var in variaveis_anova]), nomes,
+                              permutacoes=PERMUTACOES_PADRAO if permutacoes is None else permutacoes,
+                              n_jobs=n_jobs)
+    return [(nome, float(tabela.at[nome, 'F']), float(tabela.at[nome, 'p_valor'])) for nome in nomes]
+
+
+def salvar_resultados(resultado, caminho):
+    """Grava (município,) ano, cluster, nível e variáveis principais em CSV."""
+    chaves = [c for c in ('municipio_id', 'municipio') if c in resultado.df.columns]
+    # Variáveis extras do clustering (ex.: defasagens espaciais) vão ao final
+    extras = [v for v in resultado.variaveis
+              if v not in COLUNAS_RESULTADO and v not in VARIAVEIS_CLUSTER]
+    resultado.df[[*chaves, *COLUNAS_RESULTADO, *extras]].to_csv(caminho, index=False)
+
+
+# ====================
+# RELATÓRIO
+# ====================
+
+def relatorio(df, k='auto', criterio='consenso', n_jobs=None, silhueta='auto', variaveis=None):
+    """
+    Imprime o relatório da análise de cluster e retorna o resultado.
+    ``variaveis`` padrão: ``VARIAVEIS_CLUSTER``.
+    """
+    print("=" * 80)
+    print("ANÁLISE DE CLUSTER (K-MEANS)")
+    print("Agrupamento de Anos por Níveis de Tecnificação")
+    print("=" * 80)
+    print()
+
+    painel = eh_painel(df)
+    resultado = cluster(df, k=k, variaveis=variaveis, ks=K_RANGE, criterio=criterio,
+                        n_jobs=n_jobs, silhueta=silhueta)
+    X_scaled = resultado.X_scaled
+    df = resultado.df
+    niveis = separar_niveis(resultado)
+
+    print("1. PREPARAÇÃO DOS DADOS")
+    print("-" * 80)
+    print(f"Variáveis utilizadas: {len(resultado.variaveis)}")
+    print(f"Observações: {len(X_scaled)}")
+    print("\nVariáveis:")
+    for var in resultado.variaveis:
+        print(f"  - {var}")
+    print()
+
+    print("\n2. DETERMINAÇÃO DO NÚMERO ÓTIMO DE CLUSTERS")
+    print("-" * 80)
+
+    selecao = resultado.selecao
+    automatico = k == 'auto'
+    k = selecao.k
+    print(f"Varredura de K={selecao.ks[0]}..{selecao.ks[-1]} em {selecao.n_processos} "
+          f"processo(s): {selecao.tempo_total:.2f} s")
+
+    print("\nMétodo do Cotovelo (Inércia):")
+    for a in selecao.ajustes:
+        print(f"  K={a.k}: Inércia = {a.inercia:.2f}")
+
+    print("\nCoeficiente de Silhueta:")
+    for a in selecao.ajustes:
+        intervalo = ''
+        if np.isfinite(a.silhueta_ic[0]):
+            intervalo = f" (IC95% {a.silhueta_ic[0]:.4f} a {a.silhueta_ic[1]:.4f}, amostra estratificada)"
+        print(f"  K={a.k}: Silhueta = {a.silhueta:.4f}{intervalo}")
+
+    if 'gap' in selecao.sugestoes:
+        print("\nEstatística Gap:")
+        for a in selecao.ajustes:
+            print(f"  K={a.k}: Gap = {a.gap:.4f} (± {a.gap_erro:.4f})")
+
+    print("\nTempo por K (cadeia aquecida | reinícios a frio | silhueta):")
+    for a in selecao.ajustes:
+        print(f"  K={a.k}: {a.tempo_quente:.3f} s | {a.tempo_frio:.3f} s | "
+              f"{a.tempo_silhueta:.3f} s  (melhor solução: {a.origem}, {a.n_iter} iterações)")
+
+    print("\nK sugerido por critério:")
+    for nome, sugerido in selecao.sugestoes.items():
+        print(f"  {nome.capitalize()}: K = {sugerido}")
+
+    print(f"\nNúmero de clusters selecionado: K = {k} "
+          f"({'critério: ' + selecao.criterio if automatico else 'informado'})")
+    curtos = [n.replace(' Tecnificação', '') for n in resultado.niveis]
+    print(f"Interpretação: {', '.join(curtos[:-1])} e {curtos[-1]} Tecnificação")
+
+    print(f"\n\n3. APLICAÇÃO DO K-MEANS (K={k})")
+    print("-" * 80)
+
+    print("\nDistribuição de anos por cluster:")
+    for nivel, subset in niveis.items():
+        print(f"\n{nivel}:")
+        if painel:
+            print(f"  Municípios-ano: {len(subset)} ({subset['municipio_id'].nunique()} municípios)")
+            print(f"  Anos: {subset['ano'].min()} - {subset['ano'].max()}")
+        else:
+            print(f"  Anos: {subset['ano'].tolist()}")
+            print(f"  Quantidade: {len(subset)} anos")
+
+    print("\n\n4. CARACTERIZAÇÃO DOS CLUSTERS")
+    print("=" * 80)
+
+    for nivel, subset in niveis.items():
+        print(f"\n{nivel.upper()}")
+        print("-" * 80)
+
+        print(f"Período: {subset['ano'].min()} - {subset['ano'].max()}")
+        print(f"Número de {'observações' if painel else 'anos'}: {len(subset)}")
+        print()
+
+        print("Estatísticas Médias:")
+        print(f"  Índice Tecnológico:        {subset['indice_tecnologico'].mean():.2f} ± {subset['indice_tecnologico'].std():.2f}")
+        print(f"  Investimento (R$ milhões): {subset['investimento_tecnologia_milhoes'].mean():.2f} ± {subset['investimento_tecnologia_milhoes'].std():.2f}")
+        print(f"  Produtividade (kg/ha):     {subset['produtividade_kg_ha'].mean():.2f} ± {subset['produtividade_kg_ha'].std():.2f}")
+        print(f"  Cafés Especiais (ton):     {subset['producao_especiais_ton'].mean():.2f} ± {subset['producao_especiais_ton'].std():.2f}")
+        print(f"  Produção Total (ton):      {subset['producao_total_ton'].mean():.2f} ± {subset['producao_total_ton'].std():.2f}")
+
+    print("\n\n5. ANÁLISE DE VARIÂNCIA (ANOVA) ENTRE CLUSTERS")
+    print("=" * 80)
+
+    for nome, f_stat, p_value in anova_clusters(resultado, n_jobs=n_jobs):
+        print(f"\n{nome}:")
+        print(f"  Estatística F: {f_stat:.4f}")
+        print(f"  P-valor: {p_value:.6f}")
+        print(f"  Resultado: {'Diferença significativa' if p_value < 0.05 else 'Sem diferença significativa'} entre clusters (α=0.05)")
+
+    print("\n\n" + "=" * 80)
+    print("7. RESUMO EXECUTIVO DA ANÁLISE DE CLUSTER")
+    print("=" * 80)
+
+    print("\nPRINCIPAIS ACHADOS:")
+    print("-" * 80)
+
+    for i, (nivel, subset) in enumerate(niveis.items(), start=1):
+        print(f"\n{i}. Período de {nivel}: {subset['ano'].min()}-{subset['ano'].max()}")
+        print(f"   - Produtividade média: {subset['produtividade_kg_ha'].mean():.0f} kg/ha")
+        print(f"   - Índice tecnológico médio: {subset['indice_tecnologico'].mean():.1f}")
+
+    baixa, alta = niveis[resultado.niveis[0]], niveis[resultado.niveis[-1]]
+    de_para = f"{resultado.niveis[0].split()[0]} → {resultado.niveis[-1].split()[0]}"
+
+    ganho_prod = ((alta['produtividade_kg_ha'].mean() / baixa['produtividade_kg_ha'].mean()) - 1) * 100
+    print(f"\n{len(niveis) + 1}. Ganho de produtividade ({de_para}): {ganho_prod:.1f}%")
+
+    ganho_especiais = ((alta['producao_especiais_ton'].mean() / baixa['producao_especiais_ton'].mean()) - 1) * 100
+    print(f"{len(niveis) + 2}. Crescimento cafés especiais ({de_para}): {ganho_especiais:.1f}%")
+
+    print(f"\n{len(niveis) + 3}. Coeficiente de Silhueta: {resultado.silhueta:.4f}")
+    print("   (Valores próximos a 1 indicam clusters bem definidos)")
+
+    print("\n" + "=" * 80)
+    print("ANÁLISE DE CLUSTER CONCLUÍDA COM SUCESSO")
+    print("=" * 80)
+
+    return resultado
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+Agrupamento de consenso: estabilidade dos níveis de tecnificação.
+
+Os níveis do K-means (``cafe.cluster``) saem de um único ajuste. Aqui o
+K-means é refeito em ``reamostras`` subamostras (``fracao`` das linhas,
+sem reposição), cada uma com a sua semente, num pool de processos
+(``cafe.paralelo``). Os grupos de cada reamostra são ordenados pelo índice
+tecnológico médio, como os níveis de referência, e cada resultado entra no
+acumulador assim que chega:
+
+* por observação: quantas vezes foi sorteada e em quantas recebeu o seu
+  nível de referência (``estabilidade``);
+* por par: quantas vezes os dois foram sorteados juntos e em quantas
+  caíram no mesmo grupo (matriz de co-atribuição; o consenso do par é a
+  razão). Até ``LIMITE_DENSO`` linhas entram todos os pares, em matrizes
+  condensadas de uint16 (``CoatribuicaoDensa``). Acima disso, só as
+  arestas do grafo dos ``VIZINHOS_CONSENSO`` vizinhos mais próximos
+  (``CoatribuicaoEsparsa``, via ``cafe.distancias``), e a memória fica
+  linear em n.
+
+Do acumulador saem o consenso de cada observação com o seu nível (média
+sobre os pares do mesmo nível), a matriz de consenso entre níveis e o mapa
+de calor: a matriz ordenada por nível e estabilidade, agregada em no máximo
+``CELULAS_MAPA`` células por eixo (no modo esparso, a matriz entre níveis).
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cafe.algoritmos import ordenar_por_tecnologia
+from cafe.cluster import cluster
+from cafe.instrumentacao import medida
+from cafe.paralelo import executor
+
+MODOS = ('auto', 'denso', 'esparso')
+
+REAMOSTRAS_PADRAO = 100
+
+FRACAO_PADRAO = 0.8
+
+# Até este número de linhas todos os pares são acumulados (5 mil linhas:
+# 12,5 milhões de pares, 50 MB nas duas matrizes condensadas de uint16)
+LIMITE_DENSO = 5000
+
+# Vizinhos de cada observação no modo esparso
+VIZINHOS_CONSENSO = 15
+
+# Células por eixo do mapa de calor no modo denso
+CELULAS_MAPA = 200
+
+# Abaixo desta estabilidade a observação é listada como instável
+LIMIAR_ESTAVEL = 0.8
+
+# Posições de pares geradas de uma vez na atualização da matriz condensada
+PARES_POR_BLOCO = 2**21
+
+# Memória máxima (MB) de cada bloco de linhas quadradas lido da matriz condensada
+MEMORIA_PADRAO = 64
+
+# Dados de cada processo (ver _inicializar)
+_X = None
+_TECNOLOGIA = None
+
+
+# ====================
+# REAMOSTRAS
+# ====================
+
+def _inicializar(X, tecnologia):
+    global _X, _TECNOLOGIA
+    _X, _TECNOLOGIA = X, tecnologia
+
+
+def _tarefa(k, fracao, semente):
+    """Linhas sorteadas e seus grupos (0..K-1 em ordem de índice tecnológico) numa reamostra."""
+    from sklearn.cluster import KMeans
+
+    n = len(_X)
+    tamanho = min(n, max(k + 1, int(round(fracao * n))))
+    if tamanho == n:
+        linhas = np.arange(n)
+    else:
+        linhas = np.sort(np.random.default_rng(semente).choice(n, tamanho, replace=False))
+    rotulos = KMeans(n_clusters=k, n_init=1, random_state=semente).fit_predict(_X[linhas])
+    rotulos = ordenar_por_tecnologia(rotulos, _TECNOLOGIA[linhas])
+    return linhas.astype(np.int32), rotulos.astype(np.int8)
+
+
+# ====================
+# ACUMULADORES
+# ====================
+
+class CoatribuicaoDensa:
+    """
+    Contagens de todos os pares em matrizes condensadas (n(n-1)/2) de
+    uint16: ``juntos`` (mesmo grupo) e ``sorteados`` (ambos na reamostra).
+    """
+
+    modo = 'denso'
+
+    def __init__(self, n):
+        self.n = n
+        self.juntos = np.zeros(n * (n - 1) // 2, dtype=np.uint16)
+        self.sorteados = np.zeros_like(self.juntos)
+        # O par (i, j), i < j, fica na posição base[i] + j
+        i = np.arange(n, dtype=np.int64)
+        self._base = i * n - i * (i + 1) // 2 - i - 1
+
+    @property
+    def nbytes(self):
+        return self.juntos.nbytes + self.sorteados.nbytes
+
+    def _pares(self, membros):
+        """Posições condensadas dos pares de ``membros`` (crescentes), em blocos de linhas."""
+        m = membros.astype(np.int64)
+        passo = max(1, PARES_POR_BLOCO // max(len(m), 1))
+        for a in range(0, len(m) - 1, passo):
+            b = min(a + passo, len(m) - 1)
+            depois = np.arange(a + 1, len(m))[None, :] > np.arange(a, b)[:, None]
+            yield (self._base[m[a:b], None] + m[None, a + 1:])[depois]
+
+    def acumular(self, linhas, rotulos):
+        # Numa reamostra cada par aparece uma vez: a soma com índices é segura
+        for posicoes in self._pares(linhas):
+            self.sorteados[posicoes] += 1
+        for grupo in np.unique(rotulos):
+            for posicoes in self._pares(linhas[rotulos == grupo]):
+                self.juntos[posicoes] += 1
+
+    def blocos(self, memoria_mb=MEMORIA_PADRAO):
+        """
+        (linhas, consenso (len(linhas), n)) lidos da matriz condensada. Pares
+        nunca sorteados juntos e a diagonal ficam NaN.
+        """
+        n = self.n
+        tamanho = max(1, int(memoria_mb * 2**20 / (16 * n)))
+        for primeira in range(0, n, tamanho):
+            linhas = np.arange(primeira, min(n, primeira + tamanho))
+            juntos = np.zeros((len(linhas), n))
+            sorteados = np.zeros((len(linhas), n))
+            for r, i in enumerate(linhas):
+                antes = self._base[:i] + i
+                depois = slice(self._base[i] + i + 1, self._base[i] + n)
+                juntos[r, :i], juntos[r, i + 1:] = self.juntos[antes], self.juntos[depois]
+                sorteados[r, :i], sorteados[r, i + 1:] = self.sorteados[antes], self.sorteados[depois]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                yield linhas, juntos / np.where(sorteados > 0, sorteados, np.nan)
+
+    def resumir(self, referencia, ordem, celulas=CELULAS_MAPA):
+        """
+        Somas e contagens (n, K) do consenso de cada observação com cada
+        nível de ``referencia`` e o mapa de calor (células x células) da
+        matriz na ``ordem`` dada, com as fronteiras dos níveis no mapa.
+        """
+        n, k = self.n, int(referencia.max()) + 1
+        celulas = min(celulas, n)
+        posicao = np.empty(n, dtype=np.intp)
+        posicao[ordem] = np.arange(n)
+        um_quente = np.zeros((n, k))
+        um_quente[np.arange(n), referencia] = 1.0
+        em_celula = np.zeros((n, celulas))
+        em_celula[np.arange(n), posicao * celulas // n] = 1.0
+
+        somas, contagens = np.zeros((n, k)), np.zeros((n, k))
+        mapa_somas, mapa_contagens = np.zeros((celulas, celulas)), np.zeros((celulas, celulas))
+        for linhas, bloco in self.blocos():
+            valido = np.isfinite(bloco).astype(float)
+            valores = np.nan_to_num(bloco)
+            somas[linhas], contagens[linhas] = valores @ um_quente, valido @ um_quente
+            mapa_somas += em_celula[linhas].T @ (valores @ em_celula)
+            mapa_contagens += em_celula[linhas].T @ (valido @ em_celula)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mapa = mapa_somas / mapa_contagens
+        fronteiras = np.concatenate(([0], np.cumsum(np.bincount(referencia, minlength=k))))
+        return somas, contagens, mapa, fronteiras * celulas / n
+
+
+class CoatribuicaoEsparsa:
+    """
+    Contagens só dos pares vizinhos: as arestas (i < j) do grafo dos
+    ``vizinhos`` mais próximos, com a memória linear em n.
+    """
+
+    modo = 'esparso'
+
+    def __init__(self, X, vizinhos=VIZINHOS_CONSENSO, cache_disco=True):
+        from cafe.distancias import distancias
+
+        self.n = n = len(X)
+        _, indices = distancias(X, cache_disco=cache_disco).vizinhos(vizinhos)
+        origem = np.repeat(np.arange(n, dtype=np.int64), indices.shape[1])
+        destino = indices.ravel().astype(np.int64)
+        arestas = np.unique(np.minimum(origem, destino) * n + np.maximum(origem, destino))
+        self.origem, self.destino = arestas // n, arestas % n
+        self.juntos = np.zeros(len(arestas), dtype=np.uint16)
+        self.sorteados = np.zeros_like(self.juntos)
+        self._rotulos = np.empty(n, dtype=np.int8)
+
+    @property
+    def nbytes(self):
+        return (self.juntos.nbytes + self.sorteados.nbytes + self.origem.nbytes
+                + self.destino.nbytes)
+
+    def acumular(self, linhas, rotulos):
+        r = self._rotulos
+        r.fill(-1)
+        r[linhas] = rotulos
+        a, b = r[self.origem], r[self.destino]
+        sorteados = (a >= 0) & (b >= 0)
+        self.sorteados += sorteados
+        self.juntos += sorteados & (a == b)
+
+    def resumir(self, referencia, ordem=None, celulas=None):
+        """Como ``CoatribuicaoDensa.resumir``; o mapa é a matriz K x K entre níveis."""
+        n, k = self.n, int(referencia.max()) + 1
+        valido = self.sorteados > 0
+        origem, destino = self.origem[valido], self.destino[valido]
+        consenso = self.juntos[valido] / self.sorteados[valido]
+
+        somas, contagens = np.zeros(n * k), np.zeros(n * k)
+        for de, para in ((origem, destino), (destino, origem)):
+            posicoes = de * k + referencia[para]
+            somas += np.bincount(posicoes, weights=consenso, minlength=n * k)
+            contagens += np.bincount(posicoes, minlength=n * k)
+        somas, contagens = somas.reshape(n, k), contagens.reshape(n, k)
+
+        mapa_somas = np.zeros((k, k))
+        mapa_contagens = np.zeros((k, k))
+        np.add.at(mapa_somas, referencia, somas)
+        np.add.at(mapa_contagens, referencia, contagens)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mapa = mapa_somas / mapa_contagens
+        return somas, contagens, mapa, np.arange(k + 1, dtype=float)
+
+
+# ====================
+# CONSENSO
+# ====================
+
+@dataclass
+class ResultadoConsenso:
+    """Estabilidade de cada observação e matriz de consenso das reamostras."""
+    df: pd.DataFrame           # chaves, nivel_tecnificacao, sorteios, estabilidade, consenso_nivel
+    niveis: list
+    matriz_niveis: pd.DataFrame   # consenso médio entre pares de níveis
+    mapa: np.ndarray           # matriz de consenso ordenada por nível (células x células)
+    fronteiras: np.ndarray     # início de cada nível no eixo do mapa e o fim do último
+    modo: str                  # 'denso' (todos os pares) ou 'esparso' (pares vizinhos)
+    reamostras: int
+    fracao: float
+    memoria: int               # bytes do acumulador de co-atribuição
+    n_processos: int
+    tempo: float
+
+    @property
+    def instaveis(self):
+        """Observações com estabilidade abaixo de ``LIMIAR_ESTAVEL``, da menos estável."""
+        return self.df[self.df['estabilidade'] < LIMIAR_ESTAVEL].sort_values('estabilidade')
+
+    def digest(self):
+        import hashlib
+
+        h = hashlib.blake2b(digest_size=16)
+        for tabela in (self.df, self.matriz_niveis):
+            h.update(pd.util.hash_pandas_object(tabela, index=True).to_numpy().tobytes())
+        h.update(np.ascontiguousarray(self.mapa).tobytes())
+        h.update(np.ascontiguousarray(self.fronteiras).tobytes())
+        h.update(repr((self.niveis, self.modo)).encode())
+        return h.hexdigest()
+
+
+@medida('consenso')
+def consenso(df, k='auto', reamostras=REAMOSTRAS_PADRAO, fracao=FRACAO_PADRAO, variaveis=None,
+             modo='auto', n_jobs=None, semente=42, cache_disco=True):
+    """
+    Refaz o K-means de ``cafe.cluster.cluster`` (mesmo K e variáveis) em
+    ``reamostras`` subamostras com ``fracao`` das linhas, em paralelo, e
+    acumula a co-atribuição. ``modo``: 'denso', 'esparso' ou 'auto'
+    (denso até ``LIMITE_DENSO`` linhas).
+    """
+    if not 1 <= reamostras <= np.iinfo(np.uint16).max:
+        raise ValueError(f'reamostras deve estar entre 1 e {np.iinfo(np.uint16).max}')
+    if not 0 < fracao <= 1:
+        raise ValueError('fracao deve estar em (0, 1]')
+    if modo not in MODOS:
+        raise ValueError(f'modo desconhecido: {modo!r} (use {", ".join(MODOS)})')
+    inicio = time.perf_counter()
+    referencia = cluster(df, k=k, variaveis=variaveis, n_jobs=n_jobs)
+    k = len(referencia.mapeamento)
+    X = np.ascontiguousarray(referencia.X_scaled)
+    n = len(X)
+    tecnologia = referencia.df['indice_tecnologico'].to_numpy(dtype=float)
+    rotulos = ordenar_por_tecnologia(referencia.df['cluster'].to_numpy(), tecnologia)
+
+    if modo == 'auto':
+        modo = 'denso' if n <= LIMITE_DENSO else 'esparso'
+    acumulador = (CoatribuicaoDensa(n) if modo == 'denso'
+                  else CoatribuicaoEsparsa(X, cache_disco=cache_disco))
+    sorteios = np.zeros(n, dtype=np.int32)
+    acertos = np.zeros(n, dtype=np.int32)
+
+    def incorporar(futuro):
+        linhas, grupos = futuro.result()
+        acumulador.acumular(linhas, grupos)
+        sorteios[linhas] += 1
+        acertos[linhas] += grupos == rotulos[linhas]
+
+    with executor(n_jobs, _inicializar, (X, tecnologia), n_tarefas=reamostras) as pool:
+        n_proc = getattr(pool, '_max_workers', 1)
+        # Poucas reamostras em voo: cada uma entra no acumulador e é descartada
+        pendentes = set()
+        for r in range(reamostras):
+            if len(pendentes) >= 2 * n_proc:
+                prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    incorporar(futuro)
+            pendentes.add(pool.submit(_tarefa, k, fracao, semente + r))
+        for futuro in pendentes:
+            incorporar(futuro)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        estabilidade = acertos / sorteios
+    ordem = np.lexsort((-np.nan_to_num(estabilidade), rotulos))
+    somas, contagens, mapa, fronteiras = acumulador.resumir(rotulos, ordem)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        proprio = somas[np.arange(n), rotulos] / contagens[np.arange(n), rotulos]
+        entre = np.zeros((k, k))
+        total = np.zeros((k, k))
+        np.add.at(entre, rotulos, somas)
+        np.add.at(total, rotulos, contagens)
+        entre /= total
+
+    niveis = referencia.niveis
+    chaves = [c for c in ('municipio_id', 'municipio', 'ano') if c in referencia.df.columns]
+    tabela = referencia.df[chaves].reset_index(drop=True)
+    tabela['nivel_tecnificacao'] = np.asarray(niveis, dtype=object)[rotulos]
+    tabela['sorteios'] = sorteios
+    tabela['estabilidade'] = estabilidade
+    tabela['consenso_nivel'] = proprio
+    return ResultadoConsenso(
+        df=tabela, niveis=niveis,
+        matriz_niveis=pd.DataFrame(entre, index=niveis, columns=niveis),
+        mapa=mapa, fronteiras=fronteiras, modo=modo, reamostras=reamostras, fracao=fracao,
+        memoria=acumulador.nbytes, n_processos=n_proc, tempo=time.perf_counter() - inicio)
+
+
+# ====================
+# RELATÓRIO
+# ====================
+
+def relatorio(resultado, saida=None):
+    """Imprime a estabilidade por nível e as observações instáveis e grava as tabelas."""
+    df = resultado.df
+    print("=" * 80)
+    print("CONSENSO DO AGRUPAMENTO: ESTABILIDADE DOS NÍVEIS DE TECNIFICAÇÃO")
+    print("=" * 80)
+    pares = ('todos os pares' if resultado.modo == 'denso'
+             else f'pares dos {VIZINHOS_CONSENSO} vizinhos mais próximos')
+    print(f"Reamostras: {resultado.reamostras} de {resultado.fracao:.0%} das linhas, em "
+          f"{resultado.n_processos} processo(s): {resultado.tempo:.2f} s")
+    print(f"Co-atribuição ({pares}): {resultado.memoria / 2**20:.1f} MB")
+
+    print("\nEstabilidade (fração das reamostras com o nível de referência) e consenso "
+          "com o próprio nível:")
+    resumo = df.groupby('nivel_tecnificacao', sort=False)[['estabilidade', 'consenso_nivel']]
+    medias = resumo.mean().reindex(resultado.niveis)
+    tamanhos = df['nivel_tecnificacao'].value_counts().reindex(resultado.niveis)
+    for nivel, linha in medias.iterrows():
+        print(f"  {nivel}: n = {tamanhos[nivel]}, estabilidade = {linha['estabilidade']:.3f}, "
+              f"consenso = {linha['consenso_nivel']:.3f}")
+
+    print("\nConsenso médio entre níveis (fração das reamostras em que os pares ficaram juntos):")
+    print(resultado.matriz_niveis.round(3).to_string())
+
+    instaveis = resultado.instaveis
+    print(f"\nObservações instáveis (estabilidade < {LIMIAR_ESTAVEL}): {len(instaveis)} "
+          f"de {len(df)}")
+    for _, linha in instaveis.head(20).iterrows():
+        rotulo = ', '.join(f'{c} {linha[c]}' for c in ('municipio', 'ano') if c in df.columns)
+        print(f"  {rotulo}: {linha['nivel_tecnificacao']}, estabilidade = "
+              f"{linha['estabilidade']:.3f} ({linha['sorteios']} sorteios)")
+    if len(instaveis) > 20:
+        print(f"  ... e mais {len(instaveis) - 20}")
+
+    if saida is not None:
+        saida = Path(saida)
+        saida.mkdir(parents=True, exist_ok=True)
+        df.to_csv(saida / 'consenso_cluster.csv', index=False)
+        resultado.matriz_niveis.to_csv(saida / 'consenso_niveis.csv', index_label='nivel')
+        print(f"\n✓ Tabelas salvas em: {saida / 'consenso_cluster.csv'} e "
+              f"{saida / 'consenso_niveis.csv'}")
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Matrizes de correlação em blocos de colunas, para conjuntos largos de
+indicadores (centenas de variáveis de tecnologia e clima por município).
+
+As colunas são padronizadas uma vez (centradas e com norma 1) e guardadas
+em float32; a correlação de Pearson de um bloco de colunas com todas as
+demais é então um único produto de matrizes ``Z[:, bloco].T @ Z``. A
+memória extra fica limitada a um bloco (bloco x p) por vez, e a matriz
+completa só é montada quando pedida:
+
+* ``correlacao``: matriz p x p (Pearson, Spearman ou Kendall);
+* ``parceiros``: os k parceiros mais correlacionados de cada variável, em
+  formato longo, sem montar a matriz p x p;
+* ``ordem_hierarquica``: ordem das variáveis por agrupamento hierárquico,
+  usada pelos mapas de calor largos.
+
+Spearman é Pearson sobre os postos. Kendall (tau-b) não se reduz a um
+produto de matrizes; os pares de colunas são divididos em blocos e
+calculados com ``scipy.stats.kendalltau`` no pool de processos. Valores
+ausentes são tratados par a par, como em ``DataFrame.corr``; no Spearman os
+postos de cada coluna são calculados uma vez, sem os ausentes, e não
+refeitos para cada par (``DataFrame.corr`` os refaz, e com ausentes os
+valores diferem na 3ª casa decimal).
+"""
+
+import numpy as np
+import pandas as pd
+
+from cafe.dados import flutuante, matriz
+from cafe.paralelo import executor
+
+METODOS = ('pearson', 'spearman', 'kendall')
+
+# Colunas por bloco: o bloco de correlações ocupa bloco x p valores
+BLOCO_COLUNAS = 256
+
+# Colunas de cada processo no Kendall (ver _inicializar)
+_COLUNAS = None
+
+
+def _matriz(dados, variaveis):
+    """
+    Array (n, p) e nomes das colunas a partir de DataFrame ou array; colunas
+    compactas continuam em float32.
+    """
+    if isinstance(dados, pd.DataFrame):
+        variaveis = list(variaveis or dados.select_dtypes('number').columns)
+        return matriz(dados, variaveis), variaveis
+    X = flutuante(dados)
+    return X, list(variaveis or range(X.shape[1]))
+
+
+def _postos(X):
+    """Postos médios de cada coluna; ausentes continuam ausentes."""
+    from scipy.stats import rankdata
+
+    return rankdata(X, axis=0, nan_policy='omit')
+
+
+def _padronizar(X, dtype, bloco):
+    """Colunas centradas e com norma 1, convertidas para ``dtype`` bloco a bloco."""
+    Z = np.empty(X.shape, dtype=dtype)
+    for inicio in range(0, X.shape[1], bloco):
+        parte = X[:, inicio:inicio + bloco]
+        parte = parte - parte.mean(axis=0, dtype=np.float64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            Z[:, inicio:inicio + bloco] = parte / np.sqrt(np.einsum('ij,ij->j', parte, parte))
+    return Z
+
+
+def _blocos_completos(X, dtype, bloco):
+    """Blocos (inicio, fim, correlações bloco x p) sem valores ausentes."""
+    Z = _padronizar(X, dtype, bloco)
+    for inicio in range(0, Z.shape[1], bloco):
+        R = Z[:, inicio:inicio + bloco].T @ Z
+        yield inicio, min(inicio + bloco, Z.shape[1]), np.clip(R, -1, 1, out=R)
+
+
+def _blocos_pares(X, dtype, bloco):
+    """
+    Blocos com valores ausentes: somas de cada par de colunas restritas às
+    linhas em que ambas estão presentes (cinco produtos de matrizes), no
+    maior entre o tipo dos dados e ``dtype``.
+    """
+    X = X.astype(np.result_type(X.dtype, dtype), copy=False)
+    M = (~np.isnan(X)).astype(X.dtype)
+    Xc = np.nan_to_num(X - np.nanmean(X, axis=0))
+    Q = Xc ** 2
+    for inicio in range(0, X.shape[1], bloco):
+        fim = min(inicio + bloco, X.shape[1])
+        m, x, q = M[:, inicio:fim], Xc[:, inicio:fim], Q[:, inicio:fim]
+        n = m.T @ M
+        sx, sy = x.T @ M, m.T @ Xc
+        sxx, syy = q.T @ M, m.T @ Q
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cov = x.T @ Xc - sx * sy / n
+            R = cov / np.sqrt((sxx - sx ** 2 / n) * (syy - sy ** 2 / n))
+        R[n < 2] = np.nan
+        yield inicio, fim, np.clip(R, -1, 1, out=R)
+
+
+def _inicializar(colunas):
+    global _COLUNAS
+    _COLUNAS = colunas
+
+
+def _tarefa_kendall(linhas):
+    """tau-b de cada linha do bloco com todas as colunas seguintes."""
+    from scipy.stats import kendalltau
+
+    p = _COLUNAS.shape[1]
+    saida = []
+    for i in linhas:
+        for j in range(i + 1, p):
+            validos = ~(np.isnan(_COLUNAS[:, i]) | np.isnan(_COLUNAS[:, j]))
+            saida.append((i, j, kendalltau(_COLUNAS[validos, i], _COLUNAS[validos, j]).statistic))
+    return saida
+
+
+def _kendall(X, n_jobs):
+    p = X.shape[1]
+    R = np.eye(p)
+    # Linhas intercaladas equilibram as tarefas (a linha i tem p - i - 1 pares)
+    n_tarefas = min(p, 64)
+    blocos = [list(range(t, p, n_tarefas)) for t in range(n_tarefas)]
+    with executor(n_jobs, _inicializar, (X,), n_tarefas=len(blocos)) as pool:
+        for pares in pool.map(_tarefa_kendall, blocos):
+            for i, j, tau in pares:
+                R[i, j] = R[j, i] = tau
+    return R
+
+
+def _blocos(dados, variaveis, metodo, dtype, bloco):
+    """Nomes das variáveis e gerador de blocos (inicio, fim, correlações)."""
+    if metodo not in ('pearson', 'spearman'):
+        raise ValueError(f"método em blocos: 'pearson' ou 'spearman', não {metodo!r}")
+    X, nomes = _matriz(dados, variaveis)
+    if metodo == 'spearman':
+        X = _postos(X)
+    if np.isnan(X).any():
+        return nomes, _blocos_pares(X, dtype, bloco)
+    return nomes, _blocos_completos(X, dtype, bloco)
+
+
+def blocos_correlacao(dados, variaveis=None, metodo='pearson', dtype=np.float32,
+                      bloco=BLOCO_COLUNAS):
+    """
+    Gera DataFrames (bloco x p) de Pearson ou Spearman, com no máximo
+    ``bloco`` variáveis por vez.
+    """
+    nomes, blocos = _blocos(dados, variaveis, metodo, dtype, bloco)
+    for inicio, fim, R in blocos:
+        yield pd.DataFrame(R, index=nomes[inicio:fim], columns=nomes)
+
+
+def correlacao(dados, variaveis=None, metodo='pearson', dtype=np.float32, bloco=BLOCO_COLUNAS,
+               n_jobs=1):
+    """
+    Matriz de correlação (DataFrame p x p) das ``variaveis`` de ``dados``
+    (padrão: todas as colunas numéricas). ``metodo``: 'pearson',
+    'spearman' ou 'kendall'. Pearson e Spearman são calculados em float32
+    (erro da ordem de 1e-6); ``dtype=np.float64`` reproduz
+    ``DataFrame.corr`` até o arredondamento, exceto no Spearman com valores
+    ausentes: aqui os postos são os da coluna inteira, e não os de cada par
+    (diferenças de até ~3e-3).
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"método desconhecido: {metodo!r} (opções: {', '.join(METODOS)})")
+    if metodo == 'kendall':
+        X, nomes = _matriz(dados, variaveis)
+        return pd.DataFrame(_kendall(X, n_jobs), index=nomes, columns=nomes)
+
+    nomes, blocos = _blocos(dados, variaveis, metodo, dtype, bloco)
+    R = np.empty((len(nomes), len(nomes)))
+    for inicio, fim, parte in blocos:
+        R[inicio:fim] = parte
+    # Diagonal exata (variáveis constantes ficam NaN, como em DataFrame.corr)
+    diagonal = np.diag(R).copy()
+    np.fill_diagonal(R, np.where(np.isnan(diagonal), np.nan, 1.0))
+    return pd.DataFrame(R, index=nomes, columns=nomes)
+
+
+def parceiros(dados, k=5, variaveis=None, metodo='pearson', absoluto=True, dtype=np.float32,
+              bloco=BLOCO_COLUNAS, n_jobs=1):
+    """
+    Os ``k`` parceiros mais correlacionados de cada variável (por |r| com
+    ``absoluto``). Pearson e Spearman são calculados bloco a bloco, sem
+    montar a matriz p x p; Kendall parte da matriz de pares.
+
+    Retorna DataFrame longo (variavel, parceiro, correlacao, posicao).
+    """
+    if metodo == 'kendall':
+        X, nomes = _matriz(dados, variaveis)
+        blocos = [(0, len(nomes), _kendall(X, n_jobs))]
+    else:
+        nomes, blocos = _blocos(dados, variaveis, metodo, dtype, bloco)
+    k = min(k, len(nomes) - 1)
+    linhas = []
+    for inicio, fim, R in blocos:
+        R = R.astype(float)
+        R[np.arange(fim - inicio), np.arange(inicio, fim)] = np.nan
+        chave = np.abs(R) if absoluto else R
+        chave = np.where(np.isnan(chave), -np.inf, chave)
+        melhores = np.argpartition(-chave, k - 1, axis=1)[:, :k]
+        ordem = np.argsort(-np.take_along_axis(chave, melhores, axis=1), axis=1, kind='stable')
+        melhores = np.take_along_axis(melhores, ordem, axis=1)
+        for linha in range(fim - inicio):
+            for posicao, j in enumerate(melhores[linha], start=1):
+                if np.isfinite(chave[linha, j]):
+                    linhas.append((nomes[inicio + linha], nomes[j], R[linha, j], posicao))
+    return pd.DataFrame(linhas, columns=['variavel', 'parceiro', 'correlacao', 'posicao'])
+
+
+def ordem_hierarquica(matriz):
+    """
+    Ordem das variáveis pelo agrupamento hierárquico (ligação média) com
+    distância 1 - |r|: variáveis correlacionadas ficam lado a lado.
+    """
+    from scipy.cluster.hierarchy import leaves_list, linkage
+    from scipy.spatial.distance import squareform
+
+    distancias = 1 - np.abs(np.nan_to_num(np.asarray(matriz, dtype=float)))
+    distancias = (distancias + distancias.T) / 2
+    np.fill_diagonal(distancias, 0)
+    return leaves_list(linkage(squareform(np.clip(distancias, 0, None), checks=False),
+                               method='average'))
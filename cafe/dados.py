@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+"""
+Carregamento do dataset da cafeicultura de Varginha/MG.
+
+O CSV é lido com um esquema de tipos compactos (medidas em float32 nos
+arquivos a partir de ``LIMITE_COMPACTO`` bytes, contagens em int32, ``ano``
+em int16 e chaves de texto como categorias) e
+convertido para um cache binário colunar (um ``.npy`` por coluna) indexado pelo hash do conteúdo do
+arquivo. Execuções seguintes mapeiam as colunas em memória a partir do
+cache, sem reprocessar o CSV.
+
+Layout do cache (``$CAFE_CACHE`` ou ``~/.cache/cafe``)::
+
+    indice.json                 caminho -> (tamanho, mtime, hash)
+    <hash>/meta.json            nomes, tipos e categorias das colunas
+    <hash>/NNNN.npy             dados de cada coluna, na ordem de meta.json
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cafe.instrumentacao import medida
+
+# Dataset distribuído junto com o repositório; pode ser trocado pela
+# variável de ambiente CAFE_DADOS ou pela opção --dados da linha de comando.
+CAMINHO_PADRAO = Path(__file__).resolve().parent.parent / 'dataset_varginha_cafe.csv'
+
+# ====================
+# ESQUEMA DAS COLUNAS
+# ====================
+
+# Medidas em float32: cerca de 7 algarismos significativos, acima da precisão
+# das fontes (IBGE, CONAB, INMET). As etapas acumulam somas e momentos em
+# float64 (ver ``matriz`` e ``flutuante``).
+ESQUEMA = {
+    # Chaves do modo painel (municípios x anos); ausentes na série de Varginha
+    'municipio_id': 'int32',
+    'municipio': 'category',
+    'regiao': 'category',
+    'ano': 'int16',
+    'producao_total_ton': 'float32',
+    'area_colhida_ha': 'float32',
+    'produtividade_kg_ha': 'float32',
+    'indice_tecnologico': 'float32',
+    'investimento_tecnologia_milhoes': 'float32',
+    'numero_produtores': 'int32',
+    'producao_especiais_ton': 'float32',
+    'preco_medio_saca_reais': 'float32',
+    'temperatura_media_c': 'float32',
+    'precipitacao_mm': 'float32'
+}
+
+# O mesmo esquema com as medidas em float64 (``load(compacto=False)``)
+ESQUEMA_FLOAT64 = {coluna: 'float64' if tipo == 'float32' else tipo
+                   for coluna, tipo in ESQUEMA.items()}
+
+# Colunas que identificam a observação no modo painel
+CHAVES_PAINEL = ['municipio_id', 'municipio', 'regiao']
+
+# Incrementar quando o formato gravado no cache mudar
+VERSAO_CACHE = 2
+
+# Inteiros até este valor são representados exatamente em float32
+INTEIRO_FLOAT32 = 2**24
+
+# Arquivos menores que isto mantêm as medidas em float64: a economia de
+# memória do float32 é irrelevante e os resultados ficam idênticos aos do
+# cálculo em float64 (a regressão em float32 muda a 5ª casa decimal)
+LIMITE_COMPACTO = 64 * 2**20
+
+
+def caminho_dados(caminho=None):
+    """Resolve o caminho do dataset (argumento > CAFE_DADOS > padrão)."""
+    return Path(caminho or os.environ.get('CAFE_DADOS') or CAMINHO_PADRAO)
+
+
+def eh_painel(df):
+    """Verdadeiro se o DataFrame contém mais de um município."""
+    return 'municipio_id' in df.columns and df['municipio_id'].nunique() > 1
+
+
+def diretorio_cache():
+    """Diretório do cache binário (CAFE_CACHE > XDG_CACHE_HOME/cafe)."""
+    if os.environ.get('CAFE_CACHE'):
+        return Path(os.environ['CAFE_CACHE'])
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'cafe'
+
+
+def ler_csv(caminho, esquema=None, **kwargs):
+    """Lê o CSV aplicando o esquema de tipos às colunas presentes."""
+    return pd.read_csv(caminho, dtype=esquema or ESQUEMA, **kwargs)
+
+
+def ler_blocos(caminho=None, colunas=None, tamanho=100000):
+    """
+    Lê o CSV em blocos de ``tamanho`` linhas (com o esquema de tipos), para
+    processar arquivos que não cabem na memória. ``colunas`` restringe as
+    colunas lidas; as ausentes no arquivo são ignoradas.
+    """
+    caminho = caminho_dados(caminho)
+    if colunas is not None:
+        presentes = set(pd.read_csv(caminho, nrows=0).columns)
+        colunas = [c for c in colunas if c in presentes]
+    with ler_csv(caminho, usecols=colunas, chunksize=tamanho) as leitor:
+        yield from leitor
+
+
+@medida('carga')
+def load(caminho=None, cache=True, compacto=True):
+    """
+    Carrega o dataset como DataFrame.
+
+    Com ``cache=True`` o resultado vem do cache binário quando o conteúdo
+    do arquivo não mudou; caso contrário o CSV é lido e o cache gravado.
+    Com ``compacto=False`` as medidas ficam em float64 e as colunas fora do
+    esquema nos tipos padrão do pandas. Arquivos menores que
+    ``LIMITE_COMPACTO`` compactam inteiros e texto, mas mantêm os reais em
+    float64.
+    """
+    caminho = caminho_dados(caminho)
+    reais = compacto and caminho.stat().st_size >= LIMITE_COMPACTO
+    esquema = ESQUEMA if reais else ESQUEMA_FLOAT64
+    if not cache:
+        df = ler_csv(caminho, esquema)
+        return compactar(df, reais) if compacto else df
+
+    raiz = diretorio_cache()
+    chave = chave_cache(caminho, raiz, esquema, compacto, reais)
+    destino = raiz / chave
+    if (destino / 'meta.json').exists():
+        return ler_cache(destino)
+
+    df = ler_csv(caminho, esquema)
+    if compacto:
+        compactar(df, reais)
+    try:
+        gravar_cache(df, destino)
+    except OSError as erro:
+        warnings.warn(f'cache não gravado em {destino}: {erro}')
+    return df
+
+
+# ====================
+# TIPOS COMPACTOS
+# ====================
+
+def _faixa_float32(valores):
+    """Verdadeiro se os valores não saem da faixa do float32 (nem viram zero)."""
+    absolutos = np.abs(valores[np.isfinite(valores) & (valores != 0)])
+    if not len(absolutos):
+        return True
+    limites = np.finfo(np.float32)
+    return absolutos.max() <= limites.max and absolutos.min() >= limites.tiny
+
+
+def compactar(df, reais=True):
+    """
+    Converte para tipos compactos as colunas fora do ``ESQUEMA`` (indicadores
+    extras): inteiros para o menor tipo que comporta os valores, reais para
+    float32 quando cabem na faixa (só com ``reais``) e texto para categoria.
+    As colunas do esquema já são lidas compactas. Altera e retorna ``df``.
+    """
+    for coluna in df.columns:
+        if coluna in ESQUEMA:
+            continue
+        serie = df[coluna]
+        if pd.api.types.is_bool_dtype(serie.dtype) \
+                or isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(serie.dtype):
+            df[coluna] = pd.to_numeric(serie, downcast='integer')
+        elif pd.api.types.is_float_dtype(serie.dtype):
+            if reais and _faixa_float32(serie.to_numpy()):
+                df[coluna] = serie.astype(np.float32)
+        elif serie.dtype == object or pd.api.types.is_string_dtype(serie.dtype):
+            df[coluna] = serie.astype('category')
+    return df
+
+
+def _cabe_em_float32(valores):
+    """Verdadeiro se o array é representado sem perda em float32."""
+    if valores.dtype.kind in 'fb':
+        return valores.dtype.itemsize <= 4
+    if valores.dtype.itemsize <= 2:
+        return True
+    return valores.dtype.itemsize == 4 and (not len(valores) or
+                                            np.abs(valores).max() < INTEIRO_FLOAT32)
+
+
+def tipo_calculo(df, colunas):
+    """
+    Tipo de ponto flutuante das colunas: float32 se todas cabem nele sem
+    perda (float32, inteiros compactos), senão float64.
+    """
+    if all(_cabe_em_float32(df[c].to_numpy()) for c in colunas):
+        return np.float32
+    return np.float64
+
+
+def matriz(df, colunas):
+    """
+    Array (n, p) das colunas no tipo de cálculo: colunas compactas saem em
+    float32, sem uma cópia intermediária em float64.
+    """
+    colunas = list(colunas)
+    return df[colunas].to_numpy(dtype=tipo_calculo(df, colunas))
+
+
+def flutuante(valores):
+    """
+    Array de ponto flutuante sem promover float32: reais são mantidos como
+    estão e inteiros convertidos para o tipo de cálculo.
+    """
+    valores = np.asarray(valores)
+    if valores.dtype.kind == 'f':
+        return valores
+    return valores.astype(np.float32 if _cabe_em_float32(valores) else np.float64)
+
+
+def bytes_por_linha(df):
+    """
+    Bytes por linha de cada coluna nos tipos atuais e nos tipos padrão do
+    pandas (inteiros em int64, reais em float64 e texto como ``object``).
+
+    Retorna DataFrame colunas x (tipo, bytes, bytes_padrao).
+    """
+    n = max(len(df), 1)
+    linhas = {}
+    for coluna, serie in df.items():
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            # Como object: um ponteiro por linha mais o objeto str de cada linha
+            codigos = serie.cat.codes.to_numpy()
+            contagens = np.bincount(codigos[codigos >= 0], minlength=len(serie.cat.categories))
+            tamanhos = np.array([sys.getsizeof(str(c)) for c in serie.cat.categories], dtype=float)
+            padrao = 8 * len(serie) + contagens @ tamanhos + (codigos < 0).sum() * sys.getsizeof(np.nan)
+        elif pd.api.types.is_bool_dtype(serie.dtype):
+            padrao = serie.memory_usage(index=False, deep=True)
+        elif pd.api.types.is_numeric_dtype(serie.dtype):
+            padrao = 8 * len(serie)
+        else:
+            padrao = serie.memory_usage(index=False, deep=True)
+        linhas[coluna] = (str(serie.dtype), serie.memory_usage(index=False, deep=True) / n,
+                          padrao / n)
+    return pd.DataFrame.from_dict(linhas, orient='index', columns=['tipo', 'bytes', 'bytes_padrao'])
+
+
+# ====================
+# CACHE BINÁRIO
+# ====================
+
+def hash_arquivo(caminho, bloco=1 << 20):
+    """SHA-256 do conteúdo do arquivo, lido em blocos de 1 MiB."""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for parte in iter(lambda: f.read(bloco), b''):
+            h.update(parte)
+    return h.hexdigest()
+
+
+def chave_cache(caminho, raiz=None, esquema=None, compacto=True, reais=True):
+    """
+    Chave do cache: hash do conteúdo + versão do formato + esquema + tipos
+    (``compacto`` e ``reais`` de ``load``; cada combinação tem o seu cache).
+
+    O hash do conteúdo é memorizado em ``indice.json`` por (tamanho, mtime),
+    de modo que arquivos não modificados não são relidos para gerar a chave.
+    """
+    raiz = Path(raiz or diretorio_cache())
+    caminho = Path(caminho).resolve()
+    info = caminho.stat()
+    assinatura = [info.st_size, info.st_mtime_ns]
+
+    arquivo_indice = raiz / 'indice.json'
+    try:
+        indice = json.loads(arquivo_indice.read_text())
+    except (OSError, ValueError):
+        indice = {}
+
+    registro = indice.get(str(caminho))
+    if registro and registro[:2] == assinatura:
+        conteudo = registro[2]
+    else:
+        conteudo = hash_arquivo(caminho)
+        indice[str(caminho)] = assinatura + [conteudo]
+        try:
+            _gravar_atomico(arquivo_indice, json.dumps(indice))
+        except OSError:
+            pass
+
+    esquema = json.dumps(esquema or ESQUEMA, sort_keys=True)
+    tipos = f'compacto={bool(compacto)};reais={bool(reais)}'
+    sufixo = hashlib.sha256(f'{VERSAO_CACHE}:{esquema}:{tipos}'.encode()).hexdigest()[:8]
+    return f'{conteudo[:32]}-{sufixo}'
+
+
+def gravar_cache(df, destino):
+    """Grava o DataFrame como um ``.npy`` por coluna em ``destino``."""
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    temporario = Path(tempfile.mkdtemp(dir=destino.parent, prefix='.tmp-'))
+    try:
+        colunas = []
+        for i, (nome, serie) in enumerate(df.items()):
+            coluna = {'nome': nome, 'arquivo': f'{i:04d}.npy'}
+            if isinstance(serie.dtype, pd.CategoricalDtype) or serie.dtype == object \
+                    or pd.api.types.is_string_dtype(serie.dtype):
+                # Texto é gravado como códigos inteiros + lista de categorias
+                # (e volta ao tipo de texto original na leitura)
+                if not isinstance(serie.dtype, pd.CategoricalDtype):
+                    coluna['texto'] = str(serie.dtype)
+                categorica = serie.astype('category')
+                coluna['categorias'] = categorica.cat.categories.tolist()
+                coluna['ordenada'] = bool(categorica.cat.ordered)
+                valores = categorica.cat.codes.to_numpy()
+            else:
+                valores = serie.to_numpy()
+            coluna['dtype'] = str(valores.dtype)
+            np.save(temporario / coluna['arquivo'], valores, allow_pickle=False)
+            colunas.append(coluna)
+        meta = {'versao': VERSAO_CACHE, 'linhas': len(df), 'colunas': colunas}
+        (temporario / 'meta.json').write_text(json.dumps(meta, ensure_ascii=False))
+        try:
+            os.replace(temporario, destino)
+        except OSError:
+            # outro processo gravou o mesmo cache primeiro
+            if not (destino / 'meta.json').exists():
+                raise
+    finally:
+        shutil.rmtree(temporario, ignore_errors=True)
+
+
+def ler_cache(destino):
+    """Reconstrói o DataFrame a partir das colunas mapeadas em memória."""
+    destino = Path(destino)
+    meta = json.loads((destino / 'meta.json').read_text())
+    dados = {}
+    for coluna in meta['colunas']:
+        # np.asarray: visão ndarray sobre o memmap, sem cópia
+        valores = np.asarray(np.load(destino / coluna['arquivo'], mmap_mode='r',
+                                     allow_pickle=False))
+        if 'categorias' in coluna:
+            valores = pd.Categorical.from_codes(
+                valores, categories=coluna['categorias'], ordered=coluna['ordenada'])
+            if 'texto' in coluna:
+                valores = pd.Series(valores).astype(coluna['texto']).array
+        dados[coluna['nome']] = valores
+    return pd.DataFrame(dados, copy=False)
+
+
+def limpar_cache(raiz=None):
+    """Remove todo o cache binário."""
+    shutil.rmtree(raiz or diretorio_cache(), ignore_errors=True)
+
+
+def _gravar_atomico(caminho, texto):
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=caminho.parent, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(texto)
+    os.replace(temporario, caminho)
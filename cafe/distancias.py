@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Distâncias entre as observações padronizadas, calculadas uma vez e
+reaproveitadas por todos os algoritmos de agrupamento e métricas.
+
+Ward, DBSCAN e a silhueta precisam de distâncias entre pares. Em vez de
+cada um recalculá-las, ``Distancias`` guarda, por impressão digital dos
+dados (``cafe.silhueta.digest``), os artefatos já calculados, em memória e
+em disco (``$CAFE_CACHE/distancias/<digest>/``):
+
+* ``condensada``: a matriz condensada (n(n-1)/2, ``scipy.spatial.distance.pdist``),
+  lida do disco como memmap. Só existe até ``LIMITE_MATRIZ`` linhas; dela
+  saem a silhueta exata de todas as rotulações (numa só leitura) e a
+  ``ligacao`` hierárquica (a árvore do Ward, cortada em qualquer K);
+* ``vizinhos``: os k vizinhos mais próximos (distâncias e índices);
+* ``raio``: o grafo esparso das distâncias até ``eps`` (vizinhança do DBSCAN).
+
+Os vizinhos e o grafo de raio vêm de uma árvore k-d, que só calcula as
+distâncias entre pontos próximos. Acima de ``LIMITE_MATRIZ`` linhas não há
+matriz, e a silhueta passa a ser a amostrada (``cafe.silhueta``).
+
+O cache em disco é limitado a ``LIMITE_DISCO_MB``: a cada artefato gravado,
+os diretórios de dados usados há mais tempo são removidos até o total caber
+no limite (``podar``).
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from cafe import silhueta as _silhueta
+from cafe.dados import diretorio_cache
+
+# Até este número de linhas a matriz condensada é calculada (15 mil linhas:
+# cerca de 900 MB em float64)
+LIMITE_MATRIZ = 15000
+
+# Memória máxima (MB) de cada bloco de linhas quadradas lido da matriz condensada
+MEMORIA_PADRAO = 64
+
+# Tamanho máximo (MB) de $CAFE_CACHE/distancias; os dados usados há mais
+# tempo saem primeiro
+LIMITE_DISCO_MB = 4096
+
+# Instâncias já abertas: (digest dos dados, raiz, opções) -> Distancias
+_CACHE = {}
+
+
+def _gravar(caminho, gravar):
+    """Grava ``caminho`` por meio de um temporário (``gravar(arquivo)``) e ``os.replace``."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=caminho.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            gravar(f)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def _tamanho(diretorio):
+    return sum(f.stat().st_size for f in diretorio.iterdir() if f.is_file())
+
+
+def podar(raiz=None, limite_mb=LIMITE_DISCO_MB, manter=None):
+    """
+    Remove de ``raiz``/distancias os diretórios usados há mais tempo (data de
+    modificação) até o total caber em ``limite_mb``. ``manter`` (um
+    diretório) nunca é removido. Retorna os diretórios removidos.
+    """
+    base = Path(raiz or diretorio_cache()) / 'distancias'
+    if not base.is_dir():
+        return []
+    diretorios = sorted((d for d in base.iterdir() if d.is_dir()),
+                        key=lambda d: d.stat().st_mtime)
+    tamanhos = {d: _tamanho(d) for d in diretorios}
+    total, removidos = sum(tamanhos.values()), []
+    for diretorio in diretorios:
+        if total <= limite_mb * 2**20:
+            break
+        if manter is not None and diretorio == Path(manter):
+            continue
+        shutil.rmtree(diretorio, ignore_errors=True)
+        total -= tamanhos[diretorio]
+        removidos.append(diretorio)
+    return removidos
+
+
+class Distancias:
+    """
+    Artefatos de distância de uma matriz ``X`` (n, p), calculados sob
+    demanda e guardados em memória e em ``raiz``/distancias/<digest>/
+    (limitado a ``limite_disco_mb``; ver ``podar``).
+
+    ``registro`` lista (artefato, origem, segundos) de cada artefato usado,
+    com origem 'calculado' ou 'disco', para o relatório.
+    """
+
+    def __init__(self, X, raiz=None, limite=LIMITE_MATRIZ, memoria_mb=MEMORIA_PADRAO,
+                 cache_disco=True, limite_disco_mb=LIMITE_DISCO_MB):
+        self.X = np.ascontiguousarray(X, dtype=float)
+        self.n = len(self.X)
+        self.chave = _silhueta.digest(self.X)
+        self.diretorio = Path(raiz or diretorio_cache()) / 'distancias' / self.chave
+        self.matriz = self.n <= limite
+        self.memoria_mb = memoria_mb
+        self.cache_disco = cache_disco
+        self.raiz = self.diretorio.parent.parent
+        self.limite_disco_mb = limite_disco_mb
+        self.registro = []
+        self._memoria = {}
+
+    def _artefato(self, nome, calcular, ler, gravar):
+        inicio = time.perf_counter()
+        if nome in self._memoria:
+            return self._memoria[nome]
+        caminho = self.diretorio / nome
+        if self.cache_disco and caminho.exists():
+            valor, origem = ler(caminho), 'disco'
+            # Marca o uso para a poda (mais recentes ficam)
+            os.utime(self.diretorio)
+        else:
+            valor, origem = calcular(), 'calculado'
+            if self.cache_disco:
+                _gravar(caminho, lambda f: gravar(f, valor))
+                valor = ler(caminho)
+                podar(self.raiz, self.limite_disco_mb, manter=self.diretorio)
+        self._memoria[nome] = valor
+        self.registro.append((nome, origem, time.perf_counter() - inicio))
+        return valor
+
+    @property
+    def tempo_calculo(self):
+        """Segundos gastos calculando (não lendo) artefatos."""
+        return sum(t for _, origem, t in self.registro if origem == 'calculado')
+
+    # ====================
+    # MATRIZ CONDENSADA
+    # ====================
+
+    def condensada(self):
+        """Matriz condensada (memmap somente leitura quando vem do disco)."""
+        from scipy.spatial.distance import pdist
+
+        if not self.matriz:
+            raise ValueError(f'matriz de distâncias limitada a {LIMITE_MATRIZ} linhas '
+                             f'(os dados têm {self.n})')
+        return self._artefato('condensada.npy', lambda: pdist(self.X),
+                              lambda caminho: np.load(caminho, mmap_mode='r'),
+                              lambda f, valor: np.save(f, valor))
+
+    def ligacao(self, metodo='ward'):
+        """Árvore hierárquica (``scipy.cluster.hierarchy.linkage``) da matriz condensada."""
+        from scipy.cluster.hierarchy import linkage
+
+        return self._artefato(f'ligacao_{metodo}.npy',
+                              lambda: linkage(self.condensada(), method=metodo),
+                              np.load, lambda f, valor: np.save(f, valor))
+
+    def blocos(self):
+        """
+        (linhas, bloco de linhas quadradas (len(linhas), n)) lidos da matriz
+        condensada. Na linha i, as colunas j > i são um trecho contínuo da
+        matriz condensada e as colunas j < i estão nas posições
+        ``inicio[j] - j - 1 + i``.
+        """
+        D = self.condensada()
+        n = self.n
+        j = np.arange(n)
+        inicio = j * n - j * (j + 1) // 2
+        base = inicio - j - 1
+        tamanho = max(1, int(self.memoria_mb * 2**20 / (8 * n)))
+        for primeira in range(0, n, tamanho):
+            linhas = np.arange(primeira, min(n, primeira + tamanho))
+            bloco = np.empty((len(linhas), n))
+            for r, i in enumerate(linhas):
+                bloco[r, :i] = D[base[:i] + i]
+                bloco[r, i] = 0.0
+                bloco[r, i + 1:] = D[inicio[i]:inicio[i] + n - i - 1]
+            yield linhas, bloco
+
+    # ====================
+    # VIZINHANÇAS
+    # ====================
+
+    def _calcular_vizinhos(self, k):
+        from scipy.spatial import cKDTree
+
+        distancias, indices = cKDTree(self.X).query(self.X, k=k + 1, workers=-1)
+        # Descarta a própria observação (ou, com pontos repetidos, o mais distante)
+        propria = indices == np.arange(self.n)[:, None]
+        propria[~propria.any(axis=1), -1] = True
+        return distancias[~propria].reshape(self.n, k), indices[~propria].reshape(self.n, k)
+
+    def vizinhos(self, k):
+        """Distâncias e índices dos k vizinhos mais próximos de cada linha (sem ela mesma)."""
+        k = min(k, self.n - 1)
+
+        def ler(caminho):
+            with np.load(caminho) as arquivo:
+                return arquivo['distancias'], arquivo['indices']
+
+        return self._artefato(
+            f'vizinhos_{k}.npz',
+            lambda: self._calcular_vizinhos(k), ler,
+            lambda f, valor: np.savez(f, distancias=valor[0], indices=valor[1]))
+
+    def conectividade(self, k):
+        """Grafo simétrico (esparso, binário) dos k vizinhos mais próximos."""
+        from scipy import sparse
+
+        _, indices = self.vizinhos(k)
+        k = indices.shape[1]
+        grafo = sparse.csr_matrix((np.ones(self.n * k), indices.ravel(),
+                                   np.arange(0, self.n * k + 1, k)), shape=(self.n, self.n))
+        return ((grafo + grafo.T) > 0).astype(float).tocsr()
+
+    def raio(self, eps):
+        """
+        Grafo esparso das distâncias até ``eps``, sem a diagonal (o DBSCAN
+        com ``metric='precomputed'`` conta cada ponto como vizinho de si mesmo).
+        """
+        from scipy import sparse
+
+        def calcular():
+            from sklearn.neighbors import NearestNeighbors
+
+            grafo = NearestNeighbors(radius=eps, algorithm='kd_tree').fit(self.X)
+            return grafo.radius_neighbors_graph(mode='distance').tocsr()
+
+        def ler(caminho):
+            grafo = sparse.load_npz(caminho)
+            grafo.sort_indices()
+            return grafo
+
+        return self._artefato(f'raio_{eps:.6g}.npz', calcular, ler,
+                              lambda f, valor: sparse.save_npz(f, valor, compressed=False))
+
+    # ====================
+    # SILHUETA
+    # ====================
+
+    def silhuetas(self, rotulacoes, metodo='auto'):
+        """
+        Silhueta de cada rotulação (rótulo -1 = ruído, fora da conta). Com a
+        matriz, todas as rotulações são avaliadas numa única leitura dela
+        (valor exato); sem ela, cada uma usa ``cafe.silhueta.silhueta``.
+        Rotulações com menos de 2 clusters ficam NaN.
+        """
+        rotulacoes = [np.asarray(r) for r in rotulacoes]
+        saida = [None] * len(rotulacoes)
+        validas = []
+        for i, rotulos in enumerate(rotulacoes):
+            dentro = rotulos >= 0
+            if not 2 <= len(np.unique(rotulos[dentro])) <= dentro.sum() - 1:
+                saida[i] = _silhueta.Silhueta(np.nan, 'exata')
+            elif not self.matriz or metodo == 'amostrada':
+                saida[i] = _silhueta.silhueta(self.X[dentro], rotulos[dentro], metodo)
+            else:
+                validas.append(i)
+        if not validas:
+            return saida
+
+        inicio = time.perf_counter()
+        codificadas = []
+        for i in validas:
+            codigos = np.full(self.n, -1, dtype=np.intp)
+            dentro = rotulacoes[i] >= 0
+            codigos[dentro], tamanhos = _silhueta._codificar(rotulacoes[i][dentro])
+            um_quente = np.zeros((self.n, len(tamanhos)))
+            um_quente[dentro, codigos[dentro]] = 1.0
+            codificadas.append((codigos, tamanhos, um_quente, np.zeros(self.n)))
+        for linhas, bloco in self.blocos():
+            for codigos, tamanhos, um_quente, s in codificadas:
+                validas_bloco = codigos[linhas] >= 0
+                somas = (bloco @ um_quente)[validas_bloco]
+                s[linhas[validas_bloco]] = _silhueta.valores_silhueta(
+                    somas, codigos[linhas][validas_bloco], tamanhos)
+        tempo = (time.perf_counter() - inicio) / len(validas)
+        for i, (codigos, _, _, s) in zip(validas, codificadas):
+            dentro = codigos >= 0
+            saida[i] = _silhueta.Silhueta(float(s[dentro].mean()), 'exata', tempo=tempo)
+            if dentro.all():
+                _silhueta.registrar(_silhueta.chave(self.X, rotulacoes[i], 'exata'), saida[i])
+        return saida
+
+
+def distancias(X, raiz=None, **kwargs):
+    """
+    ``Distancias`` de ``X``, reaproveitando a instância já aberta para os
+    mesmos dados, a mesma raiz e as mesmas opções.
+    """
+    X = np.ascontiguousarray(X, dtype=float)
+    chave = (_silhueta.digest(X), str(Path(raiz or diretorio_cache())),
+             tuple(sorted(kwargs.items())))
+    if chave not in _CACHE:
+        _CACHE[chave] = Distancias(X, raiz, **kwargs)
+    return _CACHE[chave]
+
+
+def limpar_cache():
+    _CACHE.clear()
@@ -0,0 +1,596 @@
+# -*- coding: utf-8 -*-
+"""
+Análise espacial entre municípios: vizinhança e I de Moran.
+
+A geometria vem de um arquivo local: limites municipais em GeoJSON (a malha
+do IBGE, com o código em ``CD_MUN``) ou centróides em CSV (código,
+latitude e longitude). A matriz de pesos é esparsa (``scipy.sparse``) e é
+montada com índices espaciais (``scipy.spatial.cKDTree``), sem laços O(n²)
+de distâncias:
+
+* ``rainha``/``torre``: contiguidade. Os vértices dos limites vão para uma
+  árvore k-d, e os pares de vértices coincidentes (até ``TOLERANCIA``) de
+  municípios diferentes ligam os dois municípios. Na torre, os municípios
+  precisam dividir pelo menos dois vértices (um trecho de limite);
+* ``knn``: os k centróides mais próximos (distância na esfera para
+  coordenadas geográficas).
+
+O I de Moran global e o local (LISA) de ``indice_tecnologico`` e
+``produtividade_kg_ha`` são testados por permutação vetorizada: cada bloco
+de permutações é uma matriz, e a defasagem espacial de todas as permutações
+sai de um único produto esparso. No local, a permutação é condicional
+(o valor do município fica fixo e os vizinhos são sorteados entre os
+demais), com o mesmo sorteio de vizinhos para todos os municípios.
+"""
+
+import json
+import time
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cafe.dados import eh_painel, flutuante, matriz
+from cafe.grupos import IndiceGrupos, empilhar
+from cafe.instrumentacao import medida
+
+VARIAVEIS_ESPACIAIS = ['indice_tecnologico', 'produtividade_kg_ha']
+
+CRITERIOS = ('rainha', 'torre', 'knn')
+
+K_VIZINHOS = 6
+
+PERMUTACOES_ESPACIAIS = 999
+
+SIGNIFICANCIA = 0.05
+
+# Distância máxima entre vértices considerados o mesmo ponto do limite
+# (graus, em coordenadas geográficas: cerca de 10 cm)
+TOLERANCIA = 1e-6
+
+# Memória máxima (MB) de cada bloco de permutações
+MEMORIA_PADRAO = 32
+
+# Propriedades do GeoJSON com o código do município, em ordem de preferência
+CAMPOS_CODIGO = ('municipio_id', 'CD_MUN', 'CD_GEOCMU', 'cod_ibge', 'codigo', 'id')
+
+# Colunas de latitude e longitude aceitas no CSV de centróides
+CAMPOS_LATITUDE = ('latitude', 'lat', 'y')
+CAMPOS_LONGITUDE = ('longitude', 'lon', 'long', 'x')
+
+# Quadrantes do diagrama de Moran (valor x defasagem)
+QUADRANTES = {1: 'Alto-Alto', 2: 'Baixo-Alto', 3: 'Baixo-Baixo', 4: 'Alto-Baixo'}
+NAO_SIGNIFICATIVO = 'Não significativo'
+SEM_VIZINHOS = 'Sem vizinhos'
+
+
+# ====================
+# GEOMETRIA
+# ====================
+
+@dataclass
+class Geometria:
+    """Municípios de um arquivo de limites ou de centróides."""
+    codigos: np.ndarray        # código IBGE de cada município (n,)
+    centroides: np.ndarray     # (n, 2): x/longitude, y/latitude
+    geografica: bool           # coordenadas em graus (longitude, latitude)
+    vertices: np.ndarray = None    # (m, 2) vértices dos limites (None com centróides)
+    dono: np.ndarray = None        # município de cada vértice (m,)
+    anel: np.ndarray = None        # anel (polígono ou buraco) de cada vértice (m,)
+
+    def __len__(self):
+        return len(self.codigos)
+
+
+def _codigo(feicao):
+    propriedades = feicao.get('properties') or {}
+    for campo in CAMPOS_CODIGO:
+        if propriedades.get(campo) not in (None, ''):
+            return int(propriedades[campo])
+    if feicao.get('id') not in (None, ''):
+        return int(feicao['id'])
+    raise ValueError(f'feição sem código de município ({", ".join(CAMPOS_CODIGO)})')
+
+
+def _eh_geografica(pontos):
+    return bool(len(pontos)) and np.abs(pontos[:, 0]).max() <= 180 \
+        and np.abs(pontos[:, 1]).max() <= 90
+
+
+def _centroides_poligonos(vertices, dono, anel, n):
+    """Centróide de área de cada município (média dos vértices se a área é nula)."""
+    a, b = vertices[:-1], vertices[1:]
+    mesmo = anel[:-1] == anel[1:]
+    a, b, d = a[mesmo], b[mesmo], dono[:-1][mesmo]
+    cruz = a[:, 0] * b[:, 1] - b[:, 0] * a[:, 1]
+    area = np.bincount(d, cruz, n) / 2
+    contagens = np.maximum(np.bincount(dono, minlength=n), 1)
+    media = np.column_stack([np.bincount(dono, vertices[:, j], n) / contagens for j in (0, 1)])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        centro = np.column_stack([np.bincount(d, (a[:, j] + b[:, j]) * cruz, n) / (6 * area)
+                                  for j in (0, 1)])
+    degenerado = np.abs(area) <= np.finfo(float).eps * np.abs(media).max()
+    return np.where(degenerado[:, None] | ~np.isfinite(centro), media, centro)
+
+
+def _ler_geojson(caminho):
+    dados = json.loads(Path(caminho).read_text(encoding='utf-8'))
+    feicoes = dados['features'] if dados.get('type') == 'FeatureCollection' else [dados]
+    codigos, partes, donos = [], [], []
+    for i, feicao in enumerate(feicoes):
+        geometria = feicao.get('geometry') or {}
+        if geometria.get('type') == 'Polygon':
+            poligonos = [geometria['coordinates']]
+        elif geometria.get('type') == 'MultiPolygon':
+            poligonos = geometria['coordinates']
+        else:
+            continue
+        codigos.append(_codigo(feicao))
+        for poligono in poligonos:
+            for anel in poligono:
+                pontos = np.asarray(anel, dtype=float)[:, :2]
+                if len(pontos) and not np.array_equal(pontos[0], pontos[-1]):
+                    pontos = np.vstack([pontos, pontos[:1]])
+                partes.append(pontos)
+                donos.append(len(codigos) - 1)
+    if not partes:
+        raise ValueError(f'{caminho}: nenhum polígono encontrado')
+    tamanhos = [len(p) for p in partes]
+    # Feições com o mesmo código (partes de um município) viram um só município
+    unicos, posicao = np.unique(np.asarray(codigos, dtype=np.int64), return_inverse=True)
+    dono = posicao[np.repeat(np.asarray(donos), tamanhos)]
+    anel = np.repeat(np.arange(len(partes)), tamanhos)
+    vertices = np.concatenate(partes)
+    return Geometria(codigos=unicos,
+                     centroides=_centroides_poligonos(vertices, dono, anel, len(unicos)),
+                     geografica=_eh_geografica(vertices), vertices=vertices, dono=dono, anel=anel)
+
+
+def _ler_centroides(caminho):
+    tabela = pd.read_csv(caminho)
+    colunas = {c.lower(): c for c in tabela.columns}
+
+    def campo(nomes, descricao):
+        for nome in nomes:
+            if nome in colunas:
+                return colunas[nome]
+        raise ValueError(f'{caminho}: coluna de {descricao} ausente ({", ".join(nomes)})')
+
+    codigo = campo(('municipio_id', 'cd_mun', 'codigo', 'cod.', 'cod'), 'código')
+    tabela = tabela.drop_duplicates(codigo, keep='last').sort_values(codigo)
+    centroides = tabela[[campo(CAMPOS_LONGITUDE, 'longitude'),
+                         campo(CAMPOS_LATITUDE, 'latitude')]].to_numpy(dtype=float)
+    return Geometria(codigos=tabela[codigo].to_numpy(dtype=np.int64), centroides=centroides,
+                     geografica=_eh_geografica(centroides))
+
+
+def ler_geometria(caminho):
+    """Lê limites (``.geojson``/``.json``) ou centróides (CSV) dos municípios."""
+    if Path(caminho).suffix.lower() in ('.geojson', '.json'):
+        return _ler_geojson(caminho)
+    return _ler_centroides(caminho)
+
+
+# ====================
+# PESOS ESPACIAIS
+# ====================
+
+@dataclass
+class Pesos:
+    """Matriz de vizinhança binária (esparsa) entre os municípios ``codigos``."""
+    codigos: np.ndarray
+    binaria: object        # scipy.sparse.csr_matrix (n, n) de 0/1
+    criterio: str
+
+    def __len__(self):
+        return len(self.codigos)
+
+    @property
+    def cardinalidades(self):
+        return np.diff(self.binaria.indptr)
+
+    @property
+    def ilhas(self):
+        """Códigos dos municípios sem vizinhos."""
+        return self.codigos[self.cardinalidades == 0]
+
+    @property
+    def padronizada(self):
+        """Matriz padronizada por linha (cada linha soma 1; ilhas ficam zeradas)."""
+        from scipy import sparse
+
+        with np.errstate(divide='ignore'):
+            inverso = np.where(self.cardinalidades > 0, 1 / self.cardinalidades, 0.0)
+        return sparse.diags(inverso) @ self.binaria
+
+    def recortar(self, codigos):
+        """Pesos entre os ``codigos`` pedidos (que devem estar na geometria), na ordem dada."""
+        posicao = pd.Index(self.codigos).get_indexer(np.asarray(codigos))
+        if (posicao < 0).any():
+            raise ValueError('municípios ausentes da geometria')
+        return Pesos(np.asarray(codigos), self.binaria[posicao][:, posicao].tocsr(),
+                     self.criterio)
+
+    def digest(self):
+        import hashlib
+
+        h = hashlib.blake2b(digest_size=16)
+        for parte in (self.codigos, self.binaria.indptr, self.binaria.indices):
+            h.update(np.ascontiguousarray(parte).tobytes())
+        h.update(self.criterio.encode())
+        return h.hexdigest()
+
+
+def _simetrica(linhas, colunas, n):
+    from scipy import sparse
+
+    A = sparse.coo_matrix((np.ones(len(linhas)), (linhas, colunas)), shape=(n, n)).tocsr()
+    A = ((A + A.T) > 0).astype(float).tocsr()
+    A.setdiag(0)
+    A.eliminate_zeros()
+    return A
+
+
+def contiguidade(geometria, criterio='rainha', tolerancia=TOLERANCIA):
+    """
+    Pesos de contiguidade: rainha (um vértice em comum basta) ou torre
+    (ao menos dois vértices em comum, isto é, um trecho de limite).
+    """
+    from scipy.spatial import cKDTree
+
+    if geometria.vertices is None:
+        raise ValueError('contiguidade exige os limites dos municípios (GeoJSON); '
+                         'com centróides use knn')
+    # O último vértice de cada anel repete o primeiro
+    fecho = np.r_[geometria.anel[1:] != geometria.anel[:-1], True]
+    vertices, dono = geometria.vertices[~fecho], geometria.dono[~fecho]
+    pares = cKDTree(vertices).query_pairs(tolerancia, output_type='ndarray')
+    a, b = dono[pares[:, 0]], dono[pares[:, 1]]
+    a, b = np.minimum(a, b)[a != b], np.maximum(a, b)[a != b]
+    n = len(geometria)
+    chaves, contagens = np.unique(a.astype(np.int64) * n + b, return_counts=True)
+    if criterio == 'torre':
+        chaves = chaves[contagens >= 2]
+    return Pesos(geometria.codigos, _simetrica(chaves // n, chaves % n, n), criterio)
+
+
+def _cartesianos(pontos, geografica):
+    """Pontos na esfera unitária (x, y, z) para coordenadas geográficas; os mesmos, senão."""
+    if not geografica:
+        return pontos
+    lon, lat = np.radians(pontos[:, 0]), np.radians(pontos[:, 1])
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def knn(geometria, k=K_VIZINHOS):
+    """Pesos dos k vizinhos mais próximos (centróides); a matriz não é simétrica."""
+    from scipy import sparse
+    from scipy.spatial import cKDTree
+
+    n = len(geometria)
+    k = min(k, n - 1)
+    pontos = _cartesianos(geometria.centroides, geometria.geografica)
+    _, vizinhos = cKDTree(pontos).query(pontos, k=k + 1)
+    # Descarta o próprio município (ou, com centróides repetidos, o mais distante)
+    proprio = vizinhos == np.arange(n)[:, None]
+    proprio[~proprio.any(axis=1), -1] = True
+    colunas = vizinhos[~proprio].reshape(n, k)
+    binaria = sparse.csr_matrix((np.ones(n * k), colunas.ravel(), np.arange(0, n * k + 1, k)),
+                                shape=(n, n))
+    return Pesos(geometria.codigos, binaria, 'knn')
+
+
+def pesos(geometria, criterio='rainha', k=K_VIZINHOS):
+    """Pesos pelo ``criterio`` ('rainha', 'torre' ou 'knn'); ``geometria`` pode ser um caminho."""
+    if not isinstance(geometria, Geometria):
+        geometria = ler_geometria(geometria)
+    if criterio == 'knn':
+        return knn(geometria, k)
+    if criterio not in CRITERIOS:
+        raise ValueError(f'critério de vizinhança desconhecido: {criterio!r}')
+    return contiguidade(geometria, criterio)
+
+
+# ====================
+# I DE MORAN
+# ====================
+
+def _blocos(n, permutacoes, largura, memoria_mb):
+    bloco = max(1, int(memoria_mb * 2**20 / (8 * n * largura)))
+    return [min(bloco, permutacoes - i) for i in range(0, permutacoes, bloco)]
+
+
+def _p_dobrado(maiores, permutacoes):
+    """p-valor de permutação na direção observada (como no PySAL): (1 + extremos) / (P + 1)."""
+    return (1 + np.minimum(maiores, permutacoes - maiores)) / (permutacoes + 1)
+
+
+def moran_global(X, W, permutacoes=PERMUTACOES_ESPACIAIS, semente=42, memoria_mb=MEMORIA_PADRAO):
+    """
+    I de Moran global de cada coluna de ``X`` (n, m) com os pesos ``W``
+    (esparsa, padronizada por linha). Todas as colunas usam as mesmas
+    permutações, e cada bloco de permutações é defasado com um único
+    produto esparso.
+
+    Retorna DataFrame (colunas x I, esperado, z_normal, p_normal,
+    media_permutacoes, z_permutacao, p_permutacao).
+    """
+    from scipy import stats
+
+    X = flutuante(X).astype(np.float64)
+    if X.ndim == 1:
+        X = X[:, None]
+    n, m = X.shape
+    Z = X - X.mean(axis=0)
+    soma_quadrados = np.einsum('im,im->m', Z, Z)
+    S0 = W.sum()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        I = n / S0 * np.einsum('im,im->m', Z, W @ Z) / soma_quadrados
+
+    # Momentos sob a hipótese de normalidade
+    esperado = -1 / (n - 1)
+    S1 = 0.5 * (W + W.T).power(2).sum()
+    S2 = np.sum((np.asarray(W.sum(axis=1)).ravel() + np.asarray(W.sum(axis=0)).ravel()) ** 2)
+    variancia = (n * n * S1 - n * S2 + 3 * S0 ** 2) / ((n * n - 1) * S0 ** 2) - esperado ** 2
+    z_normal = (I - esperado) / np.sqrt(variancia)
+
+    simulados = np.full((0, m), np.nan)
+    if permutacoes > 0:
+        rng = np.random.default_rng(semente)
+        partes = []
+        for b in _blocos(n, permutacoes, 2 * m, memoria_mb):
+            indices = rng.permuted(np.broadcast_to(np.arange(n), (b, n)), axis=1)
+            # (n, b*m): coluna p*m + j é a variável j na permutação p
+            P = np.moveaxis(Z[indices], 0, 1).reshape(n, b * m)
+            partes.append((n / S0 * np.einsum('ij,ij->j', P, W @ P)).reshape(b, m)
+                          / soma_quadrados)
+        simulados = np.concatenate(partes)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.DataFrame({
+            'I': I,
+            'esperado': esperado,
+            'z_normal': z_normal,
+            'p_normal': 2 * stats.norm.sf(np.abs(z_normal)),
+            'media_permutacoes': simulados.mean(axis=0) if permutacoes else np.nan,
+            'z_permutacao': (I - simulados.mean(axis=0)) / simulados.std(axis=0, ddof=1)
+            if permutacoes else np.nan,
+            'p_permutacao': _p_dobrado((simulados >= I).sum(axis=0), permutacoes)
+            if permutacoes else np.nan,
+        })
+
+
+def moran_local(X, W, permutacoes=PERMUTACOES_ESPACIAIS, semente=42, memoria_mb=MEMORIA_PADRAO):
+    """
+    I de Moran local (LISA) de cada município e coluna de ``X`` (n, m),
+    com ``W`` padronizada por linha e permutação condicional: cada
+    permutação sorteia, sem reposição, ``k_max`` municípios entre os outros
+    n - 1 (o mesmo sorteio para todos, deslocado para pular o próprio), e
+    cada município usa os ``k_i`` primeiros com os seus pesos.
+
+    Retorna (I, defasagem, p, quadrante), arrays (n, m); quadrante 1 a 4
+    como em ``QUADRANTES``.
+    """
+    X = flutuante(X).astype(np.float64)
+    if X.ndim == 1:
+        X = X[:, None]
+    n, m = X.shape
+    Z = X - X.mean(axis=0)
+    m2 = np.einsum('im,im->m', Z, Z) / n
+    defasagem = W @ Z
+    with np.errstate(invalid='ignore', divide='ignore'):
+        I = Z * defasagem / m2
+    quadrante = np.where(Z > 0, np.where(defasagem > 0, 1, 4), np.where(defasagem > 0, 2, 3))
+
+    cardinalidades = np.diff(W.indptr)
+    k_max = int(cardinalidades.max()) if n else 0
+    p = np.full((n, m), np.nan)
+    if permutacoes > 0 and k_max > 0:
+        # Pesos dos vizinhos de cada município, alinhados à esquerda (n, k_max)
+        posicao = np.arange(W.nnz) - np.repeat(W.indptr[:-1], cardinalidades)
+        pesos_vizinhos = np.zeros((n, k_max))
+        pesos_vizinhos[np.repeat(np.arange(n), cardinalidades), posicao] = W.data
+        rng = np.random.default_rng(semente)
+        sorteio = np.stack([rng.choice(n - 1, k_max, replace=False) for _ in range(permutacoes)])
+        bloco = max(1, int(memoria_mb * 2**20 / (8 * permutacoes * k_max * (m + 1))))
+        for inicio in range(0, n, bloco):
+            linhas = np.arange(inicio, min(n, inicio + bloco))
+            outros = sorteio[None] + (sorteio[None] >= linhas[:, None, None])
+            simulada = np.einsum('bpkm,bk->bpm', Z[outros], pesos_vizinhos[linhas])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                simulados = Z[linhas, None, :] * simulada / m2
+            maiores = (simulados >= I[linhas, None, :]).sum(axis=1)
+            p[linhas] = _p_dobrado(maiores, permutacoes)
+        p[cardinalidades == 0] = np.nan
+    return I, defasagem, p, quadrante
+
+
+# ====================
+# PAINEL DE MUNICÍPIOS
+# ====================
+
+@dataclass
+class ResultadoEspacial:
+    """I de Moran global (período e cada ano) e local dos municípios."""
+    pesos: Pesos
+    centroides: pd.DataFrame   # municipio_id, x, y (centróides dos municípios analisados)
+    moran: pd.DataFrame        # variável x I global nas médias do período
+    anual: pd.DataFrame        # variavel, ano, I, p_permutacao
+    local: pd.DataFrame        # municipio_id, variavel, valor, defasagem, I, p_valor, quadrante, categoria
+    variaveis: list
+    permutacoes: int
+    tempo: float
+
+    def digest(self):
+        import hashlib
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.pesos.digest().encode())
+        for tabela in (self.centroides, self.moran, self.anual, self.local):
+            h.update(pd.util.hash_pandas_object(tabela, index=True).to_numpy().tobytes())
+        return h.hexdigest()
+
+
+def _municipios(df, pesos):
+    """Códigos do painel presentes na geometria (avisa sobre os ausentes)."""
+    codigos = np.unique(df['municipio_id'].to_numpy())
+    presentes = np.isin(codigos, pesos.codigos)
+    if not presentes.all():
+        warnings.warn(f'{(~presentes).sum()} município(s) do painel fora da geometria; '
+                      'ignorados na análise espacial')
+    return codigos[presentes]
+
+
+def defasagens(df, pesos, variaveis=None):
+    """
+    Defasagem espacial de cada linha do painel: média das variáveis nos
+    vizinhos do município no mesmo ano (vizinhos sem dado no ano não
+    entram). Retorna DataFrame ``defasagem_<variável>`` alinhado a ``df``.
+    """
+    variaveis = variaveis or VARIAVEIS_ESPACIAIS
+    codigos = _municipios(df, pesos)
+    S, rotulos, anos = empilhar(df, variaveis, por='municipio_id')
+    dentro = np.isin(rotulos.to_numpy(), codigos)
+    S, rotulos = S[dentro], rotulos[dentro]
+    A = pesos.recortar(rotulos.to_numpy()).binaria
+    G, T, m = S.shape
+    validos = np.isfinite(S).reshape(G, T * m)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        defasado = (A @ np.where(validos, S.reshape(G, T * m), 0.0)) / (A @ validos)
+    defasado = defasado.reshape(G, T, m)
+
+    grupo = pd.Index(rotulos).get_indexer(df['municipio_id'].to_numpy())
+    ano = df['ano'].to_numpy().astype(np.intp) - anos[0]
+    saida = np.full((len(df), m), np.nan)
+    linha = grupo >= 0
+    saida[linha] = defasado[grupo[linha], ano[linha]]
+    return pd.DataFrame(saida, index=df.index, columns=[f'defasagem_{v}' for v in variaveis])
+
+
+def com_defasagens(df, pesos, variaveis=None):
+    """
+    Cópia de ``df`` com as colunas ``defasagem_<variável>`` (para o
+    clustering). Municípios sem vizinhos com dado no ano ficam com o
+    próprio valor. Retorna (df, nomes das colunas).
+    """
+    variaveis = variaveis or VARIAVEIS_ESPACIAIS
+    lags = defasagens(df, pesos, variaveis)
+    df = df.copy()
+    for variavel, coluna in zip(variaveis, lags.columns):
+        df[coluna] = lags[coluna].fillna(df[variavel].astype(float))
+    return df, list(lags.columns)
+
+
+@medida('espacial')
+def analisar(df, geometria, criterio='rainha', k=K_VIZINHOS, variaveis=None,
+             permutacoes=PERMUTACOES_ESPACIAIS, semente=42):
+    """
+    I de Moran global e local das ``variaveis`` entre os municípios do
+    painel: nas médias do período (global e local) e em cada ano (global).
+    ``geometria`` é um caminho ou uma ``Geometria``.
+    """
+    if not eh_painel(df):
+        raise ValueError('a análise espacial exige o painel de municípios (municipio_id)')
+    inicio = time.perf_counter()
+    variaveis = variaveis or VARIAVEIS_ESPACIAIS
+    if not isinstance(geometria, Geometria):
+        geometria = ler_geometria(geometria)
+    todos = pesos(geometria, criterio, k)
+    codigos = _municipios(df, todos)
+    if len(codigos) < 3:
+        raise ValueError('a análise espacial exige ao menos 3 municípios na geometria')
+    recortados = todos.recortar(codigos)
+    if len(recortados.ilhas):
+        warnings.warn(f'{len(recortados.ilhas)} município(s) sem vizinhos')
+    W = recortados.padronizada
+
+    # Médias do período por município
+    dentro = df[df['municipio_id'].isin(codigos)]
+    indice = IndiceGrupos.de_coluna(dentro, 'municipio_id')
+    medias = indice.media(matriz(dentro, variaveis))
+    global_ = moran_global(medias, W, permutacoes, semente)
+    global_.index = pd.Index(variaveis, name='variavel')
+    I, defasagem, p, quadrante = moran_local(medias, W, permutacoes, semente)
+
+    sem_vizinhos = recortados.cardinalidades == 0
+    local = []
+    for j, variavel in enumerate(variaveis):
+        categoria = np.where(p[:, j] <= SIGNIFICANCIA,
+                             pd.Series(quadrante[:, j]).map(QUADRANTES).to_numpy(), NAO_SIGNIFICATIVO)
+        categoria[sem_vizinhos] = SEM_VIZINHOS
+        local.append(pd.DataFrame({
+            'municipio_id': codigos, 'variavel': variavel, 'valor': medias[:, j],
+            'defasagem': np.where(sem_vizinhos, np.nan, defasagem[:, j] + medias[:, j].mean()),
+            'I': I[:, j], 'p_valor': p[:, j],
+            'quadrante': quadrante[:, j], 'categoria': categoria
+        }))
+
+    # Global de cada ano, com os municípios que têm todas as variáveis no ano
+    anual = []
+    for ano, secao in dentro.groupby('ano', sort=True):
+        secao = secao.dropna(subset=variaveis).drop_duplicates('municipio_id', keep='last')
+        if len(secao) < 3:
+            continue
+        W_ano = todos.recortar(secao['municipio_id'].to_numpy()).padronizada
+        tabela = moran_global(matriz(secao, variaveis), W_ano, permutacoes, semente)
+        anual.append(pd.DataFrame({'variavel': variaveis, 'ano': ano, 'n': len(secao),
+                                   'I': tabela['I'].to_numpy(),
+                                   'p_permutacao': tabela['p_permutacao'].to_numpy()}))
+
+    posicao = pd.Index(geometria.codigos).get_indexer(codigos)
+    return ResultadoEspacial(
+        pesos=recortados,
+        centroides=pd.DataFrame({'municipio_id': codigos, 'x': geometria.centroides[posicao, 0],
+                                 'y': geometria.centroides[posicao, 1]}),
+        moran=global_,
+        anual=pd.concat(anual, ignore_index=True) if anual else pd.DataFrame(),
+        local=pd.concat(local, ignore_index=True),
+        variaveis=list(variaveis),
+        permutacoes=permutacoes,
+        tempo=time.perf_counter() - inicio
+    )
+
+
+def relatorio(resultado, saida=None):
+    """Imprime o I de Moran global e o resumo do LISA e grava as tabelas em ``saida``."""
+    from cafe.estatistica import NOMES
+
+    pesos_ = resultado.pesos
+    cardinalidades = pesos_.cardinalidades
+    print("ANÁLISE ESPACIAL: I DE MORAN")
+    print("-" * 80)
+    print(f"Vizinhança: {pesos_.criterio}, {len(pesos_)} municípios, "
+          f"{cardinalidades.mean():.2f} vizinhos em média "
+          f"(mín. {cardinalidades.min()}, máx. {cardinalidades.max()}); "
+          f"{len(pesos_.ilhas)} sem vizinhos")
+    print(f"Permutações: {resultado.permutacoes}; tempo: {resultado.tempo:.2f} s")
+
+    print("\nI de Moran global (médias do período):")
+    for variavel, linha in resultado.moran.iterrows():
+        print(f"  {NOMES.get(variavel, variavel)}: I = {linha['I']:.4f} "
+              f"(E[I] = {linha['esperado']:.4f}, z = {linha['z_normal']:.2f}, "
+              f"p-permutação = {linha['p_permutacao']:.4f})")
+
+    if len(resultado.anual):
+        print("\nI de Moran global por ano:")
+        tabela = resultado.anual.pivot(index='ano', columns='variavel', values=['I', 'p_permutacao'])
+        print(tabela.round(4).to_string())
+
+    print(f"\nI de Moran local (LISA, α = {SIGNIFICANCIA}):")
+    contagens = (resultado.local.groupby(['variavel', 'categoria']).size()
+                 .unstack('variavel', fill_value=0))
+    ordem = [*QUADRANTES.values(), NAO_SIGNIFICATIVO, SEM_VIZINHOS]
+    print(contagens.reindex([c for c in ordem if c in contagens.index]).to_string())
+
+    if saida is not None:
+        saida = Path(saida)
+        saida.mkdir(parents=True, exist_ok=True)
+        global_ = resultado.moran.reset_index()
+        global_.insert(1, 'ano', 'período')
+        anual = resultado.anual.assign(ano=resultado.anual['ano'].astype(str)) \
+            if len(resultado.anual) else resultado.anual
+        pd.concat([global_, anual], ignore_index=True).to_csv(saida / 'moran_global.csv',
+                                                              index=False)
+        resultado.local.to_csv(saida / 'moran_local.csv', index=False)
+        print(f"\n✓ Tabelas salvas em: {saida / 'moran_global.csv'} e {saida / 'moran_local.csv'}")
@@ -0,0 +1,442 @@
+# -*- coding: utf-8 -*-
+"""
+Análise Estatística: Correlação entre Avanço Tecnológico e Produção de Café
+Região: Polo de Varginha e Sul de Minas Gerais
+
+Estatística descritiva, correlação, regressão linear múltipla e ANOVA.
+Somente numpy e pandas são importados no carregamento do módulo; scipy é
+importado dentro das etapas que o utilizam. A regressão usa o MQO em lote de
+``cafe.regressao``, com erros padrão e p-valores.
+
+No modo painel (municípios x anos) cada etapa também é calculada por grupo
+com um único ``IndiceGrupos`` (ver ``cafe.grupos``), compartilhado entre as
+seções do relatório.
+"""
+
+import pandas as pd
+
+from cafe.dados import bytes_por_linha, eh_painel, flutuante, matriz
+from cafe.grupos import IndiceGrupos
+from cafe.instrumentacao import medida
+from cafe.regressao import ols
+
+# ============================================================================
+# VARIÁVEIS DA ANÁLISE
+# ============================================================================
+
+VARIAVEIS_NUMERICAS = [
+    'producao_total_ton',
+    'area_colhida_ha',
+    'produtividade_kg_ha',
+    'indice_tecnologico',
+    'investimento_tecnologia_milhoes',
+    'numero_produtores',
+    'producao_especiais_ton',
+    'preco_medio_saca_reais',
+    'temperatura_media_c',
+    'precipitacao_mm'
+]
+
+ALVO = 'produtividade_kg_ha'
+
+REGRESSORES = [
+    'indice_tecnologico',
+    'investimento_tecnologia_milhoes',
+    'precipitacao_mm',
+    'temperatura_media_c'
+]
+
+NOMES = {
+    'producao_total_ton': 'Produção Total (ton)',
+    'area_colhida_ha': 'Área Colhida (ha)',
+    'produtividade_kg_ha': 'Produtividade (kg/ha)',
+    'indice_tecnologico': 'Índice Tecnológico',
+    'investimento_tecnologia_milhoes': 'Investimento em Tecnologia (R$ mi)',
+    'numero_produtores': 'Número de Produtores',
+    'producao_especiais_ton': 'Cafés Especiais (ton)',
+    'preco_medio_saca_reais': 'Preço Médio da Saca (R$)',
+    'temperatura_media_c': 'Temperatura Média (°C)',
+    'precipitacao_mm': 'Precipitação (mm)'
+}
+
+# Colunas de agrupamento reconhecidas, em ordem de preferência
+COLUNAS_GRUPO = ['regiao', 'municipio']
+
+# Colunas numéricas que não são indicadores
+COLUNAS_IDENTIFICADORAS = ['municipio_id', 'ano', 'cluster']
+
+# Acima deste número de grupos os relatórios resumem a distribuição entre
+# grupos em vez de imprimir um bloco por grupo
+LIMITE_GRUPOS = 20
+
+
+def coluna_grupo(df):
+    """Retorna a coluna de agrupamento presente no DataFrame (ou None)."""
+    for coluna in COLUNAS_GRUPO:
+        if coluna in df.columns:
+            return coluna
+    return None
+
+
+def _indice(df, por=None, indice=None):
+    if indice is not None:
+        return indice
+    por = por or coluna_grupo(df)
+    return IndiceGrupos.de_coluna(df, por) if por else None
+
+
+# ============================================================================
+# ETAPAS
+# ============================================================================
+
+def describe(df, variaveis=None):
+    """Estatísticas descritivas das variáveis numéricas."""
+    return df[variaveis or VARIAVEIS_NUMERICAS].describe()
+
+
+def describe_grupos(df, por=None, variaveis=None, indice=None):
+    """Médias das variáveis por grupo (passagem única pelo índice)."""
+    return _indice(df, por, indice).medias(df, variaveis or VARIAVEIS_NUMERICAS)
+
+
+def variaveis_numericas(df):
+    """
+    Variáveis numéricas da análise presentes no DataFrame, seguidas de
+    quaisquer outros indicadores numéricos (exceto identificadores e ano).
+    """
+    conhecidas = [v for v in VARIAVEIS_NUMERICAS if v in df.columns]
+    extras = [c for c in df.select_dtypes('number').columns
+              if c not in conhecidas and c not in COLUNAS_IDENTIFICADORAS]
+    return conhecidas + extras
+
+
+def correlate(df, variaveis=None, metodo='pearson'):
+    """Matriz de correlação: 'pearson', 'spearman' ou 'kendall' (ver ``cafe.correlacao``)."""
+    from cafe.correlacao import correlacao
+
+    return correlacao(df, variaveis or VARIAVEIS_NUMERICAS, metodo)
+
+
+def parceiros(df, k=5, variaveis=None, metodo='pearson'):
+    """Os k parceiros mais correlacionados de cada variável, em formato longo."""
+    from cafe.correlacao import parceiros as parceiros_correlacao
+
+    return parceiros_correlacao(df, k, variaveis or variaveis_numericas(df), metodo)
+
+
+def correlate_grupos(df, por=None, variaveis=None, indice=None):
+    """
+    Correlação de cada variável com a produtividade dentro de cada grupo.
+
+    Retorna DataFrame grupos x variáveis.
+    """
+    variaveis = [v for v in variaveis or VARIAVEIS_NUMERICAS if v != ALVO]
+    indice = _indice(df, por, indice)
+    matrizes = indice.correlacao(matriz(df, [ALVO, *variaveis]))
+    return pd.DataFrame(matrizes[:, 0, 1:], index=indice.rotulos, columns=variaveis)
+
+
+def regress(df, alvo=ALVO, regressores=None):
+    """
+    Regressão linear múltipla do alvo sobre os regressores.
+
+    Retorna um dicionário com intercepto, coeficientes, erros padrão,
+    estatísticas t, p-valores, R², R² ajustado, RMSE e número de observações.
+    """
+    regressores = regressores or REGRESSORES
+    return ols(matriz(df, regressores), flutuante(df[alvo].to_numpy()),
+               nomes=['intercepto', *regressores]).resumo(alvo)
+
+
+def ols_grupos(df, por=None, alvo=ALVO, regressores=None, indice=None):
+    """
+    Uma regressão por grupo, resolvida em lote pelas equações normais
+    empilhadas. Retorna ``cafe.regressao.ResultadoOLS`` (arrays por grupo).
+    """
+    regressores = regressores or REGRESSORES
+    return ols(matriz(df, regressores), flutuante(df[alvo].to_numpy()),
+               _indice(df, por, indice), nomes=['intercepto', *regressores])
+
+
+def regress_grupos(df, por=None, alvo=ALVO, regressores=None, indice=None):
+    """
+    Tabela grupos x (intercepto, coeficientes..., r2, r2_ajustado, rmse, n)
+    das regressões por grupo (ver ``ols_grupos``).
+    """
+    return ols_grupos(df, por, alvo, regressores, indice).tabela()
+
+
+def anova(df, variavel=ALVO, por=None, indice=None, permutacoes=None, n_jobs=None):
+    """
+    ANOVA de um fator da variável entre os grupos. Retorna (F, p), com o
+    p-valor do teste de permutação (``cafe.permutacao``); ``permutacoes=0``
+    usa a distribuição F.
+    """
+    from cafe.permutacao import PERMUTACOES_PADRAO, anova_permutacao
+
+    indice = _indice(df, por, indice)
+    if indice is None:
+        raise ValueError('ANOVA requer uma coluna de agrupamento')
+    permutacoes = PERMUTACOES_PADRAO if permutacoes is None else permutacoes
+    teste = anova_permutacao(indice, flutuante(df[variavel].to_numpy()), [variavel],
+                             permutacoes=permutacoes, n_jobs=n_jobs).iloc[0]
+    return float(teste['F']), float(teste['p_valor'] if permutacoes > 0 else teste['p_f'])
+
+
+# ============================================================================
+# RELATÓRIOS
+# ============================================================================
+
+def _resumo_entre_grupos(tabela, colunas):
+    """Distribuição de estatísticas por grupo (mediana e faixa P10-P90)."""
+    quantis = tabela[colunas].quantile([0.1, 0.5, 0.9])
+    for coluna in colunas:
+        p10, p50, p90 = quantis[coluna]
+        print(f"  {coluna}: mediana {p50:.4f} (P10 {p10:.4f} | P90 {p90:.4f})")
+
+
+def relatorio_visao_geral(df):
+    print("1. VISÃO GERAL DOS DADOS")
+    print("-" * 80)
+    print(f"Dimensões do dataset: {df.shape[0]} linhas x {df.shape[1]} colunas")
+    memoria = bytes_por_linha(df)
+    atual, padrao = memoria['bytes'].sum(), memoria['bytes_padrao'].sum()
+    print(f"Memória: {atual:.1f} bytes/linha ({padrao:.1f} com os tipos padrão do pandas; "
+          f"redução de {1 - atual / padrao:.0%})")
+    print(f"Período analisado: {df['ano'].min()} - {df['ano'].max()}")
+    if eh_painel(df):
+        print(f"Municípios analisados: {df['municipio_id'].nunique()}")
+    por = coluna_grupo(df)
+    if por == 'regiao':
+        print(f"Regiões analisadas: {', '.join(map(str, df[por].unique()))}")
+    print()
+
+
+@medida('descritiva')
+def relatorio_descritivo(df, indice=None):
+    print("2. ESTATÍSTICA DESCRITIVA")
+    print("-" * 80)
+    print(describe(df).round(2).to_string())
+    print()
+
+    indice = _indice(df, indice=indice)
+    if indice is None:
+        return
+
+    print("\n2.1 ESTATÍSTICAS POR REGIÃO")
+    print("-" * 80)
+    medias = describe_grupos(df, indice=indice)
+    if len(indice) > LIMITE_GRUPOS:
+        print(f"{len(indice)} grupos ({indice.rotulos.name}); distribuição das médias por grupo:")
+        print(medias.describe().round(2).to_string())
+        print()
+        return
+    for grupo, linha in medias.iterrows():
+        print(f"\nRegião: {grupo}")
+        print(f"  Produção Média: {linha['producao_total_ton']:,.0f} ton")
+        print(f"  Produtividade Média: {linha['produtividade_kg_ha']:.2f} kg/ha")
+        print(f"  Índice Tecnológico Médio: {linha['indice_tecnologico']:.2f}")
+        print(f"  Investimento Médio: R$ {linha['investimento_tecnologia_milhoes']:.1f} mi")
+    print()
+
+
+@medida('bootstrap')
+def intervalos(df, reamostras=None, n_jobs=None, coeficientes=True):
+    """
+    Intervalos bootstrap de correlações e, com ``coeficientes``, dos
+    coeficientes da regressão (``cafe.bootstrap``), ou None.
+    """
+    from cafe.bootstrap import REAMOSTRAS_PADRAO, bootstrap
+
+    reamostras = REAMOSTRAS_PADRAO if reamostras is None else reamostras
+    if reamostras <= 0:
+        return None
+    return bootstrap(df, reamostras=reamostras, n_jobs=n_jobs, coeficientes=coeficientes)
+
+
+def _descrever_bootstrap(ic):
+    unidade = 'linhas' if ic.unidade == 'linha' else f'conglomerados por {ic.unidade}'
+    print(f"  IC{ic.confianca:.0%} bootstrap percentil: {ic.reamostras} reamostras "
+          f"({unidade}), {ic.tempo:.2f} s")
+
+
+@medida('correlacao')
+def relatorio_correlacao(df, indice=None, ic=None, reamostras=None, n_jobs=None):
+    print("\n3. ANÁLISE DE CORRELAÇÃO")
+    print("-" * 80)
+
+    correlacao = correlate(df)
+    if ic is None:
+        # Só as correlações: os coeficientes ficam com o relatório da regressão
+        ic = intervalos(df, reamostras, n_jobs, coeficientes=False)
+
+    print("\n3.1 CORRELAÇÕES COM PRODUTIVIDADE (kg/ha):")
+    print("-" * 80)
+    corr_produtividade = correlacao[ALVO].sort_values(ascending=False)
+    for var, valor in corr_produtividade.items():
+        if var != ALVO:
+            if ic is None:
+                print(f"  {var}: {valor:.4f}")
+            else:
+                _, inferior, superior = ic.intervalo_correlacao(var, ALVO)
+                print(f"  {var}: {valor:.4f}  [{inferior:.4f}; {superior:.4f}]")
+    if ic is not None:
+        _descrever_bootstrap(ic)
+    print()
+
+    if not eh_painel(df):
+        return
+    indice = indice if indice is not None and indice.rotulos.name == 'municipio_id' \
+        else IndiceGrupos.de_coluna(df, 'municipio_id')
+    print("3.2 CORRELAÇÕES DENTRO DE CADA MUNICÍPIO (série temporal):")
+    print("-" * 80)
+    tabela = correlate_grupos(df, indice=indice)
+    _resumo_entre_grupos(tabela, tabela.columns)
+    print()
+
+
+@medida('parceiros')
+def relatorio_parceiros(df, k=5, metodo='pearson', caminho=None):
+    """Lista os k parceiros mais correlacionados de cada variável (e grava em CSV)."""
+    tabela = parceiros(df, k, metodo=metodo)
+    print(f"3.3 PARCEIROS MAIS CORRELACIONADOS ({metodo}, k={k}):")
+    print("-" * 80)
+    for variavel, grupo in tabela.groupby('variavel', sort=False):
+        pares = ', '.join(f"{p} ({r:+.3f})" for p, r in zip(grupo['parceiro'], grupo['correlacao']))
+        print(f"  {variavel}: {pares}")
+    if caminho is not None:
+        tabela.to_csv(caminho, index=False)
+        print(f"\n✓ Parceiros salvos em: {caminho}")
+    print()
+    return tabela
+
+
+def _significancia(p):
+    if p < 0.001:
+        return '***'
+    if p < 0.01:
+        return '**'
+    if p < 0.05:
+        return '*'
+    return ''
+
+
+@medida('regressao')
+def relatorio_regressao(df, indice=None, ic=None, reamostras=None, n_jobs=None):
+    print("\n4. ANÁLISE DE REGRESSÃO LINEAR MÚLTIPLA")
+    print("-" * 80)
+    print(f"Variável Dependente: {NOMES[ALVO]}")
+    print(f"Variáveis Independentes: {', '.join(NOMES[v] for v in REGRESSORES)}")
+    print()
+
+    resultado = regress(df)
+
+    print("4.1 COEFICIENTES DO MODELO:")
+    print("-" * 80)
+    print(f"  Intercepto: {resultado['intercepto']:.4f}")
+    for var, coef in resultado['coeficientes'].items():
+        print(f"  {NOMES[var]}: {coef:.4f}")
+    print()
+
+    print("4.2 MÉTRICAS DE AJUSTE:")
+    print("-" * 80)
+    print(f"  R² (Coeficiente de Determinação): {resultado['r2']:.4f}")
+    print(f"  R² Ajustado: {resultado['r2_ajustado']:.4f}")
+    print(f"  RMSE (Erro Quadrático Médio): {resultado['rmse']:.4f}")
+    print()
+
+    # Teste de significância dos coeficientes (t de Student, bicaudal)
+    if ic is None or ic.coeficientes is None:
+        ic = intervalos(df, reamostras, n_jobs)
+    print(f"4.3 TESTE DE SIGNIFICÂNCIA DOS COEFICIENTES (gl = {resultado['n'] - len(REGRESSORES) - 1}):")
+    print("-" * 80)
+    cabecalho = f"  {'':36s} {'Coeficiente':>12s} {'Erro padrão':>12s} {'t':>8s} {'p-valor':>9s}"
+    if ic is not None:
+        cabecalho += f"      {'IC bootstrap':>25s}"
+    print(cabecalho)
+    for nome in resultado['p_valores']:
+        coef = resultado['intercepto'] if nome == 'intercepto' else resultado['coeficientes'][nome]
+        p = resultado['p_valores'][nome]
+        linha = (f"  {NOMES.get(nome, 'Intercepto'):36s} {coef:12.4f} {resultado['erros_padrao'][nome]:12.4f} "
+                 f"{resultado['estatisticas_t'][nome]:8.3f} {p:9.4f} {_significancia(p):3s}")
+        if ic is not None:
+            inferior, superior = ic.coeficientes.loc[nome, ['inferior', 'superior']]
+            linha += f"   [{inferior:11.4f}; {superior:11.4f}]"
+        print(linha)
+    print("  Significância: *** p < 0.001, ** p < 0.01, * p < 0.05")
+    if ic is not None:
+        inferior, superior = ic.coeficientes.loc['r2', ['inferior', 'superior']]
+        print(f"  R²: {resultado['r2']:.4f}  [{inferior:.4f}; {superior:.4f}]")
+        _descrever_bootstrap(ic)
+    print()
+
+    print("4.4 INTERPRETAÇÃO:")
+    print("-" * 80)
+    print(f"  O modelo explica {resultado['r2']*100:.2f}% da variação na produtividade.")
+    for var, coef in resultado['coeficientes'].items():
+        conclusao = 'significativo' if resultado['p_valores'][var] < 0.05 else 'não significativo'
+        print(f"  Para cada unidade de aumento em {NOMES[var]}, a produtividade varia "
+              f"{coef:.4f} kg/ha ({conclusao} a 5%).")
+    print()
+
+    if not eh_painel(df):
+        return
+    indice = indice if indice is not None and indice.rotulos.name == 'municipio_id' \
+        else IndiceGrupos.de_coluna(df, 'municipio_id')
+    print("4.5 REGRESSÕES POR MUNICÍPIO:")
+    print("-" * 80)
+    modelos = ols_grupos(df, indice=indice)
+    tabela = modelos.tabela()
+    print(f"  Municípios ajustados: {int(tabela['r2'].notna().sum())} de {len(tabela)}")
+    _resumo_entre_grupos(tabela, ['intercepto', *REGRESSORES, 'r2', 'r2_ajustado', 'rmse'])
+    print("  Municípios com coeficiente significativo (p < 0.05):")
+    for nome, fracao in modelos.proporcao_significativa().items():
+        print(f"    {NOMES.get(nome, 'Intercepto')}: {fracao * 100:.1f}%")
+    print()
+
+
+@medida('anova')
+def relatorio_anova(df, indice=None, n_jobs=None, permutacoes=None):
+    print("\n5. ANÁLISE DE VARIÂNCIA (ANOVA)")
+    print("-" * 80)
+    print("Teste: Diferença de produtividade entre regiões")
+    print()
+
+    indice = _indice(df, indice=indice)
+    if indice is None or len(indice) < 2:
+        print("  Dataset sem duas ou mais regiões: ANOVA não aplicável.")
+        print()
+        return
+
+    f_stat, p_value = anova(df, ALVO, indice=indice, permutacoes=permutacoes, n_jobs=n_jobs)
+
+    print("5.1 RESULTADOS DO TESTE:")
+    print("-" * 80)
+    print(f"  Estatística F: {f_stat:.4f}")
+    print(f"  Valor-p: {p_value:.6f}")
+    print()
+
+    if p_value < 0.05:
+        print("  Conclusão: Há diferença estatisticamente significativa (p < 0.05)")
+        print("  entre as produtividades das diferentes regiões.")
+    else:
+        print("  Conclusão: Não há diferença estatisticamente significativa (p >= 0.05)")
+        print("  entre as produtividades das diferentes regiões.")
+    print()
+
+
+def relatorio(df, reamostras=None, n_jobs=None):
+    """Relatório completo (seções 1 a 5)."""
+    print("=" * 80)
+    print("ANÁLISE DE DADOS: EFICIÊNCIA PRODUTIVA DO CAFÉ - VARGINHA E REGIÃO")
+    print("=" * 80)
+    print()
+    # Um único índice de grupos e uma única rodada de bootstrap são
+    # compartilhados pelas seções
+    indice = _indice(df)
+    ic = intervalos(df, reamostras, n_jobs)
+    relatorio_visao_geral(df)
+    relatorio_descritivo(df, indice)
+    relatorio_correlacao(df, indice, ic, reamostras=0)
+    relatorio_regressao(df, indice, ic, reamostras=0)
+    relatorio_anova(df, indice, n_jobs)
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Análise de cluster em fluxo (fora da memória) para registros em grande
+volume, como dados por propriedade.
+
+O CSV é lido em blocos e nenhuma etapa guarda todas as linhas:
+
+1. primeira passagem: média e variância das variáveis de clustering por
+   atualização online (fórmula de Chan et al. para combinar blocos), mais
+   uma amostra de reservatório de tamanho fixo usada para escolher K
+   (``cafe.selecao_k``) e iniciar os centróides;
+2. segunda passagem: K-means em mini-lotes (``MiniBatchKMeans.partial_fit``)
+   sobre os blocos padronizados;
+3. terceira passagem: rótulos de cada linha, gravados em
+   ``resultados_cluster.csv`` bloco a bloco, e somas por nível para o
+   relatório.
+
+A memória depende do tamanho do bloco e da amostra, não do número de linhas.
+"""
+
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from cafe.cluster import COLUNAS_RESULTADO, K_RANGE, VARIAVEIS_CLUSTER, nomes_niveis
+from cafe.dados import ler_blocos
+from cafe.instrumentacao import medida
+
+TAMANHO_BLOCO = 100000
+
+# Linhas guardadas na amostra de reservatório (escolha de K e sementes)
+TAMANHO_AMOSTRA = 20000
+
+# Linhas por atualização do K-means em mini-lotes
+TAMANHO_LOTE = 4096
+
+
+class MomentosOnline:
+    """Média e variância por coluna, atualizadas bloco a bloco."""
+
+    def __init__(self, p):
+        self.n = 0
+        self.media = np.zeros(p)
+        self.m2 = np.zeros(p)       # soma dos quadrados dos desvios
+
+    def atualizar(self, X):
+        X = np.asarray(X, dtype=float)
+        n_b = len(X)
+        if n_b == 0:
+            return self
+        media_b = X.mean(axis=0)
+        m2_b = ((X - media_b) ** 2).sum(axis=0)
+        total = self.n + n_b
+        delta = media_b - self.media
+        self.media = self.media + delta * n_b / total
+        self.m2 = self.m2 + m2_b + delta ** 2 * self.n * n_b / total
+        self.n = total
+        return self
+
+    @property
+    def variancia(self):
+        """Variância populacional (ddof=0, como o ``StandardScaler``)."""
+        return self.m2 / self.n
+
+    @property
+    def desvio(self):
+        desvio = np.sqrt(self.variancia)
+        return np.where(desvio > 0, desvio, 1.0)
+
+    def padronizar(self, X):
+        return (np.asarray(X, dtype=float) - self.media) / self.desvio
+
+    def reverter(self, Z):
+        return np.asarray(Z) * self.desvio + self.media
+
+
+class Reservatorio:
+    """Amostra aleatória uniforme de tamanho fixo de um fluxo (algoritmo R)."""
+
+    def __init__(self, tamanho, p, semente=42):
+        self.tamanho = tamanho
+        self.dados = np.empty((tamanho, p))
+        self.vistos = 0
+        self.rng = np.random.default_rng(semente)
+
+    def atualizar(self, X):
+        X = np.asarray(X, dtype=float)
+        livres = max(0, min(self.tamanho - self.vistos, len(X)))
+        self.dados[self.vistos:self.vistos + livres] = X[:livres]
+        # Linha de posição global i entra com probabilidade tamanho / (i + 1),
+        # no lugar sorteado; com posições repetidas vale a última, como no laço
+        posicoes = np.arange(self.vistos + livres, self.vistos + len(X))
+        destinos = self.rng.integers(0, posicoes + 1)
+        entram = destinos < self.tamanho
+        self.dados[destinos[entram]] = X[livres:][entram]
+        self.vistos += len(X)
+        return self
+
+    @property
+    def amostra(self):
+        return self.dados[:min(self.vistos, self.tamanho)]
+
+
+@dataclass
+class ResultadoFluxo:
+    """Resultado do K-means em fluxo e resumo por nível de tecnificação."""
+    k: int
+    centroides: np.ndarray        # na escala original das variáveis
+    mapeamento: dict              # id do cluster -> nível de tecnificação
+    momentos: MomentosOnline
+    contagens: np.ndarray         # linhas por cluster
+    medias: np.ndarray            # (k, variáveis) médias por cluster
+    inercia: float                # soma das distâncias² padronizadas aos centróides
+    n_linhas: int
+    tempos: dict = field(default_factory=dict)
+    selecao: object = None        # SelecaoK da amostra, se K automático
+    silhueta: object = None       # silhueta da amostra de reservatório
+    variaveis: list = field(default_factory=lambda: list(VARIAVEIS_CLUSTER))
+
+    @property
+    def niveis(self):
+        return list(self.mapeamento.values())
+
+
+def _blocos(caminho, colunas, tamanho):
+    """Blocos do CSV sem linhas com valores ausentes nas variáveis de clustering."""
+    for bloco in ler_blocos(caminho, colunas, tamanho):
+        yield bloco.dropna(subset=VARIAVEIS_CLUSTER)
+
+
+@medida('cluster_fluxo')
+def cluster_fluxo(caminho=None, saida=None, k='auto', ks=None, criterio='consenso',
+                  tamanho_bloco=TAMANHO_BLOCO, tamanho_amostra=TAMANHO_AMOSTRA,
+                  tamanho_lote=TAMANHO_LOTE, n_epocas=1, semente=42, n_jobs=None):
+    """
+    K-means em três passagens pelo CSV, com memória limitada.
+
+    ``saida``: caminho de ``resultados_cluster.csv`` (gravado bloco a
+    bloco); ``None`` apenas calcula o resumo. ``k='auto'`` escolhe K na
+    amostra de reservatório com ``cafe.selecao_k.selecionar_k``.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+    from cafe.selecao_k import rotular, selecionar_k
+    from cafe.silhueta import silhueta
+
+    p = len(VARIAVEIS_CLUSTER)
+    tempos = {}
+
+    # 1. Momentos e amostra de reservatório
+    inicio = time.perf_counter()
+    momentos = MomentosOnline(p)
+    reservatorio = Reservatorio(tamanho_amostra, p, semente)
+    for bloco in _blocos(caminho, VARIAVEIS_CLUSTER, tamanho_bloco):
+        X = bloco[VARIAVEIS_CLUSTER].to_numpy(dtype=float)
+        momentos.atualizar(X)
+        reservatorio.atualizar(X)
+    if momentos.n < 2:
+        raise ValueError('dados insuficientes para a análise de cluster')
+    tempos['momentos'] = time.perf_counter() - inicio
+
+    # Escolha de K e centróides iniciais na amostra
+    inicio = time.perf_counter()
+    amostra = momentos.padronizar(reservatorio.amostra)
+    candidatos = (ks or K_RANGE) if k == 'auto' else sorted(set(ks or []) | {int(k)})
+    selecao = selecionar_k(amostra, candidatos, criterio=criterio, semente=semente,
+                           n_referencias=5 if k == 'auto' else 0, n_jobs=n_jobs)
+    if k != 'auto':
+        selecao.k = int(k)
+    tempos['selecao_k'] = time.perf_counter() - inicio
+
+    # 2. K-means em mini-lotes, iniciado pela solução da amostra
+    inicio = time.perf_counter()
+    modelo = MiniBatchKMeans(n_clusters=selecao.k, init=selecao.ajuste(selecao.k).centroides,
+                             n_init=1, batch_size=tamanho_lote, random_state=semente)
+    for _ in range(n_epocas):
+        for bloco in _blocos(caminho, VARIAVEIS_CLUSTER, tamanho_bloco):
+            Z = momentos.padronizar(bloco[VARIAVEIS_CLUSTER].to_numpy(dtype=float))
+            for i in range(0, len(Z), tamanho_lote):
+                modelo.partial_fit(Z[i:i + tamanho_lote])
+    centroides = modelo.cluster_centers_
+    tempos['kmeans'] = time.perf_counter() - inicio
+
+    # Níveis ordenados pelo índice tecnológico dos centróides
+    originais = momentos.reverter(centroides)
+    ordem = np.argsort(originais[:, VARIAVEIS_CLUSTER.index('indice_tecnologico')], kind='stable')
+    mapeamento = dict(zip(ordem.tolist(), nomes_niveis(selecao.k)))
+    nomes = np.array([mapeamento[c] for c in range(selecao.k)], dtype=object)
+
+    # 3. Rótulos gravados bloco a bloco e somas por cluster
+    inicio = time.perf_counter()
+    contagens = np.zeros(selecao.k, dtype=np.int64)
+    somas = np.zeros((selecao.k, p))
+    inercia = 0.0
+    colunas = ['municipio_id', 'municipio', 'ano', *VARIAVEIS_CLUSTER]
+    primeiro = True
+    for bloco in _blocos(caminho, colunas, tamanho_bloco):
+        X = bloco[VARIAVEIS_CLUSTER].to_numpy(dtype=float)
+        rotulos, d2 = rotular(momentos.padronizar(X), centroides)
+        contagens += np.bincount(rotulos, minlength=selecao.k)
+        somas += np.stack([np.bincount(rotulos, weights=X[:, j], minlength=selecao.k)
+                           for j in range(p)], axis=1)
+        inercia += float(d2.sum())
+        if saida is not None:
+            bloco = bloco.assign(cluster=rotulos, nivel_tecnificacao=nomes[rotulos])
+            chaves = [c for c in ('municipio_id', 'municipio') if c in bloco.columns]
+            bloco[[*chaves, *COLUNAS_RESULTADO]].to_csv(
+                saida, mode='w' if primeiro else 'a', header=primeiro, index=False)
+        primeiro = False
+    tempos['rotulos'] = time.perf_counter() - inicio
+
+    rotulos_amostra, _ = rotular(amostra, centroides)
+    sil = silhueta(amostra, rotulos_amostra) if len(np.unique(rotulos_amostra)) > 1 else None
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        medias = somas / contagens[:, None]
+    return ResultadoFluxo(k=selecao.k, centroides=originais, mapeamento=mapeamento,
+                          momentos=momentos, contagens=contagens, medias=medias,
+                          inercia=inercia, n_linhas=int(contagens.sum()), tempos=tempos,
+                          selecao=selecao, silhueta=sil)
+
+
+# ====================
+# RELATÓRIO
+# ====================
+
+def relatorio(caminho=None, saida=None, k='auto', criterio='consenso',
+              tamanho_bloco=TAMANHO_BLOCO, n_jobs=None):
+    """Imprime o relatório do K-means em fluxo e retorna o resultado."""
+    print("=" * 80)
+    print("ANÁLISE DE CLUSTER (K-MEANS EM FLUXO)")
+    print("Agrupamento por Níveis de Tecnificação, com leitura em blocos")
+    print("=" * 80)
+    print()
+
+    resultado = cluster_fluxo(caminho, saida, k=k, criterio=criterio,
+                              tamanho_bloco=tamanho_bloco, n_jobs=n_jobs)
+    selecao = resultado.selecao
+
+    print("1. PREPARAÇÃO DOS DADOS")
+    print("-" * 80)
+    print(f"Observações: {resultado.n_linhas} (blocos de {tamanho_bloco} linhas)")
+    print("\nPadronização (média ± desvio, calculados em fluxo):")
+    for var, media, desvio in zip(resultado.variaveis, resultado.momentos.media,
+                                  resultado.momentos.desvio):
+        print(f"  {var}: {media:.4f} ± {desvio:.4f}")
+
+    print("\n\n2. NÚMERO DE CLUSTERS")
+    print("-" * 80)
+    print(f"Amostra de reservatório: {min(resultado.n_linhas, TAMANHO_AMOSTRA)} linhas")
+    if len(selecao.ks) > 1:
+        for a in selecao.ajustes:
+            print(f"  K={a.k}: Inércia = {a.inercia:.2f} | Silhueta = {a.silhueta:.4f}")
+        print(f"Número de clusters selecionado: K = {resultado.k} (critério: {selecao.criterio})")
+    else:
+        print(f"Número de clusters informado: K = {resultado.k}")
+
+    print("\n\n3. CARACTERIZAÇÃO DOS CLUSTERS")
+    print("=" * 80)
+    for c, nivel in resultado.mapeamento.items():
+        print(f"\n{nivel.upper()}")
+        print("-" * 80)
+        print(f"Observações: {resultado.contagens[c]}")
+        for var, media in zip(resultado.variaveis, resultado.medias[c]):
+            print(f"  {var}: {media:.2f}")
+
+    print("\n\n4. QUALIDADE E DESEMPENHO")
+    print("-" * 80)
+    print(f"Inércia (escala padronizada): {resultado.inercia:.2f}")
+    if resultado.silhueta is not None:
+        print(f"Coeficiente de Silhueta (amostra): {resultado.silhueta:.4f}")
+    for etapa, tempo in resultado.tempos.items():
+        print(f"  {etapa}: {tempo:.2f} s")
+
+    print("\n" + "=" * 80)
+    print("ANÁLISE DE CLUSTER EM FLUXO CONCLUÍDA")
+    print("=" * 80)
+    return resultado
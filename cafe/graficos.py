@@ -0,0 +1,997 @@
+# -*- coding: utf-8 -*-
+"""
+Visualizações de Dados - Produção de Café em Varginha/MG
+Gráficos para Artigo Científico
+
+Os dez gráficos do artigo, organizados em três conjuntos:
+
+* ``visualizacoes``: gráficos 1-4 de evolução temporal e correlação;
+* ``estatistica``: gráficos 1-4 da análise estatística;
+* ``cluster``: gráficos 5-6 da análise de cluster.
+
+O conjunto ``janelas`` (gráfico 7, correlação móvel) fica fora do padrão
+e é gerado sob pedido (``--conjunto janelas`` ou ``cafe janelas``), assim
+como o ``espacial`` (gráficos 8-9, diagrama de Moran e mapa LISA), que exige
+a geometria dos municípios (``--vizinhanca`` ou ``cafe espacial``), e o
+``consenso`` (gráfico 10, mapa de consenso das reamostras do cluster, ver
+``cafe consenso``).
+
+matplotlib e seaborn são importados apenas pelas funções de desenho, que
+``render`` executa em paralelo (ver ``cafe.renderizacao``). No modo painel
+os gráficos de série temporal usam a série estadual agregada por ano e os
+gráficos por região passam a mostrar a distribuição entre municípios.
+"""
+
+import numpy as np
+
+from cafe.cluster import separar_niveis
+from cafe.consenso import LIMIAR_ESTAVEL
+from cafe.correlacao import correlacao as calcular_correlacao
+from cafe.correlacao import ordem_hierarquica
+from cafe.dados import eh_painel
+from cafe.espacial import NAO_SIGNIFICATIVO, QUADRANTES, SEM_VIZINHOS
+from cafe.estatistica import (ALVO, LIMITE_GRUPOS, NOMES, REGRESSORES,
+                              coluna_grupo, variaveis_numericas)
+from cafe.grupos import IndiceGrupos, agregar_por_ano
+from cafe.instrumentacao import medida
+from cafe.janelas import JANELAS
+from cafe.janelas import correlacao_movel as calcular_correlacao_movel
+
+CORES_NIVEIS = {'Baixa Tecnificação': '#D32F2F',
+                'Média-Baixa Tecnificação': '#F57C00',
+                'Média Tecnificação': '#FFA000',
+                'Média-Alta Tecnificação': '#AFB42B',
+                'Alta Tecnificação': '#388E3C'}
+
+
+def cores_niveis(niveis):
+    """Cor de cada nível; níveis sem cor fixa recebem tons de RdYlGn."""
+    from matplotlib import colormaps
+
+    escala = colormaps['RdYlGn']
+    return {nivel: CORES_NIVEIS.get(nivel, escala(i / max(len(niveis) - 1, 1)))
+            for i, nivel in enumerate(niveis)}
+
+# Categorias do LISA: aglomerados em tons fortes, atípicos em tons claros
+CORES_LISA = {QUADRANTES[1]: '#D32F2F', QUADRANTES[3]: '#1565C0',
+              QUADRANTES[2]: '#90CAF9', QUADRANTES[4]: '#EF9A9A',
+              NAO_SIGNIFICATIVO: '#E0E0E0', SEM_VIZINHOS: '#616161'}
+
+# Configuração de fontes e estilo de cada conjunto
+ESTILOS = {
+    'visualizacoes': {
+        'font.family': 'DejaVu Sans',
+        'axes.unicode_minus': False,
+        'figure.figsize': (12, 8),
+        'font.size': 11
+    },
+    'estatistica': {
+        'font.family': 'DejaVu Sans',
+        'font.size': 10,
+        'axes.labelsize': 11,
+        'axes.titlesize': 12
+    },
+    'cluster': {
+        'font.family': 'DejaVu Sans',
+        'axes.unicode_minus': False
+    },
+    'janelas': {
+        'font.family': 'DejaVu Sans',
+        'axes.unicode_minus': False,
+        'font.size': 11
+    },
+    'espacial': {
+        'font.family': 'DejaVu Sans',
+        'axes.unicode_minus': False,
+        'font.size': 11
+    },
+    'consenso': {
+        'font.family': 'DejaVu Sans',
+        'axes.unicode_minus': False,
+        'font.size': 11
+    }
+}
+
+
+# ====================
+# DISPERSÃO EM GRANDE ESCALA
+# ====================
+
+# Acima deste número de pontos as dispersões viram uma grade agregada
+LIMITE_DISPERSAO = 20000
+
+# Células por eixo da grade agregada
+CELULAS_GRADE = 200
+
+# Máximo de rótulos de ano/ID escritos sobre os pontos de um gráfico
+ROTULOS_MAXIMOS = 40
+
+
+def _bordas(valores, celulas):
+    """Bordas de ``celulas`` intervalos iguais cobrindo os valores."""
+    minimo, maximo = np.nanmin(valores), np.nanmax(valores)
+    if minimo == maximo:
+        minimo, maximo = minimo - 0.5, maximo + 0.5
+    return np.linspace(minimo, maximo, celulas + 1)
+
+
+def _histograma(x, y, bordas_x, bordas_y, pesos=None):
+    """Histograma 2D em bordas igualmente espaçadas por ``bincount`` (sem busca binária)."""
+    nx, ny = len(bordas_x) - 1, len(bordas_y) - 1
+    i = np.clip(((x - bordas_x[0]) * (nx / (bordas_x[-1] - bordas_x[0]))).astype(np.intp), 0, nx - 1)
+    j = np.clip(((y - bordas_y[0]) * (ny / (bordas_y[-1] - bordas_y[0]))).astype(np.intp), 0, ny - 1)
+    return np.bincount(i * ny + j, weights=pesos, minlength=nx * ny).reshape(nx, ny)
+
+
+def _imagem(ax, valores, bordas_x, bordas_y, **kwargs):
+    """Desenha a grade (células x x células y) como uma única imagem."""
+    return ax.imshow(np.swapaxes(valores, 0, 1), origin='lower', aspect='auto',
+                     interpolation='nearest',
+                     extent=(bordas_x[0], bordas_x[-1], bordas_y[0], bordas_y[-1]), **kwargs)
+
+
+def dispersao(ax, x, y, c=None, cmap='viridis', limite=LIMITE_DISPERSAO, celulas=CELULAS_GRADE,
+              **kwargs):
+    """
+    Dispersão de ``y`` por ``x``. Até ``limite`` pontos, um marcador por
+    ponto (``ax.scatter`` com ``kwargs``). Acima disso, um histograma 2D
+    desenhado como imagem: a cor de cada célula é a média de ``c`` (ou a
+    contagem, em escala log, sem ``c``) e células vazias ficam
+    transparentes. O custo de desenho e o tamanho do arquivo não dependem
+    do número de pontos.
+
+    Retorna o objeto mapeável (para a barra de cores).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= limite:
+        return ax.scatter(x, y, c=c, cmap=cmap, **kwargs)
+
+    from matplotlib.colors import LogNorm
+
+    bordas_x, bordas_y = _bordas(x, celulas), _bordas(y, celulas)
+    contagens = _histograma(x, y, bordas_x, bordas_y)
+    if c is None:
+        return _imagem(ax, np.where(contagens > 0, contagens, np.nan), bordas_x, bordas_y,
+                       cmap=cmap, norm=LogNorm())
+    c = np.asarray(c, dtype=float)
+    somas = _histograma(x, y, bordas_x, bordas_y, c)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        medias = somas / contagens
+    return _imagem(ax, medias, bordas_x, bordas_y, cmap=cmap, vmin=np.nanmin(c), vmax=np.nanmax(c))
+
+
+def dispersao_categorias(ax, grupos, cores, limite=LIMITE_DISPERSAO, celulas=CELULAS_GRADE,
+                         **kwargs):
+    """
+    Dispersão com uma cor por categoria. ``grupos``: rótulo -> (x, y).
+
+    Até ``limite`` pontos no total, ``ax.scatter`` por categoria (com
+    ``kwargs``). Acima disso, uma imagem em que cada célula tem a cor da
+    categoria mais frequente nela e opacidade crescente com a densidade
+    (escala log); a legenda usa marcadores sem pontos.
+    """
+    from matplotlib.colors import to_rgba_array
+
+    total = sum(len(x) for x, _ in grupos.values())
+    if total <= limite:
+        for rotulo, (x, y) in grupos.items():
+            ax.scatter(x, y, color=cores[rotulo], label=rotulo, **kwargs)
+        return
+
+    todos_x = np.concatenate([np.asarray(x, dtype=float) for x, _ in grupos.values()])
+    todos_y = np.concatenate([np.asarray(y, dtype=float) for _, y in grupos.values()])
+    bordas_x, bordas_y = _bordas(todos_x, celulas), _bordas(todos_y, celulas)
+    contagens = np.stack([_histograma(np.asarray(x, dtype=float), np.asarray(y, dtype=float),
+                                      bordas_x, bordas_y) for x, y in grupos.values()])
+    densidade = contagens.sum(axis=0)
+    rgba = to_rgba_array([cores[rotulo] for rotulo in grupos])[contagens.argmax(axis=0)]
+    rgba[..., 3] = np.where(densidade > 0,
+                            0.25 + 0.75 * np.log1p(densidade) / np.log1p(densidade.max()), 0.0)
+    _imagem(ax, rgba, bordas_x, bordas_y)
+    for rotulo in grupos:
+        ax.scatter([], [], color=cores[rotulo], marker='s', label=rotulo)
+
+
+def rotular_pontos(ax, x, y, textos, maximo=ROTULOS_MAXIMOS, **kwargs):
+    """
+    Escreve ``textos[i]`` sobre o ponto ``(x[i], y[i])``. Com mais de
+    ``maximo`` pontos, apenas ``maximo`` deles, igualmente espaçados na
+    ordem de ``x``.
+    """
+    x, y, textos = np.asarray(x), np.asarray(y), np.asarray(textos)
+    indices = np.arange(len(x))
+    if len(x) > maximo:
+        indices = np.argsort(x, kind='stable')[np.linspace(0, len(x) - 1, maximo).round().astype(int)]
+    for i in indices:
+        ax.annotate(str(textos[i]), (x[i], y[i]), **kwargs)
+
+
+# ====================
+# GRÁFICOS 1-4 (VISUALIZAÇÕES)
+# ====================
+
+def _serie_anual(df):
+    """Série estadual por ano no modo painel; o próprio df caso contrário."""
+    return agregar_por_ano(df) if eh_painel(df) else df
+
+
+def _subtitulo(df, painel='MG (série estadual)'):
+    """
+    Local e período dos dados para os títulos: ``painel`` no modo painel,
+    o município de uma série municipal ou Varginha/MG na série única.
+    """
+    if eh_painel(df):
+        local = painel
+    elif 'municipio' in df.columns and len(df):
+        local = f"{df['municipio'].iloc[0]}/MG"
+    else:
+        local = 'Varginha/MG'
+    return f"{local} ({df['ano'].min()}-{df['ano'].max()})"
+
+
+def evolucao_temporal(df):
+    """Gráfico 1: Evolução Temporal da Produtividade e Índice Tecnológico."""
+    import matplotlib.pyplot as plt
+
+    subtitulo = _subtitulo(df)
+    df = _serie_anual(df)
+    fig, ax1 = plt.subplots(figsize=(14, 8))
+
+    # Eixo Y1: Produtividade
+    color1 = '#2E7D32'
+    ax1.set_xlabel('Ano', fontsize=13, fontweight='bold')
+    ax1.set_ylabel('Produtividade (kg/ha)', color=color1, fontsize=13, fontweight='bold')
+    line1 = ax1.plot(df['ano'], df['produtividade_kg_ha'], color=color1,
+                     linewidth=2.5, marker='o', markersize=8, label='Produtividade')
+    ax1.tick_params(axis='y', labelcolor=color1, labelsize=11)
+    ax1.grid(True, alpha=0.3, linestyle='--')
+    ax1.set_ylim(1300, 1700)
+
+    # Eixo Y2: Índice Tecnológico
+    ax2 = ax1.twinx()
+    color2 = '#1565C0'
+    ax2.set_ylabel('Índice Tecnológico (0-10)', color=color2, fontsize=13, fontweight='bold')
+    line2 = ax2.plot(df['ano'], df['indice_tecnologico'], color=color2,
+                     linewidth=2.5, marker='s', markersize=8, label='Índice Tecnológico')
+    ax2.tick_params(axis='y', labelcolor=color2, labelsize=11)
+    ax2.set_ylim(0, 8)
+
+    # Título e legenda
+    plt.title(f'Evolução da Produtividade e Índice Tecnológico\n{subtitulo}',
+              fontsize=15, fontweight='bold', pad=20)
+
+    # Combinar legendas
+    lines = line1 + line2
+    labels = [l.get_label() for l in lines]
+    ax1.legend(lines, labels, loc='upper left', fontsize=12, framealpha=0.9)
+    return fig
+
+
+def correlacao_regressao(df):
+    """Gráfico 2: Dispersão e Regressão Linear (Produtividade x Índice Tecnológico)."""
+    import matplotlib.pyplot as plt
+    from scipy import stats
+    from cafe.bootstrap import bootstrap
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+
+    # Scatter plot (grade agregada com muitos pontos)
+    scatter = dispersao(ax, df['indice_tecnologico'], df['produtividade_kg_ha'],
+                        c=df['ano'], cmap='viridis', s=200, alpha=0.7, edgecolors='black', linewidth=1.5)
+
+    # Regressão linear
+    slope, intercept, r_value, p_value, std_err = stats.linregress(df['indice_tecnologico'],
+                                                                   df['produtividade_kg_ha'])
+    line_x = np.array([df['indice_tecnologico'].min(), df['indice_tecnologico'].max()])
+    line_y = slope * line_x + intercept
+    ax.plot(line_x, line_y, 'r--', linewidth=2.5, label=f'Regressão Linear (R² = {r_value**2:.4f})')
+
+    # Anotações
+    ax.set_xlabel('Índice Tecnológico', fontsize=13, fontweight='bold')
+    ax.set_ylabel('Produtividade (kg/ha)', fontsize=13, fontweight='bold')
+    ax.set_title('Correlação entre Índice Tecnológico e Produtividade\n'
+                 + _subtitulo(df, 'MG (municípios)'),
+                 fontsize=15, fontweight='bold', pad=20)
+    ax.grid(True, alpha=0.3, linestyle='--')
+    ax.legend(fontsize=12, loc='lower right', framealpha=0.9)
+
+    # Colorbar
+    cbar = plt.colorbar(scatter, ax=ax, label='Ano')
+    cbar.set_label('Ano', fontsize=12, fontweight='bold')
+
+    # Adicionar equação da reta e correlação
+    # Intervalos bootstrap da correlação e da inclinação; com milhões de
+    # linhas independentes, os intervalos assintóticos (z de Fisher e t)
+    # substituem o bootstrap na série única acima de LIMITE_DISPERSAO linhas
+    if eh_painel(df) or len(df) <= LIMITE_DISPERSAO:
+        ic = bootstrap(df, variaveis=['indice_tecnologico', 'produtividade_kg_ha'],
+                       regressores=['indice_tecnologico'], n_jobs=1)
+        _, r_inf, r_sup = ic.intervalo_correlacao('indice_tecnologico', 'produtividade_kg_ha')
+        b_inf, b_sup = ic.coeficientes.loc['indice_tecnologico', ['inferior', 'superior']]
+    else:
+        n = len(df)
+        z = stats.norm.ppf(0.975) / np.sqrt(n - 3)
+        r_inf, r_sup = np.tanh(np.arctanh(r_value) - z), np.tanh(np.arctanh(r_value) + z)
+        t = stats.t.ppf(0.975, n - 2)
+        b_inf, b_sup = slope - t * std_err, slope + t * std_err
+    p_texto = 'p-valor < 0.001' if p_value < 0.001 else f'p-valor = {p_value:.3f}'
+    textstr = (f'y = {slope:.2f}x + {intercept:.2f} (IC95% inclinação: {b_inf:.2f} a {b_sup:.2f})\n'
+               f'Correlação de Pearson: r = {r_value:.4f} (IC95%: {r_inf:.4f} a {r_sup:.4f})\n'
+               f'{p_texto}')
+    props = dict(boxstyle='round', facecolor='wheat', alpha=0.8)
+    ax.text(0.05, 0.95, textstr, transform=ax.transAxes, fontsize=11,
+            verticalalignment='top', bbox=props)
+    return fig
+
+
+def analise_multivariada(df):
+    """Gráfico 3: Comparação de Múltiplas Variáveis (Subplots)."""
+    import matplotlib.pyplot as plt
+
+    subtitulo = _subtitulo(df)
+    df = _serie_anual(df)
+    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    fig.suptitle(f'Análise Multivariada da Cafeicultura - {subtitulo}',
+                 fontsize=16, fontweight='bold', y=0.995)
+
+    # Subplot 1: Produção Total e Área Colhida
+    ax1 = axes[0, 0]
+    ax1_twin = ax1.twinx()
+    ax1.bar(df['ano'], df['producao_total_ton'], alpha=0.7, color='#8B4513', label='Produção Total')
+    ax1_twin.plot(df['ano'], df['area_colhida_ha'], color='#D84315', linewidth=2.5,
+                  marker='o', markersize=6, label='Área Colhida')
+    ax1.set_xlabel('Ano', fontsize=11, fontweight='bold')
+    ax1.set_ylabel('Produção Total (ton)', fontsize=11, fontweight='bold', color='#8B4513')
+    ax1_twin.set_ylabel('Área Colhida (ha)', fontsize=11, fontweight='bold', color='#D84315')
+    ax1.tick_params(axis='y', labelcolor='#8B4513')
+    ax1_twin.tick_params(axis='y', labelcolor='#D84315')
+    ax1.set_title('(A) Produção Total e Área Colhida', fontsize=12, fontweight='bold', pad=10)
+    ax1.grid(True, alpha=0.3, linestyle='--')
+    ax1.legend(loc='upper left', fontsize=9)
+    ax1_twin.legend(loc='upper right', fontsize=9)
+
+    # Subplot 2: Investimento em Tecnologia
+    ax2 = axes[0, 1]
+    ax2.fill_between(df['ano'], df['investimento_tecnologia_milhoes'], alpha=0.4, color='#1976D2')
+    ax2.plot(df['ano'], df['investimento_tecnologia_milhoes'], color='#0D47A1',
+             linewidth=2.5, marker='D', markersize=7)
+    ax2.set_xlabel('Ano', fontsize=11, fontweight='bold')
+    ax2.set_ylabel('Investimento (R$ milhões)', fontsize=11, fontweight='bold')
+    ax2.set_title('(B) Investimento em Tecnologia', fontsize=12, fontweight='bold', pad=10)
+    ax2.grid(True, alpha=0.3, linestyle='--')
+
+    # Subplot 3: Produção de Cafés Especiais
+    ax3 = axes[1, 0]
+    proporcao_especiais = (df['producao_especiais_ton'] / df['producao_total_ton']) * 100
+    ax3_twin = ax3.twinx()
+    ax3.bar(df['ano'], df['producao_especiais_ton'], alpha=0.7, color='#6A1B9A', label='Produção Especiais')
+    ax3_twin.plot(df['ano'], proporcao_especiais, color='#E91E63', linewidth=2.5,
+                  marker='^', markersize=7, label='% do Total')
+    ax3.set_xlabel('Ano', fontsize=11, fontweight='bold')
+    ax3.set_ylabel('Produção Cafés Especiais (ton)', fontsize=11, fontweight='bold', color='#6A1B9A')
+    ax3_twin.set_ylabel('Proporção (%)', fontsize=11, fontweight='bold', color='#E91E63')
+    ax3.tick_params(axis='y', labelcolor='#6A1B9A')
+    ax3_twin.tick_params(axis='y', labelcolor='#E91E63')
+    ax3.set_title('(C) Produção de Cafés Especiais', fontsize=12, fontweight='bold', pad=10)
+    ax3.grid(True, alpha=0.3, linestyle='--')
+    ax3.legend(loc='upper left', fontsize=9)
+    ax3_twin.legend(loc='center left', fontsize=9)
+
+    # Subplot 4: Fatores Climáticos
+    ax4 = axes[1, 1]
+    ax4_twin = ax4.twinx()
+    ax4.bar(df['ano'], df['precipitacao_mm'], alpha=0.6, color='#0288D1', label='Precipitação')
+    ax4_twin.plot(df['ano'], df['temperatura_media_c'], color='#D32F2F', linewidth=2.5,
+                  marker='o', markersize=7, label='Temperatura Média')
+    ax4.set_xlabel('Ano', fontsize=11, fontweight='bold')
+    ax4.set_ylabel('Precipitação (mm)', fontsize=11, fontweight='bold', color='#0288D1')
+    ax4_twin.set_ylabel('Temperatura (°C)', fontsize=11, fontweight='bold', color='#D32F2F')
+    ax4.tick_params(axis='y', labelcolor='#0288D1')
+    ax4_twin.tick_params(axis='y', labelcolor='#D32F2F')
+    ax4.set_title('(D) Fatores Climáticos', fontsize=12, fontweight='bold', pad=10)
+    ax4.grid(True, alpha=0.3, linestyle='--')
+    ax4.legend(loc='upper left', fontsize=9)
+    ax4_twin.legend(loc='upper right', fontsize=9)
+    return fig
+
+
+VARS_CORRELACAO = [
+    'produtividade_kg_ha',
+    'indice_tecnologico',
+    'investimento_tecnologia_milhoes',
+    'producao_especiais_ton',
+    'temperatura_media_c',
+    'precipitacao_mm'
+]
+
+LABELS_CORRELACAO = [
+    'Produtividade\n(kg/ha)',
+    'Índice\nTecnológico',
+    'Investimento\nTecnologia\n(R$ mi)',
+    'Produção\nEspeciais\n(ton)',
+    'Temperatura\nMédia (°C)',
+    'Precipitação\n(mm)'
+]
+
+
+def matriz_correlacao(df):
+    """Gráfico 4: Matriz de Correlação (Heatmap)."""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 10))
+
+    matriz_corr = calcular_correlacao(df, VARS_CORRELACAO, dtype=np.float64)
+
+    # Criar heatmap
+    im = ax.imshow(matriz_corr, cmap='RdYlGn', aspect='auto', vmin=-1, vmax=1)
+
+    # Configurar eixos
+    ax.set_xticks(np.arange(len(LABELS_CORRELACAO)))
+    ax.set_yticks(np.arange(len(LABELS_CORRELACAO)))
+    ax.set_xticklabels(LABELS_CORRELACAO, fontsize=10)
+    ax.set_yticklabels(LABELS_CORRELACAO, fontsize=10)
+
+    # Rotacionar labels
+    plt.setp(ax.get_xticklabels(), rotation=45, ha="right", rotation_mode="anchor")
+
+    # Adicionar valores nas células
+    for i in range(len(LABELS_CORRELACAO)):
+        for j in range(len(LABELS_CORRELACAO)):
+            ax.text(j, i, f'{matriz_corr.iloc[i, j]:.3f}',
+                    ha="center", va="center", color="black", fontsize=10, fontweight='bold')
+
+    ax.set_title('Matriz de Correlação de Pearson\nVariáveis da Cafeicultura - '
+                 + _subtitulo(df, 'MG (municípios)'),
+                 fontsize=14, fontweight='bold', pad=20)
+
+    # Colorbar
+    cbar = plt.colorbar(im, ax=ax, fraction=0.046, pad=0.04)
+    cbar.set_label('Coeficiente de Correlação', fontsize=11, fontweight='bold')
+    return fig
+
+
+# ====================
+# GRÁFICOS 1-4 (ANÁLISE ESTATÍSTICA)
+# ====================
+
+def _grupos(df):
+    """Pares (rótulo, subconjunto) por região; série única se não houver região."""
+    por = coluna_grupo(df)
+    if por is None:
+        return [('Varginha/MG', df)]
+    return list(df.groupby(por, sort=False, observed=True))
+
+
+def evolucao_produtividade(df):
+    """Gráfico 1: Evolução da Produtividade ao Longo do Tempo."""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 6))
+    if eh_painel(df):
+        # Faixa P10-P90 e mediana entre municípios, uma passagem por ano
+        indice_ano = IndiceGrupos.de_coluna(df, 'ano')
+        faixa = indice_ano.quantis(df[ALVO].to_numpy(), [0.1, 0.5, 0.9])
+        anos = indice_ano.rotulos
+        ax.fill_between(anos, faixa[:, 0], faixa[:, 2], alpha=0.2, color='gray',
+                        label='Municípios (P10-P90)')
+        ax.plot(anos, faixa[:, 1], color='black', linestyle='--', linewidth=2,
+                label='Mediana dos municípios')
+        if 'regiao' in df.columns and df['regiao'].nunique() <= LIMITE_GRUPOS:
+            medias = df.groupby(['ano', 'regiao'], observed=True)[ALVO].mean().unstack()
+            for regiao in medias.columns:
+                ax.plot(medias.index, medias[regiao],
+                        marker='o', linewidth=2, markersize=6, label=regiao)
+    else:
+        for regiao, df_regiao in _grupos(df):
+            ax.plot(df_regiao['ano'], df_regiao[ALVO],
+                    marker='o', linewidth=2, markersize=6, label=regiao)
+
+    ax.set_xlabel('Ano', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Produtividade (kg/ha)', fontsize=12, fontweight='bold')
+    ax.set_title(f"Evolução da Produtividade do Café no Polo de Varginha e Região "
+                 f"({df['ano'].min()}-{df['ano'].max()})",
+                 fontsize=14, fontweight='bold', pad=20)
+    ax.legend(loc='best', fontsize=10)
+    ax.grid(True, alpha=0.3)
+    return fig
+
+
+def correlacao_tecnologia(df):
+    """Gráfico 2: Correlação entre Tecnologias e Produtividade."""
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, len(REGRESSORES), figsize=(6 * len(REGRESSORES), 5))
+
+    for ax, var in zip(axes, REGRESSORES):
+        scatter = dispersao(ax, df[var], df[ALVO], c=df['ano'], cmap='viridis', alpha=0.6, s=100)
+        ax.set_xlabel(NOMES[var], fontsize=11, fontweight='bold')
+        ax.set_ylabel('Produtividade (kg/ha)', fontsize=11, fontweight='bold')
+        ax.set_title(f'{NOMES[var]} vs Produtividade', fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+
+    # Adicionar barra de cores
+    cbar = plt.colorbar(scatter, ax=axes, orientation='horizontal', pad=0.1, aspect=50)
+    cbar.set_label('Ano', fontsize=11, fontweight='bold')
+
+    plt.suptitle('Correlação entre Avanço Tecnológico e Produtividade do Café',
+                 fontsize=14, fontweight='bold', y=1.02)
+    return fig
+
+
+# Acima deste número de variáveis os mapas de calor não anotam as células
+# e ordenam as variáveis pelo agrupamento hierárquico
+LIMITE_ANOTACAO = 30
+
+
+def matriz_correlacao_completa(df):
+    """Gráfico 3: Matriz de Correlação de todas as variáveis numéricas."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    variaveis = variaveis_numericas(df)
+    correlacao = calcular_correlacao(df, variaveis, dtype=np.float64)
+
+    fig, ax = plt.subplots(figsize=(12, 10))
+    if len(variaveis) > LIMITE_ANOTACAO:
+        _mapa_largo(fig, ax, correlacao)
+    else:
+        mask = np.triu(np.ones_like(correlacao, dtype=bool))
+        sns.heatmap(correlacao, mask=mask, annot=True, fmt='.3f', cmap='coolwarm',
+                    center=0, square=True, linewidths=1, cbar_kws={"shrink": 0.8},
+                    vmin=-1, vmax=1, ax=ax)
+    ax.set_title('Matriz de Correlação - Variáveis de Produção e Tecnologia',
+                 fontsize=14, fontweight='bold', pad=20)
+    return fig
+
+
+def _mapa_largo(fig, ax, correlacao):
+    """
+    Mapa de calor de muitas variáveis: ordem do agrupamento hierárquico,
+    triângulo inferior numa única imagem e sem valores nas células.
+    """
+    ordem = ordem_hierarquica(correlacao)
+    valores = correlacao.to_numpy()[np.ix_(ordem, ordem)]
+    valores = np.ma.masked_where(np.triu(np.ones(valores.shape, dtype=bool)), valores)
+    im = ax.imshow(valores, cmap='coolwarm', vmin=-1, vmax=1, interpolation='nearest')
+    nomes = correlacao.columns[ordem]
+    if len(nomes) <= ROTULOS_MAXIMOS * 3:
+        tamanho = max(3, 10 - len(nomes) // 15)
+        ax.set_xticks(np.arange(len(nomes)))
+        ax.set_yticks(np.arange(len(nomes)))
+        ax.set_xticklabels(nomes, fontsize=tamanho, rotation=90)
+        ax.set_yticklabels(nomes, fontsize=tamanho)
+    else:
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.set_xlabel(f'{len(nomes)} variáveis (ordem do agrupamento hierárquico)', fontsize=11)
+    fig.colorbar(im, ax=ax, shrink=0.8)
+
+
+def boxplot_regioes(df):
+    """Gráfico 4: Boxplot de Produtividade por Região."""
+    import matplotlib.pyplot as plt
+
+    grupos = _grupos(df)
+    eixo, titulo = 'Região', 'Distribuição da Produtividade por Região'
+    if len(grupos) > LIMITE_GRUPOS:
+        # Municípios demais para uma caixa cada: distribuição entre eles por ano
+        grupos = list(df.groupby('ano', sort=True))
+        eixo, titulo = 'Ano', 'Distribuição da Produtividade entre Municípios por Ano'
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    ax.boxplot([g[ALVO].to_numpy() for _, g in grupos], patch_artist=True)
+    ax.set_xticks(range(1, len(grupos) + 1))
+    ax.set_xticklabels([str(nome) for nome, _ in grupos],
+                       rotation=45 if eixo == 'Ano' else 0)
+    ax.set_xlabel(eixo, fontsize=12, fontweight='bold')
+    ax.set_ylabel('Produtividade (kg/ha)', fontsize=12, fontweight='bold')
+    ax.set_title(titulo, fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3, axis='y')
+    return fig
+
+
+# ====================
+# GRÁFICOS 5-6 (CLUSTER)
+# ====================
+
+def clusters_kmeans(resultado):
+    """Gráfico 5: Clusters em 2D (Índice Tecnológico x Produtividade)."""
+    import matplotlib.pyplot as plt
+
+    painel = eh_painel(resultado.df)
+    cores = cores_niveis(resultado.niveis)
+    fig, ax = plt.subplots(figsize=(12, 8))
+
+    niveis = separar_niveis(resultado)
+    dispersao_categorias(ax, {nivel: (subset['indice_tecnologico'], subset['produtividade_kg_ha'])
+                              for nivel, subset in niveis.items()},
+                         cores, s=40 if painel else 250, alpha=0.7,
+                         edgecolors='black', linewidth=0.5 if painel else 2)
+
+    # Adicionar anos como rótulos (no painel os anos se repetem por município);
+    # com muitos pontos, apenas alguns por nível
+    if not painel:
+        for subset in niveis.values():
+            rotular_pontos(ax, subset['indice_tecnologico'], subset['produtividade_kg_ha'],
+                           subset['ano'].astype(int), maximo=max(1, ROTULOS_MAXIMOS // len(niveis)),
+                           fontsize=9, ha='center', va='center', fontweight='bold')
+
+    # Adicionar centróides
+    centroides_original = resultado.centroides
+    for cluster_id in resultado.mapeamento:
+        centroide = centroides_original[cluster_id]
+        ax.scatter(centroide[0], centroide[2], c='black', s=500, marker='X',
+                   edgecolors='white', linewidth=2, zorder=5)
+
+    ax.set_xlabel('Índice Tecnológico', fontsize=13, fontweight='bold')
+    ax.set_ylabel('Produtividade (kg/ha)', fontsize=13, fontweight='bold')
+    ax.set_title(f'Análise de Cluster K-means (K={len(resultado.mapeamento)})\n'
+                 'Agrupamento por Nível de Tecnificação',
+                 fontsize=15, fontweight='bold', pad=20)
+    ax.legend(fontsize=11, loc='lower right', framealpha=0.9)
+    ax.grid(True, alpha=0.3, linestyle='--')
+    return fig
+
+
+def comparacao_clusters(resultado):
+    """Gráfico 6: Comparação de médias entre clusters."""
+    import matplotlib.pyplot as plt
+
+    df = resultado.df
+    fig, axes = plt.subplots(2, 2, figsize=(14, 10))
+    fig.suptitle('Comparação de Variáveis entre Níveis de Tecnificação',
+                 fontsize=15, fontweight='bold')
+
+    variaveis_plot = [
+        ('Índice Tecnológico', 'indice_tecnologico'),
+        ('Produtividade (kg/ha)', 'produtividade_kg_ha'),
+        ('Investimento (R$ mi)', 'investimento_tecnologia_milhoes'),
+        ('Cafés Especiais (ton)', 'producao_especiais_ton')
+    ]
+    niveis_full = resultado.niveis
+    niveis = [nivel.replace(' ', '\n') for nivel in niveis_full]
+    cores = cores_niveis(niveis_full)
+    estatisticas = df.groupby('nivel_tecnificacao')[[var for _, var in variaveis_plot]].agg(['mean', 'std'])
+
+    for idx, (nome, var) in enumerate(variaveis_plot):
+        ax = axes[idx // 2, idx % 2]
+
+        medias = estatisticas.loc[niveis_full, (var, 'mean')].tolist()
+        erros = estatisticas.loc[niveis_full, (var, 'std')].tolist()
+
+        bars = ax.bar(niveis, medias, yerr=erros, capsize=8,
+                      color=[cores[n] for n in niveis_full], alpha=0.7,
+                      edgecolor='black', linewidth=1.5)
+
+        ax.set_ylabel(nome, fontsize=11, fontweight='bold')
+        ax.set_title(f'({chr(65+idx)}) {nome}', fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3, axis='y', linestyle='--')
+
+        # Adicionar valores nas barras
+        for bar, media in zip(bars, medias):
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height,
+                    f'{media:.1f}', ha='center', va='bottom', fontsize=10, fontweight='bold')
+    return fig
+
+
+def correlacao_movel(df):
+    """Gráfico 7: Correlação e Inclinação Móveis (Índice Tecnológico x Produtividade)."""
+    import matplotlib.pyplot as plt
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), sharex=True)
+    cores = ['#1565C0', '#2E7D32', '#F57C00']
+    serie = calcular_correlacao_movel(_serie_anual(df))
+    painel = eh_painel(df)
+    municipios = calcular_correlacao_movel(df) if painel else None
+
+    for i, janela in enumerate(JANELAS):
+        cor = cores[i % len(cores)]
+        if painel:
+            # Faixa P10-P90 e mediana das janelas de cada município
+            tabela = municipios[municipios['janela'] == janela]
+            for ax, coluna in ((ax1, 'correlacao'), (ax2, 'inclinacao')):
+                q = tabela.groupby('ano_final')[coluna].quantile([0.1, 0.5, 0.9]).unstack()
+                ax.fill_between(q.index, q[0.1], q[0.9], color=cor, alpha=0.12)
+                ax.plot(q.index, q[0.5], color=cor, linewidth=1.5, linestyle='--',
+                        label=f'Mediana dos municípios ({janela} anos; faixa P10-P90)')
+        tabela = serie[serie['janela'] == janela]
+        rotulo = f'Janela de {janela} anos' + (' (série estadual)' if painel else '')
+        ax1.plot(tabela['ano_final'], tabela['correlacao'], color=cor, linewidth=2.5,
+                 marker='o', markersize=7, label=rotulo)
+        ax2.plot(tabela['ano_final'], tabela['inclinacao'], color=cor, linewidth=2.5,
+                 marker='s', markersize=7, label=rotulo)
+
+    # Correlação do período completo como referência
+    anual = _serie_anual(df)
+    r_total = np.corrcoef(anual['indice_tecnologico'].astype(float),
+                          anual['produtividade_kg_ha'].astype(float))[0, 1]
+    ax1.axhline(r_total, color='red', linestyle=':', linewidth=2,
+                label=f'Período completo (r = {r_total:.4f})')
+    ax1.axhline(0, color='gray', linewidth=1)
+    ax2.axhline(0, color='gray', linewidth=1)
+
+    ax1.set_ylim(-1.05, 1.05)
+    ax1.set_ylabel('Correlação de Pearson (r)', fontsize=13, fontweight='bold')
+    ax2.set_ylabel('Inclinação (kg/ha por ponto)', fontsize=13, fontweight='bold')
+    ax2.set_xlabel('Ano final da janela', fontsize=13, fontweight='bold')
+    ax1.set_title('Correlação Móvel entre Índice Tecnológico e Produtividade\n'
+                  + _subtitulo(df, 'MG (série estadual e municípios)'),
+                  fontsize=15, fontweight='bold', pad=20)
+    ax1.grid(True, alpha=0.3, linestyle='--')
+    ax2.grid(True, alpha=0.3, linestyle='--')
+    ax1.legend(fontsize=10, loc='lower left', framealpha=0.9)
+    return fig
+
+
+# ====================
+# GRÁFICOS 8-9 (ESPACIAL)
+# ====================
+
+def _categorias_lisa(local):
+    """Linhas do LISA de cada categoria presente, na ordem de ``CORES_LISA``."""
+    grupos = dict(tuple(local.groupby('categoria', sort=False)))
+    return {categoria: grupos[categoria] for categoria in CORES_LISA if categoria in grupos}
+
+
+def diagrama_moran(resultado):
+    """Gráfico 8: Diagrama de Dispersão de Moran (valor x defasagem espacial)."""
+    import matplotlib.pyplot as plt
+
+    variaveis = resultado.variaveis
+    fig, axes = plt.subplots(1, len(variaveis), figsize=(7 * len(variaveis), 7), squeeze=False)
+    fig.suptitle(f'Diagrama de Moran: Médias Municipais do Período ({resultado.pesos.criterio})',
+                 fontsize=15, fontweight='bold')
+
+    for ax, variavel in zip(axes[0], variaveis):
+        local = resultado.local[resultado.local['variavel'] == variavel]
+        local = local[local['categoria'] != SEM_VIZINHOS]
+        media, desvio = local['valor'].mean(), local['valor'].std(ddof=0)
+        dispersao_categorias(ax, {categoria: ((grupo['valor'] - media) / desvio,
+                                              (grupo['defasagem'] - media) / desvio)
+                                  for categoria, grupo in _categorias_lisa(local).items()},
+                             CORES_LISA, s=30, alpha=0.8, edgecolors='black', linewidth=0.3)
+
+        # Com pesos padronizados por linha, a inclinação da reta é o próprio I
+        I = resultado.moran.at[variavel, 'I']
+        extremos = np.array(ax.get_xlim())
+        ax.plot(extremos, I * extremos, color='black', linewidth=2,
+                label=f"I = {I:.4f} (p = {resultado.moran.at[variavel, 'p_permutacao']:.4f})")
+        ax.axhline(0, color='gray', linewidth=1)
+        ax.axvline(0, color='gray', linewidth=1)
+
+        nome = NOMES.get(variavel, variavel)
+        ax.set_xlabel(f'{nome} (padronizado)', fontsize=12, fontweight='bold')
+        ax.set_ylabel('Defasagem espacial (padronizada)', fontsize=12, fontweight='bold')
+        ax.set_title(nome, fontsize=13, fontweight='bold')
+        ax.legend(fontsize=9, loc='upper left', framealpha=0.9)
+        ax.grid(True, alpha=0.3, linestyle='--')
+    return fig
+
+
+def mapa_lisa(resultado):
+    """Gráfico 9: Mapa LISA dos Municípios (aglomerados e atípicos locais)."""
+    import matplotlib.pyplot as plt
+
+    variaveis = resultado.variaveis
+    fig, axes = plt.subplots(1, len(variaveis), figsize=(7 * len(variaveis), 7), squeeze=False)
+    fig.suptitle('Mapa LISA: I de Moran Local dos Municípios (α = 0,05)',
+                 fontsize=15, fontweight='bold')
+    posicao = resultado.centroides.set_index('municipio_id')
+
+    for ax, variavel in zip(axes[0], variaveis):
+        local = resultado.local[resultado.local['variavel'] == variavel]
+        grupos, cores = {}, {}
+        for categoria, grupo in _categorias_lisa(local).items():
+            pontos = posicao.loc[grupo['municipio_id']]
+            rotulo = f'{categoria} ({len(grupo)})'
+            grupos[rotulo] = (pontos['x'], pontos['y'])
+            cores[rotulo] = CORES_LISA[categoria]
+        dispersao_categorias(ax, grupos, cores, s=25, marker='s', edgecolors='none')
+        ax.set_aspect('equal', adjustable='datalim')
+        ax.set_title(NOMES.get(variavel, variavel), fontsize=13, fontweight='bold')
+        ax.set_xlabel('Longitude', fontsize=11)
+        ax.set_ylabel('Latitude', fontsize=11)
+        ax.legend(fontsize=9, loc='upper center', bbox_to_anchor=(0.5, -0.1), ncol=3,
+                  framealpha=0.9)
+        ax.grid(True, alpha=0.3, linestyle='--')
+    return fig
+
+
+# ====================
+# GRÁFICO 10 (CONSENSO)
+# ====================
+
+def mapa_consenso(resultado):
+    """Gráfico 10: Mapa de Consenso das Reamostras e Estabilidade das Observações."""
+    import matplotlib.pyplot as plt
+    from matplotlib.patches import Patch
+
+    df = resultado.df
+    niveis = resultado.niveis
+    cores = cores_niveis(niveis)
+    curtos = [nivel.replace(' Tecnificação', '') for nivel in niveis]
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 7), gridspec_kw={'width_ratios': [1.1, 1]})
+    fig.suptitle(f'Consenso do Agrupamento: {resultado.reamostras} Reamostras de '
+                 f'{resultado.fracao:.0%} das Observações', fontsize=15, fontweight='bold')
+
+    imagem = ax1.imshow(resultado.mapa, cmap='Blues', vmin=0, vmax=1, interpolation='nearest')
+    fronteiras = resultado.fronteiras
+    for fronteira in fronteiras[1:-1]:
+        ax1.axhline(fronteira - 0.5, color='black', linewidth=1.5)
+        ax1.axvline(fronteira - 0.5, color='black', linewidth=1.5)
+    centros = (fronteiras[:-1] + fronteiras[1:]) / 2 - 0.5
+    ax1.set_xticks(centros, curtos)
+    ax1.set_yticks(centros, curtos, rotation=90, va='center')
+    fig.colorbar(imagem, ax=ax1, fraction=0.046, pad=0.04,
+                 label='Fração das reamostras no mesmo grupo')
+    ax1.set_title('Matriz de consenso (ordenada por nível e estabilidade)'
+                  if resultado.modo == 'denso'
+                  else 'Consenso médio entre níveis (pares vizinhos)',
+                  fontsize=13, fontweight='bold')
+
+    if not eh_painel(df) and len(df) <= ROTULOS_MAXIMOS:
+        ax2.bar(df['ano'].astype(int).astype(str), df['estabilidade'],
+                color=[cores[nivel] for nivel in df['nivel_tecnificacao']], alpha=0.8,
+                edgecolor='black', linewidth=1)
+        ax2.axhline(LIMIAR_ESTAVEL, color='red', linestyle=':', linewidth=2)
+        ax2.set_ylim(0, 1.05)
+        ax2.set_xlabel('Ano', fontsize=12, fontweight='bold')
+        ax2.set_ylabel('Estabilidade', fontsize=12, fontweight='bold')
+        ax2.tick_params(axis='x', rotation=45)
+        ax2.legend(handles=[Patch(color=cores[nivel], label=nivel) for nivel in niveis],
+                   fontsize=10, loc='lower left', framealpha=0.9)
+    else:
+        bordas = np.linspace(0, 1, 21)
+        for nivel in niveis:
+            valores = df.loc[df['nivel_tecnificacao'] == nivel, 'estabilidade'].dropna()
+            ax2.hist(valores, bins=bordas, color=cores[nivel], alpha=0.6, edgecolor='black',
+                     label=f'{nivel} (n = {len(valores)})')
+        ax2.axvline(LIMIAR_ESTAVEL, color='red', linestyle=':', linewidth=2)
+        ax2.set_xlabel('Estabilidade', fontsize=12, fontweight='bold')
+        ax2.set_ylabel('Observações', fontsize=12, fontweight='bold')
+        ax2.legend(fontsize=10, loc='upper left', framealpha=0.9)
+    ax2.set_title('Fração das reamostras com o nível de referência', fontsize=13,
+                  fontweight='bold')
+    ax2.grid(True, alpha=0.3, axis='y', linestyle='--')
+    return fig
+
+
+# ====================
+# CATÁLOGO E RENDERIZAÇÃO
+# ====================
+
+# Arquivo -> (conjunto, função de desenho)
+GRAFICOS = {
+    'grafico1_evolucao_temporal.png': ('visualizacoes', evolucao_temporal),
+    'grafico2_correlacao_regressao.png': ('visualizacoes', correlacao_regressao),
+    'grafico3_analise_multivariada.png': ('visualizacoes', analise_multivariada),
+    'grafico4_matriz_correlacao.png': ('visualizacoes', matriz_correlacao),
+    'grafico1_evolucao_produtividade.png': ('estatistica', evolucao_produtividade),
+    'grafico2_correlacao_tecnologia.png': ('estatistica', correlacao_tecnologia),
+    'grafico3_matriz_correlacao.png': ('estatistica', matriz_correlacao_completa),
+    'grafico4_boxplot_regioes.png': ('estatistica', boxplot_regioes),
+    'grafico5_clusters_kmeans.png': ('cluster', clusters_kmeans),
+    'grafico6_comparacao_clusters.png': ('cluster', comparacao_clusters),
+    'grafico7_correlacao_movel.png': ('janelas', correlacao_movel),
+    'grafico8_diagrama_moran.png': ('espacial', diagrama_moran),
+    'grafico9_mapa_lisa.png': ('espacial', mapa_lisa),
+    'grafico10_mapa_consenso.png': ('consenso', mapa_consenso),
+}
+
+# Conjuntos gerados por padrão ('janelas', 'espacial' e 'consenso' só quando pedidos)
+CONJUNTOS = ('visualizacoes', 'estatistica', 'cluster')
+
+
+def estilo(conjunto):
+    """Contexto de estilo do matplotlib para o conjunto de gráficos."""
+    import matplotlib.pyplot as plt
+    from contextlib import ExitStack
+
+    pilha = ExitStack()
+    if conjunto == 'estatistica':
+        import seaborn as sns
+        pilha.enter_context(plt.style.context('seaborn-v0_8-darkgrid'))
+        pilha.enter_context(plt.rc_context(
+            {'axes.prop_cycle': plt.cycler(color=sns.color_palette('husl'))}))
+    pilha.enter_context(plt.rc_context(ESTILOS[conjunto]))
+    return pilha
+
+
+def tarefas(df, conjuntos=None, resultado_cluster=None, prefixo='', preparo_cluster=None,
+            resultado_espacial=None, resultado_consenso=None):
+    """
+    Tarefas de renderização (``cafe.renderizacao.Tarefa``) dos conjuntos
+    pedidos. Os gráficos de cluster recebem ``resultado_cluster`` ou, com
+    ``preparo_cluster``, o calculam no próprio processo de desenho; sem
+    nenhum dos dois, a clusterização só roda se algum deles faltar no cache
+    (``cafe.cluster.ClusterSobDemanda``). Os
+    espaciais exigem ``resultado_espacial`` (``cafe.espacial.analisar``); o
+    de consenso usa ``resultado_consenso`` ou calcula ``cafe.consenso.consenso``.
+    """
+    from cafe.renderizacao import Tarefa
+
+    conjuntos = conjuntos or CONJUNTOS
+    if 'espacial' in conjuntos and resultado_espacial is None:
+        raise ValueError('o conjunto espacial exige o resultado de cafe.espacial.analisar '
+                         '(geometria dos municípios)')
+    if 'cluster' in conjuntos and resultado_cluster is None and preparo_cluster is None:
+        from cafe.cluster import ClusterSobDemanda
+        resultado_cluster = ClusterSobDemanda(df)
+    if 'consenso' in conjuntos and resultado_consenso is None:
+        from cafe.consenso import consenso
+        resultado_consenso = consenso(df)
+
+    lista = []
+    for arquivo, (conjunto, funcao) in GRAFICOS.items():
+        if conjunto not in conjuntos:
+            continue
+        if conjunto == 'cluster':
+            dados = df if resultado_cluster is None else resultado_cluster
+            preparo = preparo_cluster if resultado_cluster is None else None
+        elif conjunto == 'espacial':
+            dados, preparo = resultado_espacial, None
+        elif conjunto == 'consenso':
+            dados, preparo = resultado_consenso, None
+        else:
+            dados, preparo = df, None
+        lista.append(Tarefa(prefixo + arquivo, conjunto, funcao, dados, preparo))
+    return lista
+
+
+def tarefas_municipios(df, conjuntos=None):
+    """
+    Conjuntos de gráficos de cada município do painel, em
+    ``municipios/<municipio_id>/``: a série de cada município é desenhada
+    como a de Varginha. O cluster de cada município é calculado no processo
+    que desenha seus gráficos.
+    """
+    from functools import partial
+
+    from cafe.cluster import cluster
+
+    preparo = partial(cluster, n_jobs=1)
+    lista = []
+    for municipio, serie in df.groupby('municipio_id', sort=True):
+        lista += tarefas(serie.reset_index(drop=True), conjuntos,
+                         prefixo=f'municipios/{municipio}/', preparo_cluster=preparo)
+    return lista
+
+
+@medida('graficos')
+def render(df, saida='.', conjuntos=None, resultado_cluster=None, n_jobs=None,
+           por_municipio=False, cache=True, perfil=None, formato=None, resultado_espacial=None,
+           resultado_consenso=None):
+    """
+    Gera os gráficos dos conjuntos pedidos em ``saida``, em paralelo (ver
+    ``cafe.renderizacao``). Com ``por_municipio``, gera os conjuntos de
+    cada município do painel (sem o ``espacial``, que compara municípios,
+    nem o ``consenso``). Com ``cache``, figuras cujos dados, código e
+    estilo não mudaram são copiadas do cache em vez de redesenhadas.
+    ``perfil`` ('rascunho', 'publicacao' ou 'vetorial') e ``formato``
+    definem resolução e tipo dos arquivos.
+
+    Retorna o ``Manifesto`` (arquivos gravados e tempo de cada figura).
+    """
+    from cafe.renderizacao import ARQUIVO_MANIFESTO, executar
+
+    if por_municipio:
+        lista = tarefas_municipios(df, [c for c in conjuntos or CONJUNTOS
+                                        if c not in ('espacial', 'consenso')])
+        manifesto = executar(lista, saida, n_jobs, cache=cache, perfil_nome=perfil,
+                             formato=formato)
+        print(f"✓ {len(manifesto)} gráficos de {df['municipio_id'].nunique()} municípios salvos")
+    else:
+        lista = tarefas(df, conjuntos, resultado_cluster, resultado_espacial=resultado_espacial,
+                        resultado_consenso=resultado_consenso)
+
+        def ao_concluir(figura):
+            print(f"✓ Gráfico salvo: {figura.arquivo}{' (cache)' if figura.cache else ''}")
+
+        manifesto = executar(lista, saida, n_jobs, ao_concluir, cache=cache, perfil_nome=perfil,
+                             formato=formato)
+    print(f"✓ Manifesto: {ARQUIVO_MANIFESTO} (perfil {manifesto.perfil}, "
+          f"{manifesto.processos} processo(s), {manifesto.tempo:.1f} s; "
+          f"{manifesto.falhas} desenhados, {manifesto.acertos} do cache)")
+    return manifesto
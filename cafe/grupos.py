@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Índice de grupos e agregações agrupadas em passagem única.
+
+No modo painel (municípios x anos) todas as etapas agregam por grupo. Em vez
+de filtrar ``df[df[coluna] == grupo]`` dentro de um laço (custo grupos x
+linhas), o índice fatoriza a chave uma vez e cada agregação é feita com
+``np.bincount``/``reduceat`` sobre todas as linhas de uma só vez.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cafe.dados import ESQUEMA, eh_painel, flutuante, matriz
+
+
+class IndiceGrupos:
+    """
+    Fatorização de uma chave de agrupamento.
+
+    ``codigos[i]`` é o número do grupo da linha ``i`` e ``rotulos[g]`` o
+    valor da chave do grupo ``g`` (em ordem crescente; numa chave categórica,
+    na ordem das categorias). Séries e categóricos são fatorizados como
+    estão, sem convertê-los para um array de objetos.
+    """
+
+    def __init__(self, chaves):
+        if not isinstance(chaves, (pd.Series, pd.Index, pd.Categorical)):
+            chaves = np.asarray(chaves)
+        codigos, rotulos = pd.factorize(chaves, sort=True)
+        if (codigos < 0).any():
+            raise ValueError('chave de agrupamento com valores ausentes')
+        self.codigos = codigos.astype(np.intp, copy=False)
+        self.rotulos = pd.Index(rotulos)
+        self.n_grupos = len(rotulos)
+        self.contagens = np.bincount(self.codigos, minlength=self.n_grupos)
+        self._ordem = None
+
+    @classmethod
+    def de_coluna(cls, df, coluna):
+        indice = cls(df[coluna])
+        indice.rotulos.name = coluna
+        return indice
+
+    def __len__(self):
+        return self.n_grupos
+
+    @property
+    def ordem(self):
+        """Permutação estável que ordena as linhas por grupo."""
+        if self._ordem is None:
+            self._ordem = np.argsort(self.codigos, kind='stable')
+        return self._ordem
+
+    @property
+    def inicios(self):
+        """Posição inicial de cada grupo nas linhas ordenadas por ``ordem``."""
+        return np.concatenate(([0], np.cumsum(self.contagens)[:-1]))
+
+    # ====================
+    # AGREGAÇÕES
+    # ====================
+
+    def soma(self, valores):
+        """
+        Soma por grupo. ``valores`` (n,) -> (G,) ou (n, p) -> (G, p). A soma
+        é acumulada em float64 também para colunas float32.
+        """
+        valores = flutuante(valores)
+        if valores.ndim == 1:
+            return np.bincount(self.codigos, weights=valores, minlength=self.n_grupos)
+        return np.column_stack([self.soma(valores[:, j]) for j in range(valores.shape[1])])
+
+    def media(self, valores):
+        soma = self.soma(valores)
+        contagens = self.contagens if soma.ndim == 1 else self.contagens[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return soma / contagens
+
+    def variancia(self, valores, ddof=1):
+        """Variância por grupo (centrada na média do grupo, estável)."""
+        valores = flutuante(valores)
+        desvios = valores - self.media(valores)[self.codigos]
+        contagens = self.contagens if valores.ndim == 1 else self.contagens[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.soma(desvios ** 2) / (contagens - ddof)
+
+    def desvio(self, valores, ddof=1):
+        return np.sqrt(self.variancia(valores, ddof=ddof))
+
+    def minimo(self, valores):
+        return np.minimum.reduceat(np.asarray(valores)[self.ordem], self.inicios, axis=0)
+
+    def maximo(self, valores):
+        return np.maximum.reduceat(np.asarray(valores)[self.ordem], self.inicios, axis=0)
+
+    def quantis(self, valores, qs):
+        """
+        Quantis por grupo com interpolação linear (como ``Series.quantile``).
+
+        Retorna (G, len(qs)). Uma única ordenação por (grupo, valor).
+        """
+        valores = flutuante(valores)
+        ordenados = valores[np.lexsort((valores, self.codigos))]
+        inicios = self.inicios
+        posicoes = inicios[:, None] + np.outer(self.contagens - 1, np.asarray(qs, dtype=float))
+        baixo = np.floor(posicoes).astype(np.intp)
+        alto = np.minimum(baixo + 1, (inicios + self.contagens - 1)[:, None])
+        fracao = posicoes - baixo
+        return ordenados[baixo] * (1 - fracao) + ordenados[alto] * fracao
+
+    def momentos_cruzados(self, X, Y=None):
+        """
+        Somas de produtos por grupo: (G, p, q) com ``X'Y`` de cada grupo.
+
+        Cada par de colunas é acumulado com um ``bincount`` sobre todas as
+        linhas; nada é materializado por linha além do produto do par.
+        """
+        X = flutuante(X)
+        simetrico = Y is None
+        Y = X if simetrico else flutuante(Y)
+        p, q = X.shape[1], Y.shape[1]
+        saida = np.empty((self.n_grupos, p, q))
+        for i in range(p):
+            for j in range(i if simetrico else 0, q):
+                saida[:, i, j] = self.soma(X[:, i] * Y[:, j])
+                if simetrico:
+                    saida[:, j, i] = saida[:, i, j]
+        return saida
+
+    def covariancia(self, X, ddof=1):
+        """Matrizes de covariância por grupo (G, p, p)."""
+        X = flutuante(X)
+        centrado = X - self.media(X)[self.codigos]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.momentos_cruzados(centrado) / (self.contagens - ddof)[:, None, None]
+
+    def correlacao(self, X):
+        """Matrizes de correlação de Pearson por grupo (G, p, p)."""
+        cov = self.covariancia(X)
+        desvio = np.sqrt(np.diagonal(cov, axis1=1, axis2=2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return cov / (desvio[:, :, None] * desvio[:, None, :])
+
+    # ====================
+    # TABELAS
+    # ====================
+
+    def describe(self, df, variaveis):
+        """
+        Equivalente a ``df.groupby(chave)[variaveis].describe()``, calculado
+        com o índice (colunas em MultiIndex variável x estatística).
+        """
+        tabelas = {}
+        for var in variaveis:
+            valores = flutuante(df[var].to_numpy())
+            quartis = self.quantis(valores, [0.25, 0.5, 0.75])
+            tabelas[var] = pd.DataFrame({
+                'count': self.contagens.astype(float),
+                'mean': self.media(valores),
+                'std': self.desvio(valores),
+                'min': self.minimo(valores),
+                '25%': quartis[:, 0],
+                '50%': quartis[:, 1],
+                '75%': quartis[:, 2],
+                'max': self.maximo(valores)
+            }, index=self.rotulos)
+        return pd.concat(tabelas, axis=1)
+
+    def medias(self, df, variaveis):
+        """Tabela de médias por grupo (grupos x variáveis)."""
+        X = matriz(df, variaveis)
+        return pd.DataFrame(self.media(X), index=self.rotulos, columns=variaveis)
+
+
+def agregar_por_ano(df):
+    """
+    Série estadual por ano a partir do painel: somas para quantidades,
+    médias para índices, preços e clima, e produtividade recalculada como
+    produção / área.
+    """
+    somas = ['producao_total_ton', 'area_colhida_ha', 'investimento_tecnologia_milhoes',
+             'numero_produtores', 'producao_especiais_ton']
+    medias = ['indice_tecnologico', 'preco_medio_saca_reais', 'temperatura_media_c',
+              'precipitacao_mm']
+    indice = IndiceGrupos.de_coluna(df, 'ano')
+    serie = pd.DataFrame(indice.soma(matriz(df, somas)), index=indice.rotulos, columns=somas)
+    serie[medias] = indice.media(matriz(df, medias))
+    serie['produtividade_kg_ha'] = serie['producao_total_ton'] * 1000 / serie['area_colhida_ha']
+    serie = serie.reset_index()
+    return serie[[coluna for coluna in ESQUEMA if coluna in serie.columns]]
+
+
+def empilhar(df, colunas, por=None, anos=None):
+    """
+    Séries empilhadas: array (G, T, len(colunas)) das colunas por grupo e
+    ano do calendário completo (anos ausentes ficam NaN), rótulos dos
+    grupos e anos. ``por`` padrão: ``municipio_id`` no modo painel; na
+    série anual há um único grupo ('total'). ``anos`` fixa o calendário
+    (deve conter todos os anos de ``df``).
+    """
+    if por is None and eh_painel(df):
+        por = 'municipio_id'
+    if por:
+        indice = IndiceGrupos.de_coluna(df, por)
+        codigos, rotulos = indice.codigos, indice.rotulos
+    else:
+        codigos, rotulos = np.zeros(len(df), dtype=np.intp), pd.Index(['total'], name='grupo')
+    ano = df['ano'].to_numpy().astype(np.intp)
+    if anos is None:
+        anos = np.arange(ano.min(), ano.max() + 1)
+    S = np.full((len(rotulos), len(anos), len(colunas)), np.nan)
+    S[codigos, ano - anos[0]] = matriz(df, colunas)
+    return S, rotulos, anos
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+"""
+Estatísticas incrementais: um estado acumulado que recebe as linhas de uma
+nova safra e atualiza descritivas, correlações e regressão sem reler a base.
+
+O estado guarda, para as variáveis numéricas:
+
+* contagem, médias e a matriz de co-momentos centrados
+  ``C = sum (x - média)(x - média)'``, combinada bloco a bloco pela fórmula
+  de Chan et al. (a versão em blocos da atualização de Welford);
+* mínimos, máximos e um histograma de ``CLASSES_HISTOGRAMA`` classes de
+  cada variável, de onde saem os quartis do ``describe`` (aproximados, com
+  erro de até uma classe). Quando uma safra sai da faixa coberta, a largura
+  das classes dobra e as classes vizinhas são somadas, então o histograma
+  não cresce com a base. Com ``quartis_exatos=True`` o estado guarda os
+  valores ordenados (a nova safra é intercalada na ordem existente) e os
+  quartis coincidem com os do ``describe``;
+* no modo painel, contagem, médias e co-momentos de cada grupo (região ou
+  município), para as correlações e regressões por grupo.
+
+A regressão sai dos blocos de ``C``: ``C[R, R]`` e ``C[R, y]`` são ``X'X`` e
+``X'y`` das variáveis centradas, resolvidos por ``cafe.regressao.ols_momentos``
+(os mesmos coeficientes, erros padrão e p-valores da regressão completa).
+
+Atualizar custa O(linhas novas) e o estado tem tamanho fixo: O(p²) por
+grupo mais o histograma (os valores ordenados, só com ``quartis_exatos``,
+custam uma cópia linear da base a cada safra). Médias, desvios,
+correlações e regressão coincidem com o recálculo completo (diferenças de
+arredondamento da ordem de 1e-12).
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cafe.dados import hash_arquivo
+from cafe.estatistica import ALVO, REGRESSORES, VARIAVEIS_NUMERICAS, coluna_grupo
+from cafe.grupos import IndiceGrupos
+from cafe.regressao import ols_momentos
+
+VERSAO_ESTADO = 2
+
+# Classes do histograma dos quartis aproximados (número par)
+CLASSES_HISTOGRAMA = 2048
+
+
+def _momentos(X):
+    """Contagem, médias e co-momentos centrados de um bloco (n, p)."""
+    media = X.mean(axis=0)
+    desvios = X - media
+    return len(X), media, desvios.T @ desvios
+
+
+def _combinar(n_a, media_a, C_a, n_b, media_b, C_b):
+    """
+    Combina momentos de dois blocos (fórmula de Chan et al.). Funciona em
+    lote: ``n`` (G,), ``media`` (G, p), ``C`` (G, p, p), ou sem o eixo G.
+    """
+    n = n_a + n_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fracao = np.where(n > 0, n_b / n, 0.0)
+        peso = np.where(n > 0, n_a * n_b / n, 0.0)
+    delta = media_b - media_a
+    media = media_a + delta * np.asarray(fracao)[..., None]
+    C = C_a + C_b + np.einsum('...i,...j->...ij', delta, delta) * np.asarray(peso)[..., None, None]
+    return n, media, C
+
+
+def _acumular_histograma(contagens, inicio, largura, X):
+    """
+    Soma as colunas de ``X`` (n, p) aos histogramas ``contagens`` (p, B) de
+    classes ``[inicio + i * largura, inicio + (i + 1) * largura)``. Se uma
+    coluna sai da faixa, a largura dobra (somando as classes aos pares) até
+    cobri-la; a faixa cresce para o lado em que os valores saíram.
+    """
+    B = contagens.shape[1]
+    for j, coluna in enumerate(X.T):
+        baixo, alto = coluna.min(), coluna.max()
+        if largura[j] == 0:
+            # Primeiro bloco: a faixa dos próprios valores (o máximo cai na última classe)
+            inicio[j] = baixo
+            largura[j] = (alto - baixo) / (B - 1) or max(abs(baixo), 1.0) / B
+        while baixo < inicio[j] or alto >= inicio[j] + B * largura[j]:
+            pares = contagens[j].reshape(-1, 2).sum(axis=1)
+            contagens[j] = 0
+            if baixo < inicio[j]:
+                contagens[j, B // 2:] = pares
+                inicio[j] -= B * largura[j]
+            else:
+                contagens[j, :B // 2] = pares
+            largura[j] *= 2
+        classes = np.minimum(((coluna - inicio[j]) // largura[j]).astype(int), B - 1)
+        contagens[j] += np.bincount(classes, minlength=B)
+
+
+def _ordem_histograma(contagens, inicio, largura, postos):
+    """
+    Estimativa dos valores de posto ``postos`` (0 a n - 1, inteiros) de cada
+    histograma: o valor cai na classe que contém o posto, espalhando os
+    valores da classe por igual. Cada estimativa fica na classe do valor
+    verdadeiro (erro menor que uma classe). Retorna (p, len(postos)).
+    """
+    acumuladas = np.cumsum(contagens, axis=1)
+    linhas = np.arange(len(contagens))[:, None]
+    classe = (acumuladas[:, None, :] <= np.asarray(postos)[None, :, None]).sum(axis=2)
+    classe = np.minimum(classe, contagens.shape[1] - 1)
+    na_classe = contagens[linhas, classe]
+    antes = acumuladas[linhas, classe] - na_classe
+    with np.errstate(invalid='ignore', divide='ignore'):
+        dentro = np.clip((postos - antes + 0.5) / na_classe, 0, 1)
+    return inicio[:, None] + (classe + dentro) * largura[:, None]
+
+
+def _quantis_histograma(contagens, inicio, largura, n, quantis):
+    """
+    Quantis de cada histograma, na mesma posição ``(n - 1) q`` do
+    ``describe``: interpolação entre as estimativas dos dois valores de
+    posto vizinhos, que podem estar em classes distantes (com classes
+    vazias entre elas). O erro continua menor que uma classe.
+    """
+    posicoes = (n - 1) * np.asarray(quantis, dtype=float)
+    baixo = np.floor(posicoes).astype(int)
+    alto = np.minimum(baixo + 1, n - 1)
+    fracao = posicoes - baixo
+    valores = _ordem_histograma(contagens, inicio, largura, np.concatenate([baixo, alto]))
+    m = len(posicoes)
+    return valores[:, :m] * (1 - fracao) + valores[:, m:] * fracao
+
+
+class EstadoEstatistico:
+    """
+    Estado acumulado das estatísticas. Crie com ``de_dataframe``, acrescente
+    safras com ``atualizar`` e persista com ``salvar``/``carregar``. Com
+    ``quartis_exatos`` o estado guarda todos os valores ordenados, em vez
+    do histograma.
+    """
+
+    def __init__(self, variaveis=None, por=None, quartis_exatos=False):
+        self.variaveis = list(variaveis or VARIAVEIS_NUMERICAS)
+        self.por = por
+        self.quartis_exatos = quartis_exatos
+        p = len(self.variaveis)
+        self.n = 0
+        self.media = np.zeros(p)
+        self.C = np.zeros((p, p))
+        self.minimo = np.full(p, np.inf)
+        self.maximo = np.full(p, -np.inf)
+        self.ordenados = np.empty((p, 0))
+        self.histograma = np.zeros((p, 0 if quartis_exatos else CLASSES_HISTOGRAMA), dtype=np.int64)
+        self.inicio_histograma = np.zeros(p)
+        self.largura_histograma = np.zeros(p)
+        self.grupos = pd.Index([])
+        self.n_grupos = np.zeros(0)
+        self.media_grupos = np.zeros((0, p))
+        self.C_grupos = np.zeros((0, p, p))
+        self.anos = set()
+        self.arquivos = set()      # hashes dos arquivos já incorporados
+
+    @classmethod
+    def de_dataframe(cls, df, variaveis=None, por=None, quartis_exatos=False):
+        estado = cls(variaveis, por if por is not None else coluna_grupo(df), quartis_exatos)
+        return estado.atualizar(df)
+
+    # ====================
+    # ATUALIZAÇÃO
+    # ====================
+
+    def atualizar(self, df):
+        """Incorpora as linhas de ``df`` (por exemplo, uma nova safra)."""
+        if len(df) == 0:
+            return self
+        X = df[self.variaveis].to_numpy(dtype=float)
+        if np.isnan(X).any():
+            raise ValueError('linhas com valores ausentes nas variáveis numéricas')
+
+        self.n, self.media, self.C = _combinar(self.n, self.media, self.C, *_momentos(X))
+        self.minimo = np.minimum(self.minimo, X.min(axis=0))
+        self.maximo = np.maximum(self.maximo, X.max(axis=0))
+        if self.quartis_exatos:
+            novos = np.sort(X, axis=0).T
+            self.ordenados = np.stack([
+                np.insert(atual, np.searchsorted(atual, nova), nova)
+                for atual, nova in zip(self.ordenados, novos)])
+        else:
+            _acumular_histograma(self.histograma, self.inicio_histograma,
+                                 self.largura_histograma, X)
+        if 'ano' in df.columns:
+            self.anos.update(int(a) for a in df['ano'].unique())
+
+        if self.por:
+            self._atualizar_grupos(df, X)
+        return self
+
+    def _atualizar_grupos(self, df, X):
+        indice = IndiceGrupos.de_coluna(df, self.por)
+        media_b = indice.media(X)
+        C_b = indice.momentos_cruzados(X - media_b[indice.codigos])
+
+        # Grupos novos entram no fim, sem mudar a posição dos existentes
+        rotulos = indice.rotulos.astype(object)
+        self.grupos = self.grupos.append(rotulos.difference(self.grupos))
+        p, G = len(self.variaveis), len(self.grupos)
+        extra = G - len(self.n_grupos)
+        self.n_grupos = np.concatenate([self.n_grupos, np.zeros(extra)])
+        self.media_grupos = np.concatenate([self.media_grupos, np.zeros((extra, p))])
+        self.C_grupos = np.concatenate([self.C_grupos, np.zeros((extra, p, p))])
+
+        pos = self.grupos.get_indexer(rotulos)
+        n, media, C = _combinar(self.n_grupos[pos], self.media_grupos[pos], self.C_grupos[pos],
+                                indice.contagens.astype(float), media_b, C_b)
+        self.n_grupos[pos], self.media_grupos[pos], self.C_grupos[pos] = n, media, C
+
+    def ingerir(self, caminho, leitor=None):
+        """
+        Incorpora um arquivo de novas linhas, lido com as medidas em float64
+        (como ``load`` lê arquivos pequenos). Um arquivo com o mesmo conteúdo
+        de outro já incorporado é recusado (evita contar a safra duas vezes).
+        """
+        from cafe.dados import ESQUEMA_FLOAT64, ler_csv
+
+        chave = hash_arquivo(caminho)
+        if chave in self.arquivos:
+            raise ValueError(f'{caminho} já foi incorporado ao estado')
+        self.atualizar(leitor(caminho) if leitor else ler_csv(caminho, ESQUEMA_FLOAT64))
+        self.arquivos.add(chave)
+        return self
+
+    # ====================
+    # RESULTADOS
+    # ====================
+
+    def _posicoes(self, nomes):
+        return [self.variaveis.index(v) for v in nomes]
+
+    def describe(self):
+        """
+        Mesma tabela de ``DataFrame.describe()``. Sem ``quartis_exatos``, os
+        quartis vêm do histograma (erro de até uma classe, limitados aos
+        extremos observados).
+        """
+        n = self.n
+        if self.quartis_exatos:
+            posicoes = (n - 1) * np.array([0.25, 0.5, 0.75])
+            baixo = np.floor(posicoes).astype(int)
+            alto = np.minimum(baixo + 1, n - 1)
+            fracao = posicoes - baixo
+            quartis = self.ordenados[:, baixo] * (1 - fracao) + self.ordenados[:, alto] * fracao
+        else:
+            quartis = _quantis_histograma(self.histograma, self.inicio_histograma,
+                                          self.largura_histograma, n, [0.25, 0.5, 0.75])
+            quartis = np.clip(quartis, self.minimo[:, None], self.maximo[:, None])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            desvio = np.sqrt(np.diag(self.C) / (n - 1))
+        return pd.DataFrame([np.full(len(self.variaveis), float(n)), self.media, desvio,
+                             self.minimo, *quartis.T, self.maximo],
+                            index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'],
+                            columns=self.variaveis)
+
+    def correlacao(self):
+        """Matriz de correlação de Pearson (como ``DataFrame.corr()``)."""
+        desvio = np.sqrt(np.diag(self.C))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = self.C / np.outer(desvio, desvio)
+        return pd.DataFrame(r, index=self.variaveis, columns=self.variaveis)
+
+    def _ols(self, n, media, C, alvo, regressores, rotulos=None):
+        r, (y,) = self._posicoes(regressores), self._posicoes([alvo])
+        return ols_momentos(n, media[:, r], media[:, y], C[:, r][:, :, r], C[:, r, y],
+                            C[:, y, y], nomes=['intercepto', *regressores], rotulos=rotulos)
+
+    def regressao(self, alvo=ALVO, regressores=None):
+        """Regressão linear múltipla; mesmo dicionário de ``estatistica.regress``."""
+        regressores = regressores or REGRESSORES
+        return self._ols(np.array([self.n]), self.media[None], self.C[None],
+                         alvo, regressores).resumo(alvo)
+
+    def medias_grupos(self):
+        """Médias por grupo (como ``estatistica.describe_grupos``)."""
+        return pd.DataFrame(self.media_grupos, index=self._rotulos(),
+                            columns=self.variaveis).sort_index()
+
+    def correlacao_grupos(self):
+        """Correlação de cada variável com o alvo por grupo (como ``correlate_grupos``)."""
+        (a,) = self._posicoes([ALVO])
+        outras = [i for i, v in enumerate(self.variaveis) if v != ALVO]
+        variancias = np.diagonal(self.C_grupos, axis1=1, axis2=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            r = self.C_grupos[:, a, outras] / np.sqrt(variancias[:, [a]] * variancias[:, outras])
+        return pd.DataFrame(r, index=self._rotulos(),
+                            columns=[self.variaveis[i] for i in outras]).sort_index()
+
+    def regressao_grupos(self, alvo=ALVO, regressores=None):
+        """Uma regressão por grupo em lote (como ``estatistica.regress_grupos``)."""
+        modelos = self._ols(self.n_grupos, self.media_grupos, self.C_grupos, alvo,
+                            regressores or REGRESSORES, self._rotulos())
+        return modelos.tabela().sort_index()
+
+    def _rotulos(self):
+        return pd.Index(self.grupos, name=self.por)
+
+    # ====================
+    # PERSISTÊNCIA
+    # ====================
+
+    def salvar(self, caminho):
+        """Grava o estado em ``.npz`` (substituição atômica)."""
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            'versao': VERSAO_ESTADO,
+            'variaveis': self.variaveis,
+            'por': self.por,
+            'quartis_exatos': self.quartis_exatos,
+            'grupos': self.grupos.tolist(),
+            'tipo_grupos': str(self.grupos.dtype),
+            'anos': sorted(self.anos),
+            'arquivos': sorted(self.arquivos)
+        }
+        fd, temporario = tempfile.mkstemp(dir=caminho.parent, prefix='.tmp-', suffix='.npz')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(meta, ensure_ascii=False)),
+                     n=self.n, media=self.media, C=self.C, minimo=self.minimo,
+                     maximo=self.maximo, ordenados=self.ordenados, histograma=self.histograma,
+                     inicio_histograma=self.inicio_histograma,
+                     largura_histograma=self.largura_histograma, n_grupos=self.n_grupos,
+                     media_grupos=self.media_grupos, C_grupos=self.C_grupos)
+        os.replace(temporario, caminho)
+
+    @classmethod
+    def carregar(cls, caminho):
+        with np.load(caminho) as arquivo:
+            meta = json.loads(str(arquivo['meta']))
+            if meta['versao'] != VERSAO_ESTADO:
+                raise ValueError(f'{caminho}: versão de estado {meta["versao"]} não suportada')
+            estado = cls(meta['variaveis'], meta['por'], meta['quartis_exatos'])
+            estado.n = int(arquivo['n'])
+            for nome in ('media', 'C', 'minimo', 'maximo', 'ordenados', 'histograma',
+                         'inicio_histograma', 'largura_histograma', 'n_grupos',
+                         'media_grupos', 'C_grupos'):
+                setattr(estado, nome, arquivo[nome])
+        # O tipo do índice de grupos ao salvar (objeto, ou texto no pandas 3)
+        estado.grupos = pd.Index(meta['grupos'], dtype=meta.get('tipo_grupos', object))
+        estado.anos = set(meta['anos'])
+        estado.arquivos = set(meta['arquivos'])
+        return estado
+
+
+# ====================
+# RELATÓRIO
+# ====================
+
+def relatorio(estado):
+    """Imprime descritivas, correlações e regressão a partir do estado."""
+    from cafe.estatistica import NOMES
+
+    print("=" * 80)
+    print("ESTATÍSTICAS INCREMENTAIS")
+    print("=" * 80)
+    print(f"Observações acumuladas: {estado.n}")
+    if estado.anos:
+        print(f"Período: {min(estado.anos)} - {max(estado.anos)}")
+    if estado.por:
+        print(f"Grupos ({estado.por}): {len(estado.grupos)}")
+    print()
+
+    print("1. ESTATÍSTICA DESCRITIVA")
+    print("-" * 80)
+    print(estado.describe().round(2).to_string())
+    print()
+
+    print("2. CORRELAÇÃO COM A PRODUTIVIDADE")
+    print("-" * 80)
+    correlacoes = estado.correlacao()[ALVO].drop(ALVO).sort_values(ascending=False)
+    for var, r in correlacoes.items():
+        print(f"  {NOMES.get(var, var)}: r = {r:.4f}")
+    print()
+
+    print("3. REGRESSÃO LINEAR MÚLTIPLA")
+    print("-" * 80)
+    resultado = estado.regressao()
+    print(f"Intercepto: {resultado['intercepto']:.4f}")
+    for var, coef in resultado['coeficientes'].items():
+        print(f"  {NOMES.get(var, var)}: {coef:.4f}")
+    print(f"R²: {resultado['r2']:.4f} | R² ajustado: {resultado['r2_ajustado']:.4f} | "
+          f"RMSE: {resultado['rmse']:.2f} | n = {resultado['n']}")
+    return estado
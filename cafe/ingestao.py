@@ -0,0 +1,470 @@
+# -*- coding: utf-8 -*-
+"""
+Montagem do painel municipal a partir das tabelas brutas das fontes.
+
+``metodologia_dataset.md`` descreve o dataset construído à mão a partir da
+PAM do IBGE, dos boletins da CONAB e de fontes regionais. Esta etapa lê as
+exportações dessas tabelas de um diretório (muitos arquivos anuais, CSV ou
+XLSX) e monta o painel no esquema do projeto (``cafe.dados.ESQUEMA``). O
+tipo de cada arquivo vem do prefixo do nome:
+
+* ``pam_*``: exportações do SIDRA (Tabela 1613, lavouras permanentes) com
+  área colhida e quantidade produzida de café por município. Aceita os
+  layouts longo (Ano, Variável, Valor) e largo (anos ou variáveis nas
+  colunas, com o ano ou a variável no cabeçalho do arquivo ou no nome);
+* ``conab_*``: totais de MG por safra (produção em mil sacas ou toneladas,
+  área colhida e, se houver, preço da saca);
+* ``regional_*``: tabelas por município, região ou ano com colunas do
+  esquema (clima, preço, índice tecnológico, região de cada município...).
+
+Os arquivos são lidos em paralelo (``cafe.paralelo``). A proporcionalização
+é feita sobre o array municípios x anos: a participação de cada município
+na PAM multiplica o total da CONAB do mesmo ano (nos anos ainda sem PAM,
+vale a última participação conhecida), e a produtividade é derivada como
+produção / área.
+"""
+
+import csv
+import re
+import time
+import unicodedata
+import warnings
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cafe.dados import ESQUEMA
+from cafe.estatistica import NOMES
+from cafe.grupos import empilhar
+from cafe.instrumentacao import medida
+from cafe.paralelo import executor
+
+# Prefixo do nome do arquivo -> fonte
+FONTES = ('pam', 'conab', 'regional')
+
+EXTENSOES = ('.csv', '.txt', '.xlsx', '.xls')
+
+# Variáveis da PAM (nome normalizado do SIDRA, por prefixo) -> coluna do esquema.
+# O rendimento médio da PAM é ignorado: a produtividade é derivada.
+VARIAVEIS_PAM = {
+    'area colhida': 'area_colhida_ha',
+    'quantidade produzida': 'producao_total_ton',
+}
+
+# Produto da PAM usado quando a exportação traz mais de um
+PRODUTO_PAM = 'cafe (em grao) total'
+
+# Símbolos do SIDRA: '-' é zero absoluto; os demais, dado ausente ou sigiloso
+ZERO_SIDRA = '-'
+
+# Primeiros dígitos do código IBGE dos municípios mantidos (31 = MG)
+UF_PADRAO = '31'
+
+# Toneladas por unidade de produção da CONAB
+TONELADAS = {'mil sacas': 60.0, 'sacas': 0.06, 'mil t': 1000.0, 't': 1.0}
+
+# Colunas-chave das tabelas (nome normalizado -> chave)
+CHAVES = {
+    'cod.': 'municipio_id', 'cod': 'municipio_id', 'codigo': 'municipio_id',
+    'municipio_id': 'municipio_id', 'municipio': 'municipio',
+    'regiao': 'regiao', 'mesorregiao': 'regiao', 'mesorregiao geografica': 'regiao',
+    'ano': 'ano', 'safra': 'ano', 'uf': 'uf'
+}
+
+# Casas decimais das medidas no painel (as mesmas de ``cafe.sintetico``)
+DECIMAIS = 4
+
+
+@dataclass
+class ResultadoIngestao:
+    painel: pd.DataFrame
+    arquivos: pd.DataFrame   # arquivo, fonte, linhas, tempo
+    sem_fonte: list          # colunas do esquema que nenhuma fonte trouxe
+    tempo: float
+
+
+def _normalizar(texto):
+    """Texto sem acentos, em minúsculas e com espaços simples."""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def _numero(valores):
+    """
+    Converte células de texto em float: '-' vira 0, os demais símbolos do
+    SIDRA ('..', '...', 'X') viram NaN e o formato '1.234,5' é aceito.
+    """
+    texto = pd.Series(valores, dtype=str).str.strip()
+    virgula = texto.str.contains(',', regex=False, na=False)
+    texto = texto.where(~virgula, texto.str.replace('.', '', regex=False)
+                        .str.replace(',', '.', regex=False))
+    numeros = pd.to_numeric(texto, errors='coerce').to_numpy(dtype=float)
+    return np.where((texto == ZERO_SIDRA).to_numpy(), 0.0, numeros)
+
+
+def _por_valor(serie, funcao):
+    """``serie.map(funcao)`` calculando ``funcao`` uma vez por valor distinto."""
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    return pd.Series([funcao(u) for u in unicos], dtype=object).to_numpy()[codigos]
+
+
+def _ano(texto):
+    """Primeiro ano (4 dígitos) do texto, ou None ('2023/24' -> 2023)."""
+    achado = re.search(r'(?<!\d)(19|20)\d{2}(?!\d)', str(texto))
+    return int(achado.group()) if achado else None
+
+
+# ====================
+# LEITURA DOS ARQUIVOS
+# ====================
+
+def _celulas(caminho):
+    """Linhas do arquivo como listas de células de texto (CSV, TXT ou planilha)."""
+    if caminho.suffix.lower() in ('.xlsx', '.xls'):
+        tabela = pd.read_excel(caminho, header=None, dtype=str)
+        return [[('' if pd.isna(c) else str(c)) for c in linha] for linha in tabela.to_numpy()]
+    bruto = caminho.read_bytes()
+    try:
+        texto = bruto.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        texto = bruto.decode('latin-1')
+    linhas = texto.splitlines()
+    amostra = '\n'.join(linhas[:50])
+    separador = max((';', '\t', ','), key=amostra.count)
+    return list(csv.reader(linhas, delimiter=separador))
+
+
+def _tabela(celulas):
+    """
+    Separa cabeçalho descritivo, linha de títulos e corpo de uma exportação.
+    A linha de títulos é a primeira com uma coluna-chave conhecida; o corpo
+    termina na primeira linha vazia ou de notas ('Fonte:', 'Notas').
+    Retorna (linhas do cabeçalho, DataFrame do corpo com títulos normalizados).
+    """
+    inicio = next((i for i, linha in enumerate(celulas)
+                   if any(_normalizar(c) in CHAVES for c in linha)), None)
+    if inicio is None:
+        raise ValueError('nenhuma coluna-chave (Cód., Município, Região, Ano) encontrada')
+    fim = inicio + 1
+    while fim < len(celulas):
+        primeira = _normalizar(celulas[fim][0]) if celulas[fim] else ''
+        if not any(str(c).strip() for c in celulas[fim]) or primeira.startswith(('fonte', 'nota')):
+            break
+        fim += 1
+    titulos = [str(c).strip() for c in celulas[inicio]]
+    usadas = [j for j, t in enumerate(titulos) if t]
+    corpo = pd.DataFrame([[linha[j] if j < len(linha) else '' for j in usadas]
+                          for linha in celulas[inicio + 1:fim]],
+                         columns=[titulos[j] for j in usadas], dtype=str)
+    cabecalho = [' '.join(str(c) for c in linha if str(c).strip()) for linha in celulas[:inicio]]
+    return cabecalho, corpo
+
+
+def _chaves(corpo):
+    """Renomeia as colunas-chave; as demais mantêm o título original."""
+    return corpo.rename(columns={c: CHAVES[_normalizar(c)] for c in corpo.columns
+                                 if _normalizar(c) in CHAVES})
+
+
+def _variavel_pam(texto):
+    """Coluna do esquema de uma variável da PAM, ou None."""
+    nome = _normalizar(texto)
+    return next((coluna for prefixo, coluna in VARIAVEIS_PAM.items()
+                 if nome.startswith(prefixo)), None)
+
+
+def _ler_pam(caminho, celulas):
+    """Exportação do SIDRA em formato longo (municipio_id, municipio, ano, variavel, valor)."""
+    cabecalho, corpo = _tabela(celulas)
+    corpo = _chaves(corpo).rename(columns=lambda c: _normalizar(c) if _normalizar(c) in
+                                  ('variavel', 'valor') else c)
+    # Metadados do cabeçalho ('Variável - Área colhida (Hectares)', 'Ano - 2020')
+    meta = {}
+    for linha in cabecalho:
+        chave, _, valor = linha.partition(' - ')
+        meta.setdefault(_normalizar(chave), valor.strip())
+    ano_meta = _ano(meta.get('ano', '')) or _ano(caminho.stem)
+
+    produto = next((c for c in corpo.columns if _normalizar(c).startswith('produto')), None)
+    if produto is not None:
+        nomes = pd.Series(_por_valor(corpo[produto], _normalizar), index=corpo.index)
+        if (nomes == PRODUTO_PAM).any():
+            corpo = corpo[nomes == PRODUTO_PAM]
+        corpo = corpo.drop(columns=produto)
+
+    ids = [c for c in ('municipio_id', 'municipio', 'ano', 'variavel') if c in corpo.columns]
+    if 'valor' not in corpo.columns:
+        demais = [c for c in corpo.columns if c not in ids]
+        # Anos nas colunas (variável no cabeçalho) ou variáveis nas colunas
+        nome = 'ano' if all(_ano(c) for c in demais) else 'variavel'
+        corpo = corpo.melt(id_vars=ids, value_vars=demais, var_name=nome, value_name='valor')
+    if 'ano' not in corpo.columns:
+        if ano_meta is None:
+            raise ValueError('ano ausente (nem coluna, nem cabeçalho, nem nome do arquivo)')
+        corpo['ano'] = ano_meta
+    if 'variavel' not in corpo.columns:
+        corpo['variavel'] = meta.get('variavel', '')
+
+    codigos = pd.to_numeric(corpo['municipio_id'], errors='coerce')
+    longo = pd.DataFrame({
+        'municipio_id': codigos,
+        'municipio': corpo['municipio'].str.replace(r'\s*\([A-Z]{2}\)\s*$', '', regex=True)
+        if 'municipio' in corpo.columns else '',
+        'ano': pd.to_numeric(_por_valor(corpo['ano'], _ano), errors='coerce'),
+        'variavel': _por_valor(corpo['variavel'], _variavel_pam),
+        'valor': _numero(corpo['valor'])
+    })
+    # Só municípios (código de 7 dígitos) e variáveis conhecidas
+    longo = longo[(longo['municipio_id'] >= 1_000_000) & longo['variavel'].notna()
+                  & longo['ano'].notna()]
+    return longo.astype({'municipio_id': np.int64, 'ano': np.int64})
+
+
+def _coluna_esquema(titulo):
+    """Coluna do esquema de um título (nome da coluna ou o rótulo de ``NOMES``), ou None."""
+    nome = _normalizar(titulo)
+    if nome in ESQUEMA:
+        return nome
+    return next((coluna for coluna, rotulo in NOMES.items() if _normalizar(rotulo) == nome),
+                None)
+
+
+def _ler_conab(caminho, celulas):
+    """Totais de MG por ano (ano, producao_total_ton, area_colhida_ha e colunas do esquema)."""
+    _, corpo = _tabela(celulas)
+    corpo = _chaves(corpo)
+    if 'uf' in corpo.columns:
+        corpo = corpo[corpo['uf'].map(_normalizar).isin(['mg', 'minas gerais'])]
+    tabela = pd.DataFrame({'ano': _por_valor(corpo['ano'], _ano)})
+    for titulo in corpo.columns:
+        nome = _normalizar(titulo)
+        coluna = _coluna_esquema(titulo)
+        fator = 1.0
+        if coluna is None and nome.startswith('producao'):
+            unidade = re.search(r'\((.*)\)', nome)
+            coluna = 'producao_total_ton'
+            fator = TONELADAS.get(unidade.group(1).strip() if unidade else 'mil sacas')
+            if fator is None:
+                raise ValueError(f'unidade de produção desconhecida: {titulo!r}')
+        elif coluna is None and nome.startswith('area'):
+            coluna, fator = 'area_colhida_ha', 1000.0 if 'mil ha' in nome else 1.0
+        elif coluna is None and nome.startswith('preco'):
+            coluna = 'preco_medio_saca_reais'
+        if coluna is not None and coluna not in ('ano', 'produtividade_kg_ha'):
+            tabela[coluna] = _numero(corpo[titulo]) * fator
+    return tabela.dropna(subset=['ano']).astype({'ano': np.int64})
+
+
+def _ler_regional(caminho, celulas):
+    """Tabela por município, região e/ou ano com colunas do esquema."""
+    corpo = _chaves(_tabela(celulas)[1])
+    tabela = pd.DataFrame(index=corpo.index)
+    if 'municipio_id' in corpo.columns:
+        tabela['municipio_id'] = pd.to_numeric(corpo['municipio_id'], errors='coerce')
+    if 'regiao' in corpo.columns:
+        tabela['regiao'] = corpo['regiao'].str.strip()
+    if 'ano' in corpo.columns:
+        tabela['ano'] = _por_valor(corpo['ano'], _ano)
+    for titulo in corpo.columns:
+        coluna = _coluna_esquema(titulo)
+        if coluna is not None and coluna not in CHAVES.values():
+            tabela[coluna] = _numero(corpo[titulo])
+    return tabela.dropna(subset=[c for c in ('municipio_id', 'ano') if c in tabela.columns])
+
+
+LEITORES = {'pam': _ler_pam, 'conab': _ler_conab, 'regional': _ler_regional}
+
+
+def fonte(caminho):
+    """Fonte do arquivo pelo prefixo do nome ('pam_2020.csv' -> 'pam'), ou None."""
+    prefixo = _normalizar(Path(caminho).stem).split('_')[0]
+    return prefixo if prefixo in FONTES else None
+
+
+def ler_arquivo(caminho):
+    """Lê um arquivo bruto. Retorna (fonte, tabela, segundos); roda nos processos do pool."""
+    inicio = time.perf_counter()
+    caminho = Path(caminho)
+    nome_fonte = fonte(caminho)
+    try:
+        tabela = LEITORES[nome_fonte](caminho, _celulas(caminho))
+    except (ValueError, KeyError) as erro:
+        raise ValueError(f'{caminho.name}: {erro}') from erro
+    return nome_fonte, tabela, time.perf_counter() - inicio
+
+
+def arquivos_fontes(diretorio):
+    """Arquivos reconhecidos do diretório (recursivo), em ordem de nome."""
+    return sorted(p for p in Path(diretorio).rglob('*')
+                  if p.is_file() and p.suffix.lower() in EXTENSOES and fonte(p))
+
+
+# ====================
+# MONTAGEM DO PAINEL
+# ====================
+
+def _ultima_valida(valores, validos):
+    """
+    Repete, ao longo do eixo dos anos (1), os valores dos últimos anos
+    válidos (``validos``: anos x colunas) nos anos seguintes sem dado.
+    """
+    T = valores.shape[1]
+    posicoes = np.where(validos, np.arange(T)[:, None], -1)
+    posicoes = np.maximum.accumulate(posicoes, axis=0)
+    repetidos = np.take_along_axis(valores, np.maximum(posicoes, 0)[None], axis=1)
+    return np.where(posicoes[None] >= 0, repetidos, np.nan)
+
+
+def proporcionalizar(pam, conab=None):
+    """
+    Painel (municipio_id, ano, producao_total_ton, area_colhida_ha,
+    produtividade_kg_ha) a partir da PAM municipal e dos totais estaduais
+    da CONAB: em cada ano com total da CONAB, o valor de cada município é a
+    sua participação na PAM vezes esse total; nos anos sem PAM, vale a
+    última participação do município. Sem CONAB, os valores da PAM.
+    """
+    colunas = list(VARIAVEIS_PAM.values())
+    largo = (pam.drop_duplicates(['municipio_id', 'ano', 'variavel'], keep='last')
+             .set_index(['municipio_id', 'ano', 'variavel'])['valor']
+             .unstack('variavel').reindex(columns=colunas).reset_index())
+    anos = largo['ano']
+    if conab is not None and len(conab):
+        anos = pd.concat([anos, conab['ano']])
+    calendario = np.arange(anos.min(), anos.max() + 1)
+    S, rotulos, _ = empilhar(largo, colunas, por='municipio_id', anos=calendario)
+
+    if conab is not None and len(conab):
+        estado = (conab.groupby('ano').last().reindex(index=calendario, columns=colunas)
+                  .to_numpy(dtype=float))
+        total = np.nansum(S, axis=0)
+        tem_pam = total > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            participacao = _ultima_valida(S / np.where(tem_pam, total, np.nan), tem_pam)
+        S = np.where(np.isfinite(estado)[None], participacao * estado[None], S)
+
+    area, producao = (S[:, :, colunas.index(c)] for c in ('area_colhida_ha', 'producao_total_ton'))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        produtividade = np.where(area > 0, producao * 1000 / area, np.nan)
+    G, T = S.shape[:2]
+    painel = pd.DataFrame({
+        'municipio_id': np.repeat(rotulos.to_numpy(), T),
+        'ano': np.tile(calendario, G),
+        'producao_total_ton': producao.ravel(),
+        'area_colhida_ha': area.ravel(),
+        'produtividade_kg_ha': produtividade.ravel()
+    })
+    return painel[painel[colunas].notna().any(axis=1)].reset_index(drop=True)
+
+
+def completar(painel, tabela):
+    """
+    Preenche as colunas do painel com uma tabela regional, pela chave mais
+    específica que ela tiver (municipio_id ou regiao) e pelo ano. Numa
+    tabela por município, a região é um valor (o mapa município -> região).
+    Valores já presentes no painel são mantidos.
+    """
+    chaves = [next((c for c in ('municipio_id', 'regiao') if c in tabela.columns), None)]
+    chaves = [c for c in chaves if c] + (['ano'] if 'ano' in tabela.columns else [])
+    if not chaves or not set(chaves) <= set(painel.columns):
+        warnings.warn(f'tabela regional sem chave no painel ({", ".join(tabela.columns)}); ignorada')
+        return painel
+    valores = [c for c in tabela.columns if c not in chaves]
+    tabela = tabela.drop_duplicates(chaves, keep='last')
+    juntado = painel[chaves].merge(tabela, on=chaves, how='left')
+    for coluna in valores:
+        painel[coluna] = (painel[coluna].fillna(juntado[coluna]) if coluna in painel.columns
+                          else juntado[coluna].to_numpy())
+    return painel
+
+
+def _especificidade(tabela):
+    """Ordem de aplicação das tabelas: por município, por região, por ano."""
+    return ('municipio_id' not in tabela.columns, 'regiao' not in tabela.columns)
+
+
+def montar(tabelas, uf=UF_PADRAO):
+    """
+    Painel no esquema do projeto a partir das tabelas lidas (dicionário
+    fonte -> lista de tabelas). ``uf`` filtra os municípios pelo início do
+    código IBGE (None mantém todos).
+    """
+    if not tabelas.get('pam'):
+        raise ValueError('nenhuma tabela da PAM (arquivos pam_*) encontrada')
+    pam = pd.concat(tabelas['pam'], ignore_index=True)
+    if uf:
+        pam = pam[pam['municipio_id'].astype(str).str.startswith(str(uf))]
+    conab = pd.concat(tabelas['conab'], ignore_index=True) if tabelas.get('conab') else None
+    painel = proporcionalizar(pam, conab)
+
+    nomes = pam.drop_duplicates('municipio_id', keep='last').set_index('municipio_id')['municipio']
+    painel.insert(1, 'municipio', painel['municipio_id'].map(nomes))
+
+    # Demais colunas da CONAB (ex.: preço) valem para todo o estado
+    regionais = list(tabelas.get('regional', []))
+    if conab is not None:
+        extras = [c for c in conab.columns if c not in ('ano', *VARIAVEIS_PAM.values())]
+        if extras:
+            regionais.append(conab[['ano', *extras]])
+    for tabela in sorted(regionais, key=_especificidade):
+        painel = completar(painel, tabela)
+
+    # Colunas na ordem e nos tipos do esquema
+    colunas = [c for c in ESQUEMA if c in painel.columns and painel[c].notna().any()]
+    painel = painel[colunas]
+    for coluna in colunas:
+        tipo = ESQUEMA[coluna]
+        if tipo.startswith('int') and painel[coluna].isna().any():
+            warnings.warn(f'{coluna} incompleta nas fontes; coluna descartada')
+            painel = painel.drop(columns=coluna)
+        elif tipo.startswith('float'):
+            painel[coluna] = painel[coluna].round(DECIMAIS).astype(tipo)
+        else:
+            painel[coluna] = painel[coluna].astype(tipo)
+    return painel.sort_values(['municipio_id', 'ano'], ignore_index=True)
+
+
+@medida('ingestao')
+def ingerir(diretorio, uf=UF_PADRAO, n_jobs=None):
+    """
+    Lê em paralelo os arquivos brutos de ``diretorio`` e monta o painel.
+    Retorna ``ResultadoIngestao``.
+    """
+    inicio = time.perf_counter()
+    arquivos = arquivos_fontes(diretorio)
+    if not arquivos:
+        raise ValueError(f'nenhum arquivo pam_*, conab_* ou regional_* em {diretorio}')
+    tabelas, registros = {}, []
+    with executor(n_jobs, n_tarefas=len(arquivos)) as pool:
+        lidos = pool.map(ler_arquivo, arquivos, chunksize=max(1, len(arquivos) // 64))
+        for caminho, (nome_fonte, tabela, segundos) in zip(arquivos, lidos):
+            tabelas.setdefault(nome_fonte, []).append(tabela)
+            registros.append((str(caminho.relative_to(diretorio)), nome_fonte, len(tabela),
+                              segundos))
+    painel = montar(tabelas, uf)
+    return ResultadoIngestao(
+        painel=painel,
+        arquivos=pd.DataFrame(registros, columns=['arquivo', 'fonte', 'linhas', 'tempo']),
+        sem_fonte=[c for c in ESQUEMA if c not in painel.columns],
+        tempo=time.perf_counter() - inicio
+    )
+
+
+def relatorio(resultado, caminho=None):
+    """Imprime o resumo da ingestão e grava o painel em ``caminho`` (CSV)."""
+    painel, arquivos = resultado.painel, resultado.arquivos
+    print("INGESTÃO DAS FONTES")
+    print("-" * 80)
+    resumo = arquivos.groupby('fonte').agg(arquivos=('arquivo', 'size'), linhas=('linhas', 'sum'),
+                                          tempo=('tempo', 'sum'))
+    print(resumo.round(2).to_string())
+    print(f"\nPainel: {painel['municipio_id'].nunique()} municípios, "
+          f"{painel['ano'].min()}-{painel['ano'].max()}, {len(painel)} linhas "
+          f"em {resultado.tempo:.1f} s")
+    if resultado.sem_fonte:
+        print(f"Colunas sem fonte: {', '.join(resultado.sem_fonte)}")
+    if caminho is not None:
+        painel.to_csv(caminho, index=False)
+        print(f"\n✓ Painel salvo em: {caminho}")
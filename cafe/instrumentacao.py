@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentação das etapas: tempo de parede, tempo de CPU, pico de memória
+e número de linhas de cada etapa de uma execução, num relatório JSON.
+
+As etapas são marcadas com ``etapa`` (gerenciador de contexto) ou
+``medida`` (decorador) e só são medidas dentro de uma ``execucao``; fora
+dela o custo é uma verificação. Etapas podem ser aninhadas (a varredura de
+K dentro do cluster, as figuras dentro dos gráficos).
+
+* CPU: tempo de usuário e de sistema do processo e dos processos filhos
+  encerrados na etapa (os do pool de ``cafe.paralelo``);
+* pico de memória: no Linux o pico do processo (VmHWM) é zerado no início
+  de cada etapa (``/proc/self/clear_refs``), então é o pico da própria
+  etapa; nos outros sistemas é o pico do processo até o fim da etapa
+  (``ru_maxrss``).
+
+Perfis opcionais por etapa: ``perfilar`` grava o cProfile da etapa em
+``perfil_<etapa>.prof`` e guarda no relatório as funções de maior tempo
+acumulado; ``alocacoes`` liga o tracemalloc e guarda o pico de memória
+alocada pelo Python e as linhas que mais alocaram. Só um cProfile fica
+ativo por vez: uma etapa perfilada dentro de outra entra no perfil da
+externa (o relatório aponta qual). Com o pool de processos, o trabalho dos processos filhos não aparece nesses perfis
+(use ``n_jobs=1``).
+"""
+
+import functools
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+# Relatório de cada comando, gravado no diretório de saída
+ARQUIVO_RELATORIO = 'relatorio_execucao_{comando}.json'
+
+# Funções e linhas de alocação guardadas no relatório por etapa perfilada
+TOPO_PERFIL = 15
+
+# Execução ativa (ver ``execucao``)
+_EXECUCAO = None
+
+
+@dataclass
+class MedicaoEtapa:
+    """Medidas de uma etapa."""
+    nome: str
+    pai: str                  # etapa que a contém ('' no nível superior)
+    linhas: int = None
+    tempo: float = 0.0        # parede, em segundos
+    cpu: float = 0.0          # usuário + sistema, processo e filhos
+    pico_mb: float = None     # pico de memória residente da etapa
+    extras: dict = field(default_factory=dict)
+
+
+@dataclass
+class Execucao:
+    """Etapas medidas de uma execução e o relatório JSON."""
+    comando: str
+    perfilar: set = field(default_factory=set)    # etapas com cProfile ('todas' = todas)
+    alocacoes: set = field(default_factory=set)   # etapas com tracemalloc
+    saida: Path = Path('.')                       # diretório dos arquivos .prof
+    etapas: list = field(default_factory=list)    # [MedicaoEtapa], na ordem de término
+    inicio: float = field(default_factory=time.perf_counter)
+    _abertas: list = field(default_factory=list)  # pilha de (nome, pico acumulado)
+    _perfilando: str = ''                         # etapa com o cProfile ativo
+
+    def total(self):
+        return time.perf_counter() - self.inicio
+
+    def tabela(self):
+        """DataFrame etapa x (pai, linhas, tempo, cpu, pico_mb)."""
+        import pandas as pd
+        return pd.DataFrame([{k: v for k, v in asdict(m).items() if k != 'extras'}
+                             for m in self.etapas])
+
+    def salvar(self, caminho):
+        caminho = Path(caminho)
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        conteudo = {
+            'comando': self.comando,
+            'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'nucleos': os.cpu_count(),
+            'argumentos': sys.argv[1:],
+            'tempo_total': round(self.total(), 4),
+            'pico_processo_mb': _arredondar(pico_processo_mb()),
+            'etapas': [{k: _arredondar(v) for k, v in asdict(m).items()} for m in self.etapas]
+        }
+        caminho.write_text(json.dumps(conteudo, indent=2, ensure_ascii=False))
+        return caminho
+
+
+def _arredondar(valor):
+    return round(valor, 4) if isinstance(valor, float) else valor
+
+
+# ====================
+# MEMÓRIA E CPU
+# ====================
+
+def _status():
+    """Campos de /proc/self/status em kB (vazio fora do Linux)."""
+    try:
+        with open('/proc/self/status') as f:
+            return {linha.split(':')[0]: int(linha.split()[1]) for linha in f
+                    if linha.startswith(('VmHWM', 'VmRSS'))}
+    except (OSError, ValueError, IndexError):
+        return {}
+
+
+def pico_processo_mb():
+    """Pico de memória residente do processo desde o início (MB)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss em KB no Linux e em bytes no macOS
+    escala = 2**20 if platform.system() == 'Darwin' else 2**10
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / escala
+
+
+def pico_mb():
+    """Pico de memória residente desde o último ``reiniciar_pico`` (MB)."""
+    status = _status()
+    if 'VmHWM' in status:
+        return status['VmHWM'] / 1024
+    return pico_processo_mb()
+
+
+def reiniciar_pico():
+    """Zera o pico do processo (Linux: VmHWM passa a ser o residente atual)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def tempo_cpu():
+    """Tempo de CPU do processo e dos filhos já encerrados."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+# ====================
+# ETAPAS
+# ====================
+
+@contextmanager
+def execucao(comando='', perfilar=(), alocacoes=(), saida='.'):
+    """
+    Ativa a medição das etapas. ``perfilar`` e ``alocacoes`` são nomes de
+    etapas (ou 'todas') com cProfile e tracemalloc; os ``.prof`` vão para
+    ``saida``. Produz a ``Execucao``.
+    """
+    global _EXECUCAO
+    anterior = _EXECUCAO
+    _EXECUCAO = Execucao(comando, set(perfilar or ()), set(alocacoes or ()), Path(saida))
+    try:
+        yield _EXECUCAO
+    finally:
+        _EXECUCAO = anterior
+
+
+def ativa():
+    """A ``Execucao`` ativa, ou None."""
+    return _EXECUCAO
+
+
+def _escolhida(nome, conjunto):
+    return 'todas' in conjunto or nome in conjunto
+
+
+def _resumo_perfil(perfilador, nome, diretorio):
+    import io
+    import pstats
+
+    diretorio.mkdir(parents=True, exist_ok=True)
+    arquivo = diretorio / f"perfil_{nome.replace('/', '_')}.prof"
+    perfilador.dump_stats(arquivo)
+    estatisticas = pstats.Stats(perfilador, stream=io.StringIO())
+    funcoes = []
+    for (caminho, linha, funcao), (_, chamadas, _, acumulado, _) in sorted(
+            estatisticas.stats.items(), key=lambda item: -item[1][3])[:TOPO_PERFIL]:
+        funcoes.append({'funcao': f'{Path(caminho).name}:{linha}({funcao})',
+                        'chamadas': chamadas, 'acumulado': round(acumulado, 4)})
+    return {'arquivo': str(arquivo), 'funcoes': funcoes}
+
+
+def _resumo_alocacoes(tracemalloc):
+    _, pico = tracemalloc.get_traced_memory()
+    linhas = tracemalloc.take_snapshot().statistics('lineno')[:TOPO_PERFIL]
+    return {'pico_python_mb': round(pico / 2**20, 3),
+            'linhas': [{'linha': f'{Path(s.traceback[0].filename).name}:{s.traceback[0].lineno}',
+                        'mb': round(s.size / 2**20, 3)} for s in linhas]}
+
+
+@contextmanager
+def etapa(nome, linhas=None, **extras):
+    """
+    Mede o bloco como a etapa ``nome`` da execução ativa. Produz o
+    dicionário ``extras``, gravado no relatório (a chave 'linhas' troca o
+    número de linhas), ou None sem execução ativa.
+    """
+    ex = _EXECUCAO
+    if ex is None:
+        yield None
+        return
+
+    pai = ex._abertas[-1][0] if ex._abertas else ''
+    perfilador = None
+    if _escolhida(nome, ex.perfilar):
+        if ex._perfilando:
+            # Um segundo cProfile substituiria o externo (3.11) ou falharia (3.12+)
+            extras['perfil'] = {'incluido_em': ex._perfilando}
+        else:
+            import cProfile
+            perfilador = cProfile.Profile()
+            ex._perfilando = nome
+    rastreando = False
+    if _escolhida(nome, ex.alocacoes):
+        import tracemalloc
+        rastreando = not tracemalloc.is_tracing()
+        if rastreando:
+            tracemalloc.start()
+
+    try:
+        with medicao(nome) as medidas:
+            if perfilador is not None:
+                perfilador.enable()
+            try:
+                yield extras
+            finally:
+                if perfilador is not None:
+                    perfilador.disable()
+                    ex._perfilando = ''
+    finally:
+        if perfilador is not None:
+            extras['perfil'] = _resumo_perfil(perfilador, nome, ex.saida)
+        if rastreando:
+            extras['alocacoes'] = _resumo_alocacoes(tracemalloc)
+            tracemalloc.stop()
+        linhas = extras.pop('linhas', linhas)
+        ex.etapas.append(MedicaoEtapa(nome, pai, linhas, medidas.get('tempo'),
+                                      medidas.get('cpu'), medidas.get('pico_mb'), extras))
+
+
+def _acumular_pico(valor):
+    """Leva um pico medido à etapa aberta (o contador do processo vai ser zerado)."""
+    ex = _EXECUCAO
+    if ex is not None and ex._abertas and valor:
+        ex._abertas[-1][1] = max(ex._abertas[-1][1], valor)
+
+
+@contextmanager
+def medicao(nome=''):
+    """
+    Tempo, CPU e pico de memória de um bloco, sem registrá-lo (ex.: uma
+    figura no processo que a desenha). Produz um dicionário preenchido
+    com ``tempo``, ``cpu`` e ``pico_mb`` ao fim do bloco.
+    """
+    # O pico da etapa que contém o bloco é guardado antes de zerar o contador
+    _acumular_pico(pico_mb())
+    ex = _EXECUCAO
+    quadro = [nome, 0.0]
+    if ex is not None:
+        ex._abertas.append(quadro)
+    reiniciar_pico()
+    medidas = {}
+    inicio, cpu = time.perf_counter(), tempo_cpu()
+    try:
+        yield medidas
+    finally:
+        tempo, cpu = time.perf_counter() - inicio, tempo_cpu() - cpu
+        # Inclui os picos das etapas internas, que zeraram o contador
+        pico = max(pico_mb() or 0, quadro[1]) or None
+        if ex is not None:
+            ex._abertas.remove(quadro)
+        _acumular_pico(pico)
+        medidas.update(tempo=tempo, cpu=cpu, pico_mb=pico)
+
+
+def registrar(nome, tempo, cpu=0.0, pico=None, linhas=None, **extras):
+    """
+    Acrescenta à execução ativa uma etapa medida em outro processo (ex.:
+    uma figura desenhada no pool), como filha da etapa aberta.
+    """
+    ex = _EXECUCAO
+    if ex is None:
+        return
+    pai = ex._abertas[-1][0] if ex._abertas else ''
+    ex.etapas.append(MedicaoEtapa(nome, pai, linhas, tempo, cpu, pico, extras))
+
+
+def _linhas(objeto):
+    """Linhas de um DataFrame/array ou de um resultado com ``n_linhas``."""
+    forma = getattr(objeto, 'shape', None)
+    if forma:
+        return int(forma[0])
+    return getattr(objeto, 'n_linhas', None)
+
+
+def medida(nome):
+    """
+    Decorador: mede cada chamada como a etapa ``nome``. As linhas vêm do
+    primeiro argumento (DataFrame ou array) ou, se ele não tiver, do
+    resultado.
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            if _EXECUCAO is None:
+                return funcao(*args, **kwargs)
+            linhas = _linhas(args[0]) if args else None
+            with etapa(nome, linhas) as extras:
+                resultado = funcao(*args, **kwargs)
+                if linhas is None:
+                    extras['linhas'] = _linhas(resultado)
+            return resultado
+        return envoltorio
+    return decorador
+
+
+def comparar(anterior, atual):
+    """
+    Compara dois relatórios de execução (caminhos dos JSON): DataFrame por
+    etapa com tempo, CPU e pico de cada um e a razão dos tempos. Etapas
+    repetidas (ex.: a ANOVA de várias variáveis) são somadas; o pico é o
+    maior.
+    """
+    import pandas as pd
+
+    def resumo(caminho):
+        etapas = pd.DataFrame(json.loads(Path(caminho).read_text())['etapas'])
+        return etapas.groupby('nome', sort=False).agg(
+            tempo=('tempo', 'sum'), cpu=('cpu', 'sum'), pico_mb=('pico_mb', 'max'))
+
+    tabela = resumo(anterior).join(resumo(atual), how='outer', lsuffix='_anterior',
+                                   rsuffix='_atual', sort=False)
+    tabela['razao'] = tabela['tempo_atual'] / tabela['tempo_anterior']
+    return tabela
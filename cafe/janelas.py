@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Estatísticas em janelas móveis de anos, para todas as séries de uma vez.
+
+Cada janela é resumida por somas correntes (n, x, y, x², y², xy) que
+deslizam um ano por vez: o ano que entra é somado e o que sai é subtraído.
+Cada passo custa O(1) por série, e as G séries do painel avançam juntas
+como vetores, sem recalcular ``linregress`` a cada janela. As séries são
+centradas na sua média antes das somas, para que x² e xy não percam
+precisão por cancelamento.
+
+* ``correlacao_movel``: correlação e reta (inclinação e intercepto) entre
+  ``indice_tecnologico`` e ``produtividade_kg_ha`` (o par do Gráfico 2) em
+  janelas de 5 e 7 anos;
+* ``estatisticas_moveis``: média e volatilidade móveis do preço (desvio das
+  variações anuais em log) e do clima (desvio dos níveis).
+"""
+
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cafe.estatistica import ALVO, NOMES
+from cafe.grupos import empilhar
+from cafe.instrumentacao import medida
+
+JANELAS = (5, 7)
+
+# Par (x, y) da correlação móvel (Gráfico 2)
+PAR_CORRELACAO = ('indice_tecnologico', ALVO)
+
+# Variável -> medida de volatilidade: 'retorno' (variação anual em log) ou 'nivel'
+VOLATILIDADE = {
+    'preco_medio_saca_reais': 'retorno',
+    'temperatura_media_c': 'nivel',
+    'precipitacao_mm': 'nivel'
+}
+
+# Anos válidos mínimos numa janela para que ela seja resumida
+MINIMO_OBSERVACOES = 3
+
+
+@dataclass
+class ResultadoJanelas:
+    """Tabelas longas das janelas móveis (uma linha por grupo, janela e ano final)."""
+    correlacao: pd.DataFrame    # grupo, janela, ano_final, n, correlacao, inclinacao, intercepto
+    estatisticas: pd.DataFrame  # grupo, janela, ano_final, variavel, n, media, volatilidade
+    tempo: float
+
+
+# ====================
+# SOMAS CORRENTES
+# ====================
+
+def somas_moveis(colunas, janela):
+    """
+    Somas de cada janela de ``janela`` anos: ``colunas`` é uma lista de
+    arrays (G, T) e o resultado (len(colunas), G, T) traz, na posição t, a
+    soma dos anos t - janela + 1 .. t (NaN antes da primeira janela
+    completa). Uma passagem pelos anos, somando o que entra e subtraindo o
+    que sai da janela.
+    """
+    termos = np.stack(colunas)
+    saida = np.full(termos.shape, np.nan)
+    somas = np.zeros(termos.shape[:2])
+    for t in range(termos.shape[2]):
+        somas += termos[:, :, t]
+        if t >= janela:
+            somas -= termos[:, :, t - janela]
+        if t >= janela - 1:
+            saida[:, :, t] = somas
+    return saida
+
+
+def momentos_moveis(X, Y=None, janela=5):
+    """
+    Momentos das janelas móveis de todas as séries ``X`` (e ``Y``), arrays
+    (G, T) com NaN nos anos ausentes. Retorna dicionário de arrays (G, T),
+    indexados pelo último ano da janela: ``n``, ``media_x``, ``var_x`` e,
+    com ``Y``, ``media_y``, ``var_y`` e ``cov``. Janelas com menos de
+    ``MINIMO_OBSERVACOES`` anos válidos ficam NaN.
+    """
+    validos = np.isfinite(X) if Y is None else np.isfinite(X) & np.isfinite(Y)
+    pares = [X] if Y is None else [X, Y]
+    contagem = np.maximum(validos.sum(axis=1, keepdims=True), 1)
+    centros, centradas = [], []
+    for serie in pares:
+        centro = np.where(validos, serie, 0.0).sum(axis=1, keepdims=True) / contagem
+        centros.append(centro)
+        centradas.append(np.where(validos, serie - centro, 0.0))
+
+    colunas = [validos.astype(float), *centradas, *(c * c for c in centradas)]
+    if Y is not None:
+        colunas.append(centradas[0] * centradas[1])
+    somas = somas_moveis(colunas, janela)
+
+    n = somas[0]
+    suficiente = n >= MINIMO_OBSERVACOES
+    with np.errstate(invalid='ignore', divide='ignore'):
+        medias = [np.where(suficiente, s / n, np.nan) for s in somas[1:1 + len(pares)]]
+        # Somas de quadrados centradas na média da janela (não negativas)
+        quadrados = [np.maximum(q - n * m ** 2, 0) for q, m in zip(somas[1 + len(pares):], medias)]
+        saida = {'n': np.where(np.isnan(n), 0, n).astype(int),
+                 'media_x': medias[0] + centros[0], 'var_x': quadrados[0] / (n - 1)}
+        if Y is not None:
+            saida['media_y'] = medias[1] + centros[1]
+            saida['var_y'] = quadrados[1] / (n - 1)
+            saida['cov'] = (somas[5] - n * medias[0] * medias[1]) / (n - 1)
+    return saida
+
+
+# ====================
+# TABELAS
+# ====================
+
+def _vazia(rotulos, colunas):
+    """Tabela longa sem linhas, com as mesmas colunas (nenhuma janela cabe no calendário)."""
+    return pd.DataFrame(columns=[rotulos.name or 'grupo', 'janela', 'ano_final', *colunas])
+
+
+def _longa(rotulos, anos, janela, colunas):
+    """Tabela longa (grupo, janela, ano_final, ...) das janelas completas."""
+    inicio = janela - 1
+    G, T = len(rotulos), len(anos) - inicio
+    tabela = pd.DataFrame({
+        rotulos.name or 'grupo': np.repeat(rotulos.to_numpy(), T),
+        'janela': janela,
+        'ano_final': np.tile(anos[inicio:], G)
+    })
+    for nome, valores in colunas.items():
+        tabela[nome] = valores[:, inicio:].ravel()
+    return tabela
+
+
+def correlacao_movel(df, janelas=JANELAS, x=PAR_CORRELACAO[0], y=PAR_CORRELACAO[1], por=None):
+    """
+    Correlação de Pearson e reta de ``y`` sobre ``x`` em cada janela móvel,
+    para cada grupo (``por``; padrão: ``municipio_id`` no modo painel).
+    """
+    S, rotulos, anos = empilhar(df, [x, y], por)
+    partes = []
+    for janela in janelas:
+        if janela > len(anos):
+            continue
+        m = momentos_moveis(S[:, :, 0], S[:, :, 1], janela)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlacao = np.clip(m['cov'] / np.sqrt(m['var_x'] * m['var_y']), -1, 1)
+            inclinacao = m['cov'] / m['var_x']
+        partes.append(_longa(rotulos, anos, janela, {
+            'n': m['n'],
+            'correlacao': correlacao,
+            'inclinacao': inclinacao,
+            'intercepto': m['media_y'] - inclinacao * m['media_x']
+        }))
+    if not partes:
+        return _vazia(rotulos, ['n', 'correlacao', 'inclinacao', 'intercepto'])
+    return pd.concat(partes, ignore_index=True)
+
+
+def estatisticas_moveis(df, janelas=JANELAS, variaveis=None, por=None):
+    """
+    Média e volatilidade móveis de cada variável (``VOLATILIDADE``): para
+    'retorno', o desvio padrão das variações anuais em log dentro da
+    janela; para 'nivel', o desvio padrão dos valores.
+    """
+    variaveis = {v: m for v, m in (variaveis or VOLATILIDADE).items() if v in df.columns}
+    S, rotulos, anos = empilhar(df, list(variaveis), por)
+    partes = []
+    for janela in janelas:
+        if janela > len(anos):
+            continue
+        for j, (variavel, medida_volatilidade) in enumerate(variaveis.items()):
+            X = S[:, :, j]
+            m = momentos_moveis(X, janela=janela)
+            if medida_volatilidade == 'retorno':
+                # As janela - 1 variações entre anos da própria janela
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    retornos = np.full_like(X, np.nan)
+                    retornos[:, 1:] = np.log(X[:, 1:] / X[:, :-1])
+                volatilidade = momentos_moveis(retornos, janela=janela - 1)['var_x']
+            else:
+                volatilidade = m['var_x']
+            tabela = _longa(rotulos, anos, janela, {
+                'n': m['n'], 'media': m['media_x'], 'volatilidade': np.sqrt(volatilidade)})
+            tabela.insert(3, 'variavel', variavel)
+            partes.append(tabela)
+    if not partes:
+        return _vazia(rotulos, ['variavel', 'n', 'media', 'volatilidade'])
+    return pd.concat(partes, ignore_index=True)
+
+
+@medida('janelas')
+def analisar(df, janelas=JANELAS, por=None):
+    """
+    Correlação móvel e estatísticas móveis de todas as séries. Janelas mais
+    longas que o calendário são ignoradas; se nenhuma couber, ``ValueError``.
+    """
+    inicio = time.perf_counter()
+    anos = int(df['ano'].max()) - int(df['ano'].min()) + 1 if len(df) else 0
+    if not any(janela <= anos for janela in janelas):
+        raise ValueError(f"nenhuma janela ({', '.join(map(str, janelas))} anos) cabe nos "
+                         f"{anos} ano(s) dos dados")
+    return ResultadoJanelas(correlacao=correlacao_movel(df, janelas, por=por),
+                            estatisticas=estatisticas_moveis(df, janelas, por=por),
+                            tempo=time.perf_counter() - inicio)
+
+
+def resumo(tabela, colunas, por=('janela',)):
+    """Mediana entre os grupos de cada ano final (o próprio valor na série única)."""
+    return tabela.groupby([*por, 'ano_final'])[colunas].median().unstack(list(por))
+
+
+# ====================
+# RELATÓRIO
+# ====================
+
+def relatorio(resultado, saida=None):
+    """Imprime a correlação e as estatísticas móveis e grava as tabelas em ``saida``."""
+    x, y = PAR_CORRELACAO
+    grupos = resultado.correlacao.iloc[:, 0].nunique() if len(resultado.correlacao) else 0
+    print(f"JANELAS MÓVEIS: {NOMES[x]} x {NOMES[y]}")
+    print("-" * 80)
+    if not len(resultado.correlacao):
+        print("Nenhuma janela cabe no calendário dos dados")
+    else:
+        janelas = sorted(resultado.correlacao['janela'].unique())
+        print(f"{grupos} série(s), janelas de {', '.join(map(str, janelas))} "
+              f"anos, em {resultado.tempo:.2f} s")
+        if grupos > 1:
+            print("Valores: mediana entre os municípios")
+
+        print("\nCorrelação e inclinação por ano final da janela:")
+        print(resumo(resultado.correlacao, ['correlacao', 'inclinacao']).round(4).to_string())
+
+    for variavel, tabela in resultado.estatisticas.groupby('variavel', sort=False):
+        medida_volatilidade = VOLATILIDADE.get(variavel, 'nivel')
+        print(f"\n{NOMES.get(variavel, variavel)}: média e volatilidade "
+              f"({'variação anual em log' if medida_volatilidade == 'retorno' else 'desvio padrão'}):")
+        print(resumo(tabela, ['media', 'volatilidade']).round(4).to_string())
+
+    if saida is not None:
+        from pathlib import Path
+        saida = Path(saida)
+        saida.mkdir(parents=True, exist_ok=True)
+        resultado.correlacao.to_csv(saida / 'janelas_correlacao.csv', index=False)
+        resultado.estatisticas.to_csv(saida / 'janelas_estatisticas.csv', index=False)
+        print(f"\n✓ Tabelas salvas em: {saida / 'janelas_correlacao.csv'} e "
+              f"{saida / 'janelas_estatisticas.csv'}")
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Execução em pool de processos compartilhada pelas etapas pesadas.
+
+Os dados grandes (matrizes de observações) são entregues uma única vez a
+cada processo pelo ``initializer``, e não a cada tarefa. Com um único
+processo as tarefas rodam no próprio processo, pelo mesmo código, sem o
+custo de criar o pool.
+"""
+
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+
+def n_processos(n_jobs=None):
+    """
+    Número de processos: ``None``/0 usa todos os núcleos; valores negativos
+    contam a partir do total (-1 = todos, -2 = todos menos um).
+    """
+    total = os.cpu_count() or 1
+    if not n_jobs:
+        return total
+    if n_jobs < 0:
+        return max(1, total + 1 + n_jobs)
+    return n_jobs
+
+
+class ExecutorSerial:
+    """Executor com a interface de ``concurrent.futures`` que roda no processo atual."""
+
+    def __init__(self, initializer=None, initargs=()):
+        if initializer is not None:
+            initializer(*initargs)
+
+    def submit(self, funcao, *args, **kwargs):
+        futuro = Future()
+        try:
+            futuro.set_result(funcao(*args, **kwargs))
+        except BaseException as erro:
+            futuro.set_exception(erro)
+        return futuro
+
+    def map(self, funcao, *iteraveis, chunksize=1):
+        return map(funcao, *iteraveis)
+
+    def shutdown(self, wait=True):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def _inicializar_processo(initializer, initargs):
+    # Um thread de BLAS/OpenMP por processo evita disputa entre os processos
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def executor(n_jobs=None, initializer=None, initargs=(), n_tarefas=None):
+    """
+    Pool de processos (ou ``ExecutorSerial`` com um só processo).
+
+    ``n_tarefas`` limita o número de processos ao número de tarefas.
+    """
+    n = n_processos(n_jobs)
+    if n_tarefas is not None:
+        n = min(n, n_tarefas)
+    if n <= 1:
+        return ExecutorSerial(initializer, initargs)
+    return ProcessPoolExecutor(max_workers=n, initializer=_inicializar_processo,
+                               initargs=(initializer, initargs))
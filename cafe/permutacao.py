@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+ANOVA e Kruskal–Wallis por permutação, vetorizados.
+
+Com grupos pequenos (3 a 7 anos por região) as hipóteses da distribuição F
+são frágeis. O teste de permutação não depende delas: o p-valor é a fração
+das reatribuições aleatórias dos rótulos de grupo com estatística pelo
+menos tão grande quanto a observada.
+
+Os tamanhos dos grupos não mudam sob permutação, e com a soma total fixa o
+F é função crescente de ``T = Σ_g S_g² / n_g`` (``S_g`` = soma dos valores
+centrados do grupo ``g``); o H de Kruskal–Wallis é a mesma função aplicada
+aos postos. Por isso cada bloco de permutações sorteia uma matriz (b, n) de
+índices embaralhados, reúne as linhas de todas as variáveis e de seus postos
+de uma vez (dados ordenados por grupo) e obtém as somas por grupo de todas
+as permutações com um único ``reduceat``. Nenhum F é recalculado variável a
+variável.
+
+Os blocos são distribuídos pelo pool de processos (``cafe.paralelo``) quando
+o painel é grande, com sementes de ``np.random.SeedSequence``: o resultado é
+o mesmo para qualquer ``n_jobs``.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cafe.dados import flutuante
+from cafe.paralelo import executor
+
+PERMUTACOES_PADRAO = 9999
+
+# Abaixo de n x permutações o pool de processos custa mais do que economiza
+LIMITE_PARALELO = 50_000_000
+
+# Memória máxima das linhas reunidas de cada bloco de permutações
+MEMORIA_PADRAO = 32
+
+# Dados de cada processo (ver _inicializar)
+_Z = None
+_FRONTEIRAS = None
+_TAMANHOS = None
+_OBSERVADO = None
+
+
+def _postos(valores):
+    """Postos médios de cada coluna e fator de correção de empates de Kruskal–Wallis."""
+    from scipy.stats import rankdata
+
+    postos = rankdata(valores, axis=0)
+    n = len(valores)
+    correcao = np.empty(valores.shape[1])
+    for j in range(valores.shape[1]):
+        _, empates = np.unique(valores[:, j], return_counts=True)
+        correcao[j] = 1 - np.sum(empates ** 3 - empates) / (n ** 3 - n)
+    return postos, correcao
+
+
+def _estatistica(somas, tamanhos):
+    """T = Σ_g S_g² / n_g de cada coluna (somas: (..., k, m))."""
+    return np.einsum('...gm,g->...m', somas ** 2, 1 / tamanhos)
+
+
+def _inicializar(Z, fronteiras, tamanhos, observado):
+    global _Z, _FRONTEIRAS, _TAMANHOS, _OBSERVADO
+    _Z, _FRONTEIRAS, _TAMANHOS, _OBSERVADO = Z, fronteiras, tamanhos, observado
+
+
+def _tarefa(semente, b):
+    """Quantas das b permutações igualam ou superam T observado, por coluna."""
+    n = len(_Z)
+    rng = np.random.default_rng(semente)
+    indices = rng.permuted(np.broadcast_to(np.arange(n, dtype=np.intp), (b, n)), axis=1)
+    # O maior grupo (o último) não é reunido: com os dados centrados, sua
+    # soma é menos a soma dos demais
+    corte = n - int(_TAMANHOS[-1])
+    somas = np.add.reduceat(np.take(_Z, indices[:, :corte], axis=0), _FRONTEIRAS[:-1], axis=1)
+    somas = np.concatenate([somas, -somas.sum(axis=1, keepdims=True)], axis=1)
+    return (_estatistica(somas, _TAMANHOS) >= _OBSERVADO).sum(axis=0)
+
+
+def anova_permutacao(indice, valores, nomes=None, permutacoes=PERMUTACOES_PADRAO, semente=42,
+                     n_jobs=None, memoria_mb=MEMORIA_PADRAO):
+    """
+    ANOVA de um fator e Kruskal–Wallis de cada coluna de ``valores`` (n, m)
+    entre os grupos do ``indice`` (``cafe.grupos.IndiceGrupos``), com todas
+    as colunas testadas na mesma passagem.
+
+    Retorna um DataFrame (colunas de ``valores`` x ``F``, ``p_valor``, ``p_f``,
+    ``H``, ``p_kruskal``, ``p_qui2``): ``p_valor`` e ``p_kruskal`` são os
+    p-valores de permutação, ``(1 + #{T* >= T}) / (permutacoes + 1)``;
+    ``p_f`` e ``p_qui2`` os das distribuições assintóticas (iguais aos de
+    ``scipy.stats.f_oneway`` e ``kruskal``). Com ``permutacoes=0`` os
+    p-valores de permutação ficam NaN.
+
+    ``n_jobs=None`` usa o pool só quando n x permutações passa de
+    ``LIMITE_PARALELO``.
+    """
+    from scipy import stats
+
+    valores = flutuante(valores)
+    if valores.ndim == 1:
+        valores = valores[:, None]
+    n, m = valores.shape
+    k = indice.n_grupos
+    if not 2 <= k < n:
+        raise ValueError('a ANOVA exige entre 2 e n-1 grupos')
+    nomes = list(nomes or range(m))
+
+    # Variáveis e postos, centrados (soma total zero) e ordenados por grupo,
+    # do menor para o maior grupo
+    postos, correcao = _postos(valores)
+    Z = np.column_stack([valores, postos])
+    Z = Z - Z.mean(axis=0)
+    ordem_grupos = np.argsort(indice.contagens, kind='stable')
+    posicao = np.empty(k, dtype=np.intp)
+    posicao[ordem_grupos] = np.arange(k)
+    Z = np.ascontiguousarray(Z[np.argsort(posicao[indice.codigos], kind='stable')])
+    contagens = indice.contagens[ordem_grupos]
+    tamanhos = contagens.astype(float)
+    fronteiras = np.concatenate(([0], np.cumsum(contagens)[:-1]))
+
+    observado = _estatistica(np.add.reduceat(Z, fronteiras, axis=0), tamanhos)
+    total = np.einsum('im,im->m', Z, Z)
+
+    gl_entre, gl_dentro = k - 1, n - k
+    with np.errstate(invalid='ignore', divide='ignore'):
+        f_stat = (observado[:m] / gl_entre) / ((total[:m] - observado[:m]) / gl_dentro)
+        h_stat = 12 / (n * (n + 1)) * observado[m:] / correcao
+
+    p_perm = np.full(2 * m, np.nan)
+    if permutacoes > 0:
+        if n_jobs is None and n * permutacoes < LIMITE_PARALELO:
+            n_jobs = 1
+        bloco = max(1, int(memoria_mb * 2**20 / (8 * n * 2 * m)))
+        blocos = [min(bloco, permutacoes - i) for i in range(0, permutacoes, bloco)]
+        sementes = np.random.SeedSequence(semente).spawn(len(blocos))
+        # Tolerância de arredondamento: a própria partição observada deve contar
+        limiar = observado - 1e-10 * total
+        with executor(n_jobs, _inicializar, (Z, fronteiras, tamanhos, limiar),
+                      n_tarefas=len(blocos)) as pool:
+            excedentes = sum(pool.map(_tarefa, sementes, blocos))
+        p_perm = (1 + excedentes) / (permutacoes + 1)
+        # Variável constante: nenhuma estatística a testar
+        p_perm[np.tile(total[:m], 2) == 0] = np.nan
+
+    return pd.DataFrame({
+        'F': f_stat,
+        'p_valor': p_perm[:m],
+        'p_f': stats.f.sf(f_stat, gl_entre, gl_dentro),
+        'H': h_stat,
+        'p_kruskal': p_perm[m:],
+        'p_qui2': stats.chi2.sf(h_stat, gl_entre)
+    }, index=pd.Index(nomes))
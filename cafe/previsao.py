@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+Previsão em lote da produtividade (ou de outra variável) de cada município.
+
+As séries são empilhadas em um array (G, T) por grupo e ano do calendário
+completo, com NaN nos anos ausentes, e cada modelo é ajustado a todas as
+séries de uma vez, sem um laço por município:
+
+* ``tendencia``: tendência linear com componente bienal (o ciclo de safra
+  alta e baixa do café), MQO em lote pelas equações normais empilhadas;
+* ``suavizacao``: suavização exponencial de Holt (nível e tendência
+  aditivos). Os parâmetros (alfa, beta) de cada série são escolhidos numa
+  grade, e todas as combinações da grade são filtradas juntas, um ano por
+  vez;
+* ``regressao``: regressão sobre ``indice_tecnologico`` e o clima. Nos anos
+  previstos o índice segue a tendência linear da série e o clima fica na
+  média do período. O intervalo não inclui a incerteza dessas projeções.
+
+Os intervalos de previsão usam t de Student (MQO) ou a variância analítica
+do modelo de Holt. ``validar`` refaz o ajuste sem os últimos anos e mede o
+erro e a cobertura dos intervalos nesses anos.
+"""
+
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cafe.estatistica import ALVO, NOMES
+from cafe.grupos import empilhar
+from cafe.instrumentacao import medida
+
+MODELOS = ('tendencia', 'suavizacao', 'regressao')
+
+HORIZONTE_PADRAO = 5
+
+# Regressores do modelo de regressão e sua projeção nos anos previstos
+REGRESSORES_PREVISAO = {
+    'indice_tecnologico': 'tendencia',
+    'temperatura_media_c': 'media',
+    'precipitacao_mm': 'media'
+}
+
+# Grade de parâmetros da suavização de Holt
+ALFAS = np.linspace(0.05, 0.95, 19)
+BETAS = np.array([0.0, 0.05, 0.1, 0.2, 0.3, 0.5])
+
+# Séries filtradas por vez na suavização (estados: bloco x grade)
+SERIES_BLOCO = 4096
+
+
+@dataclass
+class ResultadoPrevisao:
+    """Previsões de G séries nos anos seguintes, por modelo (arrays G x H)."""
+    variavel: str
+    rotulos: pd.Index       # grupos (municípios)
+    anos: np.ndarray        # anos previstos (H,)
+    previsao: dict          # modelo -> (G, H)
+    inferior: dict          # modelo -> (G, H)
+    superior: dict          # modelo -> (G, H)
+    rmse: dict              # modelo -> (G,) erro quadrático médio do ajuste
+    confianca: float
+    tempo: float
+
+    def __len__(self):
+        return len(self.rotulos)
+
+    @property
+    def modelos(self):
+        return list(self.previsao)
+
+    def tabela(self):
+        """Formato longo: grupo, ano, modelo, previsao, inferior, superior."""
+        G, H = len(self.rotulos), len(self.anos)
+        partes = []
+        for modelo in self.modelos:
+            partes.append(pd.DataFrame({
+                self.rotulos.name or 'grupo': np.repeat(self.rotulos.to_numpy(), H),
+                'ano': np.tile(self.anos, G),
+                'modelo': modelo,
+                'previsao': self.previsao[modelo].ravel(),
+                'inferior': self.inferior[modelo].ravel(),
+                'superior': self.superior[modelo].ravel()
+            }))
+        return pd.concat(partes, ignore_index=True)
+
+    def resumo(self):
+        """Mediana, P10 e P90 das previsões entre os grupos, por modelo e ano."""
+        linhas = {}
+        for modelo in self.modelos:
+            with np.errstate(invalid='ignore'):
+                p10, p50, p90 = np.nanquantile(self.previsao[modelo], [0.1, 0.5, 0.9], axis=0)
+            for h, ano in enumerate(self.anos):
+                linhas[(modelo, ano)] = (p50[h], p10[h], p90[h])
+        tabela = pd.DataFrame(list(linhas.values()), columns=['mediana', 'p10', 'p90'])
+        tabela.index = pd.MultiIndex.from_tuples(linhas, names=['modelo', 'ano'])
+        return tabela
+
+
+# ====================
+# MÍNIMOS QUADRADOS EM LOTE
+# ====================
+
+def _desenho_tendencia(anos, centro):
+    """Colunas intercepto, ano centrado e bienalidade (+1 nos anos pares)."""
+    return np.column_stack([np.ones(len(anos)), anos - centro,
+                            np.where(anos % 2 == 0, 1.0, -1.0)])
+
+
+def _mqo(X, Y):
+    """
+    MQO de cada série: ``X`` (G, T, p) e ``Y`` (G, T), com NaN nos anos
+    ausentes. Retorna coeficientes (G, p), (X'X)⁻¹ (G, p, p), variância dos
+    resíduos (G,) e graus de liberdade (G,).
+    """
+    validos = np.isfinite(Y) & np.isfinite(X).all(axis=2)
+    Xm = np.where(validos[:, :, None], X, 0.0)
+    Ym = np.where(validos, Y, 0.0)
+    # Séries curtas ou com anos ausentes podem ter X'X singular
+    inversas = np.linalg.pinv(np.einsum('gtp,gtq->gpq', Xm, Xm))
+    beta = np.einsum('gpq,gq->gp', inversas, np.einsum('gtq,gt->gq', Xm, Ym))
+    beta[validos.sum(axis=1) < X.shape[2]] = np.nan
+    residuos = Ym - np.einsum('gtp,gp->gt', Xm, np.nan_to_num(beta))
+    gl = validos.sum(axis=1) - X.shape[2]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma2 = np.where(gl > 0, np.einsum('gt,gt->g', residuos, residuos) / gl, np.nan)
+    return beta, inversas, sigma2, gl
+
+
+def _rmse(Y, ajustado):
+    with np.errstate(invalid='ignore'):
+        return np.sqrt(np.nanmean((Y - ajustado) ** 2, axis=1))
+
+
+def _intervalo_mqo(X0, beta, inversas, sigma2, gl, confianca):
+    """Previsão (G, H) e limites do intervalo t para as linhas futuras ``X0`` (G, H, p)."""
+    from scipy import stats
+
+    previsto = np.einsum('ghp,gp->gh', X0, beta)
+    alavanca = np.einsum('ghp,gpq,ghq->gh', X0, inversas, X0)
+    with np.errstate(invalid='ignore'):
+        erro = np.sqrt(sigma2[:, None] * (1 + alavanca))
+        q = stats.t.ppf(0.5 + confianca / 2, np.where(gl > 0, gl, np.nan))[:, None]
+    return previsto, previsto - q * erro, previsto + q * erro
+
+
+# ====================
+# MODELOS
+# ====================
+
+def _tendencia(S, anos, futuros, confianca):
+    """Tendência linear com componente bienal, ajustada a todas as séries."""
+    Y = S[:, :, 0]
+    centro = anos.mean()
+    X = np.broadcast_to(_desenho_tendencia(anos, centro), Y.shape + (3,))
+    beta, inversas, sigma2, gl = _mqo(X, Y)
+    X0 = np.broadcast_to(_desenho_tendencia(futuros, centro), (len(Y), len(futuros), 3))
+    previsto, inferior, superior = _intervalo_mqo(X0, beta, inversas, sigma2, gl, confianca)
+    return previsto, inferior, superior, _rmse(Y, np.einsum('gtp,gp->gt', X, beta))
+
+
+def _filtrar_holt(Y, inicial, alfa, beta):
+    """
+    Filtra as séries ``Y`` (g, T) com cada par (alfa, beta) da grade e
+    devolve, para o par de menor soma dos erros de um passo, nível e
+    tendência finais, posição do par e a soma dos erros.
+    """
+    nivel = np.repeat((inicial[:, 0] - inicial[:, 1])[:, None], len(alfa), axis=1)
+    tendencia = np.repeat(inicial[:, 1][:, None], len(alfa), axis=1)
+    sse = np.zeros_like(nivel)
+    for t in range(Y.shape[1]):
+        previsto = nivel + tendencia
+        observado = np.isfinite(Y[:, t])[:, None]
+        erro = np.where(observado, Y[:, t, None] - previsto, 0.0)
+        sse += erro ** 2
+        nivel = previsto + alfa * erro
+        tendencia = tendencia + alfa * beta * erro
+    melhor = np.argmin(sse, axis=1)
+    linhas = np.arange(len(Y))
+    return nivel[linhas, melhor], tendencia[linhas, melhor], melhor, sse[linhas, melhor]
+
+
+def _suavizacao(S, anos, futuros, confianca):
+    """
+    Holt aditivo na forma de correção de erros. Cada série é filtrada com
+    todas as combinações (alfa, beta) da grade ao mesmo tempo, e fica a de
+    menor soma dos erros de um passo. As séries são filtradas em blocos de
+    ``SERIES_BLOCO``, o que limita a memória a bloco x grade estados.
+    """
+    from scipy import stats
+
+    Y = S[:, :, 0]
+    alfa, beta = (v.ravel() for v in np.meshgrid(ALFAS, BETAS))
+    # Estado inicial: reta ajustada à série (nível no ano anterior ao primeiro)
+    X = np.broadcast_to(np.column_stack([np.ones(len(anos)), np.arange(len(anos))]),
+                        Y.shape + (2,))
+    inicial = _mqo(X, Y)[0]
+    partes = [_filtrar_holt(Y[i:i + SERIES_BLOCO], inicial[i:i + SERIES_BLOCO], alfa, beta)
+              for i in range(0, len(Y), SERIES_BLOCO)]
+    nivel, tendencia, melhor, sse = (np.concatenate(v) for v in zip(*partes))
+    a, b = alfa[melhor], beta[melhor]
+    h = np.arange(1, len(futuros) + 1)
+    previsto = nivel[:, None] + h * tendencia[:, None]
+
+    # Variância do erro h passos à frente: sigma² (1 + soma alfa² (1 + j beta)², j < h)
+    n = np.isfinite(Y).sum(axis=1)
+    gl = n - 4
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma2 = np.where(gl > 0, sse / gl, np.nan)
+        rmse = np.sqrt(sse / n)
+    termos = a[:, None] ** 2 * (1 + np.arange(len(futuros))[None, :] * b[:, None]) ** 2
+    termos[:, 0] = 0
+    erro = np.sqrt(sigma2[:, None] * (1 + np.cumsum(termos, axis=1)))
+    z = stats.norm.ppf(0.5 + confianca / 2)
+    return previsto, previsto - z * erro, previsto + z * erro, rmse
+
+
+def _projetar_regressores(R, anos, futuros, projecoes):
+    """Regressores (G, H, r) nos anos previstos: tendência linear ou média do período."""
+    centro = anos.mean()
+    X = np.broadcast_to(np.column_stack([np.ones(len(anos)), anos - centro]),
+                        R.shape[:2] + (2,))
+    X0 = np.column_stack([np.ones(len(futuros)), futuros - centro])
+    futuros_R = np.empty((len(R), len(futuros), R.shape[2]))
+    for j, projecao in enumerate(projecoes):
+        if projecao == 'tendencia':
+            futuros_R[:, :, j] = _mqo(X, R[:, :, j])[0] @ X0.T
+        else:
+            with np.errstate(invalid='ignore'):
+                futuros_R[:, :, j] = np.nanmean(R[:, :, j], axis=1)[:, None]
+    return futuros_R
+
+
+def _regressao(S, anos, futuros, confianca, projecoes):
+    """Regressão sobre tecnologia e clima, com os regressores projetados."""
+    Y, R = S[:, :, 0], S[:, :, 1:]
+    X = np.concatenate([np.ones(Y.shape + (1,)), R], axis=2)
+    beta, inversas, sigma2, gl = _mqo(X, Y)
+    R0 = _projetar_regressores(R, anos, futuros, projecoes)
+    X0 = np.concatenate([np.ones(R0.shape[:2] + (1,)), R0], axis=2)
+    previsto, inferior, superior = _intervalo_mqo(X0, beta, inversas, sigma2, gl, confianca)
+    return previsto, inferior, superior, _rmse(Y, np.einsum('gtp,gp->gt', X, beta))
+
+
+# ====================
+# PONTO DE ENTRADA
+# ====================
+
+def _regressores(df, variavel):
+    return {c: p for c, p in REGRESSORES_PREVISAO.items() if c in df.columns and c != variavel}
+
+
+def _ajustar(S, anos, futuros, modelos, confianca, projecoes):
+    saidas = {}
+    for modelo in modelos:
+        if modelo == 'tendencia':
+            saidas[modelo] = _tendencia(S[:, :, :1], anos, futuros, confianca)
+        elif modelo == 'suavizacao':
+            saidas[modelo] = _suavizacao(S[:, :, :1], anos, futuros, confianca)
+        elif modelo == 'regressao':
+            saidas[modelo] = _regressao(S, anos, futuros, confianca, projecoes)
+        else:
+            raise ValueError(f"modelo desconhecido: {modelo!r} (opções: {', '.join(MODELOS)})")
+    return saidas
+
+
+@medida('previsao')
+def prever(df, variavel=ALVO, horizonte=HORIZONTE_PADRAO, modelos=MODELOS, confianca=0.95,
+           por=None):
+    """
+    Previsão de ``variavel`` nos ``horizonte`` anos seguintes ao último ano
+    do dataset, para cada município (``por``; padrão: ``municipio_id`` no
+    modo painel, série única na série anual), com os ``modelos`` pedidos.
+    """
+    inicio = time.perf_counter()
+    projecoes = _regressores(df, variavel)
+    S, rotulos, anos = empilhar(df, [variavel, *projecoes], por)
+    futuros = np.arange(anos[-1] + 1, anos[-1] + 1 + horizonte)
+    saidas = _ajustar(S, anos, futuros, modelos, confianca, list(projecoes.values()))
+    return ResultadoPrevisao(
+        variavel=variavel, rotulos=rotulos, anos=futuros,
+        previsao={m: s[0] for m, s in saidas.items()},
+        inferior={m: s[1] for m, s in saidas.items()},
+        superior={m: s[2] for m, s in saidas.items()},
+        rmse={m: s[3] for m, s in saidas.items()},
+        confianca=confianca, tempo=time.perf_counter() - inicio)
+
+
+def validar(df, variavel=ALVO, anos_teste=3, modelos=MODELOS, confianca=0.95, por=None):
+    """
+    Validação fora da amostra: ajusta sem os últimos ``anos_teste`` anos e
+    compara as previsões desses anos com os valores observados.
+
+    Retorna DataFrame modelo x (mae, mape, cobertura), agregado sobre todas
+    as séries; ``cobertura`` é a fração dos valores dentro do intervalo.
+    """
+    projecoes = _regressores(df, variavel)
+    S, _, anos = empilhar(df, [variavel, *projecoes], por)
+    if len(anos) - anos_teste < 4:
+        raise ValueError('a validação exige ao menos 4 anos de ajuste')
+    corte = len(anos) - anos_teste
+    saidas = _ajustar(S[:, :corte], anos[:corte], anos[corte:], modelos, confianca,
+                      list(projecoes.values()))
+    observado = S[:, corte:, 0]
+    tabela = {}
+    for modelo, (previsto, inferior, superior, _) in saidas.items():
+        validos = np.isfinite(observado) & np.isfinite(previsto)
+        erro = np.abs(previsto - observado)[validos]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tabela[modelo] = {
+                'mae': erro.mean() if erro.size else np.nan,
+                'mape': np.mean(erro / np.abs(observado[validos])) if erro.size else np.nan,
+                'cobertura': np.mean((observado[validos] >= inferior[validos])
+                                     & (observado[validos] <= superior[validos]))
+                if erro.size else np.nan
+            }
+    return pd.DataFrame.from_dict(tabela, orient='index')
+
+
+# ====================
+# RELATÓRIO
+# ====================
+
+def relatorio(resultado, validacao=None, caminho=None):
+    """Imprime as previsões (e a validação) e grava a tabela longa em ``caminho``."""
+    nome = NOMES.get(resultado.variavel, resultado.variavel)
+    print(f"PREVISÃO: {nome}, {resultado.anos[0]}-{resultado.anos[-1]}")
+    print("-" * 80)
+    print(f"{len(resultado)} série(s) e {len(resultado.modelos)} modelo(s) ajustados em "
+          f"{resultado.tempo:.2f} s; intervalos de {resultado.confianca:.0%}")
+
+    if validacao is not None:
+        print("\nValidação fora da amostra (erro nos últimos anos, ajuste sem eles):")
+        print(validacao.round(4).to_string())
+
+    if len(resultado) == 1:
+        for modelo in resultado.modelos:
+            print(f"\n{modelo} (RMSE do ajuste: {resultado.rmse[modelo][0]:.2f}):")
+            for h, ano in enumerate(resultado.anos):
+                print(f"  {ano}: {resultado.previsao[modelo][0, h]:10.2f}  "
+                      f"[{resultado.inferior[modelo][0, h]:10.2f}; "
+                      f"{resultado.superior[modelo][0, h]:10.2f}]")
+    else:
+        print("\nPrevisões entre as séries (mediana, P10 e P90):")
+        print(resultado.resumo().round(2).to_string())
+
+    if caminho is not None:
+        resultado.tabela().to_csv(caminho, index=False)
+        print(f"\n✓ Previsões salvas em: {caminho}")
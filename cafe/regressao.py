@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Regressão linear (MQO) em lote, com inferência.
+
+Muitas regressões com os mesmos regressores (uma por região ou por
+município) são resolvidas de uma vez pelas equações normais empilhadas:
+as somas de produtos centradas de cada grupo formam ``Sxx`` (G, p, p) e
+``Sxy`` (G, p), e um único ``np.linalg.solve``/``inv`` em lote dá os
+coeficientes e ``(X'X)⁻¹`` de todos os grupos. Centrar as variáveis na
+média do grupo mantém o sistema bem condicionado com regressores de escalas
+diferentes (precipitação em mm, índice de 0 a 10).
+
+O núcleo (``ols_momentos``) parte só dessas estatísticas suficientes, e por
+isso também serve ao estado incremental (``cafe.incremental``).
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cafe.dados import flutuante
+from cafe.grupos import IndiceGrupos
+
+
+@dataclass
+class ResultadoOLS:
+    """
+    Resultado de G regressões. Arrays com uma linha por grupo; nas colunas
+    de coeficientes, a primeira é o intercepto (ver ``nomes``).
+    """
+    nomes: list                 # ['intercepto', *regressores]
+    coeficientes: np.ndarray    # (G, p+1)
+    erros_padrao: np.ndarray    # (G, p+1)
+    t: np.ndarray               # (G, p+1)
+    p_valores: np.ndarray       # (G, p+1), bicaudais
+    r2: np.ndarray              # (G,)
+    r2_ajustado: np.ndarray     # (G,)
+    rmse: np.ndarray            # (G,) raiz de SQ resíduos / n
+    n: np.ndarray               # (G,)
+    gl: np.ndarray              # (G,) graus de liberdade dos resíduos
+    rotulos: object = None      # pd.Index dos grupos, se houver
+
+    def __len__(self):
+        return len(self.n)
+
+    def tabela(self):
+        """Grupos x (coeficientes, r2, r2_ajustado, rmse, n)."""
+        tabela = pd.DataFrame(self.coeficientes, index=self.rotulos, columns=self.nomes)
+        tabela['r2'] = self.r2
+        tabela['r2_ajustado'] = self.r2_ajustado
+        tabela['rmse'] = self.rmse
+        tabela['n'] = self.n
+        return tabela
+
+    def coeficientes_grupo(self, g=0):
+        """Tabela coeficiente / erro padrão / t / p-valor de um grupo."""
+        return pd.DataFrame({
+            'coeficiente': self.coeficientes[g],
+            'erro_padrao': self.erros_padrao[g],
+            't': self.t[g],
+            'p_valor': self.p_valores[g]
+        }, index=self.nomes)
+
+    def resumo(self, alvo, g=0):
+        """Dicionário de uma regressão (formato de ``estatistica.regress``)."""
+        regressores = self.nomes[1:]
+        return {
+            'alvo': alvo,
+            'intercepto': float(self.coeficientes[g, 0]),
+            'coeficientes': dict(zip(regressores, self.coeficientes[g, 1:].tolist())),
+            'erros_padrao': dict(zip(self.nomes, self.erros_padrao[g].tolist())),
+            'estatisticas_t': dict(zip(self.nomes, self.t[g].tolist())),
+            'p_valores': dict(zip(self.nomes, self.p_valores[g].tolist())),
+            'r2': float(self.r2[g]),
+            'r2_ajustado': float(self.r2_ajustado[g]),
+            'rmse': float(self.rmse[g]),
+            'n': int(self.n[g])
+        }
+
+    def proporcao_significativa(self, alfa=0.05):
+        """Fração dos grupos ajustados com p < alfa, por coeficiente."""
+        ajustados = np.isfinite(self.p_valores[:, 0])
+        if not ajustados.any():
+            return pd.Series(np.nan, index=self.nomes)
+        return pd.Series((self.p_valores[ajustados] < alfa).mean(axis=0), index=self.nomes)
+
+
+def _inversas(Sxx):
+    """(Sxx)⁻¹ de cada grupo; pseudo-inversa em lote se algum for singular."""
+    try:
+        return np.linalg.inv(Sxx)
+    except np.linalg.LinAlgError:
+        return np.linalg.pinv(Sxx)
+
+
+def _resolver(n, Sxx, Sxy):
+    """Coeficientes angulares e (Sxx)⁻¹ dos grupos com observações suficientes."""
+    G, p = Sxy.shape
+    validos = np.asarray(n) - p - 1 > 0
+    beta = np.full((G, p), np.nan)
+    inversas = np.full((G, p, p), np.nan)
+    if validos.any():
+        inversas[validos] = _inversas(Sxx[validos])
+        beta[validos] = np.einsum('gij,gj->gi', inversas[validos], Sxy[validos])
+    return validos, beta, inversas
+
+
+def _inferencia(n, media_x, media_y, Syy, beta, inversas, validos, ss_res, nomes, rotulos):
+    from scipy import stats
+
+    n = np.asarray(n, dtype=float)
+    p = media_x.shape[1]
+    nomes = list(nomes or ['intercepto', *[f'x{j + 1}' for j in range(p)]])
+    gl = n - p - 1
+    intercepto = media_y - np.einsum('gi,gi->g', media_x, beta)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma2 = np.where(validos, ss_res / gl, np.nan)
+        ep_beta = np.sqrt(sigma2[:, None] * np.diagonal(inversas, axis1=1, axis2=2))
+        ep_intercepto = np.sqrt(sigma2 * (1 / n + np.einsum('gi,gij,gj->g', media_x,
+                                                             inversas, media_x)))
+        coeficientes = np.column_stack([intercepto, beta])
+        erros = np.column_stack([ep_intercepto, ep_beta])
+        t = coeficientes / erros
+        r2 = np.where(validos, 1 - ss_res / Syy, np.nan)
+        r2_ajustado = 1 - (1 - r2) * (n - 1) / gl
+        rmse = np.where(validos, np.sqrt(ss_res / n), np.nan)
+    p_valores = 2 * stats.t.sf(np.abs(t), gl[:, None])
+    return ResultadoOLS(nomes=nomes, coeficientes=coeficientes, erros_padrao=erros, t=t,
+                        p_valores=p_valores, r2=r2, r2_ajustado=r2_ajustado, rmse=rmse,
+                        n=n.astype(int), gl=gl.astype(int), rotulos=rotulos)
+
+
+def ols_momentos(n, media_x, media_y, Sxx, Sxy, Syy, nomes=None, rotulos=None):
+    """
+    MQO com intercepto a partir das estatísticas suficientes de cada grupo:
+    ``n`` (G,), médias ``media_x`` (G, p) e ``media_y`` (G,), somas de
+    produtos centradas ``Sxx`` (G, p, p), ``Sxy`` (G, p) e ``Syy`` (G,).
+
+    A soma dos quadrados dos resíduos sai de ``Syy - b'Sxy``. Grupos com
+    até p + 1 observações recebem NaN.
+    """
+    validos, beta, inversas = _resolver(n, Sxx, Sxy)
+    ss_res = np.maximum(Syy - np.einsum('gi,gi->g', np.nan_to_num(beta), Sxy), 0.0)
+    return _inferencia(n, media_x, media_y, Syy, beta, inversas, validos, ss_res, nomes, rotulos)
+
+
+def ols(X, y, indice=None, nomes=None):
+    """
+    Ajusta ``y ~ X`` (com intercepto) em cada grupo do ``indice`` (um
+    ``cafe.grupos.IndiceGrupos``) ou, sem índice, em todas as linhas.
+
+    Os resíduos são calculados linha a linha (uma passagem) para que R² e
+    erros padrão não percam precisão quando o ajuste é quase perfeito.
+    """
+    # Colunas float32 não são convertidas: os desvios X - média já saem em float64
+    X = flutuante(X)
+    y = flutuante(y)
+    rotulos = None if indice is None else indice.rotulos
+    if indice is None:
+        indice = IndiceGrupos(np.zeros(len(X), dtype=np.intp))
+    codigos = indice.codigos
+    media_x, media_y = indice.media(X), indice.media(y)
+    Xc, yc = X - media_x[codigos], y - media_y[codigos]
+    Sxx = indice.momentos_cruzados(Xc)
+    Sxy = indice.momentos_cruzados(Xc, yc[:, None])[:, :, 0]
+    Syy = indice.soma(yc ** 2)
+    n = indice.contagens
+
+    validos, beta, inversas = _resolver(n, Sxx, Sxy)
+    residuos = yc - np.einsum('ij,ij->i', Xc, np.nan_to_num(beta)[codigos])
+    return _inferencia(n, media_x, media_y, Syy, beta, inversas, validos, indice.soma(residuos ** 2),
+                       nomes, rotulos)
@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+"""
+Pipeline de renderização dos gráficos.
+
+Cada figura é uma tarefa declarada (``Tarefa``): o recorte de dados, a
+função de desenho e a especificação do arquivo (nome, conjunto de estilo e
+resolução). A maior parte do tempo vai para a rasterização do Agg, e as
+figuras são independentes, então as tarefas são desenhadas num pool de
+processos (``cafe.paralelo``) com o backend Agg, sem tela. Cada processo
+importa matplotlib uma única vez e recebe as tarefas em lotes.
+
+O perfil de renderização (``PERFIS``) vale para toda a passagem: dpi,
+formato do arquivo e recorte justo (``bbox_inches='tight'``, que custa uma
+segunda passagem de desenho). ``rascunho`` grava PNG de baixa resolução
+sem o recorte, para iterar no estilo; ``publicacao`` é o PNG de 300 dpi do
+artigo; ``vetorial`` grava PDF (ou SVG) com o texto como texto.
+
+Cada figura tem uma chave de conteúdo: o hash do recorte de dados, do
+código da função de desenho (e das funções e constantes do pacote que ela
+usa), das ``rcParams`` do seu estilo, do perfil e das versões do pacote e
+do matplotlib. O PNG desenhado é guardado no cache (``<CAFE_CACHE>/graficos``)
+sob essa chave; numa nova execução, as figuras cujas chaves já estão no
+cache são copiadas sem desenhar. Acrescentar um ano ou corrigir um
+município redesenha apenas as figuras cujos dados mudaram. O cache é
+limitado a ``LIMITE_CACHE_MB``: ao fim de cada passagem, as figuras usadas
+há mais tempo são removidas (``podar``).
+
+O resultado é um ``Manifesto`` com os arquivos gerados, o tamanho, o tempo
+de desenho e a origem (cache ou desenho) de cada figura, gravado em
+``manifesto_graficos.json``.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import types
+import warnings
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+
+from cafe import instrumentacao
+from cafe.dados import diretorio_cache
+from cafe.paralelo import executor, n_processos
+
+ARQUIVO_MANIFESTO = 'manifesto_graficos.json'
+
+# Tamanho máximo (MB) de <CAFE_CACHE>/graficos; as figuras usadas há mais
+# tempo saem primeiro
+LIMITE_CACHE_MB = 2048
+
+
+@dataclass
+class Perfil:
+    """Como as figuras de uma passagem são gravadas."""
+    dpi: int
+    formato: str                                # 'png', 'pdf' ou 'svg'
+    recorte: bool                               # bbox_inches='tight'
+    rc: dict = field(default_factory=dict)      # rcParams adicionais
+
+
+PERFIS = {
+    'rascunho': Perfil(72, 'png', False),
+    'publicacao': Perfil(300, 'png', True),
+    'vetorial': Perfil(300, 'pdf', True, {'pdf.fonttype': 42, 'svg.fonttype': 'none'}),
+}
+
+PERFIL_PADRAO = 'publicacao'
+
+
+def perfil(nome=None, formato=None):
+    """
+    Perfil pelo nome (padrão: ``$CAFE_PERFIL`` ou 'publicacao'), com o
+    formato do arquivo opcionalmente trocado (ex.: 'vetorial' em SVG).
+    """
+    nome = nome or os.environ.get('CAFE_PERFIL') or PERFIL_PADRAO
+    if nome not in PERFIS:
+        raise ValueError(f"perfil desconhecido: {nome!r} (opções: {', '.join(PERFIS)})")
+    escolhido = PERFIS[nome]
+    return replace(escolhido, formato=formato) if formato else escolhido
+
+
+@dataclass
+class Tarefa:
+    """Uma figura a desenhar."""
+    arquivo: str            # caminho relativo ao diretório de saída
+    conjunto: str           # estilo do matplotlib (ver ``graficos.ESTILOS``)
+    funcao: object          # função de desenho: dados -> Figure (de nível de módulo)
+    dados: object           # DataFrame, ResultadoCluster ou objeto com ``resolver``
+    preparo: object = None  # aplicado aos dados no processo antes do desenho
+
+    def destino(self, perfil):
+        """Arquivo de saída no formato do perfil."""
+        return str(Path(self.arquivo).with_suffix('.' + perfil.formato))
+
+
+@dataclass
+class Figura:
+    """Entrada do manifesto."""
+    arquivo: str
+    conjunto: str
+    bytes: int
+    tempo: float            # preparo + desenho + gravação, em segundos
+    chave: str = ''         # chave de conteúdo (vazia sem cache)
+    cache: bool = False     # copiada do cache, sem desenhar
+    cpu: float = 0.0        # tempo de CPU do processo que desenhou
+    pico_mb: float = None   # pico de memória desse processo durante a figura
+
+
+@dataclass
+class Manifesto:
+    saida: Path
+    figuras: list           # [Figura], na ordem das tarefas
+    processos: int
+    tempo: float            # tempo total de parede
+    perfil: str = PERFIL_PADRAO
+
+    def __len__(self):
+        return len(self.figuras)
+
+    @property
+    def acertos(self):
+        return sum(figura.cache for figura in self.figuras)
+
+    @property
+    def falhas(self):
+        return len(self.figuras) - self.acertos
+
+    @property
+    def caminhos(self):
+        return [self.saida / figura.arquivo for figura in self.figuras]
+
+    def tabela(self):
+        """DataFrame arquivo x (conjunto, bytes, tempo)."""
+        import pandas as pd
+        return pd.DataFrame([asdict(figura) for figura in self.figuras]).set_index('arquivo')
+
+    def salvar(self, caminho=None):
+        caminho = Path(caminho or self.saida / ARQUIVO_MANIFESTO)
+        conteudo = {
+            'saida': str(self.saida),
+            'processos': self.processos,
+            'perfil': self.perfil,
+            'tempo': round(self.tempo, 3),
+            'tempo_figuras': round(sum(f.tempo for f in self.figuras), 3),
+            'acertos_cache': self.acertos,
+            'falhas_cache': self.falhas,
+            'figuras': [{**asdict(figura), 'tempo': round(figura.tempo, 4),
+                         'cpu': round(figura.cpu, 4)} for figura in self.figuras]
+        }
+        caminho.write_text(json.dumps(conteudo, indent=2, ensure_ascii=False))
+        return caminho
+
+
+# ====================
+# CHAVES DE CONTEÚDO
+# ====================
+
+def _nomes(codigo):
+    """Nomes globais usados por um código e pelas funções aninhadas nele."""
+    nomes = set(codigo.co_names)
+    for constante in codigo.co_consts:
+        if isinstance(constante, types.CodeType):
+            nomes |= _nomes(constante)
+    return nomes
+
+
+def _simples(valor):
+    """Verdadeiro para constantes cujo repr é estável (sem endereços de memória)."""
+    if isinstance(valor, (str, int, float, bool, type(None))):
+        return True
+    if isinstance(valor, (list, tuple)):
+        return all(_simples(v) for v in valor)
+    if isinstance(valor, dict):
+        return all(_simples(k) and _simples(v) for k, v in valor.items())
+    return False
+
+
+def _fontes(funcao, partes, vistas):
+    """Código de ``funcao`` e das funções e constantes do pacote que ela usa."""
+    if isinstance(funcao, functools.partial):
+        partes.append(repr((funcao.args, sorted(funcao.keywords.items()))))
+        funcao = funcao.func
+    # Funções decoradas (ex.: ``instrumentacao.medida``) contam pelo código original
+    funcao = inspect.unwrap(funcao)
+    if funcao in vistas or not inspect.isfunction(funcao):
+        return
+    vistas.add(funcao)
+    try:
+        partes.append(inspect.getsource(funcao))
+    except (OSError, TypeError):
+        partes.append(repr(funcao.__code__.co_code))
+    for nome in sorted(_nomes(funcao.__code__) & funcao.__globals__.keys()):
+        valor = funcao.__globals__[nome]
+        if inspect.isfunction(valor) and valor.__module__.startswith('cafe'):
+            _fontes(valor, partes, vistas)
+        elif _simples(valor):
+            partes.append(f'{nome}={valor!r}')
+
+
+def digest_funcao(funcao):
+    partes = []
+    _fontes(funcao, partes, set())
+    return hashlib.blake2b('\n'.join(partes).encode(), digest_size=16).hexdigest()
+
+
+def digest_dados(dados):
+    """Impressão digital de um recorte de dados (DataFrame, array ou objeto com ``digest``)."""
+    import numpy as np
+    import pandas as pd
+
+    if hasattr(dados, 'digest'):
+        return dados.digest()
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(dados, pd.DataFrame):
+        h.update(pd.util.hash_pandas_object(dados, index=True).to_numpy().tobytes())
+        h.update(repr([(str(c), str(t)) for c, t in dados.dtypes.items()]).encode())
+    elif isinstance(dados, np.ndarray):
+        h.update(f'{dados.shape}{dados.dtype}'.encode())
+        h.update(np.ascontiguousarray(dados).tobytes())
+    else:
+        h.update(pickle.dumps(dados))
+    return h.hexdigest()
+
+
+def digest_estilo(conjunto):
+    """Impressão digital das ``rcParams`` em vigor no estilo do conjunto."""
+    import matplotlib
+
+    from cafe.graficos import estilo
+
+    with estilo(conjunto):
+        parametros = sorted((k, repr(v)) for k, v in matplotlib.rcParams.items())
+    return hashlib.blake2b(repr(parametros).encode(), digest_size=16).hexdigest()
+
+
+def chaves(tarefas, perfil_escolhido):
+    """Chave de conteúdo de cada tarefa (recortes, funções e estilos repetidos, uma vez só)."""
+    import matplotlib
+
+    import cafe
+
+    memoria = {}
+
+    def uma_vez(funcao, objeto, rotulo):
+        chave_memoria = (rotulo, id(objeto))
+        if chave_memoria not in memoria:
+            memoria[chave_memoria] = (objeto, funcao(objeto))
+        return memoria[chave_memoria][1]
+
+    versoes = f'cafe {cafe.__version__}; matplotlib {matplotlib.__version__}'
+    resultado = []
+    for tarefa in tarefas:
+        partes = [
+            versoes,
+            repr(perfil_escolhido),
+            uma_vez(digest_estilo, tarefa.conjunto, 'estilo'),
+            uma_vez(digest_funcao, tarefa.funcao, 'funcao'),
+            uma_vez(digest_funcao, tarefa.preparo, 'preparo') if tarefa.preparo else '',
+            uma_vez(digest_dados, tarefa.dados, 'dados')
+        ]
+        resultado.append(hashlib.blake2b('|'.join(partes).encode(), digest_size=16).hexdigest())
+    return resultado
+
+
+def diretorio_graficos():
+    return diretorio_cache() / 'graficos'
+
+
+def _no_cache(chave, sufixo):
+    return diretorio_graficos() / chave[:2] / f'{chave}{sufixo}'
+
+
+def podar(limite_mb=LIMITE_CACHE_MB):
+    """
+    Remove do cache as figuras usadas há mais tempo (data de modificação,
+    renovada a cada acerto) até o total caber em ``limite_mb``. Retorna o
+    número de figuras removidas.
+    """
+    base = diretorio_graficos()
+    if not base.is_dir():
+        return 0
+    arquivos = []
+    for caminho in base.glob('*/*'):
+        try:
+            info = caminho.stat()
+        except OSError:
+            continue
+        arquivos.append((info.st_mtime, info.st_size, caminho))
+    arquivos.sort()
+    total, removidos = sum(tamanho for _, tamanho, _ in arquivos), 0
+    for _, tamanho, caminho in arquivos:
+        if total <= limite_mb * 2**20:
+            break
+        try:
+            caminho.unlink()
+        except OSError:
+            continue
+        total -= tamanho
+        removidos += 1
+    return removidos
+
+
+def _copiar(origem, destino):
+    """Cópia atômica (arquivo temporário no diretório de destino + rename)."""
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=destino.parent, prefix='.tmp-')
+    os.close(fd)
+    shutil.copyfile(origem, temporario)
+    os.replace(temporario, destino)
+
+
+# ====================
+# DESENHO
+# ====================
+
+def _inicializar():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _gravar_figura(tarefa, destino, perfil_escolhido):
+    """Desenha a figura da tarefa e a grava em ``destino`` (caminho ou arquivo aberto)."""
+    import matplotlib.pyplot as plt
+
+    from cafe.graficos import estilo
+
+    dados = tarefa.preparo(tarefa.dados) if tarefa.preparo else tarefa.dados
+    with estilo(tarefa.conjunto), plt.rc_context(perfil_escolhido.rc):
+        fig = tarefa.funcao(dados)
+        with warnings.catch_warnings():
+            # colorbars compartilhadas não são compatíveis com tight_layout
+            warnings.simplefilter('ignore')
+            fig.tight_layout()
+        fig.savefig(destino, dpi=perfil_escolhido.dpi, format=perfil_escolhido.formato,
+                    bbox_inches='tight' if perfil_escolhido.recorte else None)
+        plt.close(fig)
+
+
+def _desenhar(tarefa, saida, perfil_escolhido, chave=''):
+    """Desenha e grava uma figura no processo atual (e no cache, com ``chave``)."""
+    arquivo = tarefa.destino(perfil_escolhido)
+    caminho = Path(saida) / arquivo
+    with instrumentacao.medicao() as medidas:
+        caminho.parent.mkdir(parents=True, exist_ok=True)
+        _gravar_figura(tarefa, caminho, perfil_escolhido)
+        if chave:
+            _copiar(caminho, _no_cache(chave, caminho.suffix))
+    return Figura(arquivo, tarefa.conjunto, caminho.stat().st_size, medidas['tempo'], chave,
+                  cpu=medidas['cpu'], pico_mb=medidas['pico_mb'])
+
+
+def em_memoria(tarefa, perfil_escolhido):
+    """Bytes da figura desenhada no processo atual, sem gravar arquivo (ver ``cafe.servidor``)."""
+    import io
+
+    _inicializar()
+    destino = io.BytesIO()
+    _gravar_figura(tarefa, destino, perfil_escolhido)
+    return destino.getvalue()
+
+
+def _do_cache(tarefa, saida, perfil_escolhido, chave):
+    """Copia uma figura já desenhada do cache; None se ela não estiver lá."""
+    inicio = time.perf_counter()
+    arquivo = tarefa.destino(perfil_escolhido)
+    origem = _no_cache(chave, Path(arquivo).suffix)
+    if not origem.exists():
+        return None
+    caminho = Path(saida) / arquivo
+    _copiar(origem, caminho)
+    # Marca o uso para a poda (as figuras usadas há mais tempo saem primeiro)
+    os.utime(origem)
+    return Figura(arquivo, tarefa.conjunto, caminho.stat().st_size,
+                  time.perf_counter() - inicio, chave, cache=True)
+
+
+def executar(tarefas, saida='.', n_jobs=None, ao_concluir=None, cache=True, perfil_nome=None,
+             formato=None):
+    """
+    Desenha as ``tarefas`` em ``saida`` com ``n_jobs`` processos, no perfil
+    ``perfil_nome`` (ver ``perfil``), e grava o manifesto. Com ``cache``,
+    as figuras cuja chave de conteúdo já está no cache são copiadas de lá e
+    só as demais vão para o pool (os dados com ``resolver`` são resolvidos
+    antes, no processo principal). ``ao_concluir(figura)`` é chamado no
+    processo principal a cada figura concluída.
+    """
+    inicio = time.perf_counter()
+    saida = Path(saida)
+    saida.mkdir(parents=True, exist_ok=True)
+
+    perfil_nome = perfil_nome or os.environ.get('CAFE_PERFIL') or PERFIL_PADRAO
+    escolhido = perfil(perfil_nome, formato)
+    lista_chaves = chaves(tarefas, escolhido) if cache else [''] * len(tarefas)
+    figuras = [None] * len(tarefas)
+    pendentes = []
+    for i, (tarefa, chave) in enumerate(zip(tarefas, lista_chaves)):
+        figura = _do_cache(tarefa, saida, escolhido, chave) if chave else None
+        if figura is None:
+            pendentes.append(i)
+        else:
+            figuras[i] = figura
+            if ao_concluir:
+                ao_concluir(figura)
+
+    # Dados sob demanda (com ``resolver``, como ``cluster.ClusterSobDemanda``)
+    # são calculados aqui, uma vez por objeto, só se alguma tarefa faltou no cache
+    resolvidos = {}
+    tarefas = list(tarefas)
+    for i in pendentes:
+        dados = tarefas[i].dados
+        if hasattr(dados, 'resolver'):
+            if id(dados) not in resolvidos:
+                resolvidos[id(dados)] = dados.resolver()
+            tarefas[i] = replace(tarefas[i], dados=resolvidos[id(dados)])
+
+    processos = max(1, min(n_processos(n_jobs), len(pendentes)))
+    # Lotes de tarefas por envio: poucas idas e vindas com milhares de figuras
+    lote = max(1, len(pendentes) // (4 * processos))
+    if pendentes:
+        with executor(processos, _inicializar, n_tarefas=len(pendentes)) as pool:
+            desenhadas = pool.map(_desenhar, [tarefas[i] for i in pendentes],
+                                  [saida] * len(pendentes), [escolhido] * len(pendentes),
+                                  [lista_chaves[i] for i in pendentes],
+                                  chunksize=lote)
+            for i, figura in zip(pendentes, desenhadas):
+                figuras[i] = figura
+                if ao_concluir:
+                    ao_concluir(figura)
+
+    for figura in figuras:
+        instrumentacao.registrar(f'grafico:{figura.arquivo}', figura.tempo, figura.cpu,
+                                 figura.pico_mb, conjunto=figura.conjunto, cache=figura.cache)
+    if cache and pendentes:
+        podar()
+    manifesto = Manifesto(saida, figuras, processos, time.perf_counter() - inicio, perfil_nome)
+    manifesto.salvar()
+    return manifesto
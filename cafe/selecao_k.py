@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Seleção automática do número de clusters (K) do K-means.
+
+Os K candidatos são ajustados em um pool de processos (``cafe.paralelo``):
+
+* reinícios a frio: cada inicialização k-means++ de cada K é uma tarefa;
+* cadeia aquecida: os centróides do K anterior são reaproveitados como
+  sementes do K seguinte, acrescidos de um centro sorteado com peso D²
+  (como no k-means++), e cada passo converge em poucas iterações;
+* referências da estatística gap: cada conjunto uniforme de referência é
+  ajustado pela mesma cadeia aquecida.
+
+Para cada K fica a solução de menor inércia entre a cadeia e os reinícios.
+O K é escolhido pela silhueta, pelo cotovelo (ponto de maior distância à
+reta entre os extremos da curva de inércia), pela estatística gap
+(Tibshirani et al., 2001) ou pelo consenso entre os três.
+"""
+
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from cafe import silhueta
+from cafe.dados import flutuante
+from cafe.instrumentacao import medida
+from cafe.paralelo import executor
+
+CRITERIOS = ('consenso', 'silhueta', 'cotovelo', 'gap')
+
+# Acima deste número de linhas a estatística gap usa uma amostra
+AMOSTRA_GAP = 20000
+
+# Matriz de observações padronizadas de cada processo (ver _inicializar)
+_X = None
+
+
+@dataclass
+class AjusteK:
+    """Melhor solução encontrada para um K."""
+    k: int
+    inercia: float
+    centroides: np.ndarray
+    origem: str               # 'quente' (cadeia) ou 'frio' (reinício k-means++)
+    n_iter: int
+    tempo_quente: float       # segundos do passo da cadeia aquecida
+    tempo_frio: float         # segundos somados dos reinícios a frio
+    silhueta: float = np.nan
+    silhueta_ic: tuple = (np.nan, np.nan)   # só quando a silhueta é estimada por amostra
+    tempo_silhueta: float = 0.0
+    gap: float = np.nan
+    gap_erro: float = np.nan
+
+    @property
+    def tempo(self):
+        return self.tempo_quente + self.tempo_frio + self.tempo_silhueta
+
+
+@dataclass
+class SelecaoK:
+    """Resultado da varredura de K e da escolha automática."""
+    ajustes: list
+    sugestoes: dict           # critério -> K sugerido
+    criterio: str
+    k: int
+    tempo_total: float
+    n_processos: int = 1
+    extras: dict = field(default_factory=dict)
+
+    @property
+    def ks(self):
+        return [a.k for a in self.ajustes]
+
+    def ajuste(self, k):
+        for a in self.ajustes:
+            if a.k == k:
+                return a
+        raise KeyError(k)
+
+
+# ====================
+# TAREFAS DOS PROCESSOS
+# ====================
+
+def _inicializar(X):
+    global _X
+    _X = X
+
+
+def rotular(X, centroides, bloco=100000):
+    """Rótulo do centróide mais próximo e distância² até ele, em blocos."""
+    rotulos = np.empty(len(X), dtype=np.intp)
+    dist2 = np.empty(len(X))
+    normas = np.einsum('ij,ij->i', centroides, centroides)
+    for inicio in range(0, len(X), bloco):
+        parte = X[inicio:inicio + bloco]
+        d = normas[None, :] - 2 * parte @ centroides.T
+        rotulos[inicio:inicio + bloco] = np.argmin(d, axis=1)
+        dist2[inicio:inicio + bloco] = np.maximum(
+            d[np.arange(len(parte)), rotulos[inicio:inicio + bloco]]
+            + np.einsum('ij,ij->i', parte, parte), 0)
+    return rotulos, dist2
+
+
+def _cadeia(X, ks, semente):
+    """Ajusta os K em ordem crescente, semeando cada K com os centróides do anterior."""
+    from sklearn.cluster import KMeans
+
+    rng = np.random.default_rng(semente)
+    saida = []
+    centroides = None
+    for k in ks:
+        inicio = time.perf_counter()
+        if centroides is None:
+            modelo = KMeans(n_clusters=k, n_init=1, random_state=semente)
+        else:
+            # Novos centros sorteados com probabilidade proporcional a D²
+            sementes = [centroides]
+            for _ in range(k - len(centroides)):
+                _, d2 = rotular(X, np.vstack(sementes))
+                total = d2.sum()
+                escolhido = rng.choice(len(X), p=d2 / total) if total > 0 else rng.integers(len(X))
+                sementes.append(X[escolhido][None, :])
+            modelo = KMeans(n_clusters=k, init=np.vstack(sementes), n_init=1)
+        modelo.fit(X)
+        centroides = modelo.cluster_centers_
+        saida.append((k, float(modelo.inertia_), centroides, int(modelo.n_iter_),
+                      time.perf_counter() - inicio))
+    return saida
+
+
+def _tarefa_cadeia(ks, semente):
+    return _cadeia(_X, ks, semente)
+
+
+def _tarefa_fria(k, semente):
+    from sklearn.cluster import KMeans
+
+    inicio = time.perf_counter()
+    modelo = KMeans(n_clusters=k, n_init=1, random_state=semente).fit(_X)
+    return (k, float(modelo.inertia_), modelo.cluster_centers_, int(modelo.n_iter_),
+            time.perf_counter() - inicio)
+
+
+def _tarefa_referencia(ks, linhas, semente):
+    """log(inércia) por K de um conjunto uniforme na caixa envolvente dos dados."""
+    rng = np.random.default_rng(semente)
+    amostra = _X if linhas is None else _X[linhas]
+    referencia = rng.uniform(amostra.min(axis=0), amostra.max(axis=0),
+                             size=amostra.shape).astype(amostra.dtype, copy=False)
+    return np.log([inercia for _, inercia, _, _, _ in _cadeia(referencia, ks, semente)])
+
+
+def _tarefa_silhueta(k, centroides, metodo):
+    inicio = time.perf_counter()
+    rotulos, _ = rotular(_X, centroides)
+    if len(np.unique(rotulos)) < 2:
+        return k, None, None, time.perf_counter() - inicio
+    chave_cache = silhueta.chave(_X, rotulos, metodo)
+    resultado = silhueta.silhueta(_X, rotulos, metodo)
+    return k, chave_cache, resultado, time.perf_counter() - inicio
+
+
+# ====================
+# CRITÉRIOS
+# ====================
+
+def k_silhueta(ks, silhuetas):
+    return ks[int(np.nanargmax(silhuetas))]
+
+
+def k_cotovelo(ks, inercias):
+    """Ponto da curva de inércia mais distante da reta entre os extremos."""
+    if len(ks) < 3:
+        return ks[0]
+    x = (np.asarray(ks) - ks[0]) / (ks[-1] - ks[0])
+    w = np.asarray(inercias, dtype=float)
+    y = (w - w.min()) / (w.max() - w.min()) if w.max() > w.min() else np.zeros_like(w)
+    return ks[int(np.argmax((1 - x) - y))]
+
+
+def k_gap(ks, gaps, erros):
+    """Menor K com Gap(K) >= Gap(K+1) - s(K+1); senão, o de maior gap."""
+    for i in range(len(ks) - 1):
+        if gaps[i] >= gaps[i + 1] - erros[i + 1]:
+            return ks[i]
+    return ks[int(np.nanargmax(gaps))]
+
+
+# ====================
+# VARREDURA
+# ====================
+
+@medida('varredura_k')
+def selecionar_k(X, ks=range(2, 8), criterio='consenso', n_init=10, n_referencias=5,
+                 semente=42, n_jobs=None, metodo_silhueta='auto'):
+    """
+    Varre os K candidatos em paralelo e escolhe o K pelo critério pedido.
+
+    ``X`` deve estar padronizado. Retorna ``SelecaoK`` com inércia,
+    silhueta, gap e tempos de cada K. ``metodo_silhueta`` é repassado a
+    ``cafe.silhueta.silhueta``; cada silhueta calculada fica no cache desse
+    módulo, e o relatório final não a recalcula.
+    """
+    if criterio not in CRITERIOS:
+        raise ValueError(f'critério desconhecido: {criterio!r} (use {", ".join(CRITERIOS)})')
+    X = np.ascontiguousarray(flutuante(X))
+    ks = sorted(k for k in ks if 1 < k < len(X))
+    if not ks:
+        raise ValueError('nenhum K candidato entre 2 e o número de observações - 1')
+    inicio = time.perf_counter()
+
+    linhas_gap = None
+    if len(X) > AMOSTRA_GAP:
+        linhas_gap = np.random.default_rng(semente).choice(len(X), AMOSTRA_GAP, replace=False)
+
+    n_tarefas = 1 + len(ks) * n_init + n_referencias
+    with executor(n_jobs, _inicializar, (X,), n_tarefas=n_tarefas) as pool:
+        n_proc = getattr(pool, '_max_workers', 1)
+        cadeia = pool.submit(_tarefa_cadeia, ks, semente)
+        frios = [pool.submit(_tarefa_fria, k, semente + i) for k in ks for i in range(n_init)]
+        referencias = [pool.submit(_tarefa_referencia, ks, linhas_gap, semente + 1000 + b)
+                       for b in range(n_referencias)]
+
+        ajustes = {}
+        for k, inercia, centroides, n_iter, tempo in cadeia.result():
+            ajustes[k] = AjusteK(k, inercia, centroides, 'quente', n_iter, tempo, 0.0)
+        for futuro in frios:
+            k, inercia, centroides, n_iter, tempo = futuro.result()
+            a = ajustes[k]
+            a.tempo_frio += tempo
+            if inercia < a.inercia * (1 - 1e-9):
+                a.inercia, a.centroides, a.origem, a.n_iter = inercia, centroides, 'frio', n_iter
+
+        silhuetas = [pool.submit(_tarefa_silhueta, k, ajustes[k].centroides, metodo_silhueta)
+                     for k in ks]
+        for futuro in silhuetas:
+            k, chave_cache, resultado, tempo = futuro.result()
+            ajustes[k].tempo_silhueta = tempo
+            if resultado is not None:
+                silhueta.registrar(chave_cache, resultado)
+                ajustes[k].silhueta = resultado.valor
+                ajustes[k].silhueta_ic = (resultado.ic_inferior, resultado.ic_superior)
+
+        if referencias:
+            log_ref = np.array([f.result() for f in referencias])
+            amostra = X if linhas_gap is None else X[linhas_gap]
+            for i, k in enumerate(ks):
+                _, d2 = rotular(amostra, ajustes[k].centroides)
+                ajustes[k].gap = float(log_ref[:, i].mean() - np.log(d2.sum()))
+                ajustes[k].gap_erro = float(log_ref[:, i].std() * np.sqrt(1 + 1 / len(log_ref)))
+
+    lista = [ajustes[k] for k in ks]
+    sugestoes = {
+        'silhueta': k_silhueta(ks, [a.silhueta for a in lista]),
+        'cotovelo': k_cotovelo(ks, [a.inercia for a in lista]),
+    }
+    if n_referencias:
+        sugestoes['gap'] = k_gap(ks, [a.gap for a in lista], [a.gap_erro for a in lista])
+
+    if criterio == 'consenso':
+        # K mais votado; empate decidido pela silhueta
+        votos = Counter(sugestoes.values()).most_common()
+        k = votos[0][0] if votos[0][1] > 1 else sugestoes['silhueta']
+    elif criterio == 'gap' and 'gap' not in sugestoes:
+        raise ValueError("critério 'gap' requer n_referencias > 0")
+    else:
+        k = sugestoes[criterio]
+
+    return SelecaoK(ajustes=lista, sugestoes=sugestoes, criterio=criterio, k=k,
+                    tempo_total=time.perf_counter() - inicio, n_processos=n_proc)
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+"""
+Serviço HTTP local com os resultados da análise em memória.
+
+O dataset é carregado uma vez e as descritivas, a correlação, a regressão
+e o cluster (K-means) do dataset completo são calculados na partida. As
+consultas com filtros (``ano_inicio``, ``ano_fim`` e ``municipio``,
+repetível, por código ou nome) recortam as linhas já carregadas e são
+memorizadas já serializadas num cache LRU, assim como os gráficos (PNG ou
+SVG). A cada requisição o arquivo de dados é verificado (data de
+modificação e tamanho); se mudou, tudo é recarregado e o cache é esvaziado.
+
+Rotas (GET)::
+
+    /saude                       estado do serviço e do cache
+    /descritivas                 estatísticas descritivas
+    /correlacao?metodo=spearman  matriz de correlação (pearson, spearman ou kendall)
+    /regressao                   regressão múltipla da produtividade
+    /cluster                     níveis de tecnificação de cada observação e resumo
+    /graficos                    gráficos disponíveis
+    /graficos/<nome>.png|.svg    um gráfico (?perfil=rascunho|publicacao)
+
+Os gráficos de cluster mostram o agrupamento do dataset completo e não
+aceitam filtros. ``Aplicacao`` não depende do transporte: o servidor
+(``servidor``, ``http.server`` da biblioteca padrão) e o ``ClienteLocal``,
+que a chama no próprio processo para testes, usam o mesmo ``responder``.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from cafe.dados import caminho_dados, eh_painel, load
+
+HOST_PADRAO = '127.0.0.1'
+
+PORTA_PADRAO = 8000
+
+# Respostas e gráficos guardados no cache LRU
+CAPACIDADE_PADRAO = 256
+
+METODOS_CORRELACAO = ('pearson', 'spearman', 'kendall')
+
+# Conjuntos de gráficos servidos (o espacial exige a geometria e o consenso
+# é caro demais para uma requisição)
+CONJUNTOS_SERVIDOS = ('visualizacoes', 'estatistica', 'cluster', 'janelas')
+
+TIPOS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+JSON = 'application/json; charset=utf-8'
+
+# (ano_inicio, ano_fim, municípios) de uma consulta sem filtros
+SEM_FILTROS = (None, None, ())
+
+
+class ErroConsulta(ValueError):
+    """Consulta inválida; vira uma resposta 400 (ou ``status``)."""
+
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+
+@dataclass
+class Resposta:
+    status: int
+    tipo: str
+    corpo: bytes
+    cabecalhos: dict = field(default_factory=dict)
+
+    def json(self):
+        return json.loads(self.corpo)
+
+
+class CacheLRU:
+    """Dicionário com no máximo ``capacidade`` entradas; descarta a usada há mais tempo."""
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO):
+        self.capacidade = capacidade
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter(self, chave, calcular):
+        """Valor de ``chave``, calculado por ``calcular()`` se não estiver no cache."""
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return self._itens[chave], True
+            self.falhas += 1
+        valor = calcular()
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+        return valor, False
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+
+def _simples(valor):
+    """Converte tabelas, arrays e escalares do numpy em tipos JSON (NaN vira null)."""
+    if isinstance(valor, pd.DataFrame):
+        return {str(coluna): _simples(serie) for coluna, serie in valor.items()}
+    if isinstance(valor, pd.Series):
+        return {str(indice): _simples(v) for indice, v in valor.items()}
+    if isinstance(valor, dict):
+        return {str(chave): _simples(v) for chave, v in valor.items()}
+    if isinstance(valor, (list, tuple, np.ndarray)):
+        return [_simples(v) for v in valor]
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    return valor
+
+
+def _registros(tabela):
+    """Linhas de uma tabela como lista de dicionários."""
+    return [_simples(linha) for linha in tabela.to_dict(orient='records')]
+
+
+# ====================
+# ESTADO EM MEMÓRIA
+# ====================
+
+class Analises:
+    """
+    Dataset carregado e resultados do dataset completo, recarregados
+    quando o arquivo de dados muda.
+    """
+
+    def __init__(self, caminho=None, cache=True, compacto=True, n_jobs=None):
+        self.caminho = caminho_dados(caminho)
+        self.cache = cache
+        self.compacto = compacto
+        self.n_jobs = n_jobs
+        self._trava = threading.Lock()
+        self.assinatura = None
+        self.recarregar()
+
+    def _assinatura(self):
+        estado = os.stat(self.caminho)
+        return estado.st_mtime_ns, estado.st_size
+
+    def recarregar(self):
+        from cafe.cluster import cluster
+        from cafe.estatistica import correlate, describe, regress
+
+        inicio = time.perf_counter()
+        assinatura = self._assinatura()
+        df = load(self.caminho, cache=self.cache, compacto=self.compacto)
+        resultado = cluster(df, n_jobs=self.n_jobs)
+        completos = {
+            'descritivas': describe(df),
+            ('correlacao', 'pearson'): correlate(df),
+            'regressao': regress(df),
+            'silhueta': float(resultado.silhueta)
+        }
+        # Troca o estado inteiro de uma vez: requisições em curso veem o antigo ou o novo
+        self.df, self.cluster, self.completos = df, resultado, completos
+        self.assinatura = assinatura
+        self.carregado_em = time.time()
+        self.tempo_carga = time.perf_counter() - inicio
+
+    def atualizar(self):
+        """Recarrega se o arquivo mudou. Retorna True se recarregou."""
+        if self._assinatura() == self.assinatura:
+            return False
+        with self._trava:
+            if self._assinatura() == self.assinatura:
+                return False
+            self.recarregar()
+            return True
+
+
+def _filtros(consulta):
+    """(ano_inicio, ano_fim, municípios) da consulta; a tupla é a chave de cache."""
+    def ano(nome):
+        valores = consulta.get(nome)
+        if not valores:
+            return None
+        try:
+            return int(valores[-1])
+        except ValueError:
+            raise ErroConsulta(f'{nome} deve ser um ano: {valores[-1]!r}')
+
+    return ano('ano_inicio'), ano('ano_fim'), tuple(sorted(set(consulta.get('municipio', []))))
+
+
+def _recorte(df, filtros):
+    """Máscara das linhas de ``df`` que atendem aos filtros."""
+    inicio, fim, municipios = filtros
+    ano = df['ano'].to_numpy()
+    mascara = np.ones(len(df), dtype=bool)
+    if inicio is not None:
+        mascara &= ano >= inicio
+    if fim is not None:
+        mascara &= ano <= fim
+    if municipios:
+        if not eh_painel(df):
+            raise ErroConsulta('o filtro municipio exige o painel de municípios')
+        codigos = df['municipio_id'].astype(str).to_numpy()
+        nomes = (df['municipio'].astype(str).to_numpy() if 'municipio' in df.columns
+                 else codigos)
+        mascara &= np.isin(codigos, municipios) | np.isin(nomes, municipios)
+    if not mascara.any():
+        raise ErroConsulta('nenhuma linha atende aos filtros', status=404)
+    return mascara
+
+
+# ====================
+# APLICAÇÃO
+# ====================
+
+class Aplicacao:
+    """Rotas do serviço sobre um ``Analises``, com cache LRU das respostas."""
+
+    def __init__(self, analises, capacidade=CAPACIDADE_PADRAO):
+        self.analises = analises
+        self.lru = CacheLRU(capacidade)
+        # pyplot não é seguro entre threads: um gráfico desenhado por vez
+        self._trava_graficos = threading.Lock()
+        self._rotas = {
+            '/saude': self._saude,
+            '/descritivas': self._descritivas,
+            '/correlacao': self._correlacao,
+            '/regressao': self._regressao,
+            '/cluster': self._cluster,
+            '/graficos': self._lista_graficos,
+        }
+
+    def responder(self, metodo, caminho, consulta=None):
+        """Resposta a ``metodo caminho?consulta`` (consulta no formato de ``parse_qs``)."""
+        inicio = time.perf_counter()
+        consulta = consulta or {}
+        try:
+            if metodo != 'GET':
+                raise ErroConsulta(f'método não suportado: {metodo}', status=405)
+            if self.analises.atualizar():
+                self.lru.limpar()
+            caminho = '/' + caminho.strip('/')
+            if caminho.startswith('/graficos/'):
+                resposta = self._grafico(caminho[len('/graficos/'):], consulta)
+            elif caminho in self._rotas:
+                resposta = self._rotas[caminho](consulta)
+            else:
+                raise ErroConsulta(f'rota desconhecida: {caminho}', status=404)
+        except ErroConsulta as erro:
+            resposta = self._json({'erro': str(erro)}, erro.status)
+        except ValueError as erro:
+            # ex.: recorte com poucas linhas para a regressão
+            resposta = self._json({'erro': str(erro)}, 400)
+        except OSError as erro:
+            resposta = self._json({'erro': f'dados indisponíveis: {erro}'}, 503)
+        resposta.cabecalhos['X-Tempo-ms'] = f'{(time.perf_counter() - inicio) * 1000:.2f}'
+        return resposta
+
+    @staticmethod
+    def _json(conteudo, status=200):
+        corpo = json.dumps(_simples(conteudo), ensure_ascii=False, allow_nan=False)
+        return Resposta(status, JSON, corpo.encode())
+
+    def _memorizado(self, chave, gerar, tipo):
+        """
+        Resposta com o corpo do LRU. A chave inclui a assinatura do arquivo de
+        dados: um corpo gravado durante uma recarga nunca é servido depois dela.
+        """
+        corpo, acerto = self.lru.obter((self.analises.assinatura, *chave), gerar)
+        return Resposta(200, tipo, corpo, {'X-Cache': 'acerto' if acerto else 'falha'})
+
+    def _consultar(self, rota, consulta, calcular, extra=()):
+        """
+        JSON de ``calcular(df, mascara)``, com ``mascara`` None sem filtros
+        (os resultados do dataset completo já estão calculados).
+        """
+        filtros = _filtros(consulta)
+
+        def gerar():
+            df = self.analises.df
+            mascara = None if filtros == SEM_FILTROS else _recorte(df, filtros)
+            conteudo = calcular(df, mascara)
+            return self._json({'filtros': {'ano_inicio': filtros[0], 'ano_fim': filtros[1],
+                                           'municipio': list(filtros[2])}, **conteudo}).corpo
+
+        return self._memorizado((rota, filtros, *extra), gerar, JSON)
+
+    # ----- rotas JSON -----
+
+    def _saude(self, consulta):
+        analises = self.analises
+        return self._json({
+            'status': 'ok',
+            'arquivo': str(analises.caminho),
+            'linhas': len(analises.df),
+            'painel': eh_painel(analises.df),
+            'carregado_em': analises.carregado_em,
+            'tempo_carga_s': analises.tempo_carga,
+            'cache': {'itens': len(self.lru), 'capacidade': self.lru.capacidade,
+                      'acertos': self.lru.acertos, 'falhas': self.lru.falhas}
+        })
+
+    def _descritivas(self, consulta):
+        from cafe.estatistica import describe
+
+        def calcular(df, mascara):
+            tabela = (self.analises.completos['descritivas'] if mascara is None
+                      else describe(df[mascara]))
+            return {'linhas': int(len(df) if mascara is None else mascara.sum()),
+                    'descritivas': tabela}
+
+        return self._consultar('descritivas', consulta, calcular)
+
+    def _correlacao(self, consulta):
+        from cafe.estatistica import correlate
+
+        metodo = (consulta.get('metodo') or ['pearson'])[-1]
+        if metodo not in METODOS_CORRELACAO:
+            raise ErroConsulta(f'metodo deve ser {", ".join(METODOS_CORRELACAO)}: {metodo!r}')
+
+        def calcular(df, mascara):
+            completos = self.analises.completos
+            if mascara is None:
+                if ('correlacao', metodo) not in completos:
+                    completos[('correlacao', metodo)] = correlate(df, metodo=metodo)
+                tabela = completos[('correlacao', metodo)]
+            else:
+                tabela = correlate(df[mascara], metodo=metodo)
+            return {'metodo': metodo, 'correlacao': tabela}
+
+        return self._consultar('correlacao', consulta, calcular, (metodo,))
+
+    def _regressao(self, consulta):
+        from cafe.estatistica import regress
+
+        def calcular(df, mascara):
+            if mascara is None:
+                return {'regressao': self.analises.completos['regressao']}
+            return {'regressao': regress(df[mascara])}
+
+        return self._consultar('regressao', consulta, calcular)
+
+    def _cluster(self, consulta):
+        resultado = self.analises.cluster
+
+        def calcular(df, mascara):
+            rotulados = resultado.df if mascara is None else resultado.df[mascara]
+            chaves = [c for c in ('municipio_id', 'municipio', 'ano') if c in rotulados.columns]
+            resumo = (rotulados.groupby('nivel_tecnificacao', observed=True)
+                      [['indice_tecnologico', 'produtividade_kg_ha']].mean()
+                      .reindex([n for n in resultado.niveis
+                                if n in set(rotulados['nivel_tecnificacao'])]))
+            resumo.insert(0, 'n', rotulados['nivel_tecnificacao'].value_counts())
+            return {
+                'k': len(resultado.mapeamento),
+                'niveis': resultado.niveis,
+                'silhueta': self.analises.completos['silhueta'],
+                'resumo': _registros(resumo.rename_axis('nivel').reset_index()),
+                'observacoes': _registros(rotulados[[*chaves, 'nivel_tecnificacao']])
+            }
+
+        return self._consultar('cluster', consulta, calcular)
+
+    # ----- gráficos -----
+
+    @staticmethod
+    def _catalogo():
+        from cafe.graficos import GRAFICOS
+
+        return {Path(arquivo).stem: (conjunto, funcao)
+                for arquivo, (conjunto, funcao) in GRAFICOS.items()
+                if conjunto in CONJUNTOS_SERVIDOS}
+
+    def _lista_graficos(self, consulta):
+        return self._json({'graficos': [{'nome': nome, 'conjunto': conjunto,
+                                         'formatos': list(TIPOS)}
+                                        for nome, (conjunto, _) in self._catalogo().items()]})
+
+    def _grafico(self, arquivo, consulta):
+        from cafe.renderizacao import PERFIS, Tarefa, em_memoria, perfil
+
+        nome, _, formato = arquivo.rpartition('.')
+        catalogo = self._catalogo()
+        if nome not in catalogo or formato not in TIPOS:
+            raise ErroConsulta(f'gráfico desconhecido: {arquivo}', status=404)
+        nome_perfil = (consulta.get('perfil') or ['rascunho'])[-1]
+        if nome_perfil not in PERFIS:
+            raise ErroConsulta(f"perfil deve ser {', '.join(PERFIS)}: {nome_perfil!r}")
+        conjunto, funcao = catalogo[nome]
+        filtros = _filtros(consulta)
+        if conjunto == 'cluster' and filtros != SEM_FILTROS:
+            raise ErroConsulta('os gráficos de cluster mostram o dataset completo e não '
+                               'aceitam filtros')
+
+        def desenhar():
+            df = self.analises.df
+            if conjunto == 'cluster':
+                dados = self.analises.cluster
+            elif filtros == SEM_FILTROS:
+                dados = df
+            else:
+                dados = df[_recorte(df, filtros)].reset_index(drop=True)
+            tarefa = Tarefa(f'{nome}.{formato}', conjunto, funcao, dados)
+            with self._trava_graficos:
+                return em_memoria(tarefa, perfil(nome_perfil, formato))
+
+        return self._memorizado(('grafico', nome, formato, nome_perfil, filtros), desenhar,
+                                TIPOS[formato])
+
+
+# ====================
+# CLIENTE LOCAL E SERVIDOR HTTP
+# ====================
+
+class ClienteLocal:
+    """Cliente que chama a ``Aplicacao`` no próprio processo, sem rede (para testes)."""
+
+    def __init__(self, aplicacao):
+        self.aplicacao = aplicacao
+
+    def get(self, url):
+        partes = urlsplit(url)
+        return self.aplicacao.responder('GET', partes.path, parse_qs(partes.query))
+
+
+def servidor(aplicacao, host=HOST_PADRAO, porta=PORTA_PADRAO):
+    """``ThreadingHTTPServer`` que encaminha cada requisição a ``aplicacao.responder``."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Manipulador(BaseHTTPRequestHandler):
+        def _responder(self, metodo):
+            partes = urlsplit(self.path)
+            resposta = aplicacao.responder(metodo, partes.path, parse_qs(partes.query))
+            self.send_response(resposta.status)
+            self.send_header('Content-Type', resposta.tipo)
+            self.send_header('Content-Length', str(len(resposta.corpo)))
+            for nome, valor in resposta.cabecalhos.items():
+                self.send_header(nome, valor)
+            self.end_headers()
+            self.wfile.write(resposta.corpo)
+
+        def do_GET(self):
+            self._responder('GET')
+
+        def do_POST(self):
+            self._responder('POST')
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ThreadingHTTPServer((host, porta), Manipulador)
+
+
+def servir(caminho=None, host=HOST_PADRAO, porta=PORTA_PADRAO, capacidade=CAPACIDADE_PADRAO,
+           cache=True, compacto=True, n_jobs=None):
+    """Carrega as análises e atende requisições até Ctrl+C."""
+    inicio = time.perf_counter()
+    aplicacao = Aplicacao(Analises(caminho, cache, compacto, n_jobs), capacidade)
+    http = servidor(aplicacao, host, porta)
+    print(f"✓ {len(aplicacao.analises.df)} linhas de {aplicacao.analises.caminho} carregadas "
+          f"em {time.perf_counter() - inicio:.2f} s")
+    print(f"✓ Servindo em http://{host}:{http.server_address[1]}/ (Ctrl+C encerra)")
+    try:
+        http.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http.server_close()
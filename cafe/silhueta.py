@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Coeficiente de silhueta escalável.
+
+``sklearn.metrics.silhouette_score`` monta a matriz completa de distâncias
+(n x n), o que esgota a memória muito antes de milhões de linhas. Aqui as
+distâncias são calculadas em ladrilhos (bloco de linhas x bloco de colunas)
+de tamanho limitado e reduzidas na hora para somas por cluster, de modo que
+a memória não depende de n:
+
+* ``silhueta_exata``: valor exato (igual ao do scikit-learn), O(n²) em tempo
+  e O(memoria_mb) em memória, opcionalmente em paralelo por blocos de linhas;
+* ``silhueta_amostrada``: estimativa por amostragem estratificada por
+  cluster, com cada ponto amostrado comparado a todos os n pontos (custo
+  linear em n) e intervalo de confiança normal;
+* ``silhueta``: escolhe o método pelo tamanho e memoriza o resultado por
+  (dados, rótulos), para que o mesmo agrupamento nunca seja recalculado.
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass
+from statistics import NormalDist
+
+import numpy as np
+
+from cafe.paralelo import executor
+
+# Até este número de linhas o método 'auto' calcula a silhueta exata
+LIMITE_EXATO = 20000
+
+# Com 2000 pontos o IC95% tem meia-largura da ordem de 0,003
+AMOSTRA_PADRAO = 2000
+
+# Resultados já calculados: (digest dos dados, digest dos rótulos, método, ...) -> Silhueta
+_CACHE = {}
+
+# Tamanho máximo de cada ladrilho de distâncias; ladrilhos pequenos cabem
+# no cache do processador e são mais rápidos que um bloco grande
+MEMORIA_PADRAO = 8
+
+# Dados de cada processo do cálculo exato em paralelo (ver _inicializar)
+_X = None
+_CODIGOS = None
+_TAMANHOS = None
+_NORMAS = None
+
+
+@dataclass
+class Silhueta:
+    """Valor da silhueta e, se estimado por amostra, seu intervalo de confiança."""
+    valor: float
+    metodo: str                     # 'exata' ou 'amostrada'
+    ic_inferior: float = np.nan
+    ic_superior: float = np.nan
+    n_amostra: int = 0
+    tempo: float = 0.0
+
+    def __float__(self):
+        return float(self.valor)
+
+    def __format__(self, especificacao):
+        texto = format(self.valor, especificacao)
+        if self.metodo == 'amostrada':
+            texto += (f" (IC95% {format(self.ic_inferior, especificacao)} a "
+                      f"{format(self.ic_superior, especificacao)}; amostra de {self.n_amostra})")
+        return texto
+
+
+# ====================
+# NÚCLEO EM LADRILHOS
+# ====================
+
+def _codificar(rotulos):
+    """Rótulos como 0..K-1 e tamanho de cada cluster."""
+    valores, codigos = np.unique(np.asarray(rotulos), return_inverse=True)
+    return codigos.astype(np.intp), np.bincount(codigos, minlength=len(valores))
+
+
+def _ordenar(X, rotulos):
+    """Dados ordenados por cluster (a silhueta média não depende da ordem)."""
+    codigos, tamanhos = _codificar(rotulos)
+    ordem = np.argsort(codigos, kind='stable')
+    # Distâncias em float64 mesmo com dados float32: |a|² + |b|² - 2ab perde
+    # precisão por cancelamento entre pontos próximos
+    return np.ascontiguousarray(np.asarray(X)[ordem], dtype=float), codigos[ordem], tamanhos
+
+
+def somas_por_cluster(X, tamanhos, linhas, memoria_mb=MEMORIA_PADRAO, normas=None):
+    """
+    Soma das distâncias euclidianas de cada ``X[linhas]`` a todos os pontos
+    de cada cluster: matriz (len(linhas), k).
+
+    ``X`` deve estar ordenado por cluster (ver ``_ordenar``), de modo que
+    cada cluster ocupa um intervalo contínuo de colunas e as somas saem de
+    um ``reduceat``. Cada ladrilho de distâncias tem no máximo ``memoria_mb``.
+    ``normas`` (``|x|²`` de cada linha de ``X``) pode ser passado já calculado.
+    """
+    A = X[linhas]
+    normas_a = np.einsum('ij,ij->i', A, A)
+    if normas is None:
+        normas = np.einsum('ij,ij->i', X, X)
+    fronteiras = np.concatenate(([0], np.cumsum(tamanhos)))
+    colunas = max(1, int(memoria_mb * 2**20 / 8 / max(len(A), 1)))
+    somas = np.zeros((len(A), len(tamanhos)))
+    d = np.empty((len(A), min(colunas, len(X))))
+    for inicio in range(0, len(X), colunas):
+        fim = min(inicio + colunas, len(X))
+        ladrilho = d[:, :fim - inicio]
+        np.matmul(A, X[inicio:fim].T, out=ladrilho)
+        ladrilho *= -2
+        ladrilho += normas_a[:, None]
+        ladrilho += normas[None, inicio:fim]
+        np.maximum(ladrilho, 0, out=ladrilho)
+        np.sqrt(ladrilho, out=ladrilho)
+        # clusters presentes no ladrilho e onde cada um começa
+        primeiro = np.searchsorted(fronteiras, inicio, side='right') - 1
+        ultimo = np.searchsorted(fronteiras, fim, side='left')
+        cortes = np.maximum(fronteiras[primeiro:ultimo], inicio) - inicio
+        somas[:, primeiro:ultimo] += np.add.reduceat(ladrilho, cortes, axis=1)
+    return somas
+
+
+def valores_silhueta(somas, codigos_linhas, tamanhos):
+    """s(i) a partir das somas por cluster (convenção do scikit-learn: s=0 em singletons)."""
+    n_linhas = len(codigos_linhas)
+    proprio = tamanhos[codigos_linhas]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        a = somas[np.arange(n_linhas), codigos_linhas] / (proprio - 1)
+        medias = somas / tamanhos[None, :]
+    medias[np.arange(n_linhas), codigos_linhas] = np.inf
+    b = medias.min(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        s = (b - a) / np.maximum(a, b)
+    s[(proprio <= 1) | ~np.isfinite(s)] = 0.0
+    return s
+
+
+def _inicializar(X, codigos, tamanhos):
+    global _X, _CODIGOS, _TAMANHOS, _NORMAS
+    _X, _CODIGOS, _TAMANHOS = X, codigos, tamanhos
+    _NORMAS = np.einsum('ij,ij->i', X, X)
+
+
+def _tarefa_bloco(linhas, memoria_mb):
+    """s(i) das linhas do bloco (índices nos dados ordenados por cluster)."""
+    somas = somas_por_cluster(_X, _TAMANHOS, linhas, memoria_mb, _NORMAS)
+    return valores_silhueta(somas, _CODIGOS[linhas], _TAMANHOS)
+
+
+def _valores(X, codigos, tamanhos, linhas, bloco, memoria_mb, n_jobs):
+    """s(i) de ``linhas``, em blocos distribuídos pelo pool de processos."""
+    blocos = [linhas[i:i + bloco] for i in range(0, len(linhas), bloco)]
+    with executor(n_jobs, _inicializar, (X, codigos, tamanhos), n_tarefas=len(blocos)) as pool:
+        return np.concatenate(list(pool.map(_tarefa_bloco, blocos, [memoria_mb] * len(blocos))))
+
+
+# ====================
+# MÉTODOS
+# ====================
+
+def silhueta_exata(X, rotulos, memoria_mb=MEMORIA_PADRAO, bloco=256, n_jobs=1):
+    """
+    Silhueta média exata. ``bloco`` linhas por tarefa; cada ladrilho de
+    distâncias ocupa no máximo ``memoria_mb`` por processo.
+    """
+    inicio_tempo = time.perf_counter()
+    X, codigos, tamanhos = _ordenar(X, rotulos)
+    if not 2 <= len(tamanhos) <= len(X) - 1:
+        raise ValueError('a silhueta exige entre 2 e n-1 clusters')
+
+    s = _valores(X, codigos, tamanhos, np.arange(len(X)), bloco, memoria_mb, n_jobs)
+    return Silhueta(float(s.mean()), 'exata', tempo=time.perf_counter() - inicio_tempo)
+
+
+def silhueta_amostrada(X, rotulos, n_amostra=AMOSTRA_PADRAO, confianca=0.95, semente=0,
+                       memoria_mb=MEMORIA_PADRAO, bloco=256, n_jobs=1):
+    """
+    Estimativa da silhueta média por amostragem estratificada por cluster.
+
+    Cada cluster recebe amostra proporcional ao seu tamanho (mínimo de 2
+    pontos); a silhueta de cada ponto amostrado é exata (comparada a todos
+    os n pontos). O intervalo usa a variância do estimador estratificado
+    com correção de população finita.
+    """
+    inicio_tempo = time.perf_counter()
+    X, codigos, tamanhos = _ordenar(X, rotulos)
+    k, n = len(tamanhos), len(X)
+    if not 2 <= k <= n - 1:
+        raise ValueError('a silhueta exige entre 2 e n-1 clusters')
+
+    rng = np.random.default_rng(semente)
+    alocacao = np.minimum(tamanhos, np.maximum(2, np.round(n_amostra * tamanhos / n).astype(int)))
+    inicios = np.concatenate(([0], np.cumsum(tamanhos)[:-1]))
+    linhas = np.concatenate([inicios[h] + rng.choice(tamanhos[h], alocacao[h], replace=False)
+                             for h in range(k)])
+
+    s = _valores(X, codigos, tamanhos, linhas, bloco, memoria_mb, n_jobs)
+
+    pesos = tamanhos / n
+    estrato = np.repeat(np.arange(k), alocacao)
+    medias = np.bincount(estrato, weights=s, minlength=k) / alocacao
+    quadrados = np.bincount(estrato, weights=(s - medias[estrato]) ** 2, minlength=k)
+    variancias = quadrados / np.maximum(alocacao - 1, 1)
+    estimativa = float(np.sum(pesos * medias))
+    erro = float(np.sqrt(np.sum(pesos ** 2 * (1 - alocacao / tamanhos) * variancias / alocacao)))
+    z = NormalDist().inv_cdf(0.5 + confianca / 2)
+    return Silhueta(estimativa, 'amostrada', estimativa - z * erro, estimativa + z * erro,
+                    int(alocacao.sum()), time.perf_counter() - inicio_tempo)
+
+
+# ====================
+# PONTO DE ENTRADA COM CACHE
+# ====================
+
+def digest(valores):
+    """Impressão digital de um array (formato, tipo e bytes)."""
+    valores = np.ascontiguousarray(valores)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f'{valores.shape}{valores.dtype}'.encode())
+    h.update(valores.data)
+    return h.hexdigest()
+
+
+def chave(X, rotulos, metodo, n_amostra=AMOSTRA_PADRAO, semente=0):
+    if metodo == 'auto':
+        metodo = 'exata' if len(X) <= LIMITE_EXATO else 'amostrada'
+    rotulos = np.asarray(rotulos).astype(np.int64)
+    extra = (n_amostra, semente) if metodo == 'amostrada' else ()
+    return (digest(np.asarray(X)), digest(rotulos), metodo) + extra
+
+
+def registrar(chave_cache, resultado):
+    """Guarda um resultado calculado em outro processo (ex.: na varredura de K)."""
+    _CACHE[chave_cache] = resultado
+
+
+def silhueta(X, rotulos, metodo='auto', n_amostra=AMOSTRA_PADRAO, semente=0, n_jobs=1,
+             memoria_mb=MEMORIA_PADRAO):
+    """
+    Silhueta média com cache por (dados, rótulos, método).
+
+    ``metodo``: 'exata', 'amostrada' ou 'auto' (exata até ``LIMITE_EXATO``
+    linhas). Retorna ``Silhueta``; use ``float()`` para o valor.
+    """
+    chave_cache = chave(X, rotulos, metodo, n_amostra, semente)
+    if chave_cache not in _CACHE:
+        if chave_cache[2] == 'exata':
+            _CACHE[chave_cache] = silhueta_exata(X, rotulos, memoria_mb=memoria_mb, n_jobs=n_jobs)
+        else:
+            _CACHE[chave_cache] = silhueta_amostrada(X, rotulos, n_amostra, semente=semente,
+                                                     memoria_mb=memoria_mb, n_jobs=n_jobs)
+    return _CACHE[chave_cache]
+
+
+def limpar_cache():
+    _CACHE.clear()
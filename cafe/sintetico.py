@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Gerador de datasets sintéticos com as regras de ``metodologia_dataset.md``.
+
+Com uma única unidade o resultado tem o formato da série de Varginha
+(2010-2024). Com mais unidades é um painel (``municipio_id``, ``municipio``,
+``regiao``, ``ano``, variáveis) em que cada unidade, município ou
+propriedade, recebe uma participação na área estadual. As regras:
+
+* área: participação da área de MG, com expansão de 8,3% em 15 anos;
+* índice tecnológico: de 2,1 a 6,8 em 15 anos, em ritmo crescente, escalado
+  pela adoção de cada unidade;
+* clima: choques anuais por região, com os anos de seca documentados
+  (2012, 2015, 2018, 2020, 2024; fora do período, sorteados);
+* produtividade: 1 414 kg/ha em 2010, com ganho pela tecnificação, perda
+  na seca e efeito da chuva;
+* investimento: crescimento exponencial (R$ 12,5 a 78,5 milhões em Varginha);
+* produtores: redução de 4,9% em 15 anos;
+* cafés especiais: de 10% a 31,5% da produção, conforme o índice;
+* preço da saca: tendência de R$ 280 a R$ 375, comum a todas as unidades.
+
+O gerador é determinístico para uma ``semente``: as unidades são geradas em
+blocos com sementes de ``np.random.SeedSequence``. Arquivos de milhões de
+linhas são gravados bloco a bloco (``gravar``), sem montar o DataFrame
+inteiro.
+"""
+
+import numpy as np
+import pandas as pd
+
+ANO_INICIAL = 2010
+ANOS = 15
+
+# Série de Varginha em 2010 e variação em 15 anos
+AREA_VARGINHA = 5800
+EXPANSAO_AREA = 0.083
+INDICE_INICIAL = 2.1
+INDICE_FINAL = 6.8
+PRODUTIVIDADE_INICIAL = 1414
+INVESTIMENTO_INICIAL = 12.5
+INVESTIMENTO_FINAL = 78.5
+PRODUTORES_INICIAL = 1850
+PRODUTORES_FINAL = 1760
+ESPECIAIS_INICIAL = 0.10
+ESPECIAIS_FINAL = 0.315
+PRECO_INICIAL = 280
+PRECO_FINAL = 375
+
+# Área colhida de MG em 2024 (IBGE), repartida entre as unidades do painel
+AREA_MG = 1_100_093
+
+# Anos de seca documentados; fora do período, a seca é sorteada com esta chance
+ANOS_SECA = (2012, 2015, 2018, 2020, 2024)
+CHANCE_SECA = 1 / 3
+
+# Regiões cafeeiras de MG e fração das unidades em cada uma
+REGIOES = {'Sul de Minas': 0.50, 'Cerrado Mineiro': 0.25, 'Matas de Minas': 0.20,
+           'Chapada de Minas': 0.05}
+
+# Primeiro código das unidades do painel (municípios de MG começam em 31)
+CODIGO_INICIAL = 3100000
+
+# Casas decimais das variáveis (as do CSV e as do DataFrame são as mesmas)
+DECIMAIS = 4
+
+# Unidades por bloco gerado (o bloco tem unidades x anos linhas)
+UNIDADES_BLOCO = 20000
+
+
+def unidades(linhas, anos=ANOS):
+    """Número de unidades de um dataset de ~``linhas`` linhas (linhas = unidades x anos)."""
+    return max(1, int(round(linhas / anos)))
+
+
+def _progresso(anos, ano_inicial):
+    """Fração do período de 15 anos de cada ano (1 em 2024; passa de 1 depois)."""
+    return (np.arange(ano_inicial, ano_inicial + anos) - ANO_INICIAL) / (ANOS - 1)
+
+
+def _parametros_unidades(n, rng):
+    """Área inicial, adoção, produtividade relativa, região e clima local de cada unidade."""
+    if n == 1:
+        return {'area': np.array([AREA_VARGINHA], dtype=float), 'adocao': np.ones(1),
+                'qualidade': np.ones(1), 'regiao': np.zeros(1, dtype=np.intp),
+                'chuva': np.zeros(1), 'temperatura': np.zeros(1)}
+    pesos = rng.lognormal(0, 1, n)
+    return {
+        'area': AREA_MG / (1 + EXPANSAO_AREA) * pesos / pesos.sum(),
+        'adocao': rng.uniform(0.6, 1.3, n),
+        'qualidade': rng.lognormal(0, 0.1, n),
+        'regiao': rng.choice(len(REGIOES), n, p=list(REGIOES.values())),
+        'chuva': rng.normal(0, 80, n),
+        'temperatura': rng.normal(0, 0.6, n),
+    }
+
+
+def _parametros_anos(anos, ano_inicial, rng):
+    """Seca, clima por região e preço de cada ano."""
+    calendario = np.arange(ano_inicial, ano_inicial + anos)
+    periodo = (calendario >= ANO_INICIAL) & (calendario < ANO_INICIAL + ANOS)
+    seca = np.where(periodo, np.isin(calendario, ANOS_SECA), rng.random(anos) < CHANCE_SECA)
+    chuva = 1580 - 140 * seca + rng.normal(0, 50, (len(REGIOES), anos))
+    tendencia = 20.6 + 0.06 * (calendario - ANO_INICIAL)
+    temperatura = tendencia + 0.003 * (chuva - 1550) + rng.normal(0, 0.15, (len(REGIOES), anos))
+    s = _progresso(anos, ano_inicial)
+    preco = (PRECO_INICIAL * (PRECO_FINAL / PRECO_INICIAL) ** s * (1 - 0.06 * seca)
+             * (1 + rng.normal(0, 0.02, anos)))
+    return {'seca': seca.astype(float), 'chuva': chuva, 'temperatura': temperatura,
+            'preco': preco}
+
+
+def _bloco(u, a, s, anos, rng):
+    """Variáveis (dicionário de arrays unidades x anos) de um bloco de unidades."""
+    n = len(u['area'])
+    forma = (n, anos)
+    area = u['area'][:, None] * (1 + EXPANSAO_AREA * s) * (1 + rng.normal(0, 0.005, forma))
+    adocao = u['adocao'][:, None]
+    indice = (INDICE_INICIAL * adocao + (INDICE_FINAL - INDICE_INICIAL) * adocao
+              * np.maximum(s, 0) ** 1.2 + rng.normal(0, 0.1, forma))
+    indice = np.clip(indice, 0, 10)
+    chuva = a['chuva'][u['regiao']] + u['chuva'][:, None] + rng.normal(0, 20, forma)
+    temperatura = (a['temperatura'][u['regiao']] + u['temperatura'][:, None]
+                   + rng.normal(0, 0.1, forma))
+    produtividade = (PRODUTIVIDADE_INICIAL * u['qualidade'][:, None]
+                     * (1 + 0.032 * (indice - INDICE_INICIAL)) * (1 - 0.03 * a['seca'])
+                     * (1 + 0.0002 * (chuva - 1550)) * (1 + rng.normal(0, 0.01, forma)))
+    producao = produtividade * area / 1000
+    escala = u['area'][:, None] / AREA_VARGINHA
+    investimento = (INVESTIMENTO_INICIAL * escala * adocao
+                    * (INVESTIMENTO_FINAL / INVESTIMENTO_INICIAL) ** s
+                    * (1 + rng.normal(0, 0.03, forma)))
+    produtores = np.maximum(1, np.round(PRODUTORES_INICIAL * escala
+                                        * (PRODUTORES_FINAL / PRODUTORES_INICIAL) ** s
+                                        * (1 + rng.normal(0, 0.01, forma))))
+    fracao = np.clip(ESPECIAIS_INICIAL + (ESPECIAIS_FINAL - ESPECIAIS_INICIAL)
+                     * (indice - INDICE_INICIAL) / (INDICE_FINAL - INDICE_INICIAL), 0, 0.6)
+    return {
+        'producao_total_ton': producao,
+        'area_colhida_ha': area,
+        'produtividade_kg_ha': produtividade,
+        'indice_tecnologico': indice,
+        'investimento_tecnologia_milhoes': investimento,
+        'numero_produtores': produtores.astype(np.int64),
+        'producao_especiais_ton': producao * fracao,
+        'preco_medio_saca_reais': np.broadcast_to(a['preco'], forma),
+        'temperatura_media_c': temperatura,
+        'precipitacao_mm': chuva,
+    }
+
+
+def gerar_blocos(linhas=ANOS, anos=ANOS, ano_inicial=ANO_INICIAL, semente=42):
+    """
+    Gera o dataset sintético em DataFrames de até ``UNIDADES_BLOCO``
+    unidades (todas as linhas de cada unidade ficam no mesmo bloco).
+    """
+    n = unidades(linhas, anos)
+    sementes = np.random.SeedSequence(semente).spawn(2)
+    rng = np.random.default_rng(sementes[0])
+    u = _parametros_unidades(n, rng)
+    a = _parametros_anos(anos, ano_inicial, rng)
+    s = _progresso(anos, ano_inicial)
+    calendario = np.arange(ano_inicial, ano_inicial + anos)
+    if n > 1:
+        municipios = pd.CategoricalDtype([f'Municipio {i}' for i in range(n)])
+        regioes = pd.CategoricalDtype(list(REGIOES))
+
+    n_blocos = -(-n // UNIDADES_BLOCO)
+    for b, semente_bloco in enumerate(sementes[1].spawn(n_blocos)):
+        inicio, fim = b * UNIDADES_BLOCO, min(n, (b + 1) * UNIDADES_BLOCO)
+        valores = _bloco({c: v[inicio:fim] for c, v in u.items()}, a, s, anos,
+                         np.random.default_rng(semente_bloco))
+        valores = {c: np.round(v, DECIMAIS).ravel() for c, v in valores.items()}
+        if n == 1:
+            yield pd.DataFrame({'ano': calendario, **valores})
+            continue
+        posicoes = np.repeat(np.arange(inicio, fim), anos)
+        yield pd.DataFrame({
+            'municipio_id': CODIGO_INICIAL + posicoes,
+            'municipio': pd.Categorical.from_codes(posicoes, dtype=municipios),
+            'regiao': pd.Categorical.from_codes(u['regiao'][posicoes], dtype=regioes),
+            'ano': np.tile(calendario, fim - inicio),
+            **valores
+        })
+
+
+def gerar(linhas=ANOS, anos=ANOS, ano_inicial=ANO_INICIAL, semente=42):
+    """
+    Dataset sintético com ~``linhas`` linhas (unidades x ``anos``). Com
+    ``linhas <= anos`` é uma série única no formato da série de Varginha.
+    """
+    blocos = list(gerar_blocos(linhas, anos, ano_inicial, semente))
+    return pd.concat(blocos, ignore_index=True) if len(blocos) > 1 else blocos[0]
+
+
+def gravar(caminho, linhas=ANOS, anos=ANOS, ano_inicial=ANO_INICIAL, semente=42):
+    """Grava o dataset sintético em CSV, bloco a bloco. Retorna o número de linhas."""
+    total = 0
+    for i, bloco in enumerate(gerar_blocos(linhas, anos, ano_inicial, semente)):
+        bloco.to_csv(caminho, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+        total += len(bloco)
+    return total
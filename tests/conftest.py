@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Dados compartilhados pelos testes: a série de Varginha e um painel sintético."""
+
+import os
+import shutil
+
+import pytest
+
+from cafe import sintetico
+from cafe.dados import CAMINHO_PADRAO, load
+
+
+@pytest.fixture(scope='session', autouse=True)
+def cache_isolado(tmp_path_factory):
+    """Caches do pacote (CSV, distâncias, gráficos) num diretório temporário."""
+    anterior = os.environ.get('CAFE_CACHE')
+    os.environ['CAFE_CACHE'] = str(tmp_path_factory.mktemp('cache'))
+    yield
+    if anterior is None:
+        os.environ.pop('CAFE_CACHE', None)
+    else:
+        os.environ['CAFE_CACHE'] = anterior
+
+
+@pytest.fixture
+def arquivo_serie(tmp_path):
+    """Cópia do dataset de Varginha que o teste pode alterar."""
+    destino = tmp_path / 'dados.csv'
+    shutil.copyfile(CAMINHO_PADRAO, destino)
+    return destino
+
+
+@pytest.fixture(scope='session')
+def serie():
+    return load(CAMINHO_PADRAO, cache=False)
+
+
+@pytest.fixture(scope='session')
+def painel():
+    """Painel sintético de 40 municípios x 15 anos."""
+    return sintetico.gerar(linhas=600)
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+"""Opções repassadas pelos atalhos ao ``cafe render``."""
+
+import pytest
+
+from cafe.cli import criar_parser, opcoes_render
+
+
+@pytest.mark.parametrize('argv, esperado', [
+    (['-k', '3', '--criterio', 'gap', '--dados', 'x.csv', '--saida', 'analise'],
+     ['--saida', 'analise', '--dados', 'x.csv']),
+    (['--reamostras', '100', '--n-jobs', '2', '--sem-cache', '--fluxo'],
+     ['--saida', '.', '--n-jobs', '2', '--sem-cache']),
+    (['--dados=y.csv', '--float64'], ['--saida', '.', '--dados', 'y.csv', '--float64']),
+])
+def test_opcoes_render(argv, esperado):
+    opcoes = opcoes_render(argv)
+    assert opcoes == esperado
+    # O render aceita todas as opções repassadas
+    criar_parser().parse_args(['render', '--conjunto', 'cluster', *opcoes])
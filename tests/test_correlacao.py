@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Correlação em blocos (``cafe.correlacao``) contra ``DataFrame.corr``."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cafe.correlacao import correlacao, parceiros
+
+
+@pytest.fixture
+def largo():
+    """70 indicadores correlacionados em 300 linhas (blocos de 16 colunas nos testes)."""
+    rng = np.random.default_rng(5)
+    fatores = rng.normal(size=(300, 5))
+    X = fatores @ rng.normal(size=(5, 70)) + rng.normal(size=(300, 70))
+    return pd.DataFrame(X, columns=[f'v{j}' for j in range(70)])
+
+
+@pytest.fixture
+def com_ausentes(largo):
+    rng = np.random.default_rng(6)
+    return largo.mask(rng.random(largo.shape) < 0.1)
+
+
+@pytest.mark.parametrize('metodo', ['pearson', 'spearman'])
+def test_float64_igual_ao_pandas(largo, metodo):
+    R = correlacao(largo, metodo=metodo, dtype=np.float64, bloco=16)
+    pd.testing.assert_frame_equal(R, largo.corr(method=metodo), rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize('metodo', ['pearson', 'spearman'])
+def test_float32(largo, metodo):
+    R = correlacao(largo, metodo=metodo, bloco=16)
+    np.testing.assert_allclose(R, largo.corr(method=metodo), atol=1e-5)
+
+
+def test_pearson_com_ausentes_par_a_par(com_ausentes):
+    R = correlacao(com_ausentes, dtype=np.float64, bloco=16)
+    np.testing.assert_allclose(R, com_ausentes.corr(), atol=1e-10)
+
+
+def test_spearman_com_ausentes_usa_postos_da_coluna(com_ausentes):
+    # Os postos são os da coluna inteira: perto, mas não igual, ao pandas
+    R = correlacao(com_ausentes, metodo='spearman', dtype=np.float64, bloco=16)
+    diferenca = np.abs(R.to_numpy() - com_ausentes.corr(method='spearman').to_numpy())
+    assert np.nanmax(diferenca) < 1e-2
+
+
+def test_kendall(largo):
+    parte = largo.iloc[:, :8]
+    np.testing.assert_allclose(correlacao(parte, metodo='kendall', n_jobs=2),
+                               parte.corr(method='kendall'), atol=1e-12)
+
+
+def test_coluna_constante_fica_nan(largo):
+    dados = largo.iloc[:, :5].assign(constante=1.0)
+    R = correlacao(dados, dtype=np.float64)
+    assert R['constante'].isna().all()
+    assert dados.corr()['constante'].isna().all()
+
+
+def test_parceiros_iguais_a_matriz(largo):
+    R = largo.corr()
+    tabela = parceiros(largo, k=3, dtype=np.float64, bloco=16)
+    assert len(tabela) == 3 * largo.shape[1]
+    for variavel, grupo in tabela.groupby('variavel'):
+        esperado = R[variavel].drop(variavel).abs().nlargest(3)
+        assert list(grupo.sort_values('posicao')['parceiro']) == list(esperado.index)
+        np.testing.assert_allclose(grupo['correlacao'].abs().sort_values(ascending=False),
+                                   esperado, atol=1e-12)
+
+
+def test_metodo_desconhecido(largo):
+    with pytest.raises(ValueError):
+        correlacao(largo, metodo='cosseno')
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Carga do CSV e cache binário (``cafe.dados``)."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cafe.dados import load
+
+
+@pytest.fixture
+def com_extras(arquivo_serie):
+    """Dataset de Varginha com um indicador real e um texto fora do esquema."""
+    df = pd.read_csv(arquivo_serie)
+    df['indicador_extra'] = np.linspace(0.1, 1.5, len(df))
+    df['fonte'] = np.where(df['ano'] < 2018, 'CONAB', 'IBGE')
+    df.to_csv(arquivo_serie, index=False)
+    return arquivo_serie
+
+
+@pytest.mark.parametrize('compacto', [True, False])
+def test_cache_igual_a_leitura_direta(com_extras, compacto):
+    direto = load(com_extras, cache=False, compacto=compacto)
+    gravado = load(com_extras, compacto=compacto)
+    lido = load(com_extras, compacto=compacto)
+    pd.testing.assert_frame_equal(gravado, direto)
+    pd.testing.assert_frame_equal(lido, direto)
+
+
+def test_cache_separa_os_tipos(com_extras):
+    compacto = load(com_extras)
+    completo = load(com_extras, compacto=False)
+    assert isinstance(compacto['fonte'].dtype, pd.CategoricalDtype)
+    assert not isinstance(completo['fonte'].dtype, pd.CategoricalDtype)
+    assert completo['indicador_extra'].dtype == np.float64
+    # Arquivo pequeno: medidas em float64 também no modo compacto
+    assert compacto['produtividade_kg_ha'].dtype == np.float64
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Estado incremental (``cafe.incremental``) contra o recálculo completo."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cafe.estatistica import (VARIAVEIS_NUMERICAS, correlate_grupos, describe_grupos, regress,
+                              regress_grupos)
+from cafe.incremental import EstadoEstatistico
+
+
+def _partes(painel):
+    """Três safras: a base até 2019 sem os últimos municípios, 2020-2021 e o resto."""
+    ultimos = painel['municipio_id'] >= painel['municipio_id'].max() - 4
+    base = (painel['ano'] < 2020) & ~ultimos
+    meio = (painel['ano'] < 2022) & ~base
+    return painel[base], painel[meio], painel[~base & ~meio]
+
+
+def _acumulado(painel, **opcoes):
+    base, *novas = _partes(painel)
+    estado = EstadoEstatistico.de_dataframe(base, **opcoes)
+    for parte in novas:
+        estado.atualizar(parte)
+    return estado
+
+
+def _alinhada(tabela):
+    """Rótulos de grupo como objetos, em ordem (categorias e texto comparáveis)."""
+    return tabela.set_axis(tabela.index.astype(object).rename(None)).sort_index()
+
+
+@pytest.fixture(scope='module')
+def estado(painel):
+    return _acumulado(painel)
+
+
+def test_momentos_iguais_ao_recalculo(estado, painel):
+    completo = painel[VARIAVEIS_NUMERICAS].describe()
+    incremental = estado.describe()
+    linhas = ['count', 'mean', 'std', 'min', 'max']
+    pd.testing.assert_frame_equal(incremental.loc[linhas], completo.loc[linhas], rtol=1e-10)
+    pd.testing.assert_frame_equal(estado.correlacao(), painel[VARIAVEIS_NUMERICAS].corr(),
+                                  rtol=0, atol=1e-10)
+
+
+def test_regressao_igual_ao_recalculo(estado, painel):
+    incremental, completo = estado.regressao(), regress(painel)
+    assert incremental['n'] == completo['n']
+    assert incremental['intercepto'] == pytest.approx(completo['intercepto'], rel=1e-9)
+    for chave in ('coeficientes', 'erros_padrao', 'p_valores'):
+        assert list(incremental[chave].values()) == \
+            pytest.approx(list(completo[chave].values()), rel=1e-8)
+    assert incremental['r2'] == pytest.approx(completo['r2'], rel=1e-10)
+
+
+def test_grupos_iguais_ao_recalculo(estado, painel):
+    por = estado.por
+    assert por is not None
+    pd.testing.assert_frame_equal(_alinhada(estado.medias_grupos()),
+                                  _alinhada(describe_grupos(painel, por)), rtol=1e-10)
+    pd.testing.assert_frame_equal(_alinhada(estado.correlacao_grupos()),
+                                  _alinhada(correlate_grupos(painel, por)), rtol=0, atol=1e-10)
+    incremental = _alinhada(estado.regressao_grupos())
+    completo = _alinhada(regress_grupos(painel, por))
+    pd.testing.assert_frame_equal(incremental, completo, rtol=1e-8, check_dtype=False)
+
+
+def test_quartis_do_histograma(estado, painel):
+    completo = painel[VARIAVEIS_NUMERICAS].describe().loc[['25%', '50%', '75%']]
+    incremental = estado.describe().loc[['25%', '50%', '75%']]
+    # Erro menor que uma classe, mesmo com classes vazias entre os postos vizinhos
+    tolerancia = pd.Series(estado.largura_histograma, index=estado.variaveis)
+    assert ((incremental - completo).abs() <= tolerancia).all().all()
+    assert estado.histograma.sum(axis=1).tolist() == [len(painel)] * len(estado.variaveis)
+
+
+def test_quartis_com_classes_vazias_entre_os_postos():
+    # Dois blocos distantes: a mediana interpola entre eles, atravessando classes vazias
+    valores = np.concatenate([np.linspace(0, 9, 10), np.linspace(1000, 1009, 10)])
+    df = pd.DataFrame({'a': valores})
+    estado = EstadoEstatistico.de_dataframe(df.iloc[::2], variaveis=['a']).atualizar(df.iloc[1::2])
+    completo = df['a'].describe()
+    for quartil in ('25%', '50%', '75%'):
+        assert abs(estado.describe().at[quartil, 'a'] - completo[quartil]) < \
+            estado.largura_histograma[0]
+
+
+def test_quartis_exatos(painel):
+    estado = _acumulado(painel, quartis_exatos=True)
+    pd.testing.assert_frame_equal(estado.describe(), painel[VARIAVEIS_NUMERICAS].describe(),
+                                  rtol=1e-10)
+    assert estado.histograma.size == 0
+
+
+def test_histograma_de_tamanho_fixo(painel):
+    base, *novas = _partes(painel)
+    estado = EstadoEstatistico.de_dataframe(base)
+    forma = estado.histograma.shape
+    # Uma safra bem fora da faixa da base: as classes dobram, o histograma não cresce
+    estado.atualizar(novas[0].assign(precipitacao_mm=novas[0]['precipitacao_mm'] * 10))
+    assert estado.histograma.shape == forma
+    assert estado.histograma.sum() == (len(base) + len(novas[0])) * len(estado.variaveis)
+
+
+def test_salvar_e_carregar(estado, tmp_path):
+    caminho = tmp_path / 'estado.npz'
+    estado.salvar(caminho)
+    carregado = EstadoEstatistico.carregar(caminho)
+    pd.testing.assert_frame_equal(carregado.describe(), estado.describe())
+    pd.testing.assert_frame_equal(carregado.regressao_grupos(), estado.regressao_grupos())
+    assert carregado.quartis_exatos is False
+    assert carregado.anos == estado.anos
+
+
+def test_arquivo_repetido_recusado(painel, tmp_path):
+    base, novas, _ = _partes(painel)
+    caminho = tmp_path / 'safra.csv'
+    novas.to_csv(caminho, index=False)
+    estado = EstadoEstatistico.de_dataframe(base).ingerir(caminho)
+    assert estado.n == len(base) + len(novas)
+    with pytest.raises(ValueError):
+        estado.ingerir(caminho)
+
+
+def test_valores_ausentes_recusados(painel):
+    estado = EstadoEstatistico.de_dataframe(painel.iloc[:100])
+    with pytest.raises(ValueError):
+        estado.atualizar(painel.iloc[100:110].assign(precipitacao_mm=np.nan))
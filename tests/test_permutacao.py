@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""ANOVA e Kruskal–Wallis por permutação (``cafe.permutacao``) contra o scipy."""
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from cafe.estatistica import ALVO, anova
+from cafe.grupos import IndiceGrupos
+from cafe.permutacao import anova_permutacao
+
+
+@pytest.fixture
+def grupos():
+    rng = np.random.default_rng(1)
+    codigos = np.repeat([0, 1, 2, 3], [12, 20, 7, 31])
+    valores = np.column_stack([
+        rng.normal(codigos * 0.3, 1.0),
+        rng.exponential(1 + codigos),
+        np.round(rng.normal(size=len(codigos)), 1)      # com empates nos postos
+    ])
+    return IndiceGrupos(codigos), valores
+
+
+def test_estatisticas_iguais_ao_scipy(grupos):
+    indice, valores = grupos
+    tabela = anova_permutacao(indice, valores, permutacoes=0)
+    for j in range(valores.shape[1]):
+        amostras = [valores[indice.codigos == g, j] for g in range(indice.n_grupos)]
+        f, p_f = stats.f_oneway(*amostras)
+        h, p_qui2 = stats.kruskal(*amostras)
+        assert tabela['F'].iloc[j] == pytest.approx(f, rel=1e-10)
+        assert tabela['p_f'].iloc[j] == pytest.approx(p_f, rel=1e-8)
+        assert tabela['H'].iloc[j] == pytest.approx(h, rel=1e-10)
+        assert tabela['p_qui2'].iloc[j] == pytest.approx(p_qui2, rel=1e-8)
+    assert tabela['p_valor'].isna().all()
+
+
+def test_p_valor_de_permutacao(grupos):
+    indice, valores = grupos
+    tabela = anova_permutacao(indice, valores, permutacoes=999, n_jobs=1)
+    p = tabela[['p_valor', 'p_kruskal']].to_numpy()
+    assert ((p >= 1 / 1000) & (p <= 1)).all()
+    # Com dados normais, permutação e distribuição F concordam de perto
+    assert tabela['p_valor'].iloc[0] == pytest.approx(tabela['p_f'].iloc[0], abs=0.05)
+    # Mesma semente, mesmo resultado, com ou sem o pool
+    paralelo = anova_permutacao(indice, valores, permutacoes=999, n_jobs=2)
+    np.testing.assert_array_equal(paralelo['p_valor'], tabela['p_valor'])
+
+
+def test_anova_do_painel(painel):
+    f, p = anova(painel, ALVO, por='regiao', permutacoes=0)
+    amostras = [grupo[ALVO].to_numpy() for _, grupo in painel.groupby('regiao', observed=True)]
+    esperado = stats.f_oneway(*amostras)
+    assert f == pytest.approx(esperado.statistic, rel=1e-8)
+    assert p == pytest.approx(esperado.pvalue, rel=1e-6)
+
+
+def test_um_grupo_so():
+    with pytest.raises(ValueError):
+        anova_permutacao(IndiceGrupos(np.zeros(10, dtype=int)), np.arange(10.0), permutacoes=0)
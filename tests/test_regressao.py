@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""MQO em lote (``cafe.regressao``) contra ``np.linalg.lstsq``."""
+
+import numpy as np
+import pytest
+
+from cafe.estatistica import ALVO, REGRESSORES, ols_grupos, regress
+from cafe.grupos import IndiceGrupos
+from cafe.regressao import ols, ols_momentos
+
+
+def _lstsq(X, y):
+    """Coeficientes, erros padrão e R² de referência (intercepto na primeira coluna)."""
+    A = np.column_stack([np.ones(len(X)), X])
+    beta, _, _, _ = np.linalg.lstsq(A, y, rcond=None)
+    residuos = y - A @ beta
+    gl = len(y) - A.shape[1]
+    sigma2 = residuos @ residuos / gl
+    erros = np.sqrt(sigma2 * np.diag(np.linalg.inv(A.T @ A)))
+    r2 = 1 - residuos @ residuos / np.sum((y - y.mean()) ** 2)
+    return beta, erros, r2
+
+
+def test_serie_igual_ao_lstsq(serie):
+    X = serie[REGRESSORES].to_numpy(dtype=float)
+    y = serie[ALVO].to_numpy(dtype=float)
+    beta, erros, r2 = _lstsq(X, y)
+
+    resultado = regress(serie)
+    assert resultado['intercepto'] == pytest.approx(beta[0], rel=1e-9)
+    assert list(resultado['coeficientes'].values()) == pytest.approx(beta[1:], rel=1e-9)
+    assert list(resultado['erros_padrao'].values()) == pytest.approx(erros, rel=1e-8)
+    assert resultado['r2'] == pytest.approx(r2, rel=1e-10)
+
+
+def test_grupos_iguais_ao_lstsq_de_cada_grupo(painel):
+    modelos = ols_grupos(painel, 'municipio_id')
+    for g, rotulo in enumerate(modelos.rotulos):
+        grupo = painel[painel['municipio_id'] == rotulo]
+        beta, erros, r2 = _lstsq(grupo[REGRESSORES].to_numpy(dtype=float),
+                                 grupo[ALVO].to_numpy(dtype=float))
+        np.testing.assert_allclose(modelos.coeficientes[g], beta, rtol=1e-6, atol=1e-8)
+        np.testing.assert_allclose(modelos.erros_padrao[g], erros, rtol=1e-6)
+        assert modelos.r2[g] == pytest.approx(r2, rel=1e-8)
+
+
+def test_momentos_iguais_as_linhas():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    y = X @ [1.5, -2.0, 0.5] + rng.normal(size=200)
+    Xc, yc = X - X.mean(axis=0), y - y.mean()
+
+    direto = ols(X, y)
+    por_momentos = ols_momentos(np.array([len(X)]), X.mean(axis=0)[None], np.array([y.mean()]),
+                                (Xc.T @ Xc)[None], (Xc.T @ yc)[None], np.array([yc @ yc]))
+    np.testing.assert_allclose(por_momentos.coeficientes, direto.coeficientes, rtol=1e-12)
+    np.testing.assert_allclose(por_momentos.erros_padrao, direto.erros_padrao, rtol=1e-10)
+    np.testing.assert_allclose(por_momentos.r2, direto.r2, rtol=1e-12)
+
+
+def test_grupo_pequeno_fica_nan():
+    X = np.arange(12, dtype=float).reshape(6, 2) ** 1.5
+    y = np.arange(6, dtype=float)
+    indice = IndiceGrupos(np.array([0, 0, 0, 1, 1, 1]))
+    modelos = ols(X, y, indice)
+    # 3 observações para 2 regressores e intercepto: sem graus de liberdade
+    assert np.isnan(modelos.coeficientes).all()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Rotas, erros e cache do serviço HTTP, chamados pelo ``ClienteLocal``."""
+
+import os
+
+import pytest
+
+from cafe.estatistica import ALVO
+from cafe.servidor import Aplicacao, Analises, CacheLRU, ClienteLocal
+
+
+@pytest.fixture
+def analises(arquivo_serie):
+    return Analises(arquivo_serie, cache=False, n_jobs=1)
+
+
+@pytest.fixture
+def cliente(analises):
+    return ClienteLocal(Aplicacao(analises))
+
+
+# ====================
+# ROTAS
+# ====================
+
+def test_saude(cliente):
+    resposta = cliente.get('/saude')
+    assert resposta.status == 200
+    corpo = resposta.json()
+    assert corpo['status'] == 'ok'
+    assert corpo['linhas'] == 15
+    assert corpo['painel'] is False
+    assert 'X-Tempo-ms' in resposta.cabecalhos
+
+
+def test_descritivas_com_e_sem_filtros(cliente):
+    completo = cliente.get('/descritivas').json()
+    assert completo['linhas'] == 15
+    assert completo['descritivas'][ALVO]['count'] == 15
+
+    recorte = cliente.get('/descritivas?ano_inicio=2015&ano_fim=2019').json()
+    assert recorte['linhas'] == 5
+    assert recorte['filtros'] == {'ano_inicio': 2015, 'ano_fim': 2019, 'municipio': []}
+
+
+@pytest.mark.parametrize('metodo', ['pearson', 'spearman', 'kendall'])
+def test_correlacao(cliente, metodo):
+    resposta = cliente.get(f'/correlacao?metodo={metodo}')
+    assert resposta.status == 200
+    corpo = resposta.json()
+    assert corpo['metodo'] == metodo
+    assert corpo['correlacao'][ALVO][ALVO] == pytest.approx(1.0)
+
+
+def test_regressao(cliente):
+    completo = cliente.get('/regressao').json()['regressao']
+    assert completo['n'] == 15
+    assert completo['alvo'] == ALVO
+    assert cliente.get('/regressao?ano_inicio=2014').json()['regressao']['n'] == 11
+
+
+def test_cluster(cliente):
+    corpo = cliente.get('/cluster').json()
+    assert corpo['k'] >= 2
+    assert len(corpo['observacoes']) == 15
+    assert sum(nivel['n'] for nivel in corpo['resumo']) == 15
+    assert len(cliente.get('/cluster?ano_fim=2016').json()['observacoes']) == 7
+
+
+def test_graficos(cliente):
+    nomes = {g['nome'] for g in cliente.get('/graficos').json()['graficos']}
+    assert 'grafico1_evolucao_temporal' in nomes
+
+    png = cliente.get('/graficos/grafico1_evolucao_temporal.png')
+    assert png.status == 200
+    assert png.tipo == 'image/png'
+    assert png.corpo.startswith(b'\x89PNG')
+
+    svg = cliente.get('/graficos/grafico1_evolucao_temporal.svg?ano_inicio=2015')
+    assert svg.status == 200
+    assert svg.tipo == 'image/svg+xml'
+    assert b'<svg' in svg.corpo
+
+
+# ====================
+# ERROS
+# ====================
+
+@pytest.mark.parametrize('url, status', [
+    ('/descritivas?ano_inicio=dois-mil', 400),
+    ('/correlacao?metodo=cosseno', 400),
+    ('/descritivas?municipio=Varginha', 400),
+    ('/graficos/grafico5_clusters_kmeans.png?ano_fim=2020', 400),
+    ('/graficos/grafico1_evolucao_temporal.png?perfil=tela', 400),
+    ('/descritivas?ano_inicio=2100', 404),
+    ('/regressao?ano_inicio=2020&ano_fim=2010', 404),
+    ('/inexistente', 404),
+    ('/graficos/inexistente.png', 404),
+    ('/graficos/grafico1_evolucao_temporal.gif', 404),
+])
+def test_erros(cliente, url, status):
+    resposta = cliente.get(url)
+    assert resposta.status == status
+    assert resposta.json()['erro']
+
+
+def test_filtro_vazio(cliente):
+    resposta = cliente.get('/descritivas?ano_inicio=2100')
+    assert resposta.json()['erro'] == 'nenhuma linha atende aos filtros'
+
+
+def test_metodo_nao_suportado(analises):
+    resposta = Aplicacao(analises).responder('POST', '/saude')
+    assert resposta.status == 405
+
+
+# ====================
+# CACHE
+# ====================
+
+def test_acerto_depois_de_falha(cliente):
+    primeira = cliente.get('/correlacao?metodo=spearman')
+    segunda = cliente.get('/correlacao?metodo=spearman')
+    assert primeira.cabecalhos['X-Cache'] == 'falha'
+    assert segunda.cabecalhos['X-Cache'] == 'acerto'
+    assert segunda.corpo == primeira.corpo
+    # A ordem dos filtros não muda a chave
+    cliente.get('/descritivas?ano_inicio=2012&ano_fim=2020')
+    assert cliente.get('/descritivas?ano_fim=2020&ano_inicio=2012').cabecalhos['X-Cache'] == 'acerto'
+
+
+def test_lru_descarta_o_usado_ha_mais_tempo(analises):
+    aplicacao = Aplicacao(analises, capacidade=2)
+    cliente = ClienteLocal(aplicacao)
+    cliente.get('/descritivas')
+    cliente.get('/regressao')
+    cliente.get('/descritivas')             # /descritivas passa a ser a mais recente
+    cliente.get('/correlacao')              # descarta /regressao
+    assert len(aplicacao.lru) == 2
+    assert cliente.get('/descritivas').cabecalhos['X-Cache'] == 'acerto'
+    assert cliente.get('/correlacao').cabecalhos['X-Cache'] == 'acerto'
+    assert cliente.get('/regressao').cabecalhos['X-Cache'] == 'falha'
+
+
+def test_cache_lru_isolado():
+    lru = CacheLRU(capacidade=1)
+    assert lru.obter('a', lambda: 1) == (1, False)
+    assert lru.obter('a', lambda: 2) == (1, True)
+    assert lru.obter('b', lambda: 3) == (3, False)
+    assert lru.obter('a', lambda: 4) == (4, False)
+    assert (lru.acertos, lru.falhas) == (1, 3)
+
+
+def test_recarrega_quando_a_data_muda(cliente, analises, arquivo_serie):
+    assert cliente.get('/descritivas').cabecalhos['X-Cache'] == 'falha'
+    assert cliente.get('/descritivas').cabecalhos['X-Cache'] == 'acerto'
+    assinatura = analises.assinatura
+
+    estado = os.stat(arquivo_serie)
+    os.utime(arquivo_serie, ns=(estado.st_atime_ns, estado.st_mtime_ns + 10**9))
+    resposta = cliente.get('/descritivas')
+    assert resposta.cabecalhos['X-Cache'] == 'falha'
+    assert analises.assinatura != assinatura
+
+
+def test_recarrega_quando_o_tamanho_muda(cliente, arquivo_serie):
+    assert cliente.get('/saude').json()['linhas'] == 15
+    cliente.get('/descritivas')
+
+    linhas = arquivo_serie.read_text().splitlines()
+    ultima = linhas[-1].split(',')
+    ultima[0] = str(int(ultima[0]) + 1)
+    arquivo_serie.write_text('\n'.join([*linhas, ','.join(ultima)]) + '\n')
+
+    resposta = cliente.get('/descritivas')
+    assert resposta.cabecalhos['X-Cache'] == 'falha'
+    assert resposta.json()['linhas'] == 16
+    assert cliente.get('/saude').json()['cache']['itens'] == 1
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Silhueta em ladrilhos (``cafe.silhueta``) contra ``sklearn.metrics.silhouette_score``."""
+
+import numpy as np
+import pytest
+from sklearn.metrics import silhouette_score
+
+from cafe import silhueta
+
+
+@pytest.fixture
+def agrupados():
+    rng = np.random.default_rng(3)
+    centros = np.array([[0, 0, 0], [4, 0, 1], [0, 5, -1], [3, 3, 3]])
+    rotulos = rng.integers(0, len(centros), 1500)
+    X = centros[rotulos] + rng.normal(size=(1500, 3))
+    # Rótulos fora de 0..k-1 e não contíguos
+    return X, np.array([7, -2, 10, 3])[rotulos]
+
+
+def test_exata_igual_ao_sklearn(agrupados):
+    X, rotulos = agrupados
+    esperado = silhouette_score(X, rotulos)
+    assert float(silhueta.silhueta_exata(X, rotulos)) == pytest.approx(esperado, rel=1e-8)
+
+
+def test_ladrilhos_pequenos_e_processos(agrupados):
+    X, rotulos = agrupados
+    esperado = silhouette_score(X, rotulos)
+    # Ladrilhos de ~0,1 MB e blocos de 100 linhas em dois processos
+    resultado = silhueta.silhueta_exata(X, rotulos, memoria_mb=0.1, bloco=100, n_jobs=2)
+    assert float(resultado) == pytest.approx(esperado, rel=1e-8)
+
+
+def test_float32(agrupados):
+    X, rotulos = agrupados
+    esperado = silhouette_score(X, rotulos)
+    assert float(silhueta.silhueta_exata(X.astype(np.float32), rotulos)) == \
+        pytest.approx(esperado, abs=1e-4)
+
+
+def test_amostrada_cobre_a_exata(agrupados):
+    X, rotulos = agrupados
+    esperado = silhouette_score(X, rotulos)
+    estimativa = silhueta.silhueta_amostrada(X, rotulos, n_amostra=300, semente=0)
+    assert estimativa.metodo == 'amostrada'
+    assert estimativa.ic_inferior < estimativa.valor < estimativa.ic_superior
+    # Dentro de duas meias-larguras do intervalo (cerca de 4 erros padrão)
+    assert abs(estimativa.valor - esperado) <= estimativa.ic_superior - estimativa.ic_inferior
+
+
+def test_cache(agrupados):
+    X, rotulos = agrupados
+    silhueta.limpar_cache()
+    primeira = silhueta.silhueta(X, rotulos, metodo='exata')
+    assert silhueta.silhueta(X, rotulos, metodo='exata') is primeira
+
+
+def test_um_cluster_so():
+    with pytest.raises(ValueError):
+        silhueta.silhueta_exata(np.zeros((5, 2)), np.zeros(5, dtype=int))